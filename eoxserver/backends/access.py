@@ -28,9 +28,11 @@
 
 
 from os import makedirs, path
+from functools import partial
 import hashlib
 import logging
 
+from eoxserver.contrib import gdal
 from eoxserver.backends.cache import get_cache_context
 from eoxserver.backends.component import BackendComponent, env
 
@@ -52,6 +54,14 @@ def connect(data_item, cache=None):
 
     backend = BackendComponent(env)
 
+    if data_item.package:
+        # access the file directly within the package if possible, otherwise 
+        # fall back to extraction
+        return (
+            _connect_package_item(backend, data_item, cache) 
+            or retrieve(data_item, cache)
+        )
+
     storage = data_item.storage
 
     if storage:
@@ -64,6 +74,16 @@ def connect(data_item, cache=None):
 
 
 
+def list_contents(package, location="", cache=None):
+    """ Returns the locations of all files within the given package under the 
+        specified location.
+    """
+
+    backend = BackendComponent(env)
+    component = backend.get_package_component(package.format)
+    return component.list_contents(retrieve(package, cache), location)
+
+
 def retrieve(data_item, cache=None):
     """ 
     """
@@ -73,33 +93,91 @@ def retrieve(data_item, cache=None):
     if cache is None:
         cache = get_cache_context()
 
-    # compute a cache path where the file *would* be cached
+    # compute the ID under which the file *would* be cached
     with cache:
         item_id = generate_hash(data_item.location, data_item.format)
-        path = cache.relative_path(item_id)
 
         logger.debug("Retrieving %s (ID: %s)" % (data_item, item_id))
-
-        if item_id in cache:
-            logger.debug("Item %s is already in the cache." % item_id)
-            return path
         
         if data_item.package is None and data_item.storage:
-            return _retrieve_from_storage(
-                backend, data_item, data_item.storage, item_id, path, cache
-            )
+            return cache.fetch(item_id, partial(
+                _retrieve_from_storage, backend, data_item, data_item.storage
+            ))
 
         elif data_item.package:
-            return _extract_from_package(
-                backend, data_item, data_item.package, item_id, path, cache
-            )
+            return cache.fetch(item_id, partial(
+                _extract_from_package, backend, data_item, data_item.package, 
+                cache
+            ))
 
         else:
             return data_item.location
 
 
 
-def _retrieve_from_storage(backend, data_item, storage, item_id, path, cache):
+def _connect_package_item(backend, item, cache):
+    """ Helper function to get a GDAL virtual file system path (e.g: 
+        ``/vsizip/``) to an item within a package. Returns ``None`` if the 
+        package type or the format of the item does not allow such access.
+    """
+    package = item.package
+    component = backend.get_package_component(package.format)
+
+    if not hasattr(component, "get_vsi_path") \
+            or not _supports_virtual_io(item.format):
+        return None
+
+    if package.package:
+        # nested packages are chained, if possible
+        package_path = _connect_package_item(backend, package, cache)
+    elif package.storage:
+        package_path = _connect_storage(backend, package, package.storage)
+    else:
+        package_path = None
+
+    if package_path is None:
+        package_path = path.abspath(retrieve(package, cache))
+
+    logger.debug("Accessing %s in package %s." % (item.location, package))
+    return component.get_vsi_path(package_path, item.location)
+
+
+def _connect_storage(backend, item, storage):
+    """ Helper function to get a GDAL virtual file system path (e.g: 
+        ``/vsicurl/``) to an item on a connected storage or ``None``.
+    """
+    component = backend.get_connected_storage_component(storage.storage_type)
+    if component:
+        connection = component.connect(storage.url, item.location)
+        if connection.startswith("/vsi"):
+            return connection
+    return None
+
+
+def _supports_virtual_io(format):
+    """ Helper function to check whether files of the given format can be read 
+        from GDAL virtual file systems. Formats of GDAL drivers without virtual
+        I/O support require seekable local files. Formats which are unknown to
+        the format registry are assumed to support virtual I/O.
+    """
+    # imported here, as the backends do not depend on the coverages otherwise
+    from eoxserver.resources.coverages.formats import getFormatRegistry
+
+    if not format:
+        return True
+
+    frmt = getFormatRegistry().getFormatByMIME(format)
+    if frmt is None or not frmt.driver.startswith("GDAL/"):
+        return True
+
+    driver = gdal.GetDriverByName(frmt.driver.split("/", 1)[1])
+    if driver is None:
+        return True
+
+    return driver.GetMetadataItem("DCAP_VIRTUALIO") == "YES"
+
+
+def _retrieve_from_storage(backend, data_item, storage, path):
     """ Helper function to retrieve a file from a storage.
     """
     logger.debug("Accessing storage %s." % storage)
@@ -112,13 +190,10 @@ def _retrieve_from_storage(backend, data_item, storage, item_id, path, cache):
         storage.url, data_item.location, path
     )
 
-    if actual_path and actual_path != path:
-        cache.add_mapping(actual_path, item_id)
-
     return actual_path or path
 
 
-def _extract_from_package(backend, data_item, package, item_id, path, cache):
+def _extract_from_package(backend, data_item, package, cache, path):
     """ Helper function to extract a file from a package.
     """
     logger.debug("Accessing package %s." % package)
@@ -138,9 +213,6 @@ def _extract_from_package(backend, data_item, package, item_id, path, cache):
         package_location, data_item.location, path
     )
 
-    if actual_path and actual_path != path:
-        cache.add_mapping(actual_path, item_id)
-
     return actual_path or path
 
 
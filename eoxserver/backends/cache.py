@@ -34,6 +34,9 @@ import tempfile
 import errno
 import logging
 import threading
+import time
+import fcntl
+from contextlib import contextmanager
 
 from eoxserver.core.config import get_eoxserver_config
 from eoxserver.backends.config import CacheConfigReader
@@ -50,16 +53,25 @@ class CacheException(Exception):
     pass
 
 
-def setup_cache_session(config=None):
-    """ Initialize the cache context for this session. If a cache context was 
-        already present, an exception is raised.
+def create_cache_context(config=None):
+    """ Creates a managed cache context as configured. The context has to be 
+        cleaned up explicitly.
     """
     if not config:
         config = CacheConfigReader(get_eoxserver_config())
 
-    set_cache_context(
-        CacheContext(config.retention_time, config.directory, True)
-    )
+    max_size = config.max_size
+    if max_size:
+        max_size = max_size * 1024 * 1024
+
+    return CacheContext(config.retention_time, config.directory, True, max_size)
+
+
+def setup_cache_session(config=None):
+    """ Initialize the cache context for this session. If a cache context was 
+        already present, an exception is raised.
+    """
+    set_cache_context(create_cache_context(config))
 
 
 def shutdown_cache_session():
@@ -88,6 +100,51 @@ def set_cache_context(cache_context):
     cache_context_storage.cache_context = cache_context
 
 
+@contextmanager
+def cache_context_session(cache_context):
+    """ Context manager to associate the given cache context with the current 
+        thread, e.g: a worker thread or a generator streaming a response after 
+        the session of the request was shut down. A cache context previously 
+        associated with the thread is restored afterwards. The given context is
+        not cleaned up.
+    """
+    previous = getattr(cache_context_storage, "cache_context", None)
+    set_cache_context(None)
+    set_cache_context(cache_context)
+    try:
+        yield cache_context
+    finally:
+        set_cache_context(None)
+        set_cache_context(previous)
+
+
+def iter_in_cache_context(iterable, cache_context=None):
+    """ Generator yielding the items of the iterable, which are produced within
+        a cache context of their own. This is required for iterables consumed 
+        after the cache session of the request was shut down, like the content 
+        of streamed responses. The context is associated with the thread only
+        while an item is produced and cleaned up once the iteration is done.
+    """
+    if cache_context is None:
+        cache_context = create_cache_context()
+
+    iterator = iter(iterable)
+    try:
+        while True:
+            with cache_context_session(cache_context):
+                try:
+                    item = iterator.next()
+                except StopIteration:
+                    return
+            yield item
+
+    finally:
+        if hasattr(iterator, "close"):
+            with cache_context_session(cache_context):
+                iterator.close()
+        cache_context.cleanup()
+
+
 def get_cache_context():
     """ Get the thread local cache context for this session. Raises an exception
         if the session was not initialized.
@@ -101,9 +158,13 @@ def get_cache_context():
 
 
 class CacheContext(object):
-    """ Context manager to manage cached files.
+    """ Context manager to manage cached files. If a cache directory and 
+        either a ``retention_time`` (in seconds) or a ``max_size`` (in bytes) 
+        is given, the files are cached persistently in a `SharedCache`. 
+        Otherwise they are only cached for the lifetime of the context.
     """
-    def __init__(self, retention_time=None, cache_directory=None, managed=False):
+    def __init__(self, retention_time=None, cache_directory=None, managed=False,
+                 max_size=None):
         self._cached_objects = set()
 
         if not cache_directory:
@@ -119,6 +180,19 @@ class CacheContext(object):
 
         self._managed = managed
 
+        if not self._temporary_dir and (retention_time or max_size):
+            self._shared_cache = SharedCache(
+                cache_directory, max_size, retention_time
+            )
+        else:
+            self._shared_cache = None
+        self._locks = []
+
+        # the context may be shared by several threads, items are retrieved 
+        # only once
+        self._lock = threading.Lock()
+        self._item_locks = {}
+
 
     @property
     def cache_directory(self):
@@ -159,16 +233,66 @@ class CacheContext(object):
         return relative_path
 
 
+    def fetch(self, item_id, retrieve):
+        """ Returns the path of the cached item with the given ID. If the item
+            is not yet cached, ``retrieve`` is called with the path the item
+            shall be stored at. It may return a different path, if the item 
+            can be accessed without caching it.
+        """
+        if self._shared_cache:
+            item_path, lock = self._shared_cache.get(item_id, retrieve)
+            if lock is not None:
+                # keep the item from being evicted until the context is done
+                self._locks.append(lock)
+            else:
+                self.add_mapping(item_path, item_id)
+            return item_path
+
+        with self._lock:
+            item_lock = self._item_locks.setdefault(item_id, threading.Lock())
+
+        with item_lock:
+            cache_path = self.relative_path(item_id)
+            for actual_path, mapped_id in self._mappings.items():
+                if mapped_id == item_id:
+                    return actual_path
+
+            if item_id in self:
+                logger.debug("Item %s is already in the cache." % item_id)
+                return cache_path
+
+            self.add_path(item_id)
+            actual_path = retrieve(cache_path)
+
+            if actual_path and actual_path != cache_path:
+                self.add_mapping(actual_path, item_id)
+                return actual_path
+            return cache_path
+
+
     def cleanup(self):
         """ Perform cache cleanup.
         """
-        if self._retention_time and not self._temporary_dir:
+        if self._shared_cache:
+            # release all items used by this context. They are kept in the 
+            # cache until evicted.
+            for lock in self._locks:
+                self._shared_cache.release(lock)
+            self._locks = []
+            self._cached_objects.clear()
+
+        elif self._retention_time and not self._temporary_dir:
             # no cleanup required
             return
 
         elif not self._temporary_dir:
-            for path in self._cached_objects:
-                os.remove(path)
+            for cache_path in self._cached_objects:
+                try:
+                    os.remove(self.relative_path(cache_path))
+                except OSError, e:
+                    # the item might not have been stored in the cache
+                    if e.errno != errno.ENOENT:
+                        raise
             self._cached_objects.clear()
 
         else:
@@ -205,3 +329,245 @@ class CacheContext(object):
         self._level -= 1
         if self._level == 0 and not self._managed:
             self.cleanup()
+
+
+class SharedCache(object):
+    """ Persistent cache directory, shared by all processes and threads using
+        the same directory. The size of the cache is bounded by ``max_size`` 
+        (in bytes) by evicting the least recently used items, and items that 
+        were not used for ``retention_time`` seconds are removed.
+
+        Items are written to a temporary file first and moved to their final
+        location atomically. File locks make sure that each item is only 
+        retrieved once, even if it is requested concurrently, and that items
+        are not evicted while they are in use.
+    """
+
+    def __init__(self, directory, max_size=None, retention_time=None):
+        self.directory = directory
+        self.max_size = max_size
+        self.retention_time = retention_time
+
+        self._lock_directory = path.join(directory, ".locks")
+        self._temp_directory = path.join(directory, ".tmp")
+        for directory in (self._lock_directory, self._temp_directory):
+            try:
+                os.makedirs(directory)
+            except OSError, e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+
+    def get(self, item_id, retrieve):
+        """ Returns a tuple of the path of the item and a lock, protecting the
+            item from eviction. The lock must be passed to `release` when the 
+            item is no longer used. If the item is not cached yet, it is
+            retrieved by calling ``retrieve`` with a path to store the item at. 
+            If ``retrieve`` returns a different path, the item is not cached 
+            and the returned lock is ``None``.
+        """
+        item_path = path.join(self.directory, item_id)
+        fetched = False
+
+        while True:
+            lock = self._acquire_use(item_id, item_path)
+            if lock is not None:
+                if fetched:
+                    self.evict()
+                return item_path, lock
+
+            actual_path = self._fetch(item_id, item_path, retrieve)
+            if actual_path != item_path:
+                return actual_path, None
+            fetched = True
+
+
+    def release(self, lock):
+        """ Releases a lock returned by `get`.
+        """
+        os.close(lock)
+
+
+    def evict(self):
+        """ Removes all items exceeding the retention time and the least 
+            recently used items until the size of the cache is within its 
+            bounds. Items currently in use are skipped. If another process is
+            already evicting items, nothing is done.
+        """
+        lock = self._open_lock("evict")
+        try:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError:
+                return
+
+            items = []
+            for item_id in os.listdir(self.directory):
+                if item_id.startswith("."):
+                    continue
+                try:
+                    stat = os.stat(path.join(self.directory, item_id))
+                except OSError:
+                    continue
+                items.append((stat.st_mtime, stat.st_size, item_id))
+
+            # least recently used items first
+            items.sort()
+            total_size = sum(size for _, size, _ in items)
+            now = time.time()
+
+            for last_used, size, item_id in items:
+                expired = (
+                    self.retention_time 
+                    and now - last_used > self.retention_time
+                )
+                if not expired and (
+                        not self.max_size or total_size <= self.max_size):
+                    break
+
+                if self._remove(item_id):
+                    logger.debug("Evicted item %s from the cache." % item_id)
+                    total_size -= size
+
+            self._remove_orphans(now)
+        finally:
+            os.close(lock)
+
+
+    def _acquire_use(self, item_id, item_path):
+        """ Acquires a shared lock on the item, if it exists, and marks it as
+            recently used.
+        """
+        if not path.exists(item_path):
+            return None
+
+        lock = self._lock(item_id + ".use", fcntl.LOCK_SH)
+
+        # the item might have been evicted in the meantime
+        try:
+            os.utime(item_path, None)
+        except OSError:
+            os.close(lock)
+            return None
+
+        logger.debug("Item %s is already in the cache." % item_id)
+        return lock
+
+
+    def _fetch(self, item_id, item_path, retrieve):
+        """ Retrieves the item, unless another process or thread already did. 
+        """
+        # wait for any other process fetching the same item
+        lock = self._lock(item_id + ".fetch", fcntl.LOCK_EX)
+        try:
+            if path.exists(item_path):
+                return item_path
+
+            temp_path = path.join(self._temp_directory, "%s.%d.%d" % (
+                item_id, os.getpid(), threading.current_thread().ident
+            ))
+            try:
+                actual_path = retrieve(temp_path)
+                if actual_path and actual_path != temp_path:
+                    return actual_path
+
+                os.rename(temp_path, item_path)
+            finally:
+                if path.exists(temp_path):
+                    os.remove(temp_path)
+
+            return item_path
+        finally:
+            os.close(lock)
+
+
+    def _remove(self, item_id):
+        """ Removes the item along with its lock files, if it is not in use.
+        """
+        try:
+            lock = self._lock(item_id + ".use", fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError:
+            return False
+
+        try:
+            try:
+                os.remove(path.join(self.directory, item_id))
+            except OSError:
+                return False
+
+            self._remove_lock(item_id + ".fetch")
+            self._unlink(path.join(self._lock_directory, item_id + ".use"))
+            return True
+        finally:
+            os.close(lock)
+
+
+    def _remove_orphans(self, now):
+        """ Removes the lock files of items that are not cached (anymore) and
+            temporary files of failed retrievals exceeding the retention time.
+        """
+        for name in os.listdir(self._lock_directory):
+            item_id, ext = path.splitext(name)
+            if ext in (".use", ".fetch") and \
+                    not path.exists(path.join(self.directory, item_id)):
+                self._remove_lock(name)
+
+        if not self.retention_time:
+            return
+
+        for name in os.listdir(self._temp_directory):
+            temp_path = path.join(self._temp_directory, name)
+            try:
+                if now - os.stat(temp_path).st_mtime > self.retention_time:
+                    logger.debug("Removing stale temporary file %s." % name)
+                    os.remove(temp_path)
+            except OSError:
+                pass
+
+
+    def _remove_lock(self, name):
+        """ Removes the lock file, unless it is currently locked.
+        """
+        try:
+            lock = self._lock(name, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError:
+            return
+        try:
+            self._unlink(path.join(self._lock_directory, name))
+        finally:
+            os.close(lock)
+
+
+    def _lock(self, name, operation):
+        """ Opens the lock file and locks it with the given ``flock`` 
+            operation. Lock files are removed while exclusively locked, so the
+            lock is only returned if the file was not removed or replaced in
+            the meantime. Otherwise, locking is retried with the new file.
+        """
+        lock_path = path.join(self._lock_directory, name)
+        while True:
+            lock = self._open_lock(name)
+            try:
+                fcntl.flock(lock, operation)
+                try:
+                    if os.fstat(lock).st_ino == os.stat(lock_path).st_ino:
+                        return lock
+                except OSError:
+                    pass
+            except:
+                os.close(lock)
+                raise
+            os.close(lock)
+
+
+    def _unlink(self, filename):
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+
+
+    def _open_lock(self, name):
+        return os.open(
+            path.join(self._lock_directory, name), os.O_RDWR | os.O_CREAT
+        )
@@ -30,6 +30,15 @@ from eoxserver.core.decoders import config
 
 
 class CacheConfigReader(config.Reader):
-    config.section("backends")
-    retention_time = config.Option() # TODO
-    directory = config.Option()
+    config.section("backends.cache")
+    directory = config.Option("cache_dir")
+    max_size = config.Option(type=int)
+    retention_time = config.Option(type=int)
+
+
+class ConnectionConfigReader(config.Reader):
+    config.section("backends.connections")
+    idle_timeout = config.Option(type=int, default=60)
+    max_idle = config.Option(type=int, default=4)
+    timeout = config.Option(type=int, default=30)
+    retries = config.Option(type=int, default=3)
@@ -54,6 +54,11 @@ class FileStorageInterface(AbstractStorageInterface):
             at the specified URL and given location.
         """
 
+    def read(self, url, location, offset, size):
+        """ Optional: read and return `size` bytes of the file at the given
+            location, starting at `offset`, without retrieving the whole file.
+        """
+
 
 class ConnectedStorageInterface(AbstractStorageInterface):
     """ Interface for storages that do not store "files" but provide access to
@@ -83,3 +88,10 @@ class PackageInterface(object):
             given package.
         """
 
+    def get_vsi_path(self, package_path, location):
+        """ Optional: return a path to access the file specified by the
+            `location` within the package via GDAL's virtual file systems,
+            without extracting it. The `package_path` is either an absolute 
+            local path or a virtual file system path itself.
+        """
+
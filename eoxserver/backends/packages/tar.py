@@ -27,22 +27,53 @@
 #-------------------------------------------------------------------------------
 
 
-from tarfile import TarFile
+import shutil
+import tarfile
+
 from eoxserver.core import Component, implements
 from eoxserver.backends.interfaces import PackageInterface
 
 
 class TARPackage(Component):
+    """Implementation of the package interface for (optionally compressed) TAR
+    package files.
+    """
+
     implements(PackageInterface)
 
 
     name = "TAR"
 
     def extract(self, package_filename, location, path):
-        tarfile = TarFile(package_filename, "r")
-        tarfile.extract(location, path)
+        tar = tarfile.open(package_filename, "r")
+        try:
+            infile = tar.extractfile(location)
+            if infile is None:
+                raise IOError(
+                    "'%s' is not a regular file in '%s'." 
+                    % (location, package_filename)
+                )
+            with open(path, "wb") as outfile:
+                shutil.copyfileobj(infile, outfile)
+        finally:
+            tar.close()
+
+
+    def get_vsi_path(self, package_path, location):
+        return "/vsitar/%s/%s" % (package_path, location)
 
     
     def list_files(self, package_filename):
-        tarfile = TarFile(package_filename, "r")
-        # TODO: get list
+        return self.list_contents(package_filename, "")
+
+
+    def list_contents(self, package_filename, location):
+        prefix = location.strip("/") + "/" if location else ""
+        tar = tarfile.open(package_filename, "r")
+        try:
+            return [
+                member.name for member in tar.getmembers()
+                if member.isfile() and member.name.startswith(prefix)
+            ]
+        finally:
+            tar.close()
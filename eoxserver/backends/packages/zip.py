@@ -44,11 +44,30 @@ class ZIPPackage(Component):
 
     def extract(self, package_filename, location, path):
         zipfile = ZipFile(package_filename, "r")
-        infile = zipfile.open(location)
-        with open(path, "wb") as outfile:
-            shutil.copyfileobj(infile, outfile)
+        try:
+            infile = zipfile.open(location)
+            with open(path, "wb") as outfile:
+                shutil.copyfileobj(infile, outfile)
+        finally:
+            zipfile.close()
+
+
+    def get_vsi_path(self, package_path, location):
+        return "/vsizip/%s/%s" % (package_path, location)
 
     
     def list_files(self, package_filename):
+        return self.list_contents(package_filename, "")
+
+
+    def list_contents(self, package_filename, location):
+        prefix = location.strip("/") + "/" if location else ""
         zipfile = ZipFile(package_filename, "r")
-        # TODO: get list
+        try:
+            return [
+                info.filename for info in zipfile.infolist()
+                if info.filename.startswith(prefix) 
+                and not info.filename.endswith("/")
+            ]
+        finally:
+            zipfile.close()
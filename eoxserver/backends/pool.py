@@ -0,0 +1,183 @@
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#          Stephan Krause <stephan.krause@eox.at>
+#          Stephan Meissl <stephan.meissl@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2011 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" This module provides a generic pool for reusable connections to remote 
+storages, e.g. FTP or HTTP servers.
+"""
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+from eoxserver.core.config import get_eoxserver_config
+from eoxserver.backends.config import ConnectionConfigReader
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_connection_config(config=None):
+    """ Returns the `ConnectionConfigReader` for the given or the global 
+        configuration.
+    """
+    return ConnectionConfigReader(config or get_eoxserver_config())
+
+
+def create_connection_pool(connect, close, is_usable=None, config=None):
+    """ Creates a `ConnectionPool` with the settings of the 
+        ``backends.connections`` configuration section.
+    """
+    reader = get_connection_config(config)
+    return ConnectionPool(
+        connect, close, is_usable, reader.idle_timeout, reader.max_idle
+    )
+
+
+class ConnectionPool(object):
+    """ Thread-safe pool of reusable connections. Connections are kept per 
+        ``key`` (e.g. a tuple of host, port and user) and are created with the
+        ``connect`` function. Idle connections are closed with the ``close`` 
+        function after ``idle_timeout`` seconds, and at most ``max_idle`` idle 
+        connections are kept per key. Connections for which ``is_usable`` 
+        returns ``False`` when they are released are not reused.
+
+        >>> with pool.connection(("ftp.example.com", 21)) as ftp:
+        ...     ftp.retrbinary(...)
+    """
+
+    def __init__(self, connect, close, is_usable=None, idle_timeout=60, 
+                 max_idle=4):
+        self._connect = connect
+        self._close = close
+        self._is_usable = is_usable or (lambda connection: True)
+        self.idle_timeout = idle_timeout
+        self.max_idle = max_idle
+
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._pid = os.getpid()
+
+
+    @contextmanager
+    def connection(self, key):
+        """ Context manager to get a connection for the given key. The 
+            connection is returned to the pool when the context is left 
+            without error, and discarded otherwise.
+        """
+        connection = self.acquire(key)
+        try:
+            yield connection
+        except:
+            self.discard(connection)
+            raise
+        else:
+            self.release(key, connection)
+
+
+    def acquire(self, key):
+        """ Returns an idle connection for the given key or creates a new one.
+        """
+        connection = None
+        with self._lock:
+            self._check_fork()
+            expired = self._expire(time.time())
+            idle = self._idle.get(key)
+            if idle:
+                connection, _ = idle.pop()
+
+        for expired_connection in expired:
+            self.discard(expired_connection)
+
+        if connection is None:
+            logger.debug("Opening new connection for %s." % (key,))
+            connection = self._connect(key)
+        return connection
+
+
+    def release(self, key, connection):
+        """ Returns the connection to the pool for later reuse.
+        """
+        if not self._is_usable(connection):
+            self.discard(connection)
+            return
+
+        surplus = []
+        with self._lock:
+            self._check_fork()
+            idle = self._idle.setdefault(key, [])
+            idle.append((connection, time.time()))
+            while len(idle) > self.max_idle:
+                surplus.append(idle.pop(0)[0])
+
+        for surplus_connection in surplus:
+            self.discard(surplus_connection)
+
+
+    def discard(self, connection):
+        """ Closes the connection without returning it to the pool.
+        """
+        try:
+            self._close(connection)
+        except Exception, e:
+            logger.debug("Error when closing connection: %s" % e)
+
+
+    def clear(self):
+        """ Closes all idle connections.
+        """
+        with self._lock:
+            connections = [
+                connection for idle in self._idle.values() 
+                for connection, _ in idle
+            ]
+            self._idle = {}
+
+        for connection in connections:
+            self.discard(connection)
+
+
+    def _expire(self, now):
+        # must be called with the lock held
+        expired = []
+        for key, idle in self._idle.items():
+            while idle and now - idle[0][1] > self.idle_timeout:
+                expired.append(idle.pop(0)[0])
+            if not idle:
+                del self._idle[key]
+        return expired
+
+
+    def _check_fork(self):
+        # must be called with the lock held. Connections of the parent process
+        # must not be used in a forked child process.
+        if self._pid != os.getpid():
+            self._idle = {}
+            self._pid = os.getpid()
@@ -28,6 +28,8 @@
 
 
 from os import path
+import socket
+import ftplib
 from ftplib import FTP
 from urlparse import urlparse
 
@@ -35,6 +37,42 @@ from django.core.exceptions import ValidationError
 
 from eoxserver.core import Component, implements
 from eoxserver.backends.interfaces import FileStorageInterface
+from eoxserver.backends.pool import (
+    create_connection_pool, get_connection_config
+)
+
+
+# errors indicating a broken (e.g: timed out) control connection
+CONNECTION_ERRORS = (socket.error, EOFError, ftplib.error_temp)
+
+
+_pool = None
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = create_connection_pool(_connect, _close, _is_usable)
+    return _pool
+
+
+def _connect(key):
+    hostname, port, username, password = key
+    ftp = FTP()
+    ftp.connect(hostname, port or 21, get_connection_config().timeout)
+    # TODO: default username/password?
+    ftp.login(username or "", password or "")
+    return ftp
+
+
+def _close(ftp):
+    try:
+        ftp.quit()
+    except ftplib.all_errors:
+        ftp.close()
+
+
+def _is_usable(ftp):
+    return ftp.sock is not None
 
 
 class FTPStorage(Component):
@@ -57,37 +95,83 @@ class FTPStorage(Component):
         """ Retrieves the file referenced by `location` from the server 
             specified by its `url` and stores it under the `result_path`.
         """
-        
-        ftp, parsed_url = self._open(url)
 
-        try:
+        def retrieve(ftp, parsed_url):
             cmd = "RETR %s" % path.join(parsed_url.path, location)
             with open(result_path, 'wb') as local_file:
                 ftp.retrbinary(cmd, local_file.write)
 
-        finally:
-            ftp.quit()
+        self._execute(url, retrieve)
+
+
+    def read(self, url, location, offset, size):
+        """ Reads ``size`` bytes of the file referenced by `location`, starting
+            at ``offset``, without retrieving the whole file (using the REST 
+            command).
+        """
+
+        def read(ftp, parsed_url):
+            ftp.voidcmd("TYPE I")
+            conn = ftp.transfercmd(
+                "RETR %s" % path.join(parsed_url.path, location), offset or None
+            )
+            chunks = []
+            remaining = size
+            try:
+                while remaining > 0:
+                    chunk = conn.recv(min(remaining, 65536))
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+                    remaining -= len(chunk)
+            finally:
+                conn.close()
+
+            # the transfer might have been aborted by closing the data 
+            # connection. If the server does not respond properly, the control
+            # connection is not reused.
+            try:
+                ftp.voidresp()
+            except ftplib.all_errors:
+                ftp.close()
+
+            return "".join(chunks)
+
+        return self._execute(url, read)
 
 
     def list_files(self, url, location):
-        ftp, parsed_url = self._open(url)
 
-        try:
-            return ftp.nlst(location)
-        except ftplib.error_perm, resp:
-            if str(resp).startswith("550"):
-                return []
-            else:
-                raise
-        finally:
-            ftp.quit()
+        def list_files(ftp, parsed_url):
+            try:
+                return ftp.nlst(location)
+            except ftplib.error_perm, resp:
+                if str(resp).startswith("550"):
+                    return []
+                else:
+                    raise
 
+        return self._execute(url, list_files)
 
-    def _open(self, url):
-        parsed_url = urlparse(url)
-        ftp = FTP()
-        ftp.connect(parsed_url.hostname, parsed_url.port)
-        # TODO: default username/password?
-        ftp.login(parsed_url.username, parsed_url.password)
 
-        return ftp, parsed_url
+    def _execute(self, url, func):
+        """ Calls ``func`` with a pooled connection to the server specified by
+            the `url`. Pooled connections might have been closed by the server
+            in the meantime, so the call is retried with a new connection in 
+            that case.
+        """
+        parsed_url = urlparse(url)
+        key = (
+            parsed_url.hostname, parsed_url.port, 
+            parsed_url.username, parsed_url.password
+        )
+
+        pool = _get_pool()
+        retries = get_connection_config().retries
+        for attempt in range(retries + 1):
+            try:
+                with pool.connection(key) as ftp:
+                    return func(ftp, parsed_url)
+            except CONNECTION_ERRORS:
+                if attempt == retries:
+                    raise
@@ -26,11 +26,50 @@
 #-------------------------------------------------------------------------------
 
 
-from urllib import urlretrieve
-from urlparse import urljoin
+import socket
+import httplib
+from urlparse import urljoin, urlparse
 
 from eoxserver.core import Component, implements
 from eoxserver.backends.interfaces import FileStorageInterface
+from eoxserver.backends.pool import (
+    create_connection_pool, get_connection_config
+)
+
+
+# errors indicating a broken (e.g: timed out keep-alive) connection
+CONNECTION_ERRORS = (socket.error, httplib.HTTPException)
+
+REDIRECT_STATUSES = (301, 302, 303, 307)
+MAX_REDIRECTS = 5
+
+CHUNK_SIZE = 65536
+
+
+_pool = None
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = create_connection_pool(_connect, _close, _is_usable)
+    return _pool
+
+
+def _connect(key):
+    scheme, hostname, port = key
+    if scheme == "https":
+        Connection = httplib.HTTPSConnection
+    else:
+        Connection = httplib.HTTPConnection
+    return Connection(hostname, port, timeout=get_connection_config().timeout)
+
+
+def _close(connection):
+    connection.close()
+
+
+def _is_usable(connection):
+    return connection.sock is not None
 
 
 class HTTPStorage(Component):
@@ -43,4 +82,85 @@ class HTTPStorage(Component):
         pass
 
     def retrieve(self, url, location, path):
-        urlretrieve(urljoin(url, location), path)
+        """ Downloads the file to the given path, using a pooled persistent 
+            connection.
+        """
+
+        def retrieve(connection, response):
+            with open(path, "wb") as f:
+                while True:
+                    chunk = response.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+
+        self._request(urljoin(url, location), {}, retrieve)
+
+
+    def read(self, url, location, offset, size):
+        """ Reads ``size`` bytes of the file, starting at ``offset``, using an
+            HTTP Range request.
+        """
+
+        def read(connection, response):
+            if response.status == 206:
+                return response.read()
+
+            # the server does not support ranges, so skip the leading bytes 
+            # and drop the connection afterwards, as the rest is unread.
+            remaining = offset
+            while remaining > 0:
+                chunk = response.read(min(remaining, CHUNK_SIZE))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+            data = response.read(size)
+            connection.close()
+            return data
+
+        return self._request(urljoin(url, location), {
+            "Range": "bytes=%d-%d" % (offset, offset + size - 1)
+        }, read)
+
+
+    def _request(self, url, headers, handle_response):
+        """ Performs a GET request on a pooled connection and passes the 
+            connection and the response to ``handle_response``. Redirects are followed and the 
+            request is retried on a new connection if the pooled one was closed
+            in the meantime.
+        """
+        pool = _get_pool()
+        retries = get_connection_config().retries
+
+        for _ in range(MAX_REDIRECTS + 1):
+            parsed = urlparse(url)
+            key = (parsed.scheme, parsed.hostname, parsed.port)
+            selector = parsed.path or "/"
+            if parsed.query:
+                selector += "?" + parsed.query
+
+            for attempt in range(retries + 1):
+                try:
+                    with pool.connection(key) as connection:
+                        connection.request("GET", selector, headers=headers)
+                        response = connection.getresponse()
+
+                        if response.status in REDIRECT_STATUSES:
+                            response.read()
+                            url = urljoin(url, response.getheader("location"))
+                            break
+
+                        if response.status >= 400:
+                            response.read()
+                            raise IOError(
+                                "HTTP request to '%s' failed with status %d." 
+                                % (url, response.status)
+                            )
+
+                        return handle_response(connection, response)
+
+                except CONNECTION_ERRORS:
+                    if attempt == retries:
+                        raise
+
+        raise IOError("Too many redirects for '%s'." % url)
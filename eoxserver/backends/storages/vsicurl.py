@@ -0,0 +1,67 @@
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2013 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+
+
+from urlparse import urljoin, urlparse
+
+from django.core.exceptions import ValidationError
+
+from eoxserver.core import Component, implements
+from eoxserver.contrib import gdal
+from eoxserver.backends.interfaces import ConnectedStorageInterface
+
+
+class VSICurlStorage(Component):
+    """ Connected storage for files on HTTP(S) or FTP servers. Instead of 
+        retrieving the whole files, they are accessed by GDAL via its 
+        ``/vsicurl/`` virtual file system, which only fetches the required 
+        byte ranges. This is especially useful for large, tiled files of which
+        only small parts are read.
+    """
+
+    implements(ConnectedStorageInterface)
+
+    name = "VSICURL"
+
+    def validate(self, url):
+        parsed = urlparse(url)
+        if parsed.scheme.lower() not in ("http", "https", "ftp"):
+            raise ValidationError(
+                "Invalid URL: unsupported scheme '%s'." % parsed.scheme
+            )
+        if not parsed.hostname:
+            raise ValidationError("Invalid URL: could not determine hostname.")
+
+
+    def connect(self, url, location):
+        # GDAL would otherwise try to list the remote directory on each open,
+        # which requires additional requests.
+        if gdal.GetConfigOption("GDAL_DISABLE_READDIR_ON_OPEN") is None:
+            gdal.SetConfigOption("GDAL_DISABLE_READDIR_ON_OPEN", "EMPTY_DIR")
+
+        return "/vsicurl/" + urljoin(url, location)
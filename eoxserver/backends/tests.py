@@ -27,6 +27,10 @@
 #-------------------------------------------------------------------------------
 
 import os.path
+import time
+import shutil
+import tempfile
+import zipfile
 from glob import glob
 import logging
 
@@ -34,8 +38,13 @@ from django.test import TestCase
 
 from eoxserver.backends import testbase
 from eoxserver.backends import models
-from eoxserver.backends.cache import CacheContext
-from eoxserver.backends.access import retrieve
+from eoxserver.backends.cache import (
+    CacheContext, SharedCache, CacheException, get_cache_context, 
+    iter_in_cache_context
+)
+from eoxserver.backends.pool import ConnectionPool
+from eoxserver.backends.access import retrieve, _supports_virtual_io
+from eoxserver.backends.packages.zip import ZIPPackage
 from eoxserver.backends.component import BackendComponent, env
 
 logger = logging.getLogger(__name__)
@@ -120,3 +129,204 @@ class RetrieveTestCase(TestCase):
         self.assertFalse(os.path.exists(cache_path))
         self.assertFalse(os.path.exists(cache_path2))
 
+
+
+class ZIPPackageTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "package.zip")
+        # ZipFile is no context manager before Python 2.7
+        package = zipfile.ZipFile(self.filename, "w")
+        try:
+            package.writestr("file.txt", "test\n")
+            package.writestr("data/file2.txt", "test 2\n")
+        finally:
+            package.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_list_contents(self):
+        package = ZIPPackage(env)
+        self.assertEqual(
+            package.list_files(self.filename), ["file.txt", "data/file2.txt"]
+        )
+        self.assertEqual(
+            package.list_contents(self.filename, "data"), ["data/file2.txt"]
+        )
+
+    def test_vsi_path(self):
+        package = ZIPPackage(env)
+        self.assertEqual(
+            package.get_vsi_path(self.filename, "data/file2.txt"),
+            "/vsizip/%s/data/file2.txt" % self.filename
+        )
+
+    def test_supports_virtual_io(self):
+        # the GTiff driver is resolved via the format registry
+        self.assertTrue(_supports_virtual_io("image/tiff"))
+        self.assertTrue(_supports_virtual_io("application/x-unknown"))
+        self.assertTrue(_supports_virtual_io(None))
+
+
+class CacheSessionTestCase(TestCase):
+    def test_iter_in_cache_context(self):
+        contexts = []
+        def generate():
+            for i in range(3):
+                contexts.append(get_cache_context())
+                yield i
+
+        self.assertRaises(CacheException, get_cache_context)
+
+        items = []
+        for item in iter_in_cache_context(generate()):
+            # the context is only associated while an item is produced
+            self.assertRaises(CacheException, get_cache_context)
+            items.append(item)
+
+        self.assertEqual(items, [0, 1, 2])
+        self.assertEqual(len(set(map(id, contexts))), 1)
+        self.assertRaises(CacheException, get_cache_context)
+
+
+class SharedCacheTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def retrieve(self, content):
+        def retrieve(path):
+            self.retrieved.append(path)
+            with open(path, "w") as f:
+                f.write(content)
+        return retrieve
+
+    def test_retrieve_once(self):
+        self.retrieved = []
+        cache = SharedCache(self.directory, max_size=1024)
+
+        path, lock = cache.get("item", self.retrieve("x" * 100))
+        path2, lock2 = cache.get("item", self.retrieve("x" * 100))
+
+        self.assertEqual(path, path2)
+        self.assertEqual(len(self.retrieved), 1)
+        self.assertEqual(os.path.getsize(path), 100)
+
+        cache.release(lock)
+        cache.release(lock2)
+
+    def test_evict_least_recently_used(self):
+        self.retrieved = []
+        cache = SharedCache(self.directory, max_size=1024)
+
+        path_a, lock_a = cache.get("a", self.retrieve("a" * 600))
+        cache.release(lock_a)
+        os.utime(path_a, (0, 0))
+
+        path_b, lock_b = cache.get("b", self.retrieve("b" * 600))
+
+        # "a" was evicted to make room for "b"
+        self.assertFalse(os.path.exists(path_a))
+        self.assertTrue(os.path.exists(path_b))
+
+        # "b" is in use and must not be evicted
+        path_c, lock_c = cache.get("c", self.retrieve("c" * 600))
+        self.assertTrue(os.path.exists(path_b))
+
+        cache.release(lock_b)
+        cache.release(lock_c)
+
+    def test_evict_lock_files(self):
+        self.retrieved = []
+        cache = SharedCache(self.directory, max_size=1024)
+        lock_directory = os.path.join(self.directory, ".locks")
+
+        path_a, lock_a = cache.get("a", self.retrieve("a" * 600))
+        cache.release(lock_a)
+        os.utime(path_a, (0, 0))
+        self.assertTrue(os.path.exists(os.path.join(lock_directory, "a.use")))
+
+        # items that are not cached leave no lock files behind either
+        def retrieve_elsewhere(path):
+            return "/elsewhere"
+        self.assertEqual(
+            cache.get("d", retrieve_elsewhere), ("/elsewhere", None)
+        )
+
+        path_b, lock_b = cache.get("b", self.retrieve("b" * 600))
+        self.assertFalse(os.path.exists(path_a))
+        self.assertEqual(
+            sorted(os.listdir(lock_directory)), 
+            ["b.fetch", "b.use", "evict"]
+        )
+
+        # "b" can still be used and evicted after its lock files were removed
+        cache.release(lock_b)
+        os.remove(os.path.join(lock_directory, "b.use"))
+        os.utime(path_b, (0, 0))
+        path_b, lock_b = cache.get("b", self.retrieve("b" * 600))
+        self.assertEqual(len(self.retrieved), 2)
+        cache.release(lock_b)
+
+    def test_evict_temporary_files(self):
+        cache = SharedCache(self.directory, retention_time=60)
+        temp_directory = os.path.join(self.directory, ".tmp")
+
+        for name in ("stale", "recent"):
+            with open(os.path.join(temp_directory, name), "w") as f:
+                f.write("data")
+        os.utime(os.path.join(temp_directory, "stale"), (0, 0))
+
+        cache.evict()
+        self.assertEqual(os.listdir(temp_directory), ["recent"])
+
+
+class ConnectionPoolTestCase(TestCase):
+    def setUp(self):
+        self.opened = []
+        self.closed = []
+
+        def connect(key):
+            connection = [key, True]
+            self.opened.append(connection)
+            return connection
+
+        self.pool = ConnectionPool(
+            connect, self.closed.append, lambda connection: connection[1], 
+            idle_timeout=60, max_idle=1
+        )
+
+    def test_reuse(self):
+        with self.pool.connection("a") as first:
+            pass
+        with self.pool.connection("a") as second:
+            pass
+
+        self.assertIs(first, second)
+        self.assertEqual(len(self.opened), 1)
+
+    def test_discard_broken(self):
+        with self.assertRaises(ValueError):
+            with self.pool.connection("a") as first:
+                raise ValueError
+
+        with self.pool.connection("a") as second:
+            # mark the connection as unusable
+            second[1] = False
+
+        self.assertEqual(self.closed, [first, second])
+        self.assertEqual(len(self.opened), 2)
+
+    def test_idle_timeout(self):
+        self.pool.idle_timeout = 0
+        with self.pool.connection("a") as first:
+            pass
+        time.sleep(0.01)
+        with self.pool.connection("a") as second:
+            pass
+
+        self.assertIsNot(first, second)
+        self.assertEqual(self.closed, [first])
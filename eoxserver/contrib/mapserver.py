@@ -31,6 +31,7 @@ import logging
 from cgi import escape
 import tempfile
 import os
+from threading import RLock
 
 from mapscript import *
 
@@ -44,6 +45,10 @@ is_xml = lambda ct: getMimeType(ct) in ("text/xml", "application/xml", "applicat
 is_multipart = lambda ct: getMimeType(ct).startswith("multipart/") 
 msversion = msGetVersionInt()
 
+# MapServer redirects its output via process global IO handlers, thus only one
+# thread at a time is allowed to dispatch a request
+_dispatch_lock = RLock()
+
 class MapServerException(Exception):
     def __init__(self, message, locator):
         super(MapServerException, self).__init__(message)
@@ -91,9 +96,21 @@ class Map(MetadataMixIn, mapObj):
 
 def dispatch(map_, request):
     """ Wraps the ``OWSDispatch`` method. Perfoms all necessary steps for a 
-        further handling of the result.
+        further handling of the result. If a pool of worker processes is 
+        configured, the request is dispatched in one of them.
     """
 
+    # imported here, as the pool module depends on this one
+    from eoxserver.contrib.mapserver_pool import get_dispatch_pool
+    pool = get_dispatch_pool()
+    if pool is not None:
+        return pool.dispatch(map_, request)
+
+    with _dispatch_lock:
+        return _dispatch(map_, request)
+
+
+def _dispatch(map_, request):
     logger.debug("MapServer: Installing stdout to buffer.")
     msIO_installStdoutToBuffer()
 
@@ -0,0 +1,299 @@
+#-------------------------------------------------------------------------------
+# $Id$
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2013 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" This module provides a pool of MapServer worker processes requests can be
+dispatched to. MapServer redirects its output via process global IO handlers,
+so only one request can be dispatched at a time within a process. With the 
+pool, requests of several threads are dispatched concurrently in separate, 
+long-lived processes.
+
+The map is passed to the worker as a temporary map file. Files in the 
+``/vsimem/`` file system referenced by the layers (e.g. VRTs created by the
+connectors) are private to a process and are thus transferred alongside. The
+rendered result is sent back through the pipe of the worker.
+"""
+
+import os
+import re
+import logging
+import tempfile
+from threading import Lock, BoundedSemaphore
+from multiprocessing import Process, Pipe
+
+from eoxserver.core.config import get_eoxserver_config
+from eoxserver.core.decoders import config
+from eoxserver.contrib import vsi
+from eoxserver.contrib import mapserver as ms
+
+
+logger = logging.getLogger(__name__)
+
+
+class DispatchConfigReader(config.Reader):
+    section = "services.mapserver"
+    dispatch_workers = config.Option(type=int, default=0)
+    dispatch_timeout = config.Option(type=int, default=300)
+    dispatch_max_requests = config.Option(type=int, default=1000)
+
+
+VSIMEM_PATH_RE = re.compile(r"/vsimem/[^\s\"'<>,]+")
+
+
+def collect_vsimem_files(map_):
+    """ Returns a list of (path, data) tuples of all ``/vsimem/`` files 
+    referenced by the layers of the map, including files referenced by these 
+    files (e.g. the sources of a VRT).
+    """
+    pending = []
+    for i in range(map_.numlayers):
+        layer = map_.getLayer(i)
+        for value in (layer.data, layer.tileindex, layer.connection):
+            if value:
+                pending.extend(VSIMEM_PATH_RE.findall(value))
+
+    files = []
+    seen = set()
+    while pending:
+        path = pending.pop()
+        if path in seen or vsi.VSIStatL(path) is None:
+            continue
+        seen.add(path)
+
+        f = vsi.open(path)
+        try:
+            data = f.read()
+        finally:
+            f.close()
+
+        files.append((path, data))
+        pending.extend(VSIMEM_PATH_RE.findall(data))
+
+    return files
+
+
+def serialize_request(request):
+    """ Returns a picklable representation of a ``mapscript.OWSRequest``.
+    """
+    params = [
+        (request.getName(i), request.getValue(i))
+        for i in range(request.NumParams)
+    ]
+    return request.type, params, request.postrequest
+
+
+def deserialize_request(request_type, params, postrequest):
+    request = ms.OWSRequest()
+    request.type = request_type
+    for key, value in params:
+        # the values are already escaped
+        try:
+            request.addParameter(key, value)
+        except AttributeError:
+            request.setParameter(key, value)
+    if postrequest:
+        request.postrequest = postrequest
+    return request
+
+
+def _serve(connection):
+    """ Main loop of a worker process.
+    """
+    while True:
+        try:
+            mapfile, request_args, files = connection.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+
+        try:
+            for path, data in files:
+                vsi.FileFromMemBuffer(path, data)
+
+            map_ = ms.mapObj(mapfile)
+            request = deserialize_request(*request_args)
+            result = ms._dispatch(map_, request)
+
+        except ms.MapServerException, e:
+            connection.send((False, str(e), e.locator))
+        except Exception, e:
+            connection.send((False, str(e), "NoApplicableCode"))
+        else:
+            connection.send((True, None, None))
+            connection.send_bytes(result)
+        finally:
+            for path, _ in files:
+                try:
+                    vsi.unlink(path)
+                except Exception:
+                    pass
+
+
+class Worker(object):
+    """ A single MapServer worker process and the pipe to communicate with it.
+    """
+
+    def __init__(self):
+        self.connection, child_connection = Pipe()
+        self.process = Process(target=_serve, args=(child_connection,))
+        self.process.daemon = True
+        self.process.start()
+        child_connection.close()
+        self.requests = 0
+
+
+    def dispatch(self, mapfile, request_args, files, timeout=None):
+        self.requests += 1
+        self.connection.send((mapfile, request_args, files))
+
+        if not self.connection.poll(timeout):
+            # the worker is in an undefined state
+            self.terminate()
+            raise ms.MapServerException(
+                "MapServer worker did not respond within %s seconds." % timeout,
+                "NoApplicableCode"
+            )
+
+        success, message, locator = self.connection.recv()
+        if not success:
+            raise ms.MapServerException(message, locator)
+        return self.connection.recv_bytes()
+
+
+    def terminate(self):
+        try:
+            self.connection.close()
+        finally:
+            if self.process.is_alive():
+                self.process.terminate()
+            self.process.join()
+
+
+class DispatchPool(object):
+    """ A pool of at most ``size`` MapServer worker processes. Workers are 
+    started on demand and replaced after ``max_requests`` requests to limit 
+    the effects of any memory leaks.
+    """
+
+    def __init__(self, size, timeout=None, max_requests=None):
+        self.size = size
+        self.timeout = timeout
+        self.max_requests = max_requests
+        self._idle = []
+        self._lock = Lock()
+        self._semaphore = BoundedSemaphore(size)
+
+
+    def dispatch(self, map_, request):
+        """ Dispatches the request against the map in one of the workers and 
+        returns the raw result.
+        """
+        fd, mapfile = tempfile.mkstemp(suffix=".map")
+        os.close(fd)
+        try:
+            map_.save(mapfile)
+            files = collect_vsimem_files(map_)
+            request_args = serialize_request(request)
+
+            with self._semaphore:
+                worker = self._acquire()
+                try:
+                    result = worker.dispatch(
+                        mapfile, request_args, files, self.timeout
+                    )
+                except ms.MapServerException:
+                    # the worker is still usable, unless it timed out
+                    if worker.process.is_alive():
+                        self._release(worker)
+                    raise
+                except:
+                    worker.terminate()
+                    raise
+
+                self._release(worker)
+                return result
+        finally:
+            os.remove(mapfile)
+
+
+    def _acquire(self):
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.process.is_alive():
+                    return worker
+                worker.terminate()
+        return Worker()
+
+
+    def _release(self, worker):
+        if self.max_requests and worker.requests >= self.max_requests:
+            worker.terminate()
+            return
+        with self._lock:
+            self._idle.append(worker)
+
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.terminate()
+
+
+_pool = None
+_pool_args = None
+_pool_pid = None
+_pool_lock = Lock()
+
+
+def get_dispatch_pool():
+    """ Returns the dispatch pool of this process according to the 
+    configuration or ``None``, if requests shall be dispatched in-process.
+    """
+    global _pool, _pool_args, _pool_pid
+
+    reader = DispatchConfigReader(get_eoxserver_config())
+    args = (
+        reader.dispatch_workers, reader.dispatch_timeout, 
+        reader.dispatch_max_requests
+    )
+    pid = os.getpid()
+
+    with _pool_lock:
+        if _pool is not None and (_pool_args != args or _pool_pid != pid):
+            # the configuration changed or the process was forked: the 
+            # workers of the parent process must not be used
+            if _pool_pid == pid:
+                _pool.close()
+            _pool = None
+
+        if _pool is None and reader.dispatch_workers > 0:
+            _pool = DispatchPool(*args)
+            _pool_args = args
+            _pool_pid = pid
+
+        return _pool
@@ -28,6 +28,7 @@
 #-------------------------------------------------------------------------------
 
 import logging
+from datetime import datetime, timedelta
 
 from django.test import TestCase
 
@@ -37,6 +38,7 @@ from eoxserver.core.interfaces import (
 )
 
 from eoxserver.core.exceptions import TypeMismatch, InternalError
+from eoxserver.core.util.timetools import encode_time_extent
 
 
 logger = logging.getLogger(__name__)
@@ -328,3 +330,40 @@ class InterfaceValidationTestCase(TestCase):
 
     def test_kwargs_invalid(self):
         self.assertRaises(TypeError, self.inst.use_kwargs, "a")
+
+
+class TimeExtentTestCase(TestCase):
+    def setUp(self):
+        start = datetime(2013, 1, 1)
+        self.daily = [
+            (start + timedelta(days=i), start + timedelta(days=i, hours=1))
+            for i in range(365)
+        ]
+
+    def test_periodic(self):
+        self.assertEqual(
+            encode_time_extent(self.daily),
+            "2013-01-01T00:00:00Z/2013-12-31T01:00:00Z/P1D"
+        )
+
+    def test_merge(self):
+        self.assertEqual(
+            encode_time_extent([
+                (datetime(2013, 1, 1), datetime(2013, 1, 3)),
+                (datetime(2013, 1, 2), datetime(2013, 1, 4)),
+                (datetime(2013, 1, 4), datetime(2013, 1, 5)),
+                (datetime(2013, 2, 1), datetime(2013, 2, 1)),
+            ]),
+            "2013-01-01T00:00:00Z/2013-01-05T00:00:00Z/PT1S,"
+            "2013-02-01T00:00:00Z/2013-02-01T00:00:00Z/PT1S"
+        )
+
+    def test_max_items(self):
+        irregular = self.daily[:10] + [
+            (datetime(2013, 1, 11, 0, 5), datetime(2013, 1, 11, 2))
+        ] + self.daily[11:]
+        self.assertEqual(len(encode_time_extent(irregular).split(",")), 3)
+        self.assertEqual(
+            encode_time_extent(irregular, max_items=1),
+            "2013-01-01T00:00:00Z/2013-12-31T01:00:00Z/PT1S"
+        )
@@ -145,3 +145,107 @@ def parse_iso8601(value):
             return temporal
 
     raise ValueError("Could not parse '%s' to a temporal value" % value)
+
+
+def isoformat_duration(td):
+    """ Formats a timedelta object to an ISO 8601 duration string. Only days, 
+        hours, minutes and seconds are used, as years and months have no fixed
+        length.
+    """
+    hours, seconds = divmod(td.seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if td.microseconds:
+        seconds = "%g" % (seconds + td.microseconds / 1000000.)
+
+    date_str = ("%dD" % td.days) if td.days else ""
+    time_str = "".join((
+        ("%dH" % hours) if hours else "",
+        ("%dM" % minutes) if minutes else "",
+        ("%sS" % seconds) if seconds else ""
+    ))
+
+    if time_str:
+        return "P%sT%s" % (date_str, time_str)
+    return "P%s" % (date_str or "T0S")
+
+
+def merge_intervals(intervals, tolerance=timedelta(0)):
+    """ Merges overlapping and adjacent intervals, given as (begin, end) tuples.
+        Intervals with a gap of at most ``tolerance`` are considered adjacent.
+        Returns a sorted list of the merged intervals.
+    """
+    merged = []
+    for begin, end in sorted(intervals):
+        if merged and begin - merged[-1][1] <= tolerance:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((begin, end))
+    return merged
+
+
+def aggregate_time_extent(intervals, max_items=None, min_period_count=3,
+                          resolution=timedelta(seconds=1)):
+    """ Aggregates the given (begin, end) intervals to a compact list of 
+        (begin, end, period) tuples, as used for time dimensions.
+
+        Overlapping and adjacent intervals are merged. Runs of at least 
+        ``min_period_count`` intervals with the same duration and a regular
+        spacing are expressed by a single item with the spacing as period. All
+        other items get the ``resolution`` as period. If ``max_items`` is given,
+        the items separated by the smallest gaps are joined until their number
+        no longer exceeds it.
+    """
+    merged = merge_intervals(intervals)
+
+    items = []
+    i = 0
+    while i < len(merged):
+        begin, end = merged[i]
+        j = i + 1
+        if j < len(merged):
+            duration = end - begin
+            step = merged[j][0] - begin
+            while (j < len(merged) 
+                    and merged[j][1] - merged[j][0] == duration
+                    and merged[j][0] - merged[j - 1][0] == step):
+                j += 1
+
+        if j - i >= min_period_count:
+            items.append((begin, merged[j - 1][1], step))
+            i = j
+        else:
+            items.append((begin, end, resolution))
+            i += 1
+
+    if max_items and len(items) > max_items:
+        gaps = sorted(
+            next_item[0] - item[1] for item, next_item in zip(items, items[1:])
+        )
+        threshold = gaps[len(items) - max_items - 1]
+
+        joined = [items[0]]
+        for begin, end, period in items[1:]:
+            if begin - joined[-1][1] <= threshold:
+                joined[-1] = (joined[-1][0], end, resolution)
+            else:
+                joined.append((begin, end, period))
+        items = joined
+
+    return items
+
+
+def encode_time_extent(intervals, max_items=None, 
+                       resolution=timedelta(seconds=1)):
+    """ Encodes the given (begin, end) intervals to a compact time extent 
+        string like "2013-01-01T00:00:00Z/2013-12-31T00:00:00Z/P1D". See 
+        :func:`aggregate_time_extent` for details.
+    """
+    return ",".join(
+        "%s/%s/%s" % (
+            isoformat(begin), isoformat(end), isoformat_duration(period)
+        )
+        for begin, end, period in aggregate_time_extent(
+            intervals, max_items, resolution=resolution
+        )
+    )
@@ -125,6 +125,40 @@ def parse(obj):
 
 ns_xsi = NameSpace("http://www.w3.org/2001/XMLSchema-instance", "xsi")
 
+class StreamingElement(object):
+    """ Placeholder for an element whose children are only generated while 
+        the document is serialized with :meth:`XMLEncoder.serialize_streaming`.
+        The tag, attributes and namespace map are taken from the (empty) 
+        ``element``. The ``children`` is an iterable of elements or other 
+        streaming elements.
+    """
+
+    def __init__(self, element, children):
+        self.tag = element.tag
+        self.attrib = dict(element.attrib)
+        self.nsmap = element.nsmap
+        self.children = children
+
+
+class _ChunkBuffer(object):
+    """ File-like object collecting the data written to it until flushed.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self.chunks.append(data)
+        self.size += len(data)
+
+    def flush(self):
+        data = "".join(self.chunks)
+        self.chunks = []
+        self.size = 0
+        return data
+
+
 class XMLEncoder(object):
     """ Base class for XML encoders using lxml.etree. This class does not 
         actually provide any helpers for encoding XML in a tree structure (this
@@ -145,6 +179,59 @@ class XMLEncoder(object):
             tree, pretty_print=pretty_print, encoding=encoding
         )
 
+    def serialize_streaming(self, tree, pretty_print=True, 
+                            encoding='iso-8859-1', chunk_size=65536):
+        """ Serialize a tree incrementally, yielding chunks of approximately 
+            ``chunk_size`` bytes. The tree may contain 
+            :class:`StreamingElement` objects, whose children are consumed 
+            one at a time, so only a single child needs to be held in memory.
+            Also adds the ``schemaLocations`` attribute to the root node.
+        """
+        schema_locations = self.get_schema_locations()
+        tree.attrib[ns_xsi("schemaLocation")] = " ".join(
+            "%s %s" % (uri, loc) for uri, loc in schema_locations.items()
+        )
+
+        if not hasattr(etree, "xmlfile"):
+            # lxml prior to 3.1 cannot serialize incrementally, so the whole
+            # document is built and serialized at once
+            data = etree.tostring(
+                self._build_tree(tree), pretty_print=pretty_print, 
+                encoding=encoding, xml_declaration=True
+            )
+            for i in xrange(0, len(data), chunk_size):
+                yield data[i:i + chunk_size]
+            return
+
+        buf = _ChunkBuffer()
+        with etree.xmlfile(buf, encoding=encoding) as xf:
+            xf.write_declaration()
+            for _ in self._write_streaming(xf, tree, pretty_print):
+                if buf.size >= chunk_size:
+                    yield buf.flush()
+
+        yield buf.flush()
+
+    def _build_tree(self, element):
+        if isinstance(element, StreamingElement):
+            result = etree.Element(
+                element.tag, element.attrib, nsmap=element.nsmap
+            )
+            for child in element.children:
+                result.append(self._build_tree(child))
+            return result
+        return element
+
+    def _write_streaming(self, xf, element, pretty_print):
+        if isinstance(element, StreamingElement):
+            with xf.element(element.tag, element.attrib, nsmap=element.nsmap):
+                for child in element.children:
+                    for _ in self._write_streaming(xf, child, pretty_print):
+                        yield
+        else:
+            xf.write(element, pretty_print=pretty_print)
+            yield
+
     @property
     def content_type(self):
         return "text/xml"
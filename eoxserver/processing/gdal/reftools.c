@@ -196,6 +196,11 @@ void *eoxs_create_referenceable_grid_transformer(GDALDatasetH ds, int method, in
     }
 }
 
+void eoxs_destroy_transformer(void *transformer)
+{
+    if (transformer) GDALDestroyTransformer(transformer);
+}
+
 /******************************************************************************/
 
 void *eoxs_create_gen_img_proj_transformer(
@@ -274,8 +279,35 @@ void *eoxs_create_gen_img_proj_transformer(
 
 /******************************************************************************/
 
+CPLErr eoxs_calculate_footprint_tr(GDALDatasetH ds, void *transformer, EOXS_FOOTPRINT **out_footprint);
+
 CPLErr eoxs_calculate_footprint(GDALDatasetH ds, int method, int order, EOXS_FOOTPRINT **out_footprint) {
     void *transformer;
+    CPLErr ret;
+
+    if (!ds) {
+        CPLError(CE_Failure, CPLE_ObjectNull, "No dataset passed.");
+        return CE_Failure;
+    }
+
+    transformer = eoxs_create_referenceable_grid_transformer(ds, method, order);
+
+    if (!transformer) {
+        if (CPLGetLastErrorMsg() == NULL) {
+            CPLError(CE_Failure, CPLE_OutOfMemory, "Failed to create GCP transformer.");
+        }
+        return CE_Failure; 
+    }
+
+    ret = eoxs_calculate_footprint_tr(ds, transformer, out_footprint);
+    GDALDestroyTransformer(transformer);
+    return ret;
+}
+
+/* Same as eoxs_calculate_footprint, but uses a transformer previously created
+   by eoxs_create_referenceable_grid_transformer. The transformer is not 
+   destroyed. */
+CPLErr eoxs_calculate_footprint_tr(GDALDatasetH ds, void *transformer, EOXS_FOOTPRINT **out_footprint) {
     int x_size, y_size;
     double *x, *y, *z;
 
@@ -325,12 +357,8 @@ CPLErr eoxs_calculate_footprint(GDALDatasetH ds, int method, int order, EOXS_FOO
     x_size = GDALGetRasterXSize(ds);
     y_size = GDALGetRasterYSize(ds);
 
-    transformer = eoxs_create_referenceable_grid_transformer(ds, method, order);
-
     if (!transformer) {
-        if (CPLGetLastErrorMsg() == NULL) {
-            CPLError(CE_Failure, CPLE_OutOfMemory, "Failed to create GCP transformer.");
-        }
+        CPLError(CE_Failure, CPLE_ObjectNull, "No transformer passed.");
         return CE_Failure; 
     }
 
@@ -374,7 +402,6 @@ CPLErr eoxs_calculate_footprint(GDALDatasetH ds, int method, int order, EOXS_FOO
     // discard unused information
     free(z);
     free(success);
-    GDALDestroyTransformer(transformer);
 
     *out_footprint = malloc(sizeof(EOXS_FOOTPRINT));
     (*out_footprint)->n_points = n_points;
@@ -398,10 +425,10 @@ CPLErr eoxs_calculate_footprint(GDALDatasetH ds, int method, int order, EOXS_FOO
     return CE_None;
 }
 
+CPLErr eoxs_footprint_to_wkt(EOXS_FOOTPRINT *fp, char **out_wkt);
+
 CPLErr eoxs_get_footprint_wkt(GDALDatasetH ds, int method, int order, char **out_wkt) {
     EOXS_FOOTPRINT *fp;
-    char buffer[512];
-    int i, maxlen;
     CPLErr ret;
     *out_wkt = NULL;
 
@@ -409,6 +436,26 @@ CPLErr eoxs_get_footprint_wkt(GDALDatasetH ds, int method, int order, char **out
         return ret;
     }
 
+    return eoxs_footprint_to_wkt(fp, out_wkt);
+}
+
+CPLErr eoxs_get_footprint_wkt_tr(GDALDatasetH ds, void *transformer, char **out_wkt) {
+    EOXS_FOOTPRINT *fp;
+    CPLErr ret;
+    *out_wkt = NULL;
+
+    if ((ret = eoxs_calculate_footprint_tr(ds, transformer, &fp)) != CE_None) {
+        return ret;
+    }
+
+    return eoxs_footprint_to_wkt(fp, out_wkt);
+}
+
+/* Writes the footprint as WKT polygon and destroys it. */
+CPLErr eoxs_footprint_to_wkt(EOXS_FOOTPRINT *fp, char **out_wkt) {
+    char buffer[512];
+    int i, maxlen;
+
     maxlen = (fp->n_points + 1) * 100 + sizeof("POLYGON(())");
 
     *out_wkt = calloc(maxlen, sizeof(char));
@@ -501,9 +548,35 @@ void eoxs_get_intermediate_point_count(
     *n_y = (int) ceil((eoxs_array_max(4, y) - eoxs_array_min(4, y)) / dist);
 }
 
+CPLErr eoxs_rect_from_subset_tr(GDALDatasetH ds, void *transformer, EOXS_SUBSET *subset, EOXS_RECT *out_rect);
+
 CPLErr eoxs_rect_from_subset(GDALDatasetH ds, EOXS_SUBSET *subset, int method, int order, EOXS_RECT *out_rect) {
     void *transformer;
+    CPLErr ret;
+
+    if (!ds) {
+        CPLError(CE_Failure, CPLE_ObjectNull, "No dataset passed.");
+        return CE_Failure;
+    }
+
+    transformer = eoxs_create_referenceable_grid_transformer(ds, method, order);
     
+    if (!transformer) {
+        if (CPLGetLastErrorMsg() == NULL) {
+            CPLError(CE_Failure, CPLE_OutOfMemory, "Failed to create GCP transformer.");
+        }
+        return CE_Failure; 
+    }
+
+    ret = eoxs_rect_from_subset_tr(ds, transformer, subset, out_rect);
+    GDALDestroyTransformer(transformer);
+    return ret;
+}
+
+/* Same as eoxs_rect_from_subset, but uses a transformer previously created 
+   by eoxs_create_referenceable_grid_transformer. The transformer is not 
+   destroyed. */
+CPLErr eoxs_rect_from_subset_tr(GDALDatasetH ds, void *transformer, EOXS_SUBSET *subset, EOXS_RECT *out_rect) {
     OGRSpatialReferenceH gcp_srs, subset_srs;
     OGRCoordinateTransformationH ct;
     
@@ -558,12 +631,8 @@ CPLErr eoxs_rect_from_subset(GDALDatasetH ds, EOXS_SUBSET *subset, int method, i
     ds_x_size = GDALGetRasterXSize(ds);
     ds_y_size = GDALGetRasterYSize(ds);
     
-    transformer = eoxs_create_referenceable_grid_transformer(ds, method, order);
-    
     if (!transformer) {
-        if (CPLGetLastErrorMsg() == NULL) {
-            CPLError(CE_Failure, CPLE_OutOfMemory, "Failed to create GCP transformer.");
-        }
+        CPLError(CE_Failure, CPLE_ObjectNull, "No transformer passed.");
         return CE_Failure; 
     }
     
@@ -576,7 +645,6 @@ CPLErr eoxs_rect_from_subset(GDALDatasetH ds, EOXS_SUBSET *subset, int method, i
         if (CPLGetLastErrorMsg() == NULL) {
             CPLError(CE_Failure, CPLE_OutOfMemory, "Failed to create coordinate transformer.");
         }
-        GDALDestroyTransformer(transformer);
         OSRDestroySpatialReference( gcp_srs ); 
         OSRDestroySpatialReference( subset_srs ); 
         return CE_Failure;
@@ -650,7 +718,6 @@ CPLErr eoxs_rect_from_subset(GDALDatasetH ds, EOXS_SUBSET *subset, int method, i
     out_rect->y_size = maxy - miny + 1;
     
     free(x); free(y); free(z); free(success);
-    GDALDestroyTransformer(transformer);
     OCTDestroyCoordinateTransformation( ct ); 
     OSRDestroySpatialReference( gcp_srs ); 
     OSRDestroySpatialReference( subset_srs ); 
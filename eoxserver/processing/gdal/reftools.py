@@ -30,9 +30,14 @@ from tempfile import mkstemp
 import ctypes as C
 import os.path
 import logging
+import hashlib
+import struct
+from threading import Lock
 
 from functools import wraps 
 
+from django.utils.datastructures import SortedDict
+
 from eoxserver.contrib import gdal
 from eoxserver.core.util.rect import Rect
 from eoxserver.core.exceptions import InternalError
@@ -127,11 +132,34 @@ try:
 
     REFTOOLS_USABLE = True
 
+    try:
+        _create_transformer = _lib.eoxs_create_referenceable_grid_transformer
+        _create_transformer.argtypes = [C.c_void_p, C.c_int, C.c_int]
+        _create_transformer.restype = C.c_void_p
+
+        _destroy_transformer = _lib.eoxs_destroy_transformer
+        _destroy_transformer.argtypes = [C.c_void_p]
+
+        _get_footprint_wkt_tr = _lib.eoxs_get_footprint_wkt_tr
+        _get_footprint_wkt_tr.argtypes = [C.c_void_p, C.c_void_p, C.POINTER(C.c_char_p)]
+        _get_footprint_wkt_tr.restype = C.c_int
+
+        _rect_from_subset_tr = _lib.eoxs_rect_from_subset_tr
+        _rect_from_subset_tr.argtypes = [C.c_void_p, C.c_void_p, C.POINTER(SUBSET), C.POINTER(RECT)]
+        _rect_from_subset_tr.restype = C.c_int
+
+        TRANSFORMER_CACHE_USABLE = True
+
+    except AttributeError:
+        # library compiled from an older source; transformers can't be reused
+        TRANSFORMER_CACHE_USABLE = False
+
 except OSError:
 
     logger.warn("Could not load '%s'. Referenceable Datasets will not be usable." % _lib_path)
     
     REFTOOLS_USABLE = False
+    TRANSFORMER_CACHE_USABLE = False
 
 
 def _open_ds(path_or_ds):
@@ -141,6 +169,117 @@ def _open_ds(path_or_ds):
     return path_or_ds
 
 
+#-------------------------------------------------------------------------------
+# transformer cache
+
+# maximum number of GCP transformers kept alive per process
+TRANSFORMER_CACHE_SIZE = 32
+
+
+def get_gcp_hash(path_or_ds):
+    """ Returns a hash over the GCPs, their projection and the raster size of 
+        the dataset. Datasets with equal hashes result in equal transformers.
+    """
+    ds = _open_ds(path_or_ds)
+    md5 = hashlib.md5()
+    md5.update(struct.pack("<ii", ds.RasterXSize, ds.RasterYSize))
+    md5.update(ds.GetGCPProjection() or "")
+    for gcp in ds.GetGCPs():
+        md5.update(struct.pack("<4d", 
+            gcp.GCPPixel, gcp.GCPLine, gcp.GCPX, gcp.GCPY
+        ))
+    return md5.hexdigest()
+
+
+class _CachedTransformer(object):
+    """ Reference counted handle of a transformer created in the C library. 
+        The handle is only destroyed when it is both evicted from the cache
+        and no longer in use.
+    """
+
+    def __init__(self, handle):
+        self.handle = handle
+        self.refs = 0
+        self.evicted = False
+
+
+class TransformerCache(object):
+    """ Bounded LRU cache of GCP/TPS transformers, keyed by the GCP hash of the
+        dataset, the method and the order.
+    """
+
+    def __init__(self, size=TRANSFORMER_CACHE_SIZE):
+        self.size = size
+        self._entries = SortedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def acquire(self, ds, method, order, gcp_hash=None):
+        """ Returns a cached transformer for the dataset or creates a new one.
+            Every acquired transformer must be released via ``release``.
+        """
+        key = (gcp_hash or get_gcp_hash(ds), method, order)
+
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+                entry.refs += 1
+                return entry
+
+        # the transformer setup may take a while, so don't block the cache
+        handle = _create_transformer(C.c_void_p(long(ds.this)), method, order)
+        if not handle:
+            raise RuntimeError(
+                gdal.GetLastErrorMsg() or "Failed to create GCP transformer."
+            )
+
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                # another thread was faster
+                _destroy_transformer(handle)
+            else:
+                entry = _CachedTransformer(handle)
+            self._entries[key] = entry
+            entry.refs += 1
+
+            while len(self._entries) > self.size:
+                evicted = self._entries.pop(iter(self._entries).next())
+                evicted.evicted = True
+                self._destroy_if_unused(evicted)
+
+            return entry
+
+    def release(self, entry):
+        with self._lock:
+            entry.refs -= 1
+            self._destroy_if_unused(entry)
+
+    def clear(self):
+        with self._lock:
+            for entry in self._entries.values():
+                entry.evicted = True
+                self._destroy_if_unused(entry)
+            self._entries.clear()
+
+    def _destroy_if_unused(self, entry):
+        if entry.evicted and entry.refs <= 0 and entry.handle:
+            _destroy_transformer(entry.handle)
+            entry.handle = None
+
+
+_transformer_cache = TransformerCache()
+
+
+def get_transformer_cache():
+    """ Returns the process wide transformer cache.
+    """
+    return _transformer_cache
+
+
 def requires_reftools(func):
     """ Decorator function that checks whether or not the reftools library is 
         available and raises if not.
@@ -231,7 +370,8 @@ def suggest_transformer( path_or_ds ) :
 
 
 @requires_reftools
-def get_footprint_wkt(path_or_ds, method=METHOD_GCP, order=0):
+def get_footprint_wkt(path_or_ds, method=METHOD_GCP, order=0, 
+                      use_cache=True, gcp_hash=None):
     """ 
         methods: 
 
@@ -264,13 +404,30 @@ def get_footprint_wkt(path_or_ds, method=METHOD_GCP, order=0):
 
         NOTE: The default parameters are left for backward compatibility.
               They can be, however, often inappropriate!
+
+        The transformer is taken from the process wide transformer cache
+        unless ``use_cache`` is ``False``. A precomputed ``gcp_hash`` (see 
+        ``get_gcp_hash``) spares hashing the GCPs.
     """
     
     ds = _open_ds(path_or_ds)
     
     result = C.c_char_p()
     
-    ret = _get_footprint_wkt(C.c_void_p(long(ds.this)), method, order, C.byref(result))
+    if use_cache and TRANSFORMER_CACHE_USABLE and ds.GetGCPCount() > 0:
+        cache = get_transformer_cache()
+        transformer = cache.acquire(ds, method, order, gcp_hash)
+        try:
+            ret = _get_footprint_wkt_tr(
+                C.c_void_p(long(ds.this)), transformer.handle, C.byref(result)
+            )
+        finally:
+            cache.release(transformer)
+    else:
+        ret = _get_footprint_wkt(
+            C.c_void_p(long(ds.this)), method, order, C.byref(result)
+        )
+
     if ret != gdal.CE_None:
         raise RuntimeError(gdal.GetLastErrorMsg())
     
@@ -281,17 +438,29 @@ def get_footprint_wkt(path_or_ds, method=METHOD_GCP, order=0):
 
 @requires_reftools
 def rect_from_subset(path_or_ds, srid, minx, miny, maxx, maxy,
-                     method=METHOD_GCP, order=0):
+                     method=METHOD_GCP, order=0, use_cache=True, 
+                     gcp_hash=None):
     
     ds = _open_ds(path_or_ds)
     
     rect = RECT()
-    ret = _rect_from_subset(
-        C.c_void_p(long(ds.this)),
-        C.byref(SUBSET(srid, minx, miny, maxx, maxy)),
-        method, order,
-        C.byref(rect)
-    )
+    subset = SUBSET(srid, minx, miny, maxx, maxy)
+
+    if use_cache and TRANSFORMER_CACHE_USABLE and ds.GetGCPCount() > 0:
+        cache = get_transformer_cache()
+        transformer = cache.acquire(ds, method, order, gcp_hash)
+        try:
+            ret = _rect_from_subset_tr(
+                C.c_void_p(long(ds.this)), transformer.handle,
+                C.byref(subset), C.byref(rect)
+            )
+        finally:
+            cache.release(transformer)
+    else:
+        ret = _rect_from_subset(
+            C.c_void_p(long(ds.this)), C.byref(subset), method, order,
+            C.byref(rect)
+        )
     if ret != gdal.CE_None:
         raise RuntimeError(gdal.GetLastErrorMsg())
     
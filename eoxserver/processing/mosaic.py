@@ -27,7 +27,16 @@
 #-------------------------------------------------------------------------------
 
 
+""" This module generates the tiles and the tile index of rectified stitched
+    mosaics. Tiles are rendered in parallel worker processes and are written 
+    as internally tiled GeoTIFFs with overviews. When datasets are added to or
+    removed from a mosaic, only the tiles touched by their footprints are 
+    regenerated.
+"""
+
 from datetime import datetime
+from collections import defaultdict
+from multiprocessing import Pool
 import os.path
 import shutil
 import numpy
@@ -36,28 +45,87 @@ import logging
 
 from django.contrib.gis.geos import Polygon
 
-from eoxserver.contrib import gdal, ogr, osr
+from eoxserver.core.config import get_eoxserver_config
+from eoxserver.core.decoders import config
+from eoxserver.contrib import gdal, ogr
 from eoxserver.processing.exceptions import ProcessingError
+from eoxserver.resources.coverages import crss
 
 
 logger = logging.getLogger(__name__)
 
+
+class MosaicConfigReader(config.Reader):
+    section = "processing.mosaic"
+    workers = config.Option(type=int, default=4)
+    tile_size = config.Option(type=int, default=2048)
+    block_size = config.Option(type=int, default=256)
+
+
 def make_mosaic(mosaic):
-#    if MosaicConfigReader().isAsynchronous():
-#        _make_mosaic_async(mosaic)
-#    else:
-#        _make_mosaic_sync(mosaic)
-    _make_mosaic_sync(mosaic)
-
-#def _make_mosaic_async(mosaic):
-#    generator = AsynchronousRectifiedStitchedMosaicGenerator(mosaic)
-#    
-#    generator.generate()
-
-def _make_mosaic_sync(mosaic):
-    generator = SynchronousRectifiedStitchedMosaicGenerator(mosaic)
-    
-    generator.generate()
+    """ Generates all tiles and the tile index of the mosaic.
+    """
+    RectifiedStitchedMosaicGenerator(mosaic).generate()
+
+
+def update_mosaic(mosaic, footprints):
+    """ Regenerates the tiles of the mosaic touched by the given footprints of
+        added or removed datasets. The whole mosaic is generated if it has not
+        been generated before.
+    """
+    RectifiedStitchedMosaicGenerator(mosaic).update(footprints)
+
+
+def _roundint(f):
+    return int(numpy.int_(numpy.rint(f)))
+
+
+class FootprintIndex(object):
+    """ Simple grid based spatial index of items by their extents. Each item is
+        registered in all grid cells its extent overlaps.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = float(cell_size)
+        self._cells = defaultdict(list)
+
+    def _cellRange(self, extent):
+        minx, miny, maxx, maxy = extent
+        return (
+            xrange(
+                int(math.floor(minx / self.cell_size)), 
+                int(math.floor(maxx / self.cell_size)) + 1
+            ),
+            xrange(
+                int(math.floor(miny / self.cell_size)), 
+                int(math.floor(maxy / self.cell_size)) + 1
+            )
+        )
+
+    def insert(self, item, extent):
+        x_range, y_range = self._cellRange(extent)
+        for x in x_range:
+            for y in y_range:
+                self._cells[(x, y)].append((item, extent))
+
+    def query(self, extent):
+        """ Returns all items whose extents intersect the given extent.
+        """
+        minx, miny, maxx, maxy = extent
+        x_range, y_range = self._cellRange(extent)
+        result = []
+        seen = set()
+        for x in x_range:
+            for y in y_range:
+                for item, item_extent in self._cells.get((x, y), ()):
+                    if id(item) in seen:
+                        continue
+                    seen.add(id(item))
+                    if (item_extent[0] <= maxx and item_extent[2] >= minx and
+                        item_extent[1] <= maxy and item_extent[3] >= miny):
+                        result.append(item)
+        return result
+
 
 class MosaicContribution(object):
     def __init__(self, dataset, contributing_footprint):
@@ -72,44 +140,101 @@ class MosaicContribution(object):
     
     @classmethod
     def getContributions(cls, mosaic, poly=None):
-        if poly is None:
-            datasets = mosaic.getDatasets()
-        else:
+        datasets = [
+            (dataset, dataset.getFootprint()) 
+            for dataset in mosaic.getDatasets()
+        ]
+
+        if poly is not None:
             poly.transform(4326)
             
             datasets = filter(
-                lambda dataset: dataset.getFootprint().intersects(poly),
-                mosaic.getDatasets()
+                lambda (dataset, footprint): footprint.intersects(poly),
+                datasets
             )
         
-        datasets.sort(key=lambda dataset: dataset.getBeginTime())
+        datasets.sort(key=lambda (dataset, footprint): dataset.getBeginTime())
+
+        if not datasets:
+            return []
+
+        # only footprints of later datasets with intersecting extents are
+        # subtracted from the footprint of a dataset
+        index = FootprintIndex(
+            max([
+                max(footprint.extent[2] - footprint.extent[0], 
+                    footprint.extent[3] - footprint.extent[1])
+                for _, footprint in datasets
+            ]) or 1.0
+        )
+        for order, (dataset, footprint) in enumerate(datasets):
+            index.insert(order, footprint.extent)
         
         contributions = []
         
-        for dataset in datasets:
-            footprint = dataset.getFootprint()
-            
-            for contribution in contributions:
-                contribution.difference(footprint)
-            
+        for order, (dataset, footprint) in enumerate(datasets):
             if poly is None:
-                contributions.append(cls(dataset, footprint))
+                contribution = cls(dataset, footprint)
             else:
-                contributions.append(cls(dataset, footprint.intersection(poly)))
-        
-        #logger.debug("Contributions")
-        #for contribution in contributions:
-            #logger.debug("Dataset: %s" % contribution.dataset.getCoverageId())
-            #logger.debug("Contributing Footprint: %s" % contribution.contributing_footprint.wkt)
-        
-        return filter(
-            lambda contribution: not contribution.isEmpty(),
-            contributions
-        )
+                contribution = cls(dataset, footprint.intersection(poly))
+
+            for other in sorted(index.query(footprint.extent)):
+                if contribution.isEmpty():
+                    break
+                other_footprint = datasets[other][1]
+                if other > order and other_footprint.intersects(
+                        contribution.contributing_footprint):
+                    contribution.difference(other_footprint)
+
+            if not contribution.isEmpty():
+                contributions.append(contribution)
         
-class SynchronousRectifiedStitchedMosaicGenerator(object):
-    def __init__(self, mosaic):
+        return contributions
+
+
+class MosaicSource(object):
+    """ A dataset contributing to the mosaic, reduced to the information 
+        required to render tiles.
+    """
+
+    def __init__(self, order, filename, extent, footprint):
+        self.order = order
+        self.filename = filename
+        self.extent = extent
+        self.footprint = footprint
+
+
+class TileJob(object):
+    """ Description of a single tile to be rendered by :func:`_renderTile`.
+        Sources are given as ``(filename, extent)`` tuples in the order they
+        are painted, i.e: later sources cover earlier ones.
+    """
+
+    def __init__(self, path, x_index, y_index, extent, xres, yres, sources, 
+                 band_count, data_type, nodata_values, projection, 
+                 block_size):
+        self.path = path
+        self.x_index = x_index
+        self.y_index = y_index
+        self.extent = extent
+        self.xres = xres
+        self.yres = yres
+        self.sources = sources
+        self.band_count = band_count
+        self.data_type = data_type
+        self.nodata_values = nodata_values
+        self.projection = projection
+        self.block_size = block_size
+
+
+class RectifiedStitchedMosaicGenerator(object):
+    def __init__(self, mosaic, workers=None):
         self.mosaic = mosaic
+
+        reader = MosaicConfigReader(get_eoxserver_config())
+        self.workers = workers if workers is not None else reader.workers
+        self.tile_size = reader.tile_size
+        self.block_size = reader.block_size
         
         self.srid = mosaic.getSRID()
         self.minx, self.miny, self.maxx, self.maxy = mosaic.getExtent()
@@ -124,49 +249,55 @@ class SynchronousRectifiedStitchedMosaicGenerator(object):
         
         self.target_dir = mosaic.getData().getStorageDir()
         self.create_time = datetime.now()
-    
-    def _roundint(self, f):
-        return int(numpy.int_(numpy.rint(f)))
+        self.stamp = self.create_time.strftime("%Y%m%dT%H%M%S")
+        self.tiles_dir = "tiles_%s" % self.stamp
+
+        self.projection = crss.getSpatialReference(self.srid).wkt
     
     def _getTileExtent(self, x_index, y_index):
-        minx = self.minx + float(x_index) * self.xres * 256.0
-        maxx = min(minx + self.xres * 256.0, self.maxx)
-        miny = self.miny + float(y_index) * self.yres * 256.0
-        maxy = min(miny + self.yres * 256.0, self.maxy)
+        minx = self.minx + float(x_index) * self.xres * self.tile_size
+        maxx = min(minx + self.xres * self.tile_size, self.maxx)
+        miny = self.miny + float(y_index) * self.yres * self.tile_size
+        maxy = min(miny + self.yres * self.tile_size, self.maxy)
         
         return (minx, miny, maxx, maxy)
     
     def _getTileGeometry(self, x_index, y_index):
         return Polygon.from_bbox(self._getTileExtent(x_index, y_index))
     
-    def _getContributingTiles(self, contributing_footprint):
-        if contributing_footprint.empty:
-            raise StopIteration
-        else:
-            #reproject footprint
-            ref_area = contributing_footprint.transform(self.srid, True)
+    def _getContributingTiles(self, ref_area):
+        """ Yields the indices of all tiles intersecting the given area, which
+            must be given in the CRS of the mosaic.
+        """
+        if ref_area.empty:
+            return
             
-            minx, miny, maxx, maxy = ref_area.extent
-            
-            x_index_min = int(math.floor((minx - self.minx) / self.xres / 256.0))
-            x_index_max = int(math.ceil((maxx - self.minx) / self.xres / 256.0))
-            y_index_min = int(math.floor((miny - self.miny) / self.yres / 256.0))
-            y_index_max = int(math.ceil((maxy - self.miny) / self.yres / 256.0))
-            
-            logger.debug("Mosaic Extent: %f, %f, %f, %f" % (self.minx, self.miny, self.maxx, self.maxy))
-            logger.debug("Contr. Footprint Extent: %f, %f, %f, %f" % contributing_footprint.extent)
-            logger.debug("Ref. Area Extent: %f, %f, %f, %f" % (minx, miny, maxx, maxy)) 
-            logger.debug("Tile Index Extent: %d, %d, %d, %d" % (x_index_min, y_index_min, x_index_max, y_index_max))
-            
-            for x_index in range(x_index_min, x_index_max+1):
-                for y_index in range(y_index_min, y_index_max+1):
-                    if self._getTileGeometry(x_index, y_index).intersects(ref_area):
-                        yield (x_index, y_index)
+        minx, miny, maxx, maxy = ref_area.extent
+        tile_x = self.xres * self.tile_size
+        tile_y = self.yres * self.tile_size
+        
+        x_index_min = max(int(math.floor((minx - self.minx) / tile_x)), 0)
+        x_index_max = min(
+            int(math.floor((maxx - self.minx) / tile_x)), 
+            int(math.ceil(float(self.size_x) / self.tile_size)) - 1
+        )
+        y_index_min = max(int(math.floor((miny - self.miny) / tile_y)), 0)
+        y_index_max = min(
+            int(math.floor((maxy - self.miny) / tile_y)),
+            int(math.ceil(float(self.size_y) / self.tile_size)) - 1
+        )
+        
+        logger.debug("Tile Index Extent: %d, %d, %d, %d" % (x_index_min, y_index_min, x_index_max, y_index_max))
+        
+        for x_index in range(x_index_min, x_index_max+1):
+            for y_index in range(y_index_min, y_index_max+1):
+                if self._getTileGeometry(x_index, y_index).intersects(ref_area):
+                    yield (x_index, y_index)
 
-    def _getTilePath(self, id, x_index, y_index):
+    def _getTilePath(self, x_index, y_index):
         dst_dir = os.path.join(
             self.target_dir,
-            "tiles_%s" % self.create_time.strftime("%Y%m%dT%H%M%S"),
+            self.tiles_dir,
             "%03d" % (x_index // 1000),
             "%03d" % (y_index // 1000)
         )
@@ -174,7 +305,7 @@ class SynchronousRectifiedStitchedMosaicGenerator(object):
         if not os.path.exists(dst_dir):
             os.makedirs(dst_dir)
         
-        dst_filename = "tile_%s_%06d_%06d.tiff" % (id, x_index, y_index)
+        dst_filename = "tile_%s_%06d_%06d.tiff" % (self.stamp, x_index, y_index)
         
         return os.path.join(dst_dir, dst_filename)
 
@@ -184,131 +315,118 @@ class SynchronousRectifiedStitchedMosaicGenerator(object):
         else:
             return 0
 
-    def _makeTile(self, tile_coords, dataset):
+    def _getSources(self):
+        """ Returns the sources of the mosaic ordered by time and a spatial
+            index of them with tile sized cells.
+        """
+        datasets = sorted(
+            self.mosaic.getDatasets(), key=lambda dataset: dataset.getBeginTime()
+        )
+
+        index = FootprintIndex(self.xres * self.tile_size)
+        sources = []
+        for order, dataset in enumerate(datasets):
+            src = dataset.getData().open()
+            filename = src.GetDescription()
+            del src
+
+            footprint = dataset.getFootprint().transform(self.srid, True)
+            source = MosaicSource(
+                order, filename, dataset.getExtent(), footprint
+            )
+            index.insert(source, footprint.extent)
+            sources.append(source)
+
+        return sources, index
+
+    def _getTileJob(self, tile_coords, index):
+        """ Returns the job to render the tile or ``None`` if no dataset 
+            contributes to it. Datasets whose footprints are completely covered
+            by later ones within the tile are skipped.
+        """
         x_index, y_index = tile_coords
-        
-        tile_minx, tile_miny, tile_maxx, tile_maxy = self._getTileExtent(x_index, y_index)
-        
-        ds_minx, ds_miny, ds_maxx, ds_maxy = dataset.getExtent()
-        
-        minx = max(ds_minx, tile_minx)
-        miny = max(ds_miny, tile_miny)
-        maxx = min(ds_maxx, tile_maxx)
-        maxy = min(ds_maxy, tile_maxy)
-        
-        x_offset = self._roundint((minx - ds_minx) / self.xres)
-        y_offset = self._roundint((ds_maxy - maxy) / self.yres)
-        x_size = self._roundint((maxx - minx) / self.xres)
-        y_size = self._roundint((maxy - miny) / self.yres)
-        
-        logger.debug("_makeTile()")
-        logger.debug("Tile Extent: %f, %f, %f, %f" % (tile_minx, tile_miny, tile_maxx, tile_maxy))
-        logger.debug("Dataset Extent: %f, %f, %f, %f" % (ds_minx, ds_miny, ds_maxx, ds_maxy))
-        logger.debug("Final Extent: %f, %f, %f, %f" % (minx, miny, maxx, maxy))
-        logger.debug("Offsets: %d, %d; Size: %d, %d" % (x_offset, y_offset, x_size, y_size))
-        
-        src = dataset.getData().open()
+        tile_extent = self._getTileExtent(x_index, y_index)
+        tile_geom = Polygon.from_bbox(tile_extent)
 
-        dst_path = str(self._getTilePath(dataset.getEOID(), x_index, y_index))
+        candidates = sorted(
+            index.query(tile_extent), key=lambda source: source.order
+        )
 
-        driver = gdal.GetDriverByName('GTiff')
-        dst = driver.Create(dst_path, x_size, y_size, len(self.bands), self.data_type)
-        gt = [minx, self.xres, 0, maxy, 0, -self.yres]
-        dst.SetGeoTransform(gt)
-        dst.SetProjection(src.GetProjection())
-        
-        data = src.ReadRaster(x_offset, y_offset, x_size, y_size, x_size, y_size)
-        dst.WriteRaster(0, 0, x_size, y_size, data, x_size, y_size)
-        
-        del src # close the datasets
-        del dst
-        
-        return Tile(dst_path, x_index, y_index, minx, miny, maxx, maxy, x_size, y_size)
-        
-    def _mergeTiles(self, tiles):
-        if len(tiles) == 1:
-            return tiles[0]
-        else:
-            logger.debug("_mergeTiles")
-            
-            x_index = tiles[0].x_index
-            y_index = tiles[0].y_index
-            
-            logger.debug("Index: (%d, %d)" % (x_index, y_index))
-            
-            minx = min([tile.minx for tile in tiles])
-            miny = min([tile.miny for tile in tiles])
-            maxx = max([tile.maxx for tile in tiles])
-            maxy = max([tile.maxy for tile in tiles])
-            
-            x_size = self._roundint((maxx - minx) / self.xres)
-            y_size = self._roundint((maxy - miny) / self.yres)
-            
-            dst_path = str(self._getTilePath("merged", x_index, y_index))
-            
-            driver = gdal.GetDriverByName('MEM')
-            tmp = driver.Create(dst_path, x_size, y_size, len(self.bands), self.data_type)
+        contributing = []
+        covered = None
+        for source in reversed(candidates):
+            if not source.footprint.intersects(tile_geom):
+                continue
+            area = source.footprint.intersection(tile_geom)
+            if covered is None:
+                covered = area
+            elif covered.contains(area):
+                continue
+            else:
+                covered = covered.union(area)
+            contributing.append(source)
 
-            
-            # initialize arrays
-            for band_no in xrange(len(self.bands)):
-                band = tmp.GetRasterBand(band_no + 1)
-                
-                band.SetNoDataValue(self._getNoData(self.bands[band_no]))
-            
-            for tile in tiles:
-                src = gdal.Open(tile.path)
-                
-                tile_x_offset = self._roundint((tile.minx - minx) / self.xres)
-                tile_y_offset = self._roundint((maxy - tile.maxy) / self.yres)
+        if not contributing:
+            return None
 
-                logger.debug("Offsets: %d, %d" % (tile_x_offset, tile_y_offset))
-                logger.debug("Float Offsets: %f, %f" % ((tile.minx - minx) / self.xres, (maxy - tile.maxy) / self.yres))
+        contributing.reverse()
 
-                for band_no in xrange(len(self.bands)):
-                    src_band = src.GetRasterBand(band_no + 1)
-                    tmp_band = tmp.GetRasterBand(band_no + 1)
-                    
-                    tile_data = src_band.ReadAsArray(0, 0, tile.x_size, tile.y_size)
-                    merged_data = tmp_band.ReadAsArray(tile_x_offset, tile_y_offset, tile.x_size, tile.y_size)
-                    
-                    tile_nodata = numpy.equal(tile_data, self._getNoData(self.bands[band_no]))
-                    
-                    to_write = numpy.choose(tile_nodata, (tile_data, merged_data))
-                    
-                    logger.debug("Shape: %s " % str(to_write.shape))
-                    
-                    tmp_band.WriteArray(to_write, tile_x_offset, tile_y_offset)
-            
-            driver = gdal.GetDriverByName('GTiff')
-            dst = driver.CreateCopy(dst_path, tmp)
-            gt = [minx, self.xres, 0, maxy, 0, -self.yres]
-            dst.SetGeoTransform(gt)
-            dst.SetProjection(src.GetProjection())
+        # the tile covers the union of the contributing dataset extents 
+        minx = max(tile_extent[0], min([s.extent[0] for s in contributing]))
+        miny = max(tile_extent[1], min([s.extent[1] for s in contributing]))
+        maxx = min(tile_extent[2], max([s.extent[2] for s in contributing]))
+        maxy = min(tile_extent[3], max([s.extent[3] for s in contributing]))
+
+        return TileJob(
+            str(self._getTilePath(x_index, y_index)), x_index, y_index,
+            (minx, miny, maxx, maxy), self.xres, self.yres, 
+            [(source.filename, source.extent) for source in contributing],
+            len(self.bands), self.data_type, 
+            [self._getNoData(band) for band in self.bands],
+            self.projection, self.block_size
+        )
 
-            return Tile(dst_path, x_index, y_index, minx, miny, maxx, maxy, x_size, y_size)
+    def _renderTiles(self, tile_coords, index):
+        """ Renders the given tiles, distributed across the worker processes,
+            and returns a dictionary of the resulting tiles by their indices.
+        """
+        jobs = filter(None, [
+            self._getTileJob(coords, index) for coords in sorted(tile_coords)
+        ])
+
+        logger.info(
+            "Rendering %d tiles of mosaic '%s'." 
+            % (len(jobs), self.mosaic.getEOID())
+        )
+
+        if self.workers > 1 and len(jobs) > 1:
+            pool = Pool(min(self.workers, len(jobs)))
+            try:
+                tiles = pool.map(_renderTile, jobs, chunksize=1)
+                pool.close()
+            except:
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+        else:
+            tiles = map(_renderTile, jobs)
+
+        return dict(((tile.x_index, tile.y_index), tile) for tile in tiles)
             
     def _createTileIndex(self, result_tiles):
-        path = os.path.join(self.target_dir, "tindex_%s.shp" % self.create_time.strftime("%Y%m%dT%H%M%S"))
+        path = os.path.join(self.target_dir, "tindex_%s.shp" % self.stamp)
         
         tile_index = TileIndex(path, self.srid)
         
         tile_index.open()
         
-        for tile_coords, tile in result_tiles.items():
+        for tile_coords, tile in sorted(result_tiles.items()):
             tile_index.addTile(tile)
         
         tile_index.close()
         
         return tile_index
-    
-    def _cleanup(self, tmp_tiles, result_tiles):
-        driver = gdal.GetDriverByName('GTiff')
-        
-        for tile_coords, tiles in tmp_tiles.items():
-            if len(tiles) > 1:      
-                for tile in tiles:
-                    driver.Delete(tile.path)
                     
     def _finish(self, tile_index):
         dst_path = os.path.join(self.target_dir, "tindex.shp")
@@ -321,42 +439,171 @@ class SynchronousRectifiedStitchedMosaicGenerator(object):
         for node in nodes:
             path = os.path.join(self.target_dir, node)
             
-            if not node.startswith("tindex.") and node != "tiles_%s" % self.create_time.strftime("%Y%m%dT%H%M%S"):
+            if not node.startswith("tindex.") and node != self.tiles_dir:
                 if os.path.isdir(path):
                     shutil.rmtree(path)
                 else:
                     os.remove(path)
 
     def generate(self):
-        # determine contributing footprints
-        contributions = MosaicContribution.getContributions(self.mosaic)
-        
-        # tile datasets
-        dataset_tiles = {}
-        
-        for contribution in contributions:
-            logger.debug("Processing Dataset '%s' ..." % contribution.dataset.getEOID())
-            
-            for tile_coords in self._getContributingTiles(contribution.contributing_footprint):
-                if tile_coords in dataset_tiles:
-                    dataset_tiles[tile_coords].append(self._makeTile(tile_coords, contribution.dataset))
-                else:
-                    dataset_tiles[tile_coords] = [self._makeTile(tile_coords, contribution.dataset)]
-        
-        # merge tiles
-        result_tiles = {}
-        
-        for tile_coords, tiles in dataset_tiles.items():
-            result_tiles[tile_coords] = self._mergeTiles(tiles)
+        sources, index = self._getSources()
+
+        tile_coords = set()
+        for source in sources:
+            logger.debug("Processing Dataset '%s' ..." % source.filename)
+            tile_coords.update(self._getContributingTiles(source.footprint))
+
+        result_tiles = self._renderTiles(tile_coords, index)
         
         # create tileindex
         tile_index = self._createTileIndex(result_tiles)
-                
-        # cleanup
-        self._cleanup(dataset_tiles, result_tiles)
         
         # move tile index to expected location and remove unused files
         self._finish(tile_index)
+
+    def update(self, footprints):
+        """ Regenerates the tiles touched by the footprints of added or removed
+            datasets and updates the tile index accordingly. Replaced tiles are
+            written to new files, so that the previous state of the mosaic 
+            stays consistent until the tile index is replaced.
+        """
+        tindex_path = os.path.join(self.target_dir, "tindex.shp")
+        if not os.path.exists(tindex_path):
+            return self.generate()
+
+        existing_tiles = dict(
+            ((tile.x_index, tile.y_index), tile)
+            for tile in TileIndex(tindex_path, self.srid).getTiles()
+        )
+        if not existing_tiles:
+            return self.generate()
+
+        # continue to use the current tiles directory
+        self.tiles_dir = os.path.relpath(
+            existing_tiles.values()[0].path, self.target_dir
+        ).split(os.sep)[0]
+
+        touched = set()
+        for footprint in footprints:
+            touched.update(self._getContributingTiles(
+                footprint.transform(self.srid, True)
+            ))
+
+        if not touched:
+            return
+
+        sources, index = self._getSources()
+        rendered_tiles = self._renderTiles(touched, index)
+
+        result_tiles = dict(existing_tiles)
+        obsolete_tiles = []
+        for tile_coords in touched:
+            tile = result_tiles.pop(tile_coords, None)
+            if tile is not None:
+                obsolete_tiles.append(tile)
+        result_tiles.update(rendered_tiles)
+
+        tile_index = self._createTileIndex(result_tiles)
+        tile_index.move(tindex_path)
+
+        for tile in obsolete_tiles:
+            if os.path.exists(tile.path):
+                os.remove(tile.path)
+
+
+def _renderTile(job):
+    """ Renders a single tile as described by the :class:`TileJob` and returns 
+        the resulting :class:`Tile`. Sources are painted in order; pixels with
+        the nodata value of a band do not cover pixels of earlier sources.
+    """
+    minx, miny, maxx, maxy = job.extent
+    x_size = _roundint((maxx - minx) / job.xres)
+    y_size = _roundint((maxy - miny) / job.yres)
+
+    tmp = gdal.GetDriverByName("MEM").Create(
+        "", x_size, y_size, job.band_count, job.data_type
+    )
+
+    arrays = []
+    for band_no in xrange(job.band_count):
+        band = tmp.GetRasterBand(band_no + 1)
+        band.SetNoDataValue(job.nodata_values[band_no])
+        band.Fill(job.nodata_values[band_no])
+        arrays.append(band.ReadAsArray())
+
+    for filename, (ds_minx, ds_miny, ds_maxx, ds_maxy) in job.sources:
+        src = gdal.Open(filename)
+        if src is None:
+            raise ProcessingError("Cannot open dataset '%s'." % filename)
+
+        w_minx = max(ds_minx, minx)
+        w_maxy = min(ds_maxy, maxy)
+
+        src_x_offset = _roundint((w_minx - ds_minx) / job.xres)
+        src_y_offset = _roundint((ds_maxy - w_maxy) / job.yres)
+        dst_x_offset = _roundint((w_minx - minx) / job.xres)
+        dst_y_offset = _roundint((maxy - w_maxy) / job.yres)
+
+        # the sizes and offsets are rounded independently, so the window is
+        # clipped to both the source dataset and the tile
+        w_x_size = min(
+            _roundint((min(ds_maxx, maxx) - w_minx) / job.xres), 
+            src.RasterXSize - src_x_offset, x_size - dst_x_offset
+        )
+        w_y_size = min(
+            _roundint((w_maxy - max(ds_miny, miny)) / job.yres), 
+            src.RasterYSize - src_y_offset, y_size - dst_y_offset
+        )
+        if w_x_size <= 0 or w_y_size <= 0:
+            continue
+
+        for band_no in xrange(job.band_count):
+            data = src.GetRasterBand(band_no + 1).ReadAsArray(
+                src_x_offset, src_y_offset, w_x_size, w_y_size
+            )
+            target = arrays[band_no][
+                dst_y_offset:dst_y_offset + w_y_size,
+                dst_x_offset:dst_x_offset + w_x_size
+            ]
+            valid = numpy.not_equal(data, job.nodata_values[band_no])
+            target[valid] = data[valid]
+
+        del src # close the dataset
+
+    for band_no in xrange(job.band_count):
+        tmp.GetRasterBand(band_no + 1).WriteArray(arrays[band_no])
+
+    tmp.SetGeoTransform([minx, job.xres, 0, maxy, 0, -job.yres])
+    tmp.SetProjection(job.projection)
+
+    # build the overviews down to the size of a single block
+    overview_levels = []
+    factor = 2
+    while max(x_size, y_size) // factor >= job.block_size:
+        overview_levels.append(factor)
+        factor *= 2
+
+    # write to a temporary file first, so that the tile is replaced atomically
+    tmp_path = job.path + ".tmp"
+    dst = gdal.GetDriverByName("GTiff").CreateCopy(tmp_path, tmp, 0, [
+        "TILED=YES", 
+        "BLOCKXSIZE=%d" % job.block_size, 
+        "BLOCKYSIZE=%d" % job.block_size
+    ])
+    if dst is None:
+        raise ProcessingError("Cannot create tile '%s'." % job.path)
+
+    if overview_levels:
+        dst.BuildOverviews("NEAREST", overview_levels)
+
+    del dst
+    del tmp
+    os.rename(tmp_path, job.path)
+
+    return Tile(
+        job.path, job.x_index, job.y_index, minx, miny, maxx, maxy, 
+        x_size, y_size
+    )
         
 class Tile(object):
     def __init__(self, path, x_index, y_index, minx, miny, maxx, maxy, x_size, y_size):
@@ -377,8 +624,7 @@ class TileIndex(object):
         self.path = path
         
         self.srid = srid
-        self.srs = osr.SpatialReference()
-        self.srs.ImportFromEPSG(self.srid)
+        self.srs = crss.getSpatialReference(self.srid).sr
         
         self.shapefile = None
         self.layer = None
@@ -451,6 +697,27 @@ class TileIndex(object):
         
         self.path = dst_path
     
+    def getTiles(self):
+        """ Returns the :class:`Tile` objects of all entries of the tile index.
+        """
+        shapefile = ogr.Open(str(self.path))
+        if shapefile is None:
+            raise ProcessingError("Cannot open shapefile '%s'." % self.path)
+
+        layer = shapefile.GetLayer(0)
+        base_dir = os.path.dirname(self.path)
+
+        tiles = []
+        for feature in layer:
+            minx, maxx, miny, maxy = feature.GetGeometryRef().GetEnvelope()
+            tiles.append(Tile(
+                os.path.join(base_dir, feature.GetField("location")),
+                feature.GetField("x_index"), feature.GetField("y_index"),
+                minx, miny, maxx, maxy, None, None
+            ))
+
+        return tiles
+
     def addTile(self, tile):
         logger.info("Creating shapefile entry for tile (%06d, %06d) ..." % (tile.x_index, tile.y_index))
         
@@ -474,15 +741,3 @@ class TileIndex(object):
         feature = None
         
         logger.info("Success.")
-    
-#class MosaicConfigReader(object):
-#    def validate(self, config):
-#        pass
-#        
-#    def isAsynchronous(self):
-#        ret = System.getConfig().getConfigValue("processing.mosaic", "async")
-#        
-#        return ret and ret.lower() == "true"
-#        
-#MosaicConfigReaderImplementation = \
-#ConfigReaderInterface.implement(MosaicConfigReader)
@@ -27,8 +27,11 @@
 # THE SOFTWARE.
 #-------------------------------------------------------------------------------
 
-from os.path import splitext
-from itertools import izip
+from os.path import splitext, join
+from itertools import izip, count
+from tempfile import mkdtemp
+from shutil import rmtree
+from math import ceil
 import numpy
 import logging
 
@@ -38,7 +41,8 @@ from django.contrib.gis.gdal.geometries import OGRGeometry
 from eoxserver.contrib import  gdal, ogr, osr 
 from eoxserver.core.util.xmltools import XMLEncoder
 from eoxserver.processing.preprocessing.util import (
-    create_mem, create_mem_copy, copy_projection
+    create_mem, create_mem_copy, create_vrt_copy, copy_projection,
+    copy_metadata, iter_windows
 )
 from eoxserver.processing.preprocessing.optimization import (
     BandSelectionOptimization, ColorIndexOptimization, NoDataValueOptimization,
@@ -81,6 +85,28 @@ class NativeMetadataFormatEncoder(XMLEncoder):
 # enum for bandmode
 RGB, RGBA, ORIG_BANDS = range(3)
 
+# size of the tiles (in pixels of the decimated mask) used to extract the 
+# footprint
+FOOTPRINT_TILE_SIZE = 1024
+
+
+def _reduce_mask(mask, factor):
+    """ Decimates the boolean mask by the given factor. A pixel of the result is
+        ``True`` if any of the pixels it covers is ``True``.
+    """
+    
+    if factor <= 1:
+        return mask
+    
+    # pad the mask to a multiple of the factor and reduce it
+    size_y, size_x = mask.shape
+    rows = int(ceil(float(size_y) / factor))
+    cols = int(ceil(float(size_x) / factor))
+    padded = numpy.zeros((rows * factor, cols * factor), dtype=numpy.bool)
+    padded[:size_y, :size_x] = mask
+    return padded.reshape(rows, factor, cols, factor).any(axis=3).any(axis=1)
+
+
 #===============================================================================
 # Pre-Processors
 #===============================================================================
@@ -96,7 +122,8 @@ class PreProcessor(object):
                  color_index=False, palette_file=None, no_data_value=None,
                  overview_resampling=None, overview_levels=None, 
                  overview_minsize=None, radiometric_interval_min=None, 
-                 radiometric_interval_max=None, simplification_factor=None):
+                 radiometric_interval_max=None, simplification_factor=None,
+                 window_budget=None, approximate_statistics=False):
         
         self.format_selection = format_selection
         self.overviews = overviews
@@ -121,10 +148,21 @@ class PreProcessor(object):
             # default 2 * resolution == 2 pixels
             self.simplification_factor = 2
         
+        # when a window budget (in bytes) is given, the dataset is streamed
+        # from the input to the output file instead of being loaded to memory
+        self.window_budget = window_budget
+        self.approximate_statistics = approximate_statistics
+        
     
     def process(self, input_filename, output_filename, 
                 geo_reference=None, generate_metadata=True):
         
+        if self.window_budget:
+            return self._process_windowed(
+                input_filename, output_filename, geo_reference,
+                generate_metadata
+            )
+        
         # open the dataset and create an In-Memory Dataset as copy
         # to perform optimizations
         ds = create_mem_copy(gdal.Open(input_filename))
@@ -182,113 +220,325 @@ class PreProcessor(object):
         # generate metadata if requested
         footprint = None
         if generate_metadata:
-            normalized_space = Polygon.from_bbox((-180, -90, 180, 90))
-            non_normalized_space = Polygon.from_bbox((180, -90, 360, 90))
+            footprint = self._normalize_footprint(footprint_wkt)
+        
+        num_bands = ds.RasterCount
+        
+        # close the dataset and write it to the disc
+        ds = None
+        
+        return PreProcessResult(output_filename, footprint, num_bands)
+    
+    
+    def _process_windowed(self, input_filename, output_filename,
+                          geo_reference=None, generate_metadata=True):
+        """ Processes the dataset without loading it into memory. Optimizations
+            are applied as virtual datasets stored in a temporary directory and
+            the result is written to the output file in block aligned windows 
+            of at most ``window_budget`` bytes.
+        """
+        
+        tmp_dir = mkdtemp(prefix="eoxs_preprocess_")
+        counter = count()
+        
+        def tmp_filename(extension=".vrt"):
+            return join(tmp_dir, "%d%s" % (next(counter), extension))
+        
+        def create_tmp(sizex, sizey, numbands, datatype=gdal.GDT_Byte,
+                       options=None):
+            # intermediate rasters are written to disc, not to memory
+            driver = gdal.GetDriverByName("GTiff")
+            return driver.Create(tmp_filename(".tif"), sizex, sizey, numbands,
+                                 datatype, ["TILED=YES"] + (options or []))
+        
+        ds = dst_ds = None
+        try:
+            ds = create_vrt_copy(gdal.Open(input_filename), tmp_filename())
             
-            footprint = GEOSGeometry(footprint_wkt)
-            #.intersection(normalized_space)
-            outer = non_normalized_space.intersection(footprint)
+            gt = ds.GetGeoTransform()
+            footprint_wkt = None
             
-            if len(outer):
-                footprint = MultiPolygon(
-                    *map(lambda p: 
-                        Polygon(*map(lambda ls:
-                            LinearRing(*map(lambda point: 
-                                (point[0] - 360, point[1]), ls.coords
-                            )), tuple(p)
-                        )), (outer,)
-                    )
-                ).union(normalized_space.intersection(footprint))
+            if not geo_reference:
+                if gt == (0.0, 1.0, 0.0, 0.0, 0.0, 1.0):
+                    raise ValueError("No geospatial reference for unreferenced "
+                                     "dataset given.")
             else:
-                if isinstance(footprint, Polygon):
-                    footprint = MultiPolygon(footprint)
-                
+                logger.debug("Applying geo reference '%s'."
+                             % type(geo_reference).__name__)
+                ds, footprint_wkt = geo_reference.apply(
+                    ds, create_dataset=create_tmp
+                )
             
+            # apply the optimizations as virtual datasets. Only the color
+            # indexing needs the actual pixel values and is thus performed when
+            # writing the output file.
+            color_index = None
+            for optimization in self.get_optimizations(ds):
+                logger.debug("Applying optimization '%s' virtually."
+                             % type(optimization).__name__)
+                # make sure all changes are visible for the referencing VRTs
+                ds.FlushCache()
+                try:
+                    ds = optimization.virtual(ds, tmp_filename())
+                except NotImplementedError:
+                    if (isinstance(optimization, ColorIndexOptimization) 
+                        and not color_index):
+                        color_index = optimization
+                    else:
+                        raise ValueError(
+                            "Optimization '%s' cannot be applied in windowed "
+                            "mode." % type(optimization).__name__
+                        )
+            ds.FlushCache()
             
-            logger.info("Calculated Footprint: '%s'" % footprint.wkt)
+            output_filename = self.generate_filename(output_filename)
             
+            num_bands = 1 if color_index else ds.RasterCount
+            if self.footprint_alpha and num_bands == 3:
+                # reserve the alpha band, as bands cannot be added later on
+                num_bands = 4
             
+            logger.debug("Writing file to disc using options: %s."
+                         % ", ".join(self.format_selection.creation_options))
             
-            # use the provided footprint
-            #geom = OGRGeometry(footprint_wkt)
-            #exterior = []
-            #for x, y in geom.exterior_ring.tuple:
-            #    exterior.append(y); exterior.append(x)
+            driver = gdal.GetDriverByName(self.format_selection.driver_name)
+            dst_ds = driver.Create(
+                output_filename, ds.RasterXSize, ds.RasterYSize, num_bands,
+                gdal.GDT_Byte if color_index 
+                else ds.GetRasterBand(1).DataType,
+                options=self.format_selection.creation_options
+            )
+            copy_projection(ds, dst_ds)
+            copy_metadata(ds, dst_ds)
             
-            #polygon = [exterior]
-        
-        num_bands = ds.RasterCount
+            if color_index:
+                logger.debug("Applying optimization 'ColorIndexOptimization'.")
+                color_index.dither(ds, dst_ds)
+            
+            else:
+                for x_off, y_off, x_size, y_size in iter_windows(
+                        dst_ds, self.window_budget):
+                    for index in range(1, ds.RasterCount + 1):
+                        data = ds.GetRasterBand(index).ReadAsArray(
+                            x_off, y_off, x_size, y_size
+                        )
+                        dst_ds.GetRasterBand(index).WriteArray(
+                            data, x_off, y_off
+                        )
+            
+            for index in range(1, min(ds.RasterCount, num_bands) + 1):
+                nodata = ds.GetRasterBand(index).GetNoDataValue()
+                if nodata is not None:
+                    dst_ds.GetRasterBand(index).SetNoDataValue(nodata)
+            
+            ds = None
+            
+            # generate the footprint from the written dataset
+            if not footprint_wkt:
+                logger.debug("Generating footprint.")
+                footprint_wkt = self._generate_footprint_wkt(dst_ds)
+            
+            if self.footprint_alpha:
+                logger.debug("Applying optimization 'AlphaBandOptimization'.")
+                opt = AlphaBandOptimization()
+                opt(dst_ds, footprint_wkt)
+            
+            for optimization in self.get_post_optimizations(dst_ds):
+                logger.debug("Applying post-optimization '%s'."
+                             % type(optimization).__name__)
+                optimization(dst_ds)
+            
+            footprint = None
+            if generate_metadata:
+                footprint = self._normalize_footprint(footprint_wkt)
+            
+            num_bands = dst_ds.RasterCount
         
-        # close the dataset and write it to the disc
-        ds = None
+        finally:
+            # close all datasets before removing the intermediate files
+            ds = dst_ds = None
+            rmtree(tmp_dir, ignore_errors=True)
         
         return PreProcessResult(output_filename, footprint, num_bands)
     
     
+    def _normalize_footprint(self, footprint_wkt):
+        """ Returns the footprint as a MultiPolygon normalized to the 
+            -180/180 longitude range.
+        """
+        
+        normalized_space = Polygon.from_bbox((-180, -90, 180, 90))
+        non_normalized_space = Polygon.from_bbox((180, -90, 360, 90))
+        
+        footprint = GEOSGeometry(footprint_wkt)
+        #.intersection(normalized_space)
+        outer = non_normalized_space.intersection(footprint)
+        
+        if len(outer):
+            footprint = MultiPolygon(
+                *map(lambda p: 
+                    Polygon(*map(lambda ls:
+                        LinearRing(*map(lambda point: 
+                            (point[0] - 360, point[1]), ls.coords
+                        )), tuple(p)
+                    )), (outer,)
+                )
+            ).union(normalized_space.intersection(footprint))
+        else:
+            if isinstance(footprint, Polygon):
+                footprint = MultiPolygon(footprint)
+        
+        logger.info("Calculated Footprint: '%s'" % footprint.wkt)
+        
+        return footprint
+    
+    
     def generate_filename(self, filename):
         """ Adjust the filename with the correct extension. """
         base_filename, _ = splitext(filename)
         return base_filename + self.format_selection.extension 
     
     
+    def _iter_footprint_tiles(self, ds, factor):
+        """ Yields the valid data mask of the dataset tile by tile as tuples
+            ``(x_off, y_off, mask)``, where offsets and mask are in pixels of 
+            the dataset decimated by ``factor``. The mask is read in full 
+            resolution strips and a decimated pixel is valid if any of its 
+            pixels is valid, so that thin valid areas are preserved.
+        """
+        
+        size_x, size_y = ds.RasterXSize, ds.RasterYSize
+        tile_size = FOOTPRINT_TILE_SIZE * factor
+        # height of the full resolution strips, a multiple of the factor
+        strip_size = max(FOOTPRINT_TILE_SIZE / factor, 1) * factor
+        
+        for y_off in range(0, size_y, tile_size):
+            for x_off in range(0, size_x, tile_size):
+                x_size = min(tile_size, size_x - x_off)
+                y_size = min(tile_size, size_y - y_off)
+                
+                # create an empty boolean array initialized as 'False' to store
+                # where values exist as a mask array.
+                mask = numpy.zeros(
+                    (int(ceil(float(y_size) / factor)),
+                     int(ceil(float(x_size) / factor))), dtype=numpy.bool
+                )
+                
+                for strip_off in range(0, y_size, strip_size):
+                    strip_y = min(strip_size, y_size - strip_off)
+                    strip = numpy.zeros((strip_y, x_size), dtype=numpy.bool)
+                    
+                    for idx in range(1, ds.RasterCount + 1):
+                        band = ds.GetRasterBand(idx)
+                        raster_data = band.ReadAsArray(
+                            x_off, y_off + strip_off, x_size, strip_y
+                        )
+                        nodata = band.GetNoDataValue()
+                        
+                        if nodata is None:
+                            nodata = 0
+                        
+                        # apply the output to the mask
+                        strip |= (raster_data != nodata)
+                    
+                    strip = _reduce_mask(strip, factor)
+                    row = strip_off / factor
+                    mask[row:row + strip.shape[0]] = strip
+                
+                yield x_off / factor, y_off / factor, mask
+    
+    
     def _generate_footprint_wkt(self, ds):
         """ Generate a fooptrint from a raster, using black/no-data as exclusion
         """
         
-        # create an empty boolean array initialized as 'False' to store where
-        # values exist as a mask array.
-        nodata_map = numpy.zeros((ds.RasterYSize, ds.RasterXSize),
-                                 dtype=numpy.bool)
+        # the mask is decimated by the simplification factor, as the details
+        # below would be lost in the simplification anyway
+        factor = max(int(self.simplification_factor), 1)
         
-        for idx in range(1, ds.RasterCount + 1):
-            band = ds.GetRasterBand(idx)
-            raster_data = band.ReadAsArray()
-            nodata = band.GetNoDataValue()
+        # collect the valid data outlines of all tiles in pixel coordinates of
+        # the decimated mask, so that the borders of neighbouring tiles match 
+        # exactly
+        outlines = ogr.Geometry(ogr.wkbMultiPolygon)
+        
+        for x_off, y_off, mask in self._iter_footprint_tiles(ds, factor):
+            if not mask.any():
+                continue
             
-            if nodata is None:
-                nodata = 0
+            tile_y, tile_x = mask.shape
+            if mask.all():
+                # the whole tile is valid, no need to polygonize
+                outlines.AddGeometry(ogr.CreateGeometryFromWkt(
+                    "POLYGON((%d %d, %d %d, %d %d, %d %d, %d %d))" % (
+                        x_off, y_off, x_off + tile_x, y_off, 
+                        x_off + tile_x, y_off + tile_y, x_off, y_off + tile_y,
+                        x_off, y_off
+                    )
+                ))
+                continue
+            
+            # create a temporary in-memory dataset and write the tile mask
+            # into its single band
+            tmp_ds = create_mem(tile_x, tile_y, 1, gdal.GDT_Byte)
+            tmp_ds.SetGeoTransform([x_off, 1, 0, y_off, 0, 1])
+            tmp_band = tmp_ds.GetRasterBand(1)
+            tmp_band.WriteArray(mask.astype(numpy.uint8))
+            
+            # create an OGR in memory layer to hold the created polygons
+            ogr_ds = ogr.GetDriverByName('Memory').CreateDataSource('out')
+            layer = ogr_ds.CreateLayer('poly', None, ogr.wkbPolygon)
+            fd = ogr.FieldDefn('DN', ogr.OFTInteger)
+            layer.CreateField(fd)
+            
+            # polygonize the valid pixels of the mask band
+            gdal.Polygonize(tmp_band, tmp_band, layer, 0)
             
-            # apply the output to the map  
-            nodata_map |= (raster_data != nodata)
-        
-        # create a temporary in-memory dataset and write the nodata mask 
-        # into its single band
-        tmp_ds = create_mem(ds.RasterXSize + 2, ds.RasterYSize + 2, 1, 
-                            gdal.GDT_Byte)
-        copy_projection(ds, tmp_ds)
-        tmp_band = tmp_ds.GetRasterBand(1)
-        tmp_band.WriteArray(nodata_map.astype(numpy.uint8))
-        
-        # create an OGR in memory layer to hold the created polygon
-        sr = osr.SpatialReference(); sr.ImportFromWkt(ds.GetProjectionRef())
-        ogr_ds = ogr.GetDriverByName('Memory').CreateDataSource('out')
-        layer = ogr_ds.CreateLayer('poly', sr.sr, ogr.wkbPolygon)
-        fd = ogr.FieldDefn('DN', ogr.OFTInteger)
-        layer.CreateField(fd)
-        
-        # polygonize the mask band and store the result in the OGR layer
-        gdal.Polygonize(tmp_band, tmp_band, layer, 0)
-        
-        if layer.GetFeatureCount() != 1:
-            # if there is more than one polygon, compute the minimum bounding polygon
-            geometry = ogr.Geometry(ogr.wkbPolygon)
             while True:
                 feature = layer.GetNextFeature()
                 if not feature: break
-                geometry = geometry.Union(feature.GetGeometryRef())
-            
+                outlines.AddGeometry(feature.GetGeometryRef())
+        
+        if outlines.IsEmpty():
+            raise RuntimeError("Error during poligonization. The dataset does "
+                               "not contain any valid data.")
+        
+        # merge all outlines at once
+        geometry = outlines.UnionCascaded()
+        
+        if geometry.GetGeometryType() != ogr.wkbPolygon:
+            # if there is more than one polygon, compute the minimum bounding
+            # polygon
             # TODO: improve this for a better minimum bounding polygon
             geometry = geometry.ConvexHull()
         
-        else:
-            # obtain geometry from the first (and only) layer
-            feature = layer.GetNextFeature()
-            geometry = feature.GetGeometryRef()
-        
         if geometry.GetGeometryType() != ogr.wkbPolygon:
             raise RuntimeError("Error during poligonization. Wrong geometry "
                                "type.")
         
+        # simplify the polygon in pixel coordinates. The tolerance is the 
+        # simplification factor in pixels of the original dataset.
+        simplification_value = float(self.simplification_factor) / factor
+        try:
+            # SimplifyPreserveTopology() available since OGR 1.9.0
+            geometry = geometry.SimplifyPreserveTopology(simplification_value)
+        except AttributeError:
+            # use GeoDjango bindings if OGR is too old
+            geometry = ogr.CreateGeometryFromWkt(GEOSGeometry(geometry.ExportToWkt()).simplify(simplification_value, True).wkt)
+        
+        # transform the pixel coordinates to the coordinates of the dataset
+        gt = ds.GetGeoTransform()
+        for i in range(geometry.GetGeometryCount()):
+            ring = geometry.GetGeometryRef(i)
+            for j in range(ring.GetPointCount()):
+                x, y = ring.GetX(j) * factor, ring.GetY(j) * factor
+                ring.SetPoint_2D(j,
+                    gt[0] + x * gt[1] + y * gt[2],
+                    gt[3] + x * gt[4] + y * gt[5]
+                )
+        
+        sr = osr.SpatialReference(); sr.ImportFromWkt(ds.GetProjectionRef())
+        geometry.AssignSpatialReference(sr.sr)
+        
         # check if reprojection to latlon is necessary
         if not sr.IsGeographic():
             dst_sr = osr.SpatialReference(); dst_sr.ImportFromEPSG(4326)
@@ -297,19 +547,6 @@ class PreProcessor(object):
             except RuntimeError:
                 geometry.Transform(osr.CoordinateTransformation(sr.sr, dst_sr.sr))
         
-        gt = ds.GetGeoTransform()
-        resolution = min(abs(gt[1]), abs(gt[5]))
-
-        simplification_value = self.simplification_factor * resolution
-        
-        # simplify the polygon. the tolerance value is *really* vague
-        try:
-            # SimplifyPreserveTopology() available since OGR 1.9.0
-            geometry = geometry.SimplifyPreserveTopology(simplification_value)
-        except AttributeError:
-            # use GeoDjango bindings if OGR is too old
-            geometry = ogr.CreateGeometryFromWkt(GEOSGeometry(geometry.ExportToWkt()).simplify(simplification_value, True).wkt)
-        
         return geometry.ExportToWkt()
 
 
@@ -346,11 +583,13 @@ class WMSPreProcessor(PreProcessor):
             if ds.RasterCount == 1:
                 yield BandSelectionOptimization(self.bands or [(1, rad_min, rad_max), 
                                                                (1, rad_min, rad_max),
-                                                               (1, rad_min, rad_max)])
+                                                               (1, rad_min, rad_max)],
+                                                approximate_statistics=self.approximate_statistics)
             else:
                 yield BandSelectionOptimization(self.bands or [(1, rad_min, rad_max), 
                                                                (2, rad_min, rad_max),
-                                                               (3, rad_min, rad_max)])
+                                                               (3, rad_min, rad_max)],
+                                                approximate_statistics=self.approximate_statistics)
         
         # if RGBA is requested, use the given bands or the first 4 bands as RGBA
         elif self.bandmode == RGBA:
@@ -361,12 +600,14 @@ class WMSPreProcessor(PreProcessor):
                 yield BandSelectionOptimization(self.bands or [(1, rad_min, rad_max), 
                                                                (1, rad_min, rad_max),
                                                                (1, rad_min, rad_max),
-                                                               (0, 0, 0)]) # add zero band
+                                                               (0, 0, 0)], # add zero band
+                                                approximate_statistics=self.approximate_statistics)
             else:
                 yield BandSelectionOptimization(self.bands or [(1, rad_min, rad_max), 
                                                                (2, rad_min, rad_max),
                                                                (3, rad_min, rad_max),
-                                                               (4, rad_min, rad_max)])
+                                                               (4, rad_min, rad_max)],
+                                                approximate_statistics=self.approximate_statistics)
             
         # when band mode is set to original bands, don't use this optimization
         elif self.bandmode == ORIG_BANDS:
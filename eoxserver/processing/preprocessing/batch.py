@@ -0,0 +1,342 @@
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#          Stephan Meissl <stephan.meissl@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2013 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" Parallel batch pre-processing of a large number of files with a resumable
+    journal.
+"""
+
+import os
+import sys
+from os.path import join, basename, splitext, getsize
+from glob import glob
+from multiprocessing import Pool, cpu_count
+import time
+import traceback
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+#===============================================================================
+# Jobs
+#===============================================================================
+
+class BatchJob(object):
+    """ A single input file to be pre-processed to an output file. """
+    
+    def __init__(self, input_filename, output_filename):
+        self.input_filename = input_filename
+        self.output_filename = output_filename
+
+
+def jobs_from_manifest(manifest_filename, output_dir=None, suffix="_proc"):
+    """ Reads the jobs from a manifest file. Each line contains an input 
+        filename and optionally the output filename, separated by whitespace.
+        Empty lines and lines starting with '#' are ignored.
+    """
+    
+    with open(manifest_filename) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            
+            parts = line.split()
+            if len(parts) > 2:
+                raise ValueError("Invalid manifest line: '%s'." % line)
+            
+            if len(parts) == 2:
+                yield BatchJob(parts[0], parts[1])
+            else:
+                yield BatchJob(
+                    parts[0], _output_filename(parts[0], output_dir, suffix)
+                )
+
+
+def jobs_from_glob(pattern, output_dir=None, suffix="_proc"):
+    """ Yields a job for each file matching the given pattern. """
+    
+    for input_filename in sorted(glob(pattern)):
+        yield BatchJob(
+            input_filename, _output_filename(input_filename, output_dir, suffix)
+        )
+
+
+def _output_filename(input_filename, output_dir, suffix):
+    base = splitext(input_filename)[0]
+    if output_dir:
+        base = join(output_dir, basename(base))
+    return base + suffix
+
+
+#===============================================================================
+# Journal
+#===============================================================================
+
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+
+
+class BatchJournal(object):
+    """ Append-only journal of the processed files. Each finished job is 
+        written as a line ``status<TAB>seconds<TAB>input_filename`` and synced 
+        to disc, so that a crashed batch can be resumed by skipping all files
+        that have already been processed successfully.
+    """
+    
+    def __init__(self, filename):
+        self.filename = filename
+        self.finished = set()
+        
+        try:
+            with open(filename) as f:
+                for line in f:
+                    parts = line.rstrip("\n").split("\t", 2)
+                    if len(parts) == 3 and parts[0] == STATUS_OK:
+                        self.finished.add(parts[2])
+        except IOError:
+            pass
+        
+        self._file = open(filename, "a")
+    
+    
+    def is_finished(self, input_filename):
+        return input_filename in self.finished
+    
+    
+    def record(self, result):
+        self._file.write("%s\t%f\t%s\n" % (
+            result.status, result.duration, result.input_filename
+        ))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        
+        if result.status == STATUS_OK:
+            self.finished.add(result.input_filename)
+    
+    
+    def close(self):
+        self._file.close()
+
+
+#===============================================================================
+# Results
+#===============================================================================
+
+class BatchResult(object):
+    """ The outcome of a single batch job. """
+    
+    def __init__(self, input_filename, output_filename, status, duration,
+                 input_size=0, error=None):
+        self.input_filename = input_filename
+        self.output_filename = output_filename
+        self.status = status
+        self.duration = duration
+        self.input_size = input_size
+        self.error = error
+
+
+class BatchReport(object):
+    """ Collects the results of a batch run and reports timings and 
+        throughput.
+    """
+    
+    def __init__(self):
+        self.results = []
+        self.skipped = 0
+        self.begin = time.time()
+        self.end = None
+    
+    
+    def add(self, result):
+        self.results.append(result)
+    
+    
+    def finish(self):
+        self.end = time.time()
+    
+    
+    @property
+    def succeeded(self):
+        return [r for r in self.results if r.status == STATUS_OK]
+    
+    
+    @property
+    def failed(self):
+        return [r for r in self.results if r.status != STATUS_OK]
+    
+    
+    @property
+    def elapsed(self):
+        return (self.end or time.time()) - self.begin
+    
+    
+    def summary(self):
+        """ Returns the report as a list of lines. """
+        
+        lines = []
+        for result in self.results:
+            lines.append("%-6s %10.2fs  %s" % (
+                result.status, result.duration, result.input_filename
+            ))
+            if result.error:
+                lines.append("       %s" % result.error)
+        
+        elapsed = self.elapsed
+        succeeded = self.succeeded
+        megabytes = sum(r.input_size for r in succeeded) / (1024.0 * 1024.0)
+        
+        lines.append(
+            "%d succeeded, %d failed, %d skipped in %.2fs." % (
+                len(succeeded), len(self.failed), self.skipped, elapsed
+            )
+        )
+        if elapsed > 0:
+            lines.append("Throughput: %.3f files/s, %.3f MB/s." % (
+                len(succeeded) / elapsed, megabytes / elapsed
+            ))
+        return lines
+
+
+#===============================================================================
+# Batch pre-processor
+#===============================================================================
+
+def _init_worker(gdal_cache_max):
+    """ Initializes a worker process and limits its GDAL block cache. """
+    
+    from eoxserver.contrib import gdal
+    if gdal_cache_max:
+        gdal.SetCacheMax(gdal_cache_max)
+
+
+def _process_job(args):
+    """ Executes a single job in a worker process. Errors are returned as part
+        of the result instead of being raised, so that a single failing file
+        does not abort the whole batch.
+    """
+    
+    preprocessor, job = args
+    begin = time.time()
+    
+    try:
+        input_size = getsize(job.input_filename)
+        result = preprocessor.process(
+            job.input_filename, job.output_filename, generate_metadata=False
+        )
+        return BatchResult(
+            job.input_filename, result.output_filename, STATUS_OK,
+            time.time() - begin, input_size
+        )
+    except Exception, e:
+        logger.debug(traceback.format_exc())
+        return BatchResult(
+            job.input_filename, job.output_filename, STATUS_FAILED,
+            time.time() - begin, error="%s: %s" % (type(e).__name__, str(e))
+        )
+
+
+class BatchPreProcessor(object):
+    """ Distributes the pre-processing of many files over a pool of worker
+        processes.
+    
+        >>> batch = BatchPreProcessor(WMSPreProcessor(...), workers=8,
+        ...                           journal_filename="batch.journal")
+        >>> report = batch.process(jobs_from_glob("/data/*.tif", "/out"))
+        >>> print "\\n".join(report.summary())
+    
+        The ``gdal_cache_max`` is the size of the GDAL block cache of each 
+        worker in bytes. When a journal file is given, all files marked as 
+        successfully processed in it are skipped.
+    """
+    
+    def __init__(self, preprocessor, workers=None, gdal_cache_max=None,
+                 journal_filename=None):
+        self.preprocessor = preprocessor
+        self.workers = workers or cpu_count()
+        self.gdal_cache_max = gdal_cache_max
+        self.journal_filename = journal_filename
+    
+    
+    def process(self, jobs, callback=None):
+        """ Processes all jobs and returns a `BatchReport`. The optional 
+            ``callback`` is called with each `BatchResult` as soon as it is
+            available.
+        """
+        
+        report = BatchReport()
+        journal = None
+        if self.journal_filename:
+            journal = BatchJournal(self.journal_filename)
+        
+        def iter_args():
+            for job in jobs:
+                if journal and journal.is_finished(job.input_filename):
+                    report.skipped += 1
+                    continue
+                yield (self.preprocessor, job)
+        
+        pool_kwargs = {}
+        if sys.version_info >= (2, 7):
+            # restart workers regularly to release fragmented memory
+            pool_kwargs["maxtasksperchild"] = 100
+
+        pool = Pool(
+            self.workers, _init_worker, (self.gdal_cache_max,), **pool_kwargs
+        )
+        
+        try:
+            for result in pool.imap_unordered(_process_job, iter_args()):
+                if journal:
+                    journal.record(result)
+                report.add(result)
+                
+                if result.status == STATUS_OK:
+                    logger.info("Processed '%s' in %.2fs." 
+                                % (result.input_filename, result.duration))
+                else:
+                    logger.error("Failed to process '%s': %s" 
+                                 % (result.input_filename, result.error))
+                
+                if callback:
+                    callback(result)
+            
+            pool.close()
+        
+        except:
+            pool.terminate()
+            raise
+        
+        finally:
+            pool.join()
+            if journal:
+                journal.close()
+            report.finish()
+        
+        return report
@@ -56,7 +56,7 @@ class Extent(GeographicReference):
         self.srid = srid
     
     
-    def apply(self, ds):
+    def apply(self, ds, create_dataset=create_mem):
         """ Set the geotransform and projection of the dataset according to 
             the defined extent and SRID.
         """
@@ -91,7 +91,12 @@ class GCPList(GeographicReference):
         self.srid = srid
     
         
-    def apply(self, src_ds):
+    def apply(self, src_ds, create_dataset=create_mem):
+        """ Rectifies the dataset using the GCPs. The rectified dataset is 
+            created with ``create_dataset``, which takes the same arguments as
+            `create_mem`. As the rectification is performed in chunks, a file
+            based dataset can be used to keep the memory usage bounded.
+        """
         # setup
         dst_sr = osr.SpatialReference()
         gcp_sr = osr.SpatialReference()
@@ -137,9 +142,9 @@ class GCPList(GeographicReference):
                     logger.debug("New size is '%i x %i'" % (size_x, size_y))
                     
                     # create the output dataset
-                    dst_ds = create_mem(size_x, size_y,
-                                        src_ds.RasterCount, 
-                                        src_ds.GetRasterBand(1).DataType)
+                    dst_ds = create_dataset(size_x, size_y,
+                                            src_ds.RasterCount, 
+                                            src_ds.GetRasterBand(1).DataType)
                     
                     # reproject the image
                     dst_ds.SetProjection(dst_sr.ExportToWkt())
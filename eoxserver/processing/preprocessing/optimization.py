@@ -32,7 +32,7 @@ import numpy
 
 from eoxserver.contrib import gdal, gdal_array, osr, ogr
 from eoxserver.processing.preprocessing.util import ( 
-    get_limits, create_mem, copy_metadata, copy_projection
+    get_limits, create_mem, create_vrt_copy, copy_metadata, copy_projection
 )
 from eoxserver.resources.coverages.crss import (
     parseEPSGCode, fromShortCode, fromURL, fromURN, fromProj4Str
@@ -54,6 +54,15 @@ class DatasetOptimization(object):
     def __call__(self, ds):
         raise NotImplementedError
 
+    def virtual(self, ds, vrt_filename):
+        """ Apply the optimization step lazily, i.e: without reading any pixel
+            data. Returns a VRT dataset stored as ``vrt_filename`` (or the
+            dataset itself if nothing needs to be done). Raises
+            `NotImplementedError` if the step can only be applied on the
+            pixel data.
+        """
+        raise NotImplementedError
+
 
 class ReprojectionOptimization(DatasetOptimization):
     """ Dataset optimization step to reproject the dataset into a predefined
@@ -73,6 +82,14 @@ class ReprojectionOptimization(DatasetOptimization):
         self.srid = crs_or_srid
 
         
+    def _is_required(self, src_ds, src_sr, dst_sr):
+        if src_sr.IsSame(dst_sr) and (src_ds.GetGeoTransform()[1] > 0) and (src_ds.GetGeoTransform()[5] < 0):
+            logger.info("Source and destination projection are equal and image "
+                        "is not flipped. Thus, no reprojection is required.")
+            return False
+        return True
+
+
     def __call__(self, src_ds):
         # setup
         src_sr = osr.SpatialReference()
@@ -81,9 +98,7 @@ class ReprojectionOptimization(DatasetOptimization):
         dst_sr = osr.SpatialReference()
         dst_sr.ImportFromEPSG(self.srid)
         
-        if src_sr.IsSame(dst_sr) and (src_ds.GetGeoTransform()[1] > 0) and (src_ds.GetGeoTransform()[5] < 0):
-            logger.info("Source and destination projection are equal and image "
-                        "is not flipped. Thus, no reprojection is required.")
+        if not self._is_required(src_ds, src_sr, dst_sr):
             return src_ds
         
         # create a temporary dataset to get information about the output size
@@ -113,44 +128,71 @@ class ReprojectionOptimization(DatasetOptimization):
         return dst_ds
 
 
+    def virtual(self, src_ds, vrt_filename):
+        src_sr = osr.SpatialReference()
+        src_sr.ImportFromWkt(src_ds.GetProjection())
+        
+        dst_sr = osr.SpatialReference()
+        dst_sr.ImportFromEPSG(self.srid)
+        
+        if not self._is_required(src_ds, src_sr, dst_sr):
+            return src_ds
+        
+        # the warped VRT is evaluated block by block when it is read
+        tmp_ds = gdal.AutoCreateWarpedVRT(src_ds, None, dst_sr.ExportToWkt(), 
+                                          gdal.GRA_Bilinear, 0.125)
+        copy_metadata(src_ds, tmp_ds)
+        
+        return create_vrt_copy(tmp_ds, vrt_filename)
+
+
 class BandSelectionOptimization(DatasetOptimization):
     """ Dataset optimization step which selects a number of bands and their 
     respective scale and copies them to the result dataset. 
     """
     
-    def __init__(self, bands, datatype=gdal.GDT_Byte):
+    def __init__(self, bands, datatype=gdal.GDT_Byte,
+                 approximate_statistics=False):
         # preprocess bands list
         # TODO: improve
         self.bands = map(lambda b: b  if len(b) == 3 else (b[0], None, None),
                          bands)
         self.datatype = datatype
+        self.approximate_statistics = approximate_statistics
         
-    def __call__(self, src_ds):
-        dst_ds = create_mem(src_ds.RasterXSize, src_ds.RasterYSize, 
-                            len(self.bands), self.datatype)
-        dst_range = get_limits(self.datatype)
-        
-        multiple = 0
-        
-        for dst_index, (src_index, dmin, dmax) in enumerate(self.bands, 1):
-            # check if next band is equal
-            if dst_index < len(self.bands) and (src_index, dmin, dmax) == self.bands[dst_index]:
-                multiple += 1
-                continue
+    
+    def get_scales(self, src_ds):
+        """ Returns a list with an entry for each band to be produced. Each 
+            entry is either ``None`` if the source band is not available, or a
+            tuple ``(src_index, (src_min, src_max))`` with the source interval
+            to be scaled to the range of the output datatype. A ``src_index``
+            of 0 denotes a band initialized with zeros.
+            
+            The "min" and "max" values are computed in a separate pass over 
+            each required source band, or from its overviews if
+            ``approximate_statistics`` is set.
+        """
+        min_max = {}
+        scales = []
+        
+        for src_index, dmin, dmax in self.bands:
             # check that src band is available
             if src_index > src_ds.RasterCount:
+                scales.append(None)
                 continue
             
-            # initialize with zeros if band is 0
+            # band is initialized with zeros
             if src_index == 0:
-                src_band = src_ds.GetRasterBand(1)
-                data = numpy.zeros((src_band.YSize, src_band.XSize), dtype=gdal_array.codes[self.datatype])
-                src_min, src_max = (0, 0)
-            # use src_ds band otherwise
-            else:
-                src_band = src_ds.GetRasterBand(src_index)
-                data = src_band.ReadAsArray()
-                src_min, src_max = src_band.ComputeRasterMinMax()
+                scales.append((0, (0.0, 0.0)))
+                continue
+            
+            src_band = src_ds.GetRasterBand(src_index)
+            if dmin == "min" or dmax == "max":
+                if src_index not in min_max:
+                    min_max[src_index] = src_band.ComputeRasterMinMax(
+                        int(self.approximate_statistics)
+                    )
+                src_min, src_max = min_max[src_index]
             
             # get min/max values or calculate from band
             if dmin is None:
@@ -161,31 +203,95 @@ class BandSelectionOptimization(DatasetOptimization):
                 dmax = get_limits(src_band.DataType)[1]
             elif dmax == "max":
                 dmax = src_max
-            src_range = (float(dmin), float(dmax))
             
-            # perform clipping and scaling
-            data = ((dst_range[1] - dst_range[0]) * 
-                    ((numpy.clip(data, dmin, dmax) - src_range[0]) / 
-                    (src_range[1] - src_range[0])))
+            scales.append((src_index, (float(dmin), float(dmax))))
+        
+        return scales
+    
+    
+    def __call__(self, src_ds):
+        dst_ds = create_mem(src_ds.RasterXSize, src_ds.RasterYSize, 
+                            len(self.bands), self.datatype)
+        dst_range = get_limits(self.datatype)
+        
+        # equal bands are only calculated once
+        results = {}
+        
+        for dst_index, scale in enumerate(self.get_scales(src_ds), 1):
+            if scale is None:
+                continue
             
-            # set new datatype
-            data = data.astype(gdal_array.codes[self.datatype])
+            if scale not in results:
+                src_index, src_range = scale
+                
+                # initialize with zeros if band is 0
+                if src_index == 0:
+                    data = numpy.zeros((src_ds.RasterYSize, src_ds.RasterXSize),
+                                       dtype=gdal_array.codes[self.datatype])
+                
+                else:
+                    data = src_ds.GetRasterBand(src_index).ReadAsArray()
+                    
+                    # perform clipping and scaling
+                    data = ((dst_range[1] - dst_range[0]) * 
+                            ((numpy.clip(data, *src_range) - src_range[0]) / 
+                            (src_range[1] - src_range[0])))
+                    
+                    # set new datatype
+                    data = data.astype(gdal_array.codes[self.datatype])
+                
+                results[scale] = data
             
             # write result
             dst_band = dst_ds.GetRasterBand(dst_index)
-            dst_band.WriteArray(data)
-            
-            # write equal bands at once
-            if multiple > 0:
-                for i in range(multiple):
-                    dst_band = dst_ds.GetRasterBand(dst_index-1-i)
-                    dst_band.WriteArray(data)
-                multiple = 0
+            dst_band.WriteArray(results[scale])
         
         copy_projection(src_ds, dst_ds)
         copy_metadata(src_ds, dst_ds)
         
         return dst_ds
+    
+    
+    def virtual(self, src_ds, vrt_filename):
+        """ Expresses the band selection as VRT bands with scaled sources. The 
+            clipping is performed by the conversion to the output datatype.
+        """
+        dst_range = get_limits(self.datatype)
+        vrt_ds = gdal.GetDriverByName("VRT").Create(
+            vrt_filename, src_ds.RasterXSize, src_ds.RasterYSize, 0
+        )
+        
+        for scale in self.get_scales(src_ds):
+            vrt_ds.AddBand(self.datatype)
+            
+            # bands without a source are initialized with zeros
+            if scale is None or scale[0] == 0:
+                continue
+            
+            src_index, (src_min, src_max) = scale
+            if src_max != src_min:
+                ratio = float(dst_range[1] - dst_range[0]) / (src_max - src_min)
+            else:
+                ratio = 0.0
+            
+            vrt_ds.GetRasterBand(vrt_ds.RasterCount).SetMetadataItem(
+                "source_0", SCALED_SOURCE_TEMPLATE % (
+                    src_ds.GetDescription(), src_index, -src_min * ratio, ratio
+                ), "new_vrt_sources"
+            )
+        
+        copy_projection(src_ds, vrt_ds)
+        copy_metadata(src_ds, vrt_ds)
+        
+        return vrt_ds
+
+
+SCALED_SOURCE_TEMPLATE = """<ComplexSource>
+  <SourceFilename relativeToVRT="0">%s</SourceFilename>
+  <SourceBand>%d</SourceBand>
+  <ScaleOffset>%r</ScaleOffset>
+  <ScaleRatio>%r</ScaleRatio>
+</ComplexSource>"""
 
 
 class ColorIndexOptimization(DatasetOptimization):
@@ -203,6 +309,20 @@ class ColorIndexOptimization(DatasetOptimization):
         dst_ds = create_mem(src_ds.RasterXSize, src_ds.RasterYSize, 
                             1, gdal.GDT_Byte)
         
+        self.dither(src_ds, dst_ds)
+        
+        copy_projection(src_ds, dst_ds)
+        copy_metadata(src_ds, dst_ds)
+        
+        return dst_ds
+    
+    
+    def dither(self, src_ds, dst_ds):
+        """ Writes the color indices of the first three bands of ``src_ds`` 
+            into the first band of ``dst_ds`` and sets its color table. Both 
+            the color table computation and the dithering are performed line by
+            line, so ``dst_ds`` may be a file based dataset.
+        """
         if not self.palette_file:
             # create a color table as a median of the given dataset
             ct = gdal.ColorTable()
@@ -226,11 +346,6 @@ class ColorIndexOptimization(DatasetOptimization):
                            src_ds.GetRasterBand(2),
                            src_ds.GetRasterBand(3),
                            dst_ds.GetRasterBand(1), ct)
-        
-        copy_projection(src_ds, dst_ds)
-        copy_metadata(src_ds, dst_ds)
-        
-        return dst_ds
 
 
 class NoDataValueOptimization(DatasetOptimization):
@@ -256,6 +371,11 @@ class NoDataValueOptimization(DatasetOptimization):
                 pass # TODO
         
         return ds
+    
+    
+    def virtual(self, ds, vrt_filename):
+        # the no-data values are set on the VRT bands directly
+        return self(ds)
 
 
 #===============================================================================
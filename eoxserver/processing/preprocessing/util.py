@@ -27,6 +27,7 @@
 #-------------------------------------------------------------------------------
 
 from os.path import exists
+from fractions import gcd
 import numpy
 
 from eoxserver.contrib import gdal, gdal_array
@@ -65,6 +66,55 @@ def create_mem(sizex, sizey, numbands, datatype=gdal.GDT_Byte,
     return mem_drv.Create('', sizex, sizey, numbands, datatype, options)
 
 
+def create_vrt_copy(ds, filename=""):
+    """ Create a new VRT Dataset as copy from an existing dataset. Only the
+        dataset structure is copied, the pixel data is still read from the
+        source dataset.
+    """
+    vrt_drv = gdal.GetDriverByName('VRT')
+    return vrt_drv.CreateCopy(filename, ds)
+
+
+def get_pixel_size(ds):
+    """ Returns the size of a single pixel over all bands in bytes. """
+    return sum(
+        gdal.GetDataTypeSize(ds.GetRasterBand(index).DataType) / 8
+        for index in range(1, ds.RasterCount + 1)
+    )
+
+
+def iter_windows(ds, window_budget, align=1):
+    """ Yields the windows ``(x_off, y_off, x_size, y_size)`` covering the
+        whole dataset. The windows are aligned to the block size of the
+        datasets first band (and to ``align``) and hold at most
+        ``window_budget`` bytes of pixel data over all bands, unless a single
+        block row already exceeds the budget.
+    """
+    size_x, size_y = ds.RasterXSize, ds.RasterYSize
+    block_x, block_y = ds.GetRasterBand(1).GetBlockSize()
+    pixel_size = max(get_pixel_size(ds), 1)
+
+    # align the step sizes to both the block size and the requested alignment
+    step_x = block_x * align / gcd(block_x, align)
+    step_y = block_y * align / gcd(block_y, align)
+
+    # prefer full rows of blocks and split the rows only when necessary
+    rows = window_budget / (size_x * pixel_size)
+    if rows >= step_y:
+        window_x = size_x
+        window_y = max(rows / step_y, 1) * step_y
+    else:
+        window_x = max(window_budget / (step_y * pixel_size) / step_x, 1) * step_x
+        window_y = step_y
+
+    for y_off in range(0, size_y, window_y):
+        for x_off in range(0, size_x, window_x):
+            yield (
+                x_off, y_off,
+                min(window_x, size_x - x_off), min(window_y, size_y - y_off)
+            )
+
+
 def copy_projection(src_ds, dst_ds):
     """ Copy the projection and geotransform from on dataset to another """
     dst_ds.SetProjection(src_ds.GetProjection())
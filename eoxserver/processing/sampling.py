@@ -0,0 +1,374 @@
+#-------------------------------------------------------------------------------
+# $Id$
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2011 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" This module provides a point sampling engine to extract the pixel values at
+a set of coordinates from many coverages at once. The coordinates are
+transformed with a single call per coordinate reference system, the points are
+grouped by the raster blocks they fall in and each needed block is read only 
+once. Coverages are sampled concurrently in a pool of threads.
+"""
+
+from itertools import izip
+from threading import Lock
+from multiprocessing.pool import ThreadPool
+import csv
+import logging
+
+import numpy as np
+from django.contrib.gis.geos import Point, MultiPoint
+
+from eoxserver.core.config import get_eoxserver_config
+from eoxserver.core.decoders import config
+from eoxserver.contrib import gdal
+from eoxserver.backends.access import connect
+from eoxserver.backends import models as backends
+from eoxserver.resources.coverages import crss
+
+
+logger = logging.getLogger(__name__)
+
+
+class SamplingConfigReader(config.Reader):
+    section = "processing.sampling"
+    workers = config.Option(type=int, default=4)
+
+
+class PointSet(object):
+    """ A set of coordinates in the given SRID. The coordinates transformed to
+    other reference systems are cached.
+    """
+
+    def __init__(self, xs, ys, srid):
+        self.xs = np.asarray(xs, dtype=np.float64)
+        self.ys = np.asarray(ys, dtype=np.float64)
+        self.srid = srid
+        self._transformed = {}
+        self._lock = Lock()
+
+    @classmethod
+    def from_string(cls, coord_list, srid):
+        """ Parses a coordinate list in the form ``x1,y1;x2,y2;...``.
+        """
+        coords = np.array([
+            map(float, coordinate.split(","))
+            for coordinate in coord_list.split(";")
+        ], dtype=np.float64).reshape(-1, 2)
+        return cls(coords[:, 0], coords[:, 1], srid)
+
+    def __len__(self):
+        return len(self.xs)
+
+    def to_geometry(self):
+        """ Returns the points as a ``MultiPoint`` geometry.
+        """
+        return MultiPoint(
+            [Point(x, y) for x, y in izip(self.xs, self.ys)], srid=self.srid
+        )
+
+    def transform(self, srs):
+        """ Returns the coordinates transformed to the given reference system,
+        either an EPSG code or a WKT string, as a tuple of two arrays.
+        """
+        with self._lock:
+            try:
+                return self._transformed[srs]
+            except KeyError:
+                pass
+
+            transformation = crss.getCoordinateTransformation(self.srid, srs)
+
+            if transformation is None or not len(self):
+                result = (self.xs, self.ys)
+            else:
+                coords = np.array(transformation.TransformPoints(
+                    zip(self.xs.tolist(), self.ys.tolist())
+                ), dtype=np.float64)
+                result = (coords[:, 0], coords[:, 1])
+
+            self._transformed[srs] = result
+            return result
+
+
+def footprint_mask(footprint, points):
+    """ Returns a boolean array stating which points are contained in the 
+    footprint. Points outside of the footprints extent are rejected without 
+    consulting GEOS.
+    """
+    xs, ys = points.transform(footprint.srid or 4326)
+    minx, miny, maxx, maxy = footprint.extent
+    mask = (xs >= minx) & (xs <= maxx) & (ys >= miny) & (ys <= maxy)
+
+    prepared = footprint.prepared
+    for index in np.flatnonzero(mask):
+        mask[index] = prepared.contains(Point(xs[index], ys[index]))
+    return mask
+
+
+def invert_geotransform(gt):
+    """ Returns the inverse of an affine geotransform.
+    """
+    det = gt[1] * gt[5] - gt[2] * gt[4]
+    if det == 0:
+        raise ValueError("Geotransform is not invertible.")
+
+    inv1, inv2 = gt[5] / det, -gt[2] / det
+    inv4, inv5 = -gt[4] / det, gt[1] / det
+    return (
+        -gt[0] * inv1 - gt[3] * inv2, inv1, inv2,
+        -gt[0] * inv4 - gt[3] * inv5, inv4, inv5
+    )
+
+
+def sample_dataset(ds, xs, ys, mask=None, bands=None, geotransform=None):
+    """ Reads the pixel values at the given coordinates, which must be in the 
+    reference system of the dataset. Points are grouped by the raster block 
+    they fall into and only the part of each block containing points is read,
+    once per band. Returns an array of shape ``(len(xs), len(bands))`` and a
+    boolean array marking the points that were actually sampled.
+    """
+    bands = bands or range(1, ds.RasterCount + 1)
+    gt = geotransform or ds.GetGeoTransform()
+    inv = invert_geotransform(gt)
+
+    px = np.floor(inv[0] + inv[1] * xs + inv[2] * ys).astype(np.int64)
+    py = np.floor(inv[3] + inv[4] * xs + inv[5] * ys).astype(np.int64)
+
+    valid = (
+        (px >= 0) & (px < ds.RasterXSize) & (py >= 0) & (py < ds.RasterYSize)
+    )
+    if mask is not None:
+        valid &= mask
+
+    values = None
+    indices = np.flatnonzero(valid)
+    if len(indices):
+        block_x, block_y = ds.GetRasterBand(bands[0]).GetBlockSize()
+        blocks_per_row = (ds.RasterXSize + block_x - 1) // block_x
+        block_ids = (
+            (py[indices] // block_y) * blocks_per_row + px[indices] // block_x
+        )
+
+        for block_id in np.unique(block_ids):
+            block_indices = indices[block_ids == block_id]
+            bpx, bpy = px[block_indices], py[block_indices]
+
+            # only read the window of the block covering its points
+            x_off, y_off = int(bpx.min()), int(bpy.min())
+            x_size = int(bpx.max()) - x_off + 1
+            y_size = int(bpy.max()) - y_off + 1
+
+            for band_index, band in enumerate(bands):
+                data = ds.GetRasterBand(band).ReadAsArray(
+                    x_off, y_off, x_size, y_size
+                )
+                if values is None:
+                    values = np.zeros((len(xs), len(bands)), dtype=data.dtype)
+                values[block_indices, band_index] = (
+                    data[bpy - y_off, bpx - x_off]
+                )
+
+    if values is None:
+        values = _empty_values(len(xs), bands)
+
+    return values, valid
+
+
+def _empty_values(num_points, bands):
+    # use the smallest type, so that merging results doesn't promote the type
+    return np.zeros((num_points, len(bands or ()) or 1), dtype=np.uint8)
+
+
+class SamplingTask(object):
+    """ Describes the sampling of a single coverage. All database access is 
+    done upon creation, so that the sampling itself can be performed in a
+    worker thread.
+    """
+
+    def __init__(self, coverage, path, points, bands=None):
+        self.coverage = coverage
+        self.path = path
+        self.points = points
+        self.bands = bands
+        self.mask = footprint_mask(coverage.footprint, points)
+
+        # fallback for datasets without a geotransform
+        minx, miny, maxx, maxy = coverage.footprint.extent
+        self.footprint_srid = coverage.footprint.srid or 4326
+        self.footprint_geotransform = (
+            minx, (maxx - minx) / coverage.size_x, 0,
+            maxy, 0, (miny - maxy) / coverage.size_y
+        )
+
+    def __call__(self):
+        if not self.mask.any():
+            return _empty_values(len(self.points), self.bands), self.mask
+
+        ds = gdal.Open(self.path)
+        try:
+            projection = ds.GetProjection()
+            if projection:
+                xs, ys = self.points.transform(projection)
+                geotransform = None
+            else:
+                xs, ys = self.points.transform(self.footprint_srid)
+                geotransform = self.footprint_geotransform
+
+            return sample_dataset(
+                ds, xs, ys, self.mask, self.bands, geotransform
+            )
+        finally:
+            del ds
+
+
+def get_band_paths(coverages):
+    """ Returns a dict mapping the coverages primary keys to the paths of 
+    their first "bands" data item, fetched with a single query.
+    """
+    coverages = dict((coverage.dataset_ptr_id, coverage) 
+                     for coverage in coverages)
+    data_items = backends.DataItem.objects.filter(
+        dataset__in=coverages.keys(), semantic__startswith="bands"
+    ).order_by("-semantic")
+
+    # the last assignment wins, which is the first data item
+    return dict(
+        (coverages[data_item.dataset_id].pk, connect(data_item)) 
+        for data_item in data_items
+    )
+
+
+class SamplingResult(object):
+    """ Dense result of sampling several coverages. ``values`` has the shape
+    ``(coverages, points, bands)``, ``valid`` ``(coverages, points)``. 
+    Coverages with less bands than others are padded; ``band_counts`` holds 
+    the actual number of bands per coverage.
+    """
+
+    def __init__(self, coverages, points, values, valid, band_counts):
+        self.coverages = coverages
+        self.points = points
+        self.values = values
+        self.valid = valid
+        self.band_counts = band_counts
+
+    def iter_values(self):
+        """ Yields tuples of coverage, point index (starting with 1) and the
+        band values of all sampled points.
+        """
+        for coverage, values, valid, band_count in izip(
+                self.coverages, self.values, self.valid, self.band_counts):
+            for index in np.flatnonzero(valid):
+                yield coverage, index + 1, values[index, :band_count]
+
+
+def sample_coverages(coverages, points, bands=None, workers=None):
+    """ Samples the given coverages at the points and returns a 
+    :class:`SamplingResult`. The coverages are processed concurrently in 
+    ``workers`` threads, which defaults to the configured number.
+    """
+    coverages = list(coverages)
+    if workers is None:
+        workers = SamplingConfigReader(get_eoxserver_config()).workers
+
+    paths = get_band_paths(coverages)
+    tasks = []
+    for coverage in coverages:
+        try:
+            tasks.append(
+                SamplingTask(coverage, paths[coverage.pk], points, bands)
+            )
+        except KeyError:
+            logger.warn(
+                "Coverage '%s' has no data item with bands." 
+                % coverage.identifier
+            )
+
+    if workers > 1 and len(tasks) > 1:
+        pool = ThreadPool(min(workers, len(tasks)))
+        try:
+            results = pool.map(_run_task, tasks)
+        finally:
+            pool.terminate()
+    else:
+        results = map(_run_task, tasks)
+
+    num_bands = max([values.shape[1] for values, _ in results] or [1])
+    values = np.zeros(
+        (len(results), len(points), num_bands), 
+        dtype=np.result_type(*[v.dtype for v, _ in results]) 
+        if results else np.uint8
+    )
+    valid = np.zeros((len(results), len(points)), dtype=bool)
+    for index, (task_values, task_valid) in enumerate(results):
+        values[index, :, :task_values.shape[1]] = task_values
+        valid[index] = task_valid
+
+    return SamplingResult(
+        [task.coverage for task in tasks], points, values, valid,
+        [task_values.shape[1] for task_values, _ in results]
+    )
+
+
+def _run_task(task):
+    return task()
+
+
+class _RowBuffer(object):
+    """ Minimal file-like object collecting the rows written by a csv writer.
+    """
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(data)
+
+    def pop(self):
+        data = "".join(self.parts)
+        self.parts = []
+        return data
+
+
+def iter_csv(header, rows, quoting=csv.QUOTE_ALL, chunk_rows=1000):
+    """ Generator to encode the header and rows as CSV in chunks of 
+    ``chunk_rows`` rows.
+    """
+    buf = _RowBuffer()
+    writer = csv.writer(buf, quoting=quoting)
+    writer.writerow(header)
+
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % chunk_rows == 0:
+            yield buf.pop()
+
+    data = buf.pop()
+    if data:
+        yield data
@@ -0,0 +1,558 @@
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#          Stephan Meissl <stephan.meissl@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2013 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" This module provides a bulk registration API for large numbers of datasets.
+Compared to registering each dataset on its own, the descriptions are validated
+batch-wise, data items and collection links are inserted in bulk and the EO 
+metadata of the affected collections is only updated once per batch.
+"""
+
+import json
+import logging
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from django.contrib.gis.geos import GEOSGeometry
+
+from eoxserver.core import env
+from eoxserver.contrib import gdal, osr, vsi
+from eoxserver.backends import models as backends
+from eoxserver.backends.component import BackendComponent
+from eoxserver.backends.access import connect
+from eoxserver.resources.coverages import models, revision
+from eoxserver.resources.coverages.metadata.component import MetadataComponent
+
+
+logger = logging.getLogger(__name__)
+
+
+METADATA_KEYS = frozenset((
+    "identifier", "extent", "size", "projection", "footprint", "begin_time",
+    "end_time"
+))
+
+# optional metadata, only stored for referenceable datasets
+REFERENCEABLE_METADATA_KEYS = frozenset((
+    "transformer_method", "transformer_order"
+))
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def iter_descriptions(lines):
+    """ Parses dataset descriptions from an iterable of lines, e.g. an opened 
+    file. Each line is either a JSON object or the location of a single data 
+    file, which is registered with the metadata read from the file itself. 
+    Empty lines and lines starting with '#' are ignored.
+    """
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        if line.startswith("{"):
+            yield json.loads(line)
+        else:
+            yield {"data": [[line]]}
+
+
+def iter_batches(iterable, size):
+    """ Splits an iterable into lists of at most ``size`` items. """
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def split_location(item):
+    """ Splits string as follows: <format>:<location> where format can be 
+        None.
+    """
+    p = item.find(":")
+    if p == -1:
+        return None, item 
+    return item[:p], item[p + 1:]
+
+
+class BulkRegistrationReport(object):
+    """ Result of a bulk registration. Holds the identifiers of all registered
+    datasets and the descriptions that were skipped, along with the reason.
+    """
+
+    def __init__(self):
+        self.registered = []
+        self.failed = []
+
+    def __len__(self):
+        return len(self.registered)
+
+
+class BulkRegistrator(object):
+    """ Registers large numbers of datasets with as few database round trips as
+    possible.
+
+    The dataset descriptions are dicts with the following keys:
+
+      * ``data``: list of location chains of the data files, each in the form
+        ``[[storage_type:url], [package_type:location]*, format:location]``
+      * ``semantics``: optional list of semantics, one per data item
+      * ``metadata``: optional list of location chains of metadata files
+      * ``range_type``: the name of the range type
+      * ``coverage_type``: the name of the coverage model
+      * ``collections``: optional list of collection identifiers to insert the
+        dataset into
+      * ``identifier``, ``extent``, ``size``, ``projection``, ``footprint``,
+        ``begin_time``, ``end_time``: optional overrides of the metadata read
+        from the files
+
+    The descriptions are processed in batches of ``batch_size``. Each batch is
+    validated as a whole and inserted in a single transaction. Invalid 
+    descriptions either abort the registration with a `ValidationError` or
+    are reported and skipped, if ``skip_invalid`` is set. A batch is always
+    registered completely or not at all.
+    """
+
+    def __init__(self, range_type_name=None, coverage_type="RectifiedDataset",
+                 collection_ids=None, batch_size=DEFAULT_BATCH_SIZE,
+                 skip_invalid=False, ignore_missing_collections=False):
+        self.range_type_name = range_type_name
+        self.coverage_type = coverage_type
+        self.collection_ids = collection_ids or []
+        self.batch_size = batch_size
+        self.skip_invalid = skip_invalid
+        self.ignore_missing_collections = ignore_missing_collections
+
+        self.backend_component = BackendComponent(env)
+        self.metadata_component = MetadataComponent(env)
+
+        # lookups that are shared by all datasets of a registration
+        self._range_types = {}
+        self._projections = {}
+        self._storages = {}
+        self._packages = {}
+
+
+    def register(self, descriptions, cache=None, callback=None):
+        """ Registers all datasets of the given descriptions and returns a 
+        `BulkRegistrationReport`. The optional ``callback`` is invoked with the
+        report after each batch.
+        """
+        report = BulkRegistrationReport()
+        for batch in iter_batches(descriptions, self.batch_size):
+            self.register_batch(batch, report, cache)
+            if callback:
+                callback(report)
+        return report
+
+
+    def register_batch(self, descriptions, report, cache=None):
+        """ Validates and registers a single batch of dataset descriptions.
+        """
+
+        prepared = []
+        for description in descriptions:
+            try:
+                prepared.append(self._prepare(description, cache))
+            except Exception, e:
+                self._fail(report, description, e)
+
+        prepared = self._validate_identifiers(prepared, report)
+        collections = self._lookup_collections(prepared, report)
+
+        if not prepared:
+            return
+
+        with transaction.commit_on_success():
+            with models.deferred_eo_metadata_update():
+                self._insert(prepared, collections)
+
+        # the collection links are inserted without signals, and documents 
+        # cached during the transaction may still reflect the previous state
+        revision.increment_revision()
+
+        report.registered.extend(
+            coverage.identifier for _, coverage, _, _ in prepared
+        )
+
+
+    def _insert(self, prepared, collections):
+        # the coverages are spread over several tables due to model 
+        # inheritance, which is not supported by `bulk_create`. New coverages 
+        # are not contained in any collection yet, so a plain save is cheap.
+        all_data_items = []
+        for _, coverage, data_items, _ in prepared:
+            coverage.save()
+            for data_item in data_items:
+                data_item.dataset = coverage
+            all_data_items.extend(data_items)
+
+        backends.DataItem.objects.bulk_create(all_data_items)
+
+        # the insertion is checked by the collection itself. The EO metadata 
+        # updates are deferred and performed once per collection.
+        throughs = []
+        inserted = {}
+        for _, coverage, _, collection_ids in prepared:
+            for collection_id in collection_ids:
+                collection = collections.get(collection_id)
+                if collection is None:
+                    continue
+
+                logger.debug("Inserting %s into %s." % (coverage, collection))
+                collection.perform_insertion(coverage)
+                throughs.append(models.EOObjectToCollectionThrough(
+                    eo_object=coverage, collection=collection
+                ))
+                inserted.setdefault(collection_id, []).append(coverage)
+
+        models.EOObjectToCollectionThrough.objects.bulk_create(throughs)
+
+        # the closure table is not updated by `bulk_create`
+        for collection_id, coverages in inserted.items():
+            models.CollectionClosure.insert(
+                collections[collection_id], coverages
+            )
+
+
+    def _prepare(self, description, cache):
+        """ Creates the (unsaved) coverage and data items for a description and
+        validates them, without querying the database for each of them.
+        """
+
+        CoverageType = getattr(
+            models, description.get("coverage_type", self.coverage_type), None
+        )
+        if not isinstance(CoverageType, type) \
+                or not issubclass(CoverageType, models.Coverage):
+            raise ValidationError(
+                "Invalid coverage type '%s'." 
+                % description.get("coverage_type", self.coverage_type)
+            )
+
+        # the files are only read until all accepted keys are known
+        keys = METADATA_KEYS
+        if issubclass(CoverageType, models.ReferenceableDataset):
+            keys = keys | REFERENCEABLE_METADATA_KEYS
+
+        values = self._get_overrides(description)
+        data_items = []
+
+        for chain in description.get("metadata", []):
+            data_item = self._create_data_item(chain, "metadata")
+            data_items.append(data_item)
+            if keys.issubset(values) and data_item.format:
+                continue
+
+            with vsi.open(connect(data_item, cache)) as f:
+                content = f.read()
+            self._read_metadata(data_item, content, values, keys)
+
+        datas = description.get("data", [])
+        if not datas:
+            raise ValidationError("No data files specified.")
+
+        range_type = self._get_range_type(
+            description.get("range_type", self.range_type_name)
+        )
+
+        semantics = description.get("semantics")
+        if semantics is None:
+            if len(datas) == 1:
+                if len(range_type) == 1:
+                    semantics = ["bands[1]"]
+                else:
+                    semantics = ["bands[1:%d]" % len(range_type)]
+            else:
+                semantics = ["bands[%d]" % i for i in range(len(datas))]
+
+        if len(semantics) != len(datas):
+            raise ValidationError(
+                "Expected %d semantics, got %d." % (len(datas), len(semantics))
+            )
+
+        for chain, semantic in zip(datas, semantics):
+            data_item = self._create_data_item(chain, semantic)
+            data_items.append(data_item)
+            if keys.issubset(values) and data_item.format:
+                continue
+
+            ds = gdal.Open(connect(data_item, cache))
+            self._read_metadata(data_item, ds, values, keys)
+            ds = None
+
+        missing = METADATA_KEYS - set(values.keys())
+        if missing:
+            raise ValidationError(
+                "Missing metadata keys %s." % ", ".join(sorted(missing))
+            )
+
+        self._resolve_projection(values)
+
+        coverage = CoverageType()
+        coverage.range_type = range_type
+        for key, value in values.items():
+            setattr(coverage, key, value)
+
+        # validate the fields, except the ones requiring a query. These are
+        # either already resolved or validated for the whole batch.
+        exclude = [
+            field.name for field in coverage._meta.fields 
+            if field.rel is not None
+        ]
+        exclude.append("identifier")
+        coverage.clean_fields(exclude=exclude)
+        coverage.clean()
+
+        for data_item in data_items:
+            data_item.clean_fields(exclude=["dataset", "storage", "package"])
+            data_item.clean()
+
+        collection_ids = list(self.collection_ids)
+        for collection_id in description.get("collections", []):
+            if collection_id not in collection_ids:
+                collection_ids.append(collection_id)
+
+        return description, coverage, data_items, collection_ids
+
+
+    def _validate_identifiers(self, prepared, report):
+        """ Checks the identifiers of the whole batch for uniqueness with a 
+        single query.
+        """
+        identifiers = [coverage.identifier for _, coverage, _, _ in prepared]
+        existing = set(
+            models.EOObject.objects.filter(
+                identifier__in=identifiers
+            ).values_list("identifier", flat=True)
+        )
+
+        valid = []
+        seen = set()
+        for item in prepared:
+            description, coverage = item[:2]
+            if coverage.identifier in existing or coverage.identifier in seen:
+                self._fail(report, description, ValidationError(
+                    "The identifier '%s' is already in use." 
+                    % coverage.identifier
+                ))
+                continue
+
+            seen.add(coverage.identifier)
+            valid.append(item)
+        return valid
+
+
+    def _lookup_collections(self, prepared, report):
+        """ Fetches all collections referenced in the batch, casted to their 
+        actual types, with one query per collection type.
+        """
+        collection_ids = set()
+        for _, _, _, ids in prepared:
+            collection_ids.update(ids)
+
+        if not collection_ids:
+            return {}
+
+        pks_by_type = {}
+        for pk, real_content_type in models.Collection.objects.filter(
+                identifier__in=collection_ids
+            ).values_list("pk", "real_content_type"):
+            pks_by_type.setdefault(real_content_type, []).append(pk)
+
+        collections = {}
+        for real_content_type, pks in pks_by_type.items():
+            CollectionType = models.EO_OBJECT_TYPE_REGISTRY[real_content_type]
+            for collection in CollectionType.objects.filter(pk__in=pks):
+                collections[collection.identifier] = collection
+
+        missing = collection_ids - set(collections.keys())
+        for collection_id in missing:
+            msg = (
+                "There is no collection matching the given identifier: '%s'"
+                % collection_id
+            )
+            if self.ignore_missing_collections:
+                logger.warning(msg)
+            else:
+                raise ValidationError(msg)
+
+        return collections
+
+
+    def _fail(self, report, description, error):
+        if not self.skip_invalid:
+            raise ValidationError(
+                "Invalid dataset description %s: %s" % (description, error)
+            )
+
+        logger.warning("Skipping dataset description %s: %s" 
+            % (description, error)
+        )
+        report.failed.append((description, str(error)))
+
+
+    def _read_metadata(self, data_item, obj, values, keys=METADATA_KEYS):
+        """ Reads the metadata from the given object (file content or dataset) 
+        if a suitable reader is available. Only the given ``keys`` are taken.
+        Values that are already present are not overridden.
+        """
+        reader = self.metadata_component.get_reader_by_test(obj)
+        if not reader:
+            return
+
+        read_values = reader.read(obj)
+        format = read_values.pop("format", None)
+        if format:
+            data_item.format = format
+
+        for key, value in read_values.items():
+            if key in keys:
+                values.setdefault(key, value)
+
+
+    def _get_overrides(self, description):
+        overrides = {}
+
+        if description.get("identifier"):
+            overrides["identifier"] = description["identifier"]
+
+        extent = description.get("extent")
+        if extent:
+            if isinstance(extent, basestring):
+                extent = extent.split(",")
+            overrides["extent"] = map(float, extent)
+
+        size = description.get("size")
+        if size:
+            if isinstance(size, basestring):
+                size = size.split(",")
+            overrides["size"] = map(int, size)
+
+        for key in ("begin_time", "end_time"):
+            if description.get(key):
+                overrides[key] = parse_datetime(description[key])
+
+        if description.get("footprint"):
+            overrides["footprint"] = GEOSGeometry(description["footprint"])
+
+        projection = description.get("projection")
+        if projection:
+            try:
+                overrides["projection"] = int(projection)
+            except (TypeError, ValueError):
+                overrides["projection"] = projection
+
+        return overrides
+
+
+    def _resolve_projection(self, values):
+        """ Replaces the 'projection' value either by an SRID or by a stored 
+        `Projection`.
+        """
+        projection = values.pop("projection")
+        if isinstance(projection, int):
+            values["srid"] = projection
+            return
+
+        if isinstance(projection, basestring):
+            definition, format = projection, None
+        else:
+            definition, format = projection
+
+        try:
+            values["srid"] = osr.SpatialReference(definition, format).srid
+        except Exception:
+            key = (definition, format)
+            if key not in self._projections:
+                self._projections[key] = models.Projection.objects.get(
+                    format=format, definition=definition
+                )
+            values["projection"] = self._projections[key]
+
+
+    def _get_range_type(self, name):
+        if name is None:
+            raise ValidationError("No range type name specified.")
+
+        if name not in self._range_types:
+            try:
+                range_type = models.RangeType.objects.get(name=name)
+            except models.RangeType.DoesNotExist:
+                raise ValidationError("No such range type '%s'." % name)
+
+            self._range_types[name] = range_type
+        return self._range_types[name]
+
+
+    def _create_data_item(self, chain, semantic):
+        """ Creates an unsaved `DataItem` from a location chain. Storages and 
+        packages are looked up or created only once per registration.
+        """
+        if isinstance(chain, basestring):
+            chain = [chain]
+
+        storage = None
+        package = None
+
+        storage_type, url = split_location(chain[0])
+        if storage_type and len(chain) > 1 and \
+                self.backend_component.get_storage_component(storage_type):
+            key = (storage_type, url)
+            if key not in self._storages:
+                self._storages[key], _ = backends.Storage.objects.get_or_create(
+                    url=url, storage_type=storage_type
+                )
+            storage = self._storages[key]
+            chain = chain[1:]
+
+        for item in chain[:-1]:
+            format, location = split_location(item)
+            if not format or \
+                    not self.backend_component.get_package_component(format):
+                raise ValidationError(
+                    "Could not find package component for '%s'." % item
+                )
+
+            key = (format, location, storage, package)
+            if key not in self._packages:
+                self._packages[key], _ = backends.Package.objects.get_or_create(
+                    location=location, format=format, 
+                    storage=storage, package=package
+                )
+            package = self._packages[key]
+            storage = None
+
+        format, location = split_location(chain[-1])
+        return backends.DataItem(
+            location=location, format=format or "", semantic=semantic,
+            storage=storage, package=package
+        )
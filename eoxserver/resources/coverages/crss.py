@@ -27,12 +27,22 @@
 
 """
  This module provides CRS handling utilities.
+
+ Parsed CRS identifiers and properties derived from them are cached process
+ wide. Spatial references and coordinate transformations are cached per
+ thread, as the underlying OGR/PROJ objects must not be used concurrently.
+ The objects returned by :func:`getSpatialReference` and
+ :func:`getCoordinateTransformation` are shared and must not be altered.
 """
 
 #-------------------------------------------------------------------------------
 
 import re 
+import math
 import logging
+from threading import RLock, local
+
+from django.utils.datastructures import SortedDict
 
 from eoxserver.contrib import osr
 from eoxserver.core.config import get_eoxserver_config
@@ -203,6 +213,75 @@ EPSG_AXES_REVERSED = set([
     32661, 32761,
 ])
 
+#-------------------------------------------------------------------------------
+# caches
+
+#: Maximum number of entries kept in each of the CRS caches.
+CACHE_SIZE = 1024
+
+
+class _LRUCache(object):
+    """ A thread-safe, size bounded cache. The least recently used entries are
+    discarded first.
+    """
+
+    def __init__(self, max_size=CACHE_SIZE):
+        self.max_size = max_size
+        self._items = SortedDict()
+        self._lock = RLock()
+
+    def get(self, key, create):
+        """ Returns the value for the given key. If it is not yet cached, it is
+        created by calling ``create``.
+        """
+        with self._lock:
+            try:
+                value = self._items.pop(key)
+                self._items[key] = value
+                return value
+            except KeyError:
+                pass
+
+        value = create()
+
+        with self._lock:
+            self._items[key] = value
+            while self.max_size and len(self._items) > self.max_size:
+                self._items.pop(iter(self._items).next())
+
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+_parse_cache = _LRUCache()
+_validation_cache = _LRUCache()
+_properties_cache = _LRUCache()
+_thread_caches = local()
+
+
+def _getThreadCache(name):
+    """ Returns the cache with the given name of the current thread. """
+    try:
+        return getattr(_thread_caches, name)
+    except AttributeError:
+        cache = _LRUCache()
+        setattr(_thread_caches, name, cache)
+        return cache
+
+
+def clearCaches():
+    """ Clears the process wide caches and those of the current thread. """
+    for cache in (_parse_cache, _validation_cache, _properties_cache):
+        cache.clear()
+    for name in ("spatial_references", "transformations"):
+        _getThreadCache(name).clear()
+
 #-------------------------------------------------------------------------------
 # format functions 
 
@@ -241,10 +320,18 @@ _gerexProj4Str = re.compile(r"^\+init=epsg:(\d+)$")
 def validateEPSGCode( string ) : 
     """Check whether the given string is a valid EPSG code (True) or not (False)""" 
     try:
-        osr.SpatialReference().ImportFromEPSG(int(string)) 
-    except (ValueError, RuntimeError): 
+        epsg = int(string)
+    except (ValueError, TypeError):
         return False
-    return True
+
+    def validate():
+        try:
+            osr.SpatialReference().ImportFromEPSG(epsg) 
+        except RuntimeError: 
+            return False
+        return True
+
+    return _validation_cache.get(epsg, validate)
 
 def fromInteger( string ) :  
     """ parse EPSG code from simple integer string """
@@ -278,10 +365,15 @@ def fromProj4Str( string ) :
 
 def parseEPSGCode( string , parsers ) :  
     """ parse EPSG code using provided sequence of EPSG parsers """ 
-    for parser in parsers : 
-        epsg = parser( string ) 
-        if epsg is not None : return epsg 
-    return None 
+    parsers = tuple(parsers)
+
+    def parse():
+        for parser in parsers : 
+            epsg = parser( string ) 
+            if epsg is not None : return epsg 
+        return None 
+
+    return _parse_cache.get((string, parsers), parse)
 
 #-------------------------------------------------------------------------------
 # public API 
@@ -359,42 +451,71 @@ def getAxesSwapper( epsg , swapAxes = None ) :
 
         return (lambda x,y:(y,x)) if swapAxes else (lambda x,y:(x,y))
 
+def getSpatialReference( srs ) : 
+    """ Get the spatial reference for the given EPSG code (integer) or CRS 
+    definition (e.g. WKT string). The returned object is cached for the 
+    current thread and must not be altered. """
+
+    def create():
+        return osr.SpatialReference(srs)
+
+    return _getThreadCache("spatial_references").get(srs, create)
+
+
+def getCoordinateTransformation( src , dst ) : 
+    """ Get the coordinate transformation between the spatial references given
+    as EPSG codes or CRS definitions. ``None`` is returned if both denote the 
+    same CRS. The returned object is cached for the current thread. """
+
+    def create():
+        src_srs = getSpatialReference(src)
+        dst_srs = getSpatialReference(dst)
+        if src_srs.IsSame(dst_srs):
+            return None
+        return osr.CoordinateTransformation(src_srs.sr, dst_srs.sr)
+
+    return _getThreadCache("transformations").get((src, dst), create)
+
+
+def _getProperties( epsg ) : 
+    """ Get the cached properties (projected flag, bounds and tolerance) of 
+    the CRS given by the EPSG code. """
+
+    def create():
+        srs = osr.SpatialReference()
+        srs.ImportFromEPSG(epsg)
+
+        if srs.IsGeographic():
+            bounds = (-180.0, -90.0, 180.0, 90.0)
+            tolerance = 1e-8
+        else:
+            earth_circumference = 2 * math.pi * srs.GetSemiMajor()
+            bounds = (
+                -earth_circumference,
+                -earth_circumference,
+                earth_circumference,
+                earth_circumference
+            )
+            tolerance = 1e-2
+
+        return bool(srs.IsProjected()), bounds, tolerance
+
+    return _properties_cache.get(int(epsg), create)
+
+
 def isProjected( epsg ) : 
     """Is the coordinate system projected (True) or Geographic (False)? """
-
-    spat_ref = osr.SpatialReference() 
-    spat_ref.ImportFromEPSG(epsg)
-    return bool( spat_ref.IsProjected() ) 
+    return _getProperties(epsg)[0]
 
 
 def crs_bounds(srid):
     """ Get the maximum bounds of the CRS. """
+    return _getProperties(srid)[1]
 
-    srs = osr.SpatialReference()
-    srs.ImportFromEPSG(srid)
-        
-    if srs.IsGeographic():
-        return (-180.0, -90.0, 180.0, 90.0)
-    else:
-        earth_circumference = 2 * math.pi * srs.GetSemiMajor()
-    
-        return (
-            -earth_circumference,
-            -earth_circumference,
-            earth_circumference,
-            earth_circumference
-        )
 
 def crs_tolerance(srid):
     """ Get the "tolerance" of the CRS """
-
-    srs = osr.SpatialReference()
-    srs.ImportFromEPSG(srid)
-        
-    if srs.IsGeographic():
-        return 1e-8
-    else:
-        return 1e-2
+    return _getProperties(srid)[2]
 
 #-------------------------------------------------------------------------------
 
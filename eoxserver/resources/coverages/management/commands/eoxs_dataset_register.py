@@ -39,12 +39,13 @@ from django.db import transaction
 from django.contrib.gis.geos import GEOSGeometry
 
 from eoxserver.core import env
-from eoxserver.contrib import gdal, osr
+from eoxserver.contrib import gdal, osr, vsi
 from eoxserver.backends import models as backends
 from eoxserver.backends.component import BackendComponent
 from eoxserver.backends.cache import CacheContext
 from eoxserver.backends.access import connect
 from eoxserver.resources.coverages import models
+from eoxserver.resources.coverages.bulk import REFERENCEABLE_METADATA_KEYS
 from eoxserver.resources.coverages.metadata.component import MetadataComponent
 from eoxserver.resources.coverages.management.commands import (
     CommandOutputMixIn, _variable_args_cb
@@ -185,6 +186,13 @@ class Command(CommandOutputMixIn, BaseCommand):
             "footprint", "begin_time", "end_time"
         ))
 
+        # the GCP transformer parameters are kept for referenceable datasets
+        accepted_keys = set(metadata_keys)
+        CoverageType = getattr(models, kwargs["coverage_type"], None)
+        if isinstance(CoverageType, type) and \
+                issubclass(CoverageType, models.ReferenceableDataset):
+            accepted_keys |= REFERENCEABLE_METADATA_KEYS
+
         all_data_items = []
         retrieved_metadata = {}
 
@@ -223,7 +231,7 @@ class Command(CommandOutputMixIn, BaseCommand):
             data_item.save()
             all_data_items.append(data_item)
 
-            with open(connect(data_item, cache)) as f:
+            with vsi.open(connect(data_item, cache)) as f:
                 content = f.read()
                 reader = metadata_component.get_reader_by_test(content)
                 if reader:
@@ -236,7 +244,7 @@ class Command(CommandOutputMixIn, BaseCommand):
                         data_item.save()
 
                     for key, value in values.items():
-                        if key in metadata_keys:
+                        if key in accepted_keys:
                             retrieved_metadata.setdefault(key, value)
 
 
@@ -280,7 +288,7 @@ class Command(CommandOutputMixIn, BaseCommand):
                     data_item.save()
 
                 for key, value in values.items():
-                    if key in metadata_keys:
+                    if key in accepted_keys:
                         retrieved_metadata.setdefault(key, value)
             ds = None
 
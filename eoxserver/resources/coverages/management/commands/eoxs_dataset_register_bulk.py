@@ -0,0 +1,146 @@
+#-------------------------------------------------------------------------------
+# $Id$
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#          Martin Paces <martin.paces@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2013 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+import sys
+import traceback
+from itertools import chain
+from optparse import make_option
+
+from django.core.management.base import CommandError, BaseCommand
+
+from eoxserver.backends.cache import CacheContext
+from eoxserver.resources.coverages.bulk import (
+    BulkRegistrator, iter_descriptions, DEFAULT_BATCH_SIZE
+)
+from eoxserver.resources.coverages.management.commands import (
+    CommandOutputMixIn, _variable_args_cb
+)
+
+
+class Command(CommandOutputMixIn, BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option("-r", "--range-type", dest="range_type_name",
+            help=("Name of the stored range type. Used for all descriptions "
+                  "which do not specify a range type.")
+        ),
+        make_option("--coverage-type", dest="coverage_type",
+            action="store", default="RectifiedDataset",
+            help=("The actual coverage type. Used for all descriptions "
+                  "which do not specify a coverage type.")
+        ),
+        make_option("--series", dest="parents",
+            action='callback', callback=_variable_args_cb,
+            default=[], help=("Optional. Link all datasets to one or more "
+                              "parent collections.")
+        ),
+        make_option("--batch-size", dest="batch_size",
+            action="store", type="int", default=DEFAULT_BATCH_SIZE,
+            help=("Number of datasets registered in a single transaction. "
+                  "Default: %d" % DEFAULT_BATCH_SIZE)
+        ),
+        make_option("--skip-invalid", dest="skip_invalid",
+            action="store_true", default=False,
+            help=("Optional. Report and skip invalid dataset descriptions "
+                  "instead of aborting the registration.")
+        ),
+        make_option('--ignore-missing-parent',
+            dest='ignore_missing_parent',
+            action="store_true", default=False,
+            help=("Optional. Proceed even if a linked parent"
+                  " does not exist. By default, a missing parent " 
+                  "will terminate the command." )
+        ),
+    )
+
+    args = "<description-file> [<description-file> ...]"
+
+    help = (
+"""Registers a large number of datasets at once. Each line of the given files 
+(or of the standard input if the filename is '-') is either a JSON object 
+describing a dataset or the location of a single data file. The keys of the 
+JSON objects are 'data', 'semantics', 'metadata', 'range_type', 
+'coverage_type', 'collections', 'identifier', 'extent', 'size', 'projection',
+'footprint', 'begin_time' and 'end_time'. The locations in 'data' and 
+'metadata' are given as in 'eoxs_dataset_register', e.g:
+
+    {"data": [["GTiff:/path/to/data.tif"]], "metadata": [["/path/to/md.xml"]]}
+"""
+    )
+
+    def handle(self, *filenames, **kwargs):
+        self.verbosity = int(kwargs.get("verbosity", 1))
+
+        if not filenames:
+            raise CommandError("No description files given.")
+
+        if kwargs["batch_size"] < 1:
+            raise CommandError("The batch size must be a positive number.")
+
+        registrator = BulkRegistrator(
+            range_type_name=kwargs["range_type_name"],
+            coverage_type=kwargs["coverage_type"],
+            collection_ids=kwargs["parents"],
+            batch_size=kwargs["batch_size"],
+            skip_invalid=kwargs["skip_invalid"],
+            ignore_missing_collections=kwargs["ignore_missing_parent"]
+        )
+
+        files = [
+            sys.stdin if filename == "-" else open(filename)
+            for filename in filenames
+        ]
+
+        def callback(report):
+            self.print_msg("%d datasets registered." % len(report), 2)
+
+        try:
+            with CacheContext() as cache:
+                report = registrator.register(
+                    iter_descriptions(chain(*files)), cache, callback
+                )
+
+        except Exception as e:
+            # print stack trace if required 
+            if kwargs.get("traceback", False):
+                self.print_msg(traceback.format_exc())
+
+            raise CommandError("Bulk registration failed! REASON=%s" % e)
+
+        finally:
+            for f in files:
+                if f is not sys.stdin:
+                    f.close()
+
+        for description, error in report.failed:
+            self.print_wrn("Skipped dataset %s: %s" % (description, error))
+
+        self.print_msg(
+            "%d datasets registered sucessfully, %d skipped." 
+            % (len(report), len(report.failed))
+        )
@@ -0,0 +1,228 @@
+#-------------------------------------------------------------------------------
+# $Id$
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#          Martin Paces <martin.paces@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Q
+
+from eoxserver.contrib import gdal
+from eoxserver.backends.cache import CacheContext
+from eoxserver.backends.access import connect
+from eoxserver.resources.coverages.models import (
+    EOObject, Collection, CollectionClosure, EOObjectToCollectionThrough,
+    ReferenceableDataset, EO_OBJECT_INDICES
+)
+from eoxserver.processing.gdal import reftools
+from eoxserver.resources.coverages.management.commands import (
+    CommandOutputMixIn
+)
+
+
+class Command(CommandOutputMixIn, BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option("--batch-size", dest="batch_size",
+            action="store", type="int", default=1000,
+            help=("Number of objects updated in a single transaction. "
+                  "Default: 1000")
+        ),
+        make_option("--rebuild-closure", dest="rebuild_closure",
+            action="store_true", default=False,
+            help=("Rebuild the collection closure table even if it is "
+                  "already populated.")
+        ),
+        make_option("--no-transformers", dest="transformers",
+            action="store_false", default=True,
+            help=("Do not suggest the GCP transformer parameters of "
+                  "referenceable datasets, which requires reading their "
+                  "data.")
+        ),
+    )
+
+    help = (
+    """
+    Upgrades the database schema of an existing instance. syncdb only creates
+    missing tables, so this command adds the columns and indices introduced
+    since and populates them from the existing data. It only performs the 
+    steps that are still required and can thus be run repeatedly.
+
+    The collection closure table is created if necessary and rebuilt from 
+    the collection relations when it is empty or `--rebuild-closure` is set.
+
+    Referenceable datasets registered without GCP transformer parameters get
+    them suggested from their data, unless `--no-transformers` is set. 
+    Datasets without stored parameters fall back to a suggestion per request.
+    """
+    )
+
+    def handle(self, *args, **opt):
+        self.verbosity = int(opt.get("verbosity", 1))
+        batch_size = opt["batch_size"]
+
+        # footprint bounding boxes of EO objects
+        with transaction.commit_on_success():
+            added = self.add_columns(
+                EOObject, ("min_lon", "min_lat", "max_lon", "max_lat")
+            )
+            if added:
+                for field_names in EO_OBJECT_INDICES:
+                    self.add_index(EOObject, field_names)
+
+        count = EOObject.update_bounds(
+            EOObject.objects.filter(
+                min_lon__isnull=True, footprint__isnull=False
+            ), batch_size=batch_size
+        )
+        self.print_msg("Updated the bounding boxes of %d EO objects." % count)
+
+        # closure table of the collection hierarchy
+        with transaction.commit_on_success():
+            self.add_table(CollectionClosure, (Collection, EOObject))
+
+            if opt["rebuild_closure"] or (
+                    not CollectionClosure.objects.exists() 
+                    and EOObjectToCollectionThrough.objects.exists()):
+                self.print_msg("Rebuilding the collection closure table.")
+                CollectionClosure.rebuild()
+
+        # GCP transformer parameters of referenceable datasets
+        with transaction.commit_on_success():
+            self.add_columns(
+                ReferenceableDataset, ("transformer_method", "transformer_order")
+            )
+
+        if opt["transformers"]:
+            count = 0
+            with CacheContext() as cache:
+                for dataset in ReferenceableDataset.objects.filter(
+                        Q(transformer_method__isnull=True) 
+                        | Q(transformer_order__isnull=True)):
+                    params = self.suggest_transformer(dataset, cache)
+                    if params is None:
+                        continue
+                    ReferenceableDataset.objects.filter(pk=dataset.pk).update(
+                        transformer_method=params["method"],
+                        transformer_order=params["order"]
+                    )
+                    count += 1
+            self.print_msg(
+                "Updated the transformer parameters of %d referenceable "
+                "datasets." % count
+            )
+
+
+    def suggest_transformer(self, dataset, cache):
+        """ Returns the suggested GCP transformer parameters for the first band
+            data item of the referenceable dataset that has GCPs, or ``None``.
+        """
+        data_items = sorted(
+            dataset.data_items.filter(semantic__startswith="bands"),
+            key=lambda data_item: data_item.semantic
+        )
+        for data_item in data_items:
+            try:
+                ds = gdal.Open(connect(data_item, cache))
+                if ds.GetGCPCount() > 0:
+                    return reftools.suggest_transformer(ds)
+            except Exception as e:
+                self.print_wrn(
+                    "Could not read the data of referenceable dataset '%s': %s"
+                    % (dataset.identifier, e)
+                )
+                return None
+
+        self.print_wrn(
+            "Referenceable dataset '%s' has no GCPs." % dataset.identifier
+        )
+        return None
+
+
+    def add_table(self, model, known_models=()):
+        """ Creates the table of the model along with its indices, if it is
+            missing. ``known_models`` are the models whose tables the new 
+            table may reference. Returns whether the table was created.
+        """
+        cursor = connection.cursor()
+        table = model._meta.db_table
+        if table in connection.introspection.table_names():
+            return False
+
+        self.print_msg("Creating table '%s'." % table)
+        style = no_style()
+        statements, _ = connection.creation.sql_create_model(
+            model, style, set(known_models)
+        )
+        statements.extend(
+            connection.creation.sql_indexes_for_model(model, style)
+        )
+        for statement in statements:
+            cursor.execute(statement)
+        return True
+
+
+    def add_columns(self, model, field_names):
+        """ Adds the columns of the given fields to the table of the model, if
+            they are missing. The fields must be nullable. Returns the names of
+            the added fields.
+        """
+        qn = connection.ops.quote_name
+        cursor = connection.cursor()
+        table = model._meta.db_table
+        columns = set(
+            row[0] for row in 
+            connection.introspection.get_table_description(cursor, table)
+        )
+
+        added = []
+        for field_name in field_names:
+            field = model._meta.get_field(field_name)
+            if field.column in columns:
+                continue
+
+            self.print_msg("Adding column '%s.%s'." % (table, field.column))
+            cursor.execute("ALTER TABLE %s ADD COLUMN %s %s NULL" % (
+                qn(table), qn(field.column), field.db_type(connection=connection)
+            ))
+            added.append(field_name)
+        return added
+
+
+    def add_index(self, model, field_names):
+        """ Creates a composite index on the given fields of the model.
+        """
+        qn = connection.ops.quote_name
+        table = model._meta.db_table
+        columns = [model._meta.get_field(name).column for name in field_names]
+        index_name = "%s_%s_idx" % (table, "_".join(columns))
+
+        self.print_msg("Adding index '%s'." % index_name)
+        connection.cursor().execute("CREATE INDEX %s ON %s (%s)" % (
+            qn(index_name), qn(table), ", ".join(qn(c) for c in columns)
+        ))
@@ -319,9 +319,22 @@ class BaseManagerContainerMixIn(object):
         return new_datasets
     
     def _synchronize(self, container, data_sources, datasets):
+        """ Synchronizes the container with its data sources and returns the 
+            footprints of all datasets which have been added to or removed from
+            the container.
+        """
         # TODO: make this more efficient by using updateModel()
         
+        contained_ids = set(
+            dataset.getCoverageId() for dataset in datasets
+        )
+        
         new_datasets = self._create_contained(container, data_sources)
+        
+        footprints = [
+            dataset.getFootprint() for dataset in new_datasets
+            if dataset.getCoverageId() not in contained_ids
+        ]
 
         # if new datasets have been created the container metadata
         # have already been updated
@@ -341,10 +354,12 @@ class BaseManagerContainerMixIn(object):
                     )
                 )
                 
+                footprint = dataset.getFootprint()
                 self.rect_dataset_mgr.delete(dataset.getCoverageId())
                 
                 # force updating the metadata
                 do_md_update = True
+                footprints.append(footprint)
             
             elif dataset.getAttrValue("automatic"):
                 # remove all automatic coverages from a mosaic/dataset series
@@ -358,11 +373,14 @@ class BaseManagerContainerMixIn(object):
                 if not contained:
                     container.removeCoverage(dataset)
                     do_md_update = True
+                    footprints.append(dataset.getFootprint())
 
         # if no update has been done do it now
         if do_md_update:
             container.updateModel({}, {}, {})
         
+        return footprints
+        
     def _guess_metadata_location(self, location):
         if location.getType() == "local":
             return self.location_factory.create(
@@ -31,7 +31,7 @@ from eoxserver.core.system import System
 from eoxserver.core.exceptions import InternalError
 from eoxserver.resources.coverages.exceptions import NoSuchCoverageException
 
-from eoxserver.processing.mosaic import make_mosaic
+from eoxserver.processing.mosaic import make_mosaic, update_mosaic
 
 #-------------------------------------------------------------------------------
 
@@ -122,6 +122,12 @@ class RectifiedStitchedMosaicManager(BaseManagerContainerMixIn, CoverageManager)
     _type0   = "rect_stitched_mosaic"
     _type    = "eo.%s"%_type0
 
+    # attributes which change the tile grid of the mosaic
+    GRID_FIELDS = frozenset((
+        "geo_metadata", "srid", "size_x", "size_y", 
+        "minx", "miny", "maxx", "maxy"
+    ))
+
     REGISTRY_CONF = {
         "name": "Rectified Stitched Mosaic Manager",
         "impl_id": "resources.coverages.managers.RectifiedStitchedMosaicManager",
@@ -158,6 +164,9 @@ class RectifiedStitchedMosaicManager(BaseManagerContainerMixIn, CoverageManager)
         * All instances of :class:`~.RectifiedDatasetRecord` associated with the
           :class:`~.RectifiedStitchedMosaicRecord` which are not referenced by a
           data source anymore are unlinked from the `Rectified Stitched Mosaic`.
+        
+        Afterwards only the tiles touched by the added or removed datasets are
+        regenerated.
 
         :param obj_id: the ID (CoverageID or EOID) of the object to be synchronised
         :rtype: no output returned
@@ -165,8 +174,37 @@ class RectifiedStitchedMosaicManager(BaseManagerContainerMixIn, CoverageManager)
 
         container = self._get_wrapper( obj_id )
         
-        self._synchronize(container, container.getDataSources(), container.getDatasets())
-        self._make_mosaic(container)
+        footprints = self._synchronize(
+            container, container.getDataSources(), container.getDatasets()
+        )
+        self._update_mosaic(container, footprints)
+    
+    def update(self, obj_id, link=None, unlink=None, set=None):
+        """
+        Updates the `Rectified Stitched Mosaic` identified by ``obj_id`` as 
+        described in :meth:`~BaseManager.update`. Only the tiles touched by 
+        linked or unlinked coverages are regenerated, unless the geospatial 
+        metadata of the mosaic is changed.
+        """
+        link = link if link is not None else {}
+        unlink = unlink if unlink is not None else {}
+        set = set if set is not None else {}
+        
+        wrapper = super(RectifiedStitchedMosaicManager, self).update(
+            obj_id, link, unlink, set
+        )
+        
+        # the update dicts hold the coverage wrappers after the update
+        coverages = link.get("coverages", []) + unlink.get("coverages", [])
+        
+        if self.GRID_FIELDS.intersection(set.keys()):
+            self._make_mosaic(wrapper)
+        elif coverages:
+            self._update_mosaic(
+                wrapper, [coverage.getFootprint() for coverage in coverages]
+            )
+        
+        return wrapper
     
     def __init__(self):
         super(RectifiedStitchedMosaicManager, self).__init__()
@@ -285,6 +323,9 @@ class RectifiedStitchedMosaicManager(BaseManagerContainerMixIn, CoverageManager)
     
     def _make_mosaic(self, coverage):
         make_mosaic(coverage)
+    
+    def _update_mosaic(self, coverage, footprints):
+        update_mosaic(coverage, footprints)
 
     def _prepare_update_dicts(self, link_kwargs, unlink_kwargs, set_kwargs):
         super(RectifiedStitchedMosaicManager, self)._prepare_update_dicts(link_kwargs, unlink_kwargs, set_kwargs)
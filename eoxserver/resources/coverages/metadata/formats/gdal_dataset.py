@@ -26,6 +26,8 @@
 # THE SOFTWARE.
 #-------------------------------------------------------------------------------
 
+from django.contrib.gis.geos import GEOSGeometry
+
 from eoxserver.core import Component, ExtensionPoint, implements
 from eoxserver.contrib import gdal
 from eoxserver.resources.coverages.metadata.interfaces import (
@@ -96,11 +98,14 @@ class GDALDatasetMetadataReader(Component):
                     values.setdefault(key, value)
 
             if ds.GetGCPCount() > 0:
-                rt_prm = rt.suggest_transformer(raw_metadata)
-                fp_wkt = rt.get_footprint_wkt(raw_metadata,**rt_prm)
+                rt_prm = rt.suggest_transformer(ds)
+                fp_wkt = rt.get_footprint_wkt(ds, use_cache=False, **rt_prm)
                 values["footprint"] = GEOSGeometry(
                     fp_wkt
                 )
+                # persist the suggestion for referenceable datasets
+                values["transformer_method"] = rt_prm["method"]
+                values["transformer_order"] = rt_prm["order"]
 
             driver_metadata = driver.GetMetadata()
             frmt = driver_metadata.get("DMD_MIMETYPE")
@@ -29,16 +29,23 @@
 
 import logging
 from itertools import chain
+from contextlib import contextmanager
+from threading import local
 
+import django
 from django.core.exceptions import ValidationError
 from django.contrib.gis.db import models
+from django.db import transaction
+from django.db.models.signals import pre_delete, post_save, post_delete
 from django.utils.timezone import now
 
 from eoxserver.core import models as base
 from eoxserver.contrib import gdal, osr
 from eoxserver.backends import models as backends
+from eoxserver.resources.coverages import crss, revision
 from eoxserver.resources.coverages.util import (
-    detect_circular_reference, collect_eo_metadata, is_same_grid
+    collect_eo_metadata, extend_eo_metadata,
+    is_extension, is_same_grid
 )
 
 
@@ -59,6 +66,62 @@ def iscollection(eo_object):
     return issubclass(eo_object.real_type, Collection)
 
 
+_deferred = local()
+
+
+@contextmanager
+def deferred_eo_metadata_update():
+    """ Context manager to defer the EO metadata updates of collections, e.g.
+        when inserting a large number of objects. Within the context, the 
+        affected collections are only recorded. Their EO metadata is computed
+        once when the outermost context is left without an error.
+
+        >>> with deferred_eo_metadata_update():
+        ...     for dataset in datasets:
+        ...         series.insert(dataset)
+    """
+
+    if getattr(_deferred, "collections", None) is not None:
+        # the updates are already deferred by an enclosing context
+        yield
+        return
+
+    _deferred.collections = {}
+    try:
+        yield
+        deferred = _deferred.collections
+    finally:
+        _deferred.collections = None
+
+    for collection in Collection.objects.filter(pk__in=deferred.keys()):
+        eo_objects = deferred[collection.pk]
+        if eo_objects is None:
+            collection.update_eo_metadata()
+        else:
+            # only insertions were recorded, so extend the EO metadata
+            collection.extend_eo_metadata(eo_objects)
+
+
+def _defer_eo_metadata_update(collection, eo_objects=None):
+    """ Records the collection for a deferred EO metadata update, if updates 
+        are currently deferred. If ``eo_objects`` is given, only these objects
+        were inserted and the metadata can be extended later. Returns whether
+        the update was deferred.
+    """
+    deferred = getattr(_deferred, "collections", None)
+    if deferred is None:
+        return False
+
+    if eo_objects is None:
+        # a full update is required
+        deferred[collection.pk] = None
+    else:
+        inserted = deferred.setdefault(collection.pk, [])
+        if inserted is not None:
+            inserted.extend(eo_objects)
+    return True
+
+
 #===============================================================================
 # Metadata classes
 #===============================================================================
@@ -101,9 +164,7 @@ class Extent(models.Model):
     @property
     def spatial_reference(self):
         if self.srid is not None:
-            sr = osr.SpatialReference()
-            sr.ImportFromEPSG(self.srid)
-            return sr
+            return crss.getSpatialReference(self.srid)
         else:
             return self.projection.spatial_reference
     
@@ -167,6 +228,12 @@ class DataSource(backends.Dataset):
 # registry to map the integer type IDs to the model types and vice-versa.
 EO_OBJECT_TYPE_REGISTRY = {}
 
+# composite indices of the EO object table
+EO_OBJECT_INDICES = (
+    ("min_lon", "max_lon", "min_lat", "max_lat"),
+    ("begin_time", "end_time"),
+)
+
 
 class EOObject(base.Castable, EOMetadata):
     """ Base class for EO objects. All EO objects share a pool of unique 
@@ -179,6 +246,13 @@ class EOObject(base.Castable, EOMetadata):
     real_content_type = models.PositiveSmallIntegerField()
     type_registry = EO_OBJECT_TYPE_REGISTRY
 
+    # bounding box of the footprint in WGS84, denormalized to allow cheap 
+    # range queries before the exact geometry tests. Maintained by `save()`.
+    min_lon = models.FloatField(null=True, blank=True, editable=False)
+    min_lat = models.FloatField(null=True, blank=True, editable=False)
+    max_lon = models.FloatField(null=True, blank=True, editable=False)
+    max_lat = models.FloatField(null=True, blank=True, editable=False)
+
 
     objects = models.GeoManager()
 
@@ -192,15 +266,30 @@ class EOObject(base.Castable, EOMetadata):
 
 
     def save(self, *args, **kwargs):
+        created = self.pk is None
+        self.min_lon, self.min_lat, self.max_lon, self.max_lat = \
+            get_footprint_bounds(self.footprint)
         super(EOObject, self).save(*args, **kwargs)
 
-        # propagate changes of the EO Metadata up in the collection hierarchy
-        if (self._original_begin_time != self.begin_time
+        # propagate changes of the EO Metadata up in the collection hierarchy.
+        # newly created objects are not yet contained in any collection.
+        if not created and (self._original_begin_time != self.begin_time
             or self._original_end_time != self.end_time
             or self._original_footprint != self.footprint):
 
+            # if the metadata only grew, the collections can be extended 
+            # incrementally. Otherwise they need to be computed from scratch.
+            extended = is_extension(
+                (self._original_begin_time, self._original_end_time,
+                 self._original_footprint),
+                (self.begin_time, self.end_time, self.footprint)
+            )
+
             for collection in self.collections.all():
-                collection.update_eo_metadata()
+                if extended:
+                    collection.extend_eo_metadata([self])
+                else:
+                    collection.update_eo_metadata()
 
         # set the new values for subsequent calls to `save()`
         self._original_begin_time = self.begin_time
@@ -212,9 +301,63 @@ class EOObject(base.Castable, EOMetadata):
         return "%s (%s)" % (self.identifier, self.real_type._meta.verbose_name)
 
 
+    @classmethod
+    def update_bounds(cls, queryset=None, batch_size=1000):
+        """ (Re-)computes the denormalized bounding boxes of all EO objects in 
+        the ``queryset``. Databases that were populated before the columns 
+        existed are upgraded with `eoxs_schema_upgrade`, which uses this 
+        method. Returns the number of updated objects.
+        """
+        if queryset is None:
+            queryset = cls.objects.all()
+
+        # page by primary key instead of offsets, as the update may remove 
+        # objects from a queryset filtering on the bounding box columns
+        count = 0
+        last_pk = None
+        while True:
+            batch = queryset
+            if last_pk is not None:
+                batch = batch.filter(pk__gt=last_pk)
+            batch = list(
+                batch.order_by("pk").values_list("pk", "footprint")[:batch_size]
+            )
+            if not batch:
+                break
+
+            with transaction.commit_on_success():
+                for pk, footprint in batch:
+                    min_lon, min_lat, max_lon, max_lat = \
+                        get_footprint_bounds(footprint)
+                    cls.objects.filter(pk=pk).update(
+                        min_lon=min_lon, min_lat=min_lat,
+                        max_lon=max_lon, max_lat=max_lat
+                    )
+                    count += 1
+            last_pk = batch[-1][0]
+        return count
+
+
     class Meta:
         verbose_name = "EO Object"
         verbose_name_plural = "EO Objects"
+        # index_together is not available before Django 1.5. For existing 
+        # databases, the indices are created by `eoxs_schema_upgrade`
+        if django.VERSION >= (1, 5):
+            index_together = EO_OBJECT_INDICES
+
+
+def get_footprint_bounds(footprint):
+    """ Returns the ``(min_lon, min_lat, max_lon, max_lat)`` bounding box of 
+    the footprint in WGS84 or a tuple of ``None`` values.
+    """
+    if footprint is None or footprint.empty:
+        return (None, None, None, None)
+
+    if footprint.srid is not None and footprint.srid != 4326:
+        footprint = footprint.transform(4326, clone=True)
+
+    return footprint.extent
 
 #===============================================================================
 # Identifier reservation
@@ -518,6 +661,10 @@ class Collection(EOObject):
 
     objects = models.GeoManager()
 
+    # whether the footprint of the collection is only the bounding box of the 
+    # footprints of its contents
+    bbox_footprint = False
+
     def insert(self, eo_object, through=None):
         # TODO: a collection shall not contain itself!
         if self.pk == eo_object.pk:
@@ -565,9 +712,33 @@ class Collection(EOObject):
         raise NotImplementedError
 
 
-    def update_eo_metadata(self):
+    def update_eo_metadata(self, exclude=None):
+        """ Computes the EO metadata from all contained objects, except the
+        ones in ``exclude``.
+        """
+        if _defer_eo_metadata_update(self):
+            return
+
         logger.debug("Updating EO Metadata for %s." % self)
-        self.begin_time, self.end_time, self.footprint = collect_eo_metadata(self.eo_objects.all())
+        self.begin_time, self.end_time, self.footprint = collect_eo_metadata(
+            self.eo_objects.all(), exclude=exclude,
+            bbox=self.real_type.bbox_footprint
+        )
+        self.full_clean()
+        self.save()
+
+    def extend_eo_metadata(self, eo_objects):
+        """ Incrementally extends the EO metadata by the metadata of the given 
+        objects only, without aggregating over all contained objects.
+        """
+        if _defer_eo_metadata_update(self, eo_objects):
+            return
+
+        logger.debug("Extending EO Metadata for %s." % self)
+        self.begin_time, self.end_time, self.footprint = extend_eo_metadata(
+            self.begin_time, self.end_time, self.footprint, eo_objects,
+            bbox=self.real_type.bbox_footprint
+        )
         self.full_clean()
         self.save()
 
@@ -581,16 +752,13 @@ class Collection(EOObject):
         if not isinstance(eo_object, EOObject):
             raise ValueError("Expected EOObject.")
 
-        if self.eo_objects.filter(pk=eo_object.pk).exists():
-            return True
-
         if recursive:
-            for collection in self.eo_objects.filter(collection__isnull=False):
-                collection = collection.cast()
-                if collection.contains(eo_object, recursive):
-                    return True
+            # the closure table holds all direct and indirect relations
+            return CollectionClosure.objects.filter(
+                ancestor=self.pk, descendant=eo_object.pk
+            ).exists()
 
-        return False
+        return self.eo_objects.filter(pk=eo_object.pk).exists()
 
 
     def __contains__(self, eo_object):
@@ -601,13 +769,34 @@ class Collection(EOObject):
         return iter(self.eo_objects.all())
 
     def iter_cast(self, recursive=False):
-        for eo_object in self.eo_objects.all():
-            eo_object = eo_object.cast()
-            yield eo_object
-            if recursive and iscollection(eo_object):
-                for item in eo_object.iter_cast(recursive):
+        if not recursive:
+            for eo_object in self.eo_objects.all():
+                yield eo_object.cast()
+            return
+
+        # fetch all direct and indirect EO objects and their relations at once
+        # and traverse the hierarchy in memory.
+        descendants = EOObject.objects.filter(
+            ancestor_closures__ancestor=self.pk
+        )
+        casted = cast_eo_objects(descendants)
+
+        children = {}
+        for collection_id, eo_object_id in (
+                EOObjectToCollectionThrough.objects.filter(
+                    eo_object__ancestor_closures__ancestor=self.pk
+                ).values_list("collection", "eo_object")):
+            children.setdefault(collection_id, []).append(eo_object_id)
+
+        def iter_children(collection_id):
+            for eo_object_id in children.get(collection_id, ()):
+                yield casted[eo_object_id]
+                for item in iter_children(eo_object_id):
                     yield item
 
+        for item in iter_children(self.pk):
+            yield item
+
     def __len__(self):
         if self.id == None:
             return 0
@@ -617,7 +806,8 @@ class Collection(EOObject):
 class EOObjectToCollectionThrough(models.Model):
     """Relation of objects to collections. 
     Warning: do *not* use bulk methods of query sets of this collection, as it 
-    will not invoke the correct `insert` and `remove` methods on the collection.
+    will not invoke the correct `insert` and `remove` methods on the collection
+    and will not update the `CollectionClosure` on insertion.
     """
 
     eo_object = models.ForeignKey(EOObject)
@@ -640,17 +830,20 @@ class EOObjectToCollectionThrough(models.Model):
 
 
     def save(self, *args, **kwargs):
-        if (self._original_eo_object is not None 
+        created = self.pk is None
+        altered = (self._original_eo_object is not None 
             and self._original_collection is not None
             and (self._original_eo_object != self.eo_object
-                 or self._original_collection != self.collection)):
+                 or self._original_collection != self.collection))
+
+        if altered:
             logger.debug("Relation has been altered!")
             self._original_collection.remove(self._original_eo_object, self)
+            CollectionClosure.remove(
+                self._original_collection, [self._original_eo_object]
+            )
 
-        def getter(eo_object):
-            return eo_object.collections.all()
-
-        if detect_circular_reference(self.eo_object, self.collection, getter):
+        if CollectionClosure.is_circular(self.eo_object, self.collection):
             raise ValidationError("Circular reference detected.")
 
         # perform the insertion
@@ -661,6 +854,9 @@ class EOObjectToCollectionThrough(models.Model):
 
         super(EOObjectToCollectionThrough, self).save(*args, **kwargs)
 
+        if created or altered:
+            CollectionClosure.insert(self.collection, [self.eo_object])
+
         self._original_eo_object = self.eo_object
         self._original_collection = self.collection
 
@@ -679,6 +875,259 @@ class EOObjectToCollectionThrough(models.Model):
         verbose_name_plural = "EO Object to Collection Relations"
 
 
+class CollectionClosure(models.Model):
+    """ Closure table of the collection hierarchy. For each collection, it 
+    holds one entry for every directly or indirectly contained EO object, 
+    along with the number of distinct paths between the two. This allows 
+    recursive containment queries to be answered with a single lookup. The 
+    table is maintained by `EOObjectToCollectionThrough`.
+    """
+
+    ancestor = models.ForeignKey(Collection, related_name="descendant_closures")
+    descendant = models.ForeignKey(EOObject, related_name="ancestor_closures")
+    path_count = models.PositiveIntegerField(default=1)
+
+    objects = models.GeoManager()
+
+
+    @classmethod
+    def is_circular(cls, eo_object, collection):
+        """ Checks whether inserting the ``eo_object`` into the ``collection`` 
+        would create a circular reference.
+        """
+        return eo_object.pk == collection.pk or cls.objects.filter(
+            ancestor=eo_object.pk, descendant=collection.pk
+        ).exists()
+
+
+    @classmethod
+    def insert(cls, collection, eo_objects):
+        """ Updates the closure for the insertion of the ``eo_objects`` into the
+        ``collection``.
+        """
+        paths = cls._get_paths(collection, eo_objects)
+        if not paths:
+            return
+
+        ancestors = set(ancestor for ancestor, _ in paths)
+        descendants = set(descendant for _, descendant in paths)
+
+        for closure in cls.objects.filter(ancestor__in=ancestors, 
+                                          descendant__in=descendants):
+            closure.path_count += paths.pop(
+                (closure.ancestor_id, closure.descendant_id)
+            )
+            closure.save()
+
+        cls.objects.bulk_create([
+            cls(ancestor_id=ancestor, descendant_id=descendant, path_count=count)
+            for (ancestor, descendant), count in paths.items()
+        ])
+
+
+    @classmethod
+    def remove(cls, collection, eo_objects):
+        """ Updates the closure for the removal of the ``eo_objects`` from the
+        ``collection``.
+        """
+        paths = cls._get_paths(collection, eo_objects)
+        if not paths:
+            return
+
+        ancestors = set(ancestor for ancestor, _ in paths)
+        descendants = set(descendant for _, descendant in paths)
+
+        obsolete = []
+        for closure in cls.objects.filter(ancestor__in=ancestors, 
+                                          descendant__in=descendants):
+            closure.path_count -= paths[
+                (closure.ancestor_id, closure.descendant_id)
+            ]
+            if closure.path_count > 0:
+                closure.save()
+            else:
+                obsolete.append(closure.pk)
+
+        if obsolete:
+            cls.objects.filter(pk__in=obsolete).delete()
+
+
+    @classmethod
+    def rebuild(cls):
+        """ Recreates the whole closure table from the collection relations,
+        e.g. for databases that were populated before the table existed.
+        """
+        cls.objects.all().delete()
+
+        eo_object_ids = {}
+        for collection_id, eo_object_id in (
+                EOObjectToCollectionThrough.objects.values_list(
+                    "collection", "eo_object"
+                )):
+            eo_object_ids.setdefault(collection_id, []).append(eo_object_id)
+
+        for collection in Collection.objects.filter(pk__in=eo_object_ids.keys()):
+            cls.insert(collection, EOObject.objects.filter(
+                pk__in=eo_object_ids[collection.pk]
+            ))
+
+
+    @classmethod
+    def get_sub_collections(cls, collections, filter_qs=None):
+        """ Returns a list of all collections recursively contained in the 
+        given ``collections``. The optional ``filter_qs`` function is applied to
+        the queryset of candidate sub-collections. A sub-collection is only 
+        included when it is reachable through candidates alone, so excluded 
+        collections prune their whole subtree.
+        """
+        root_ids = [collection.pk for collection in collections]
+        if not root_ids:
+            return []
+
+        candidates_qs = Collection.objects.filter(
+            ancestor_closures__ancestor__in=root_ids
+        )
+        if filter_qs is not None:
+            candidates_qs = filter_qs(candidates_qs)
+        candidates = dict(
+            (collection.pk, collection) for collection in candidates_qs
+        )
+        if not candidates:
+            return []
+
+        children = {}
+        for collection_id, eo_object_id in (
+                EOObjectToCollectionThrough.objects.filter(
+                    eo_object__in=candidates_qs.values("pk")
+                ).values_list("collection", "eo_object")):
+            children.setdefault(collection_id, []).append(eo_object_id)
+
+        reached = set()
+        pending = list(root_ids)
+        while pending:
+            for child_id in children.get(pending.pop(), ()):
+                if child_id in candidates and child_id not in reached:
+                    reached.add(child_id)
+                    pending.append(child_id)
+
+        return [candidates[collection_id] for collection_id in reached]
+
+
+    @classmethod
+    def _get_paths(cls, collection, eo_objects):
+        """ Returns a dict mapping all (ancestor, descendant) pairs affected by
+        relations between the ``collection`` and the ``eo_objects`` to the 
+        number of paths the relations add to them.
+        """
+        eo_objects = list(eo_objects)
+        if not eo_objects:
+            return {}
+
+        # the collection itself and all collections containing it
+        ancestors = dict(cls.objects.filter(
+            descendant=collection.pk
+        ).values_list("ancestor", "path_count"))
+        ancestors[collection.pk] = 1
+
+        # the objects themselves and all objects within them
+        descendants = {}
+        sub_collection_ids = [
+            eo_object.pk for eo_object in eo_objects if iscollection(eo_object)
+        ]
+        if sub_collection_ids:
+            for ancestor_id, descendant_id, count in cls.objects.filter(
+                    ancestor__in=sub_collection_ids
+                ).values_list("ancestor", "descendant", "path_count"):
+                descendants.setdefault(ancestor_id, {})[descendant_id] = count
+
+        paths = {}
+        for eo_object in eo_objects:
+            eo_object_descendants = descendants.get(eo_object.pk, {})
+            eo_object_descendants[eo_object.pk] = 1
+
+            for ancestor, ancestor_count in ancestors.items():
+                for descendant, descendant_count in eo_object_descendants.items():
+                    key = (ancestor, descendant)
+                    paths[key] = (
+                        paths.get(key, 0) + ancestor_count * descendant_count
+                    )
+        return paths
+
+    class Meta:
+        unique_together = (("ancestor", "descendant"),)
+        verbose_name = "Collection Closure"
+        verbose_name_plural = "Collection Closures"
+
+
+def _remove_closure(sender, instance, **kwargs):
+    """ Updates the closure table when a relation is deleted. This is done via
+    a signal, as relations are also deleted in cascades, e.g. when deleting a
+    collection, without invoking `EOObjectToCollectionThrough.delete()`.
+    """
+    CollectionClosure.remove(instance.collection, [instance.eo_object])
+
+pre_delete.connect(_remove_closure, sender=EOObjectToCollectionThrough)
+
+
+def _increment_revision(sender, instance, **kwargs):
+    """ Increments the revision of the EO objects whenever an EO object or a
+    collection membership is changed, as well as the revisions of the single 
+    coverages and range types affected by a change. The signals are connected
+    without a sender, as they are sent for the concrete (sub-)class only.
+    """
+    if issubclass(sender, (EOObject, EOObjectToCollectionThrough)):
+        revision.increment_revision()
+
+    coverage_ids = ()
+    range_type_ids = ()
+    if issubclass(sender, Coverage):
+        coverage_ids = (instance.pk,)
+    elif issubclass(sender, backends.DataItem) and instance.dataset_id:
+        # the coverage is linked via its own pointer to the dataset
+        coverage_ids = Coverage.objects.filter(
+            dataset_ptr=instance.dataset_id
+        ).values_list("pk", flat=True)
+    elif issubclass(sender, RangeType):
+        range_type_ids = (instance.pk,)
+    elif issubclass(sender, Band):
+        range_type_ids = (instance.range_type_id,)
+    elif issubclass(sender, (NilValueSet, NilValue)):
+        nil_value_set_id = (
+            instance.pk if sender is NilValueSet else instance.nil_value_set_id
+        )
+        range_type_ids = Band.objects.filter(
+            nil_value_set=nil_value_set_id
+        ).values_list("range_type_id", flat=True).distinct()
+
+    for coverage_id in coverage_ids:
+        revision.increment_object_revision("coverage", coverage_id)
+    for range_type_id in range_type_ids:
+        revision.increment_object_revision("range_type", range_type_id)
+
+post_save.connect(_increment_revision)
+post_delete.connect(_increment_revision)
+
+
+def cast_eo_objects(eo_objects):
+    """ Casts the given EO objects to their actual types with one query per 
+    type instead of one per object. Returns a dict mapping the primary keys to
+    the casted objects.
+    """
+    pks_by_type = {}
+    casted = {}
+    for eo_object in eo_objects:
+        if eo_object.real_type == type(eo_object):
+            casted[eo_object.pk] = eo_object
+        else:
+            pks_by_type.setdefault(eo_object.real_type, []).append(eo_object.pk)
+
+    for real_type, pks in pks_by_type.items():
+        for eo_object in real_type.objects.filter(pk__in=pks):
+            casted[eo_object.pk] = eo_object
+
+    return casted
+
+
 #===============================================================================
 # Actual Coverage and Collections
 #===============================================================================
@@ -700,8 +1149,24 @@ EO_OBJECT_TYPE_REGISTRY[10] = RectifiedDataset
 class ReferenceableDataset(Coverage):
     """ Coverage type using a referenceable grid.
     """
+
+    # GCP transformer method and order, as suggested at registration time
+    transformer_method = models.PositiveSmallIntegerField(null=True, blank=True)
+    transformer_order = models.SmallIntegerField(null=True, blank=True)
     
     objects = models.GeoManager()
+
+    @property
+    def transformer_params(self):
+        """ Returns the persisted transformer parameters as keyword arguments
+            for the ``reftools`` functions or ``None`` if they are not set.
+        """
+        if self.transformer_method is None or self.transformer_order is None:
+            return None
+        return {
+            "method": self.transformer_method, 
+            "order": self.transformer_order
+        }
     
     class Meta:
         verbose_name = "Referenceable Dataset"
@@ -741,21 +1206,13 @@ class RectifiedStitchedMosaic(Coverage, Collection):
                 "Stitched Mosaic '%s'."  % (rectified_dataset, self.identifier)
             )
 
-        self.begin_time, self.end_time, self.footprint = collect_eo_metadata(
-            self.eo_objects.all(), insert=[eo_object]
-        )
         # TODO: recalculate size and extent!
-        self.full_clean()
-        self.save()
+        self.extend_eo_metadata([eo_object])
         return
 
     def perform_removal(self, eo_object):
-        self.begin_time, self.end_time, self.footprint = collect_eo_metadata(
-            self.eo_objects.all(), exclude=[eo_object]
-        )
         # TODO: recalculate size and extent!
-        self.full_clean()
-        self.save()
+        self.update_eo_metadata(exclude=[eo_object])
         return
 
 EO_OBJECT_TYPE_REGISTRY[20] = RectifiedStitchedMosaic
@@ -768,25 +1225,19 @@ class DatasetSeries(Collection):
 
     objects = models.GeoManager()
 
+    bbox_footprint = True
+
     class Meta:
         verbose_name = "Dataset Series"
         verbose_name_plural = "Dataset Series"
 
 
     def perform_insertion(self, eo_object, through=None):
-        self.begin_time, self.end_time, self.footprint = collect_eo_metadata(
-            self.eo_objects.all(), insert=[eo_object], bbox=True
-        )
-        self.full_clean()
-        self.save()
+        self.extend_eo_metadata([eo_object])
         return
 
     def perform_removal(self, eo_object):
-        self.begin_time, self.end_time, self.footprint = collect_eo_metadata(
-            self.eo_objects.all(), exclude=[eo_object], bbox=True
-        )
-        self.full_clean()
-        self.save()
+        self.update_eo_metadata(exclude=[eo_object])
         return
 
 EO_OBJECT_TYPE_REGISTRY[30] = DatasetSeries
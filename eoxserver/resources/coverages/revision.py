@@ -0,0 +1,120 @@
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#          Stephan Meissl <stephan.meissl@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2013 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" This module keeps track of a revision number of the registered EO objects
+and their collection memberships. The revision is incremented whenever one of
+them is saved or deleted and allows services to detect whether any cached
+document derived from the models (e.g. a capabilities document) is outdated.
+Additionally, revisions of single objects (e.g. coverages or range types) are
+maintained for documents that only depend on these.
+
+The revisions are stored in the ``default`` Django cache. For deployments with
+several processes, a cache shared between them (e.g. memcached) must be
+configured, as otherwise changes are only noticed by the modifying process.
+"""
+
+import logging
+from time import time
+
+from django.core.cache import get_cache, DEFAULT_CACHE_ALIAS
+
+
+logger = logging.getLogger(__name__)
+
+
+REVISION_KEY = "eoxserver.resources.coverages.revision"
+
+# memcached interprets timeouts above 30 days as timestamps
+REVISION_TIMEOUT = 30 * 24 * 60 * 60
+
+
+def _initial_revision():
+    # time based, so a lost revision (e.g. due to a cache restart or eviction)
+    # never coincides with a previous one
+    return int(time() * 1000)
+
+
+def get_revision():
+    """ Returns the current revision of the EO objects.
+    """
+    cache = get_cache(DEFAULT_CACHE_ALIAS)
+    revision = cache.get(REVISION_KEY)
+    if revision is None:
+        revision = _initial_revision()
+        if not cache.add(REVISION_KEY, revision, REVISION_TIMEOUT):
+            # someone else was faster
+            revision = cache.get(REVISION_KEY, revision)
+    return revision
+
+
+def increment_revision():
+    """ Increments the revision of the EO objects, invalidating all documents
+    that were derived from a previous revision.
+    """
+    return _increment(REVISION_KEY)
+
+
+def _get_object_key(kind, pk):
+    return "%s.%s.%s" % (REVISION_KEY, kind, pk)
+
+
+def get_object_revisions(kind, pks):
+    """ Returns a dict mapping the given primary keys of objects of a certain 
+    kind (e.g. "coverage") to their current revision.
+    """
+    cache = get_cache(DEFAULT_CACHE_ALIAS)
+    keys = dict((_get_object_key(kind, pk), pk) for pk in pks)
+    revisions = cache.get_many(keys.keys())
+
+    missing = dict(
+        (key, _initial_revision()) for key in keys if key not in revisions
+    )
+    if missing:
+        cache.set_many(missing, REVISION_TIMEOUT)
+        revisions.update(missing)
+
+    return dict((keys[key], revision) for key, revision in revisions.items())
+
+
+def increment_object_revision(kind, pk):
+    """ Increments the revision of a single object of a certain kind.
+    """
+    return _increment(_get_object_key(kind, pk))
+
+
+def _increment(key):
+    cache = get_cache(DEFAULT_CACHE_ALIAS)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # the key is not (or no longer) present
+        revision = _initial_revision()
+        cache.set(key, revision, REVISION_TIMEOUT)
+        return revision
+    except Exception, e:
+        logger.warning("Failed to increment the revision '%s': %s" % (key, e))
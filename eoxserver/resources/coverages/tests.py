@@ -27,18 +27,28 @@
 # THE SOFTWARE.
 #-------------------------------------------------------------------------------
 
+import shutil
+import tempfile
+from os.path import join
 from datetime import datetime
 from StringIO import StringIO
 from textwrap import dedent
 
 from django.test import TestCase
+from django.core.management import call_command
 from django.core.exceptions import ValidationError
 from django.contrib.gis.geos import GEOSGeometry, Polygon, MultiPolygon
 from django.utils.dateparse import parse_datetime
 from django.utils.timezone import utc
 
 from eoxserver.core import env
+from eoxserver.contrib import gdal, osr
+from eoxserver.processing.gdal import reftools
 from eoxserver.resources.coverages.models import *
+from eoxserver.resources.coverages import crss
+from eoxserver.resources.coverages.bulk import BulkRegistrator
+from eoxserver.resources.coverages.revision import get_object_revisions
+from eoxserver.services.subset import Subsets, Trim
 from eoxserver.resources.coverages.metadata.formats import (
     native, eoom, dimap_general
 )
@@ -216,6 +226,54 @@ class ModelTests(TestCase):
             pass
 
 
+    def test_closure_removal(self):
+        rectified_1, series_1, series_2 = self.rectified_1, self.series_1, self.series_2
+
+        # two distinct paths from series_2 to rectified_1
+        series_1.insert(rectified_1)
+        series_2.insert(series_1)
+        series_2.insert(rectified_1)
+
+        series_1.remove(rectified_1)
+        self.assertTrue(series_2.contains(rectified_1, recursive=True))
+        self.assertFalse(series_1.contains(rectified_1, recursive=True))
+
+        series_2.remove(rectified_1)
+        self.assertFalse(series_2.contains(rectified_1, recursive=True))
+        self.assertTrue(series_2.contains(series_1, recursive=True))
+
+        self.assertEqual(
+            [obj.identifier for obj in series_2.iter_cast(True)], ["series-1"]
+        )
+
+
+    def test_sub_collections(self):
+        series_1, series_2 = self.series_1, self.series_2
+        series_3 = create(DatasetSeries, identifier="series-3")
+
+        series_2.insert(series_1)
+        series_1.insert(series_3)
+        series_1.insert(self.rectified_1)
+
+        identifiers = lambda *args: set(
+            collection.identifier 
+            for collection in CollectionClosure.get_sub_collections(*args)
+        )
+        exclude_series_1 = lambda qs: qs.exclude(identifier="series-1")
+
+        self.assertEqual(
+            identifiers([series_2]), set(["series-1", "series-3"])
+        )
+
+        # excluded collections prune their subtrees
+        self.assertEqual(identifiers([series_2], exclude_series_1), set())
+
+        series_2.insert(series_3)
+        self.assertEqual(
+            identifiers([series_2], exclude_series_1), set(["series-3"])
+        )
+
+
     def test_insertion_failed(self):
         referenceable, mosaic = self.referenceable, self.mosaic
 
@@ -260,6 +318,163 @@ class ModelTests(TestCase):
         self.assertEqual(series_1.end_time, new_end_time)
 
 
+    def test_deferred_eo_metadata_update(self):
+        rectified_1, rectified_2, series_1 = self.rectified_1, self.rectified_2, self.series_1
+
+        with deferred_eo_metadata_update():
+            series_1.insert(rectified_1)
+            series_1.insert(rectified_2)
+
+            # the EO metadata is not yet updated within the context
+            self.assertEqual(refresh(series_1).time_extent, (None, None))
+
+        series_1 = refresh(series_1)
+
+        begin_time, end_time, _ = collect_eo_metadata(
+            RectifiedDataset.objects.filter(
+                pk__in=[rectified_1.pk, rectified_2.pk]
+            )
+        )
+        self.assertEqual(series_1.time_extent, (begin_time, end_time))
+        self.assertTrue(series_1.footprint is not None)
+
+
+    def test_bulk_registration(self):
+        descriptions = [{
+            "identifier": "bulk-%d" % i,
+            "data": [["GTiff:/path/to/bulk-%d.tif" % i]],
+            "range_type": "RGB",
+            "extent": "10,10,20,20", "size": "100,100", "projection": 4326,
+            "footprint": "MULTIPOLYGON (((%d 0, %d 10, %d 10, %d 0, %d 0)))" 
+                % (i, i, i + 1, i + 1, i),
+            "begin_time": "2013-06-1%dT10:00:00Z" % i,
+            "end_time": "2013-06-1%dT11:00:00Z" % i,
+            "collections": ["series-1"]
+        } for i in range(3)]
+
+        # the second batch contains a duplicate identifier, which is skipped
+        descriptions.append(dict(descriptions[0]))
+
+        registrator = BulkRegistrator(batch_size=2, skip_invalid=True)
+        report = registrator.register(descriptions)
+
+        self.assertEqual(report.registered, ["bulk-0", "bulk-1", "bulk-2"])
+        self.assertEqual(len(report.failed), 1)
+
+        series_1 = refresh(self.series_1)
+        self.assertEqual(len(series_1), 3)
+        self.assertEqual(series_1.time_extent, (
+            parse_datetime("2013-06-10T10:00:00Z"),
+            parse_datetime("2013-06-12T11:00:00Z")
+        ))
+        self.assertEqual(
+            RectifiedDataset.objects.get(identifier="bulk-1").data_items.count(),
+            1
+        )
+
+
+    def test_referenceable_registration(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            filename = join(tmp_dir, "referenceable.tif")
+            ds = gdal.GetDriverByName("GTiff").Create(filename, 100, 100, 1)
+            ds.SetGCPs([
+                gdal.GCP(10 + x / 10.0, 20 - y / 10.0, 0, x, y)
+                for x in (0, 50, 100) for y in (0, 50, 100)
+            ], osr.SpatialReference(4326).wkt)
+            ds = None
+            expected = reftools.suggest_transformer(filename)
+
+            # the metadata is complete, but the transformer parameters still 
+            # have to be read from the file
+            registrator = BulkRegistrator(coverage_type="ReferenceableDataset")
+            registrator.register([{
+                "identifier": "referenceable-bulk",
+                "data": [["GTiff:%s" % filename]],
+                "range_type": "RGB",
+                "extent": "10,10,20,20", "size": "100,100", "projection": 4326,
+                "footprint": "MULTIPOLYGON (((10 10, 10 20, 20 20, 20 10, 10 10)))",
+                "begin_time": "2013-06-10T10:00:00Z",
+                "end_time": "2013-06-10T11:00:00Z"
+            }])
+
+            call_command("eoxs_dataset_register",
+                identifier="referenceable-command", data=[[filename]],
+                range_type_name="RGB", coverage_type="ReferenceableDataset",
+                extent="10,10,20,20", projection="4326",
+                begin_time="2013-06-10T10:00:00Z",
+                end_time="2013-06-10T11:00:00Z"
+            )
+        finally:
+            shutil.rmtree(tmp_dir)
+
+        for identifier in ("referenceable-bulk", "referenceable-command"):
+            dataset = ReferenceableDataset.objects.get(identifier=identifier)
+            self.assertEqual(dataset.transformer_params, expected)
+
+
+    def test_object_revisions(self):
+        def revisions():
+            return (
+                get_object_revisions("coverage", [self.rectified_1.pk]),
+                get_object_revisions("range_type", [self.range_type.pk])
+            )
+
+        coverage_revisions, range_type_revisions = revisions()
+
+        self.rectified_1.save()
+        self.assertNotEqual(revisions()[0], coverage_revisions)
+        self.assertEqual(revisions()[1], range_type_revisions)
+
+        coverage_revisions = revisions()[0]
+        create(Band, 
+            index=0, name="red", identifier="red", uom="none", data_type=1,
+            range_type=self.range_type
+        )
+        self.assertEqual(revisions()[0], coverage_revisions)
+        self.assertNotEqual(revisions()[1], range_type_revisions)
+
+
+    def test_footprint_bounds(self):
+        rectified_2 = EOObject.objects.get(pk=self.rectified_2.pk)
+        self.assertEqual(
+            (rectified_2.min_lon, rectified_2.min_lat, 
+             rectified_2.max_lon, rectified_2.max_lat),
+            self.rectified_2.footprint.extent
+        )
+        self.assertEqual(
+            EOObject.objects.get(pk=self.series_1.pk).min_lon, None
+        )
+
+        EOObject.objects.all().update(
+            min_lon=None, min_lat=None, max_lon=None, max_lat=None
+        )
+
+        # objects without bounding boxes are still subject to the exact tests
+        subsets = Subsets([Trim("x", -120, -100), Trim("y", -10, 30)])
+        self.assertEqual(
+            set(subsets.filter(EOObject.objects.all()).values_list(
+                "identifier", flat=True
+            )),
+            set(["rectified-1", "rectified-3", "referenceable-1"])
+        )
+        subsets = Subsets([Trim("x", -120, -60), Trim("y", -20, 30)])
+        self.assertEqual(
+            list(subsets.filter(EOObject.objects.all(), "contains").values_list(
+                "identifier", flat=True
+            )),
+            ["rectified-1"]
+        )
+
+        EOObject.update_bounds()
+        self.assertEqual(
+            set(EOObject.objects.filter(min_lon__lt=-100).values_list(
+                "identifier", flat=True
+            )),
+            set(["rectified-1", "rectified-3", "referenceable-1"])
+        )
+
+
     def test_insert_in_self_fails(self):
         series_1 = self.series_1
         with self.assertRaises(ValidationError):
@@ -273,6 +488,160 @@ class ModelTests(TestCase):
             series_2.insert(series_1)
 
 
+class CRSTests(TestCase):
+    def test_parse_cached(self):
+        parsers = (crss.fromShortCode, crss.fromURN, crss.fromURL)
+        self.assertEqual(crss.parseEPSGCode("EPSG:4326", parsers), 4326)
+        self.assertEqual(crss.parseEPSGCode("EPSG:4326", parsers), 4326)
+        self.assertEqual(
+            crss.parseEPSGCode(
+                "http://www.opengis.net/def/crs/EPSG/0/3035", parsers
+            ), 3035
+        )
+        self.assertEqual(crss.parseEPSGCode("invalid", parsers), None)
+        self.assertFalse(crss.validateEPSGCode("invalid"))
+
+
+    def test_spatial_reference_cached(self):
+        sr = crss.getSpatialReference(4326)
+        self.assertTrue(sr is crss.getSpatialReference(4326))
+        self.assertEqual(sr.srid, 4326)
+        self.assertFalse(crss.isProjected(4326))
+        self.assertTrue(crss.isProjected(3035))
+
+
+    def test_transformation_cached(self):
+        self.assertEqual(crss.getCoordinateTransformation(4326, 4326), None)
+        transformation = crss.getCoordinateTransformation(4326, 3857)
+        self.assertTrue(
+            transformation is crss.getCoordinateTransformation(4326, 3857)
+        )
+        x, y, _ = transformation.TransformPoint(0, 0)
+        self.assertAlmostEqual(x, 0)
+        self.assertAlmostEqual(y, 0)
+
+
+class _Dataset(object):
+    """ Stand-in for a GDAL dataset, only providing the SWIG pointer.
+    """
+    this = 0
+
+
+class TransformerCacheTests(TestCase):
+    """ Tests the reference counting of the transformer cache with the C 
+    library functions replaced by stubs.
+    """
+
+    def setUp(self):
+        self.created = []
+        self.destroyed = []
+        self.on_create = None
+        self.originals = dict(
+            (name, getattr(reftools, name, None))
+            for name in ("_create_transformer", "_destroy_transformer")
+        )
+        reftools._create_transformer = self.create_transformer
+        reftools._destroy_transformer = self.destroyed.append
+
+
+    def tearDown(self):
+        for name, func in self.originals.items():
+            if func is None:
+                delattr(reftools, name)
+            else:
+                setattr(reftools, name, func)
+
+
+    def create_transformer(self, ds, method, order):
+        handle = len(self.created) + 1
+        self.created.append(handle)
+        if self.on_create:
+            on_create, self.on_create = self.on_create, None
+            on_create()
+        return handle
+
+
+    def acquire(self, cache, gcp_hash):
+        return cache.acquire(_Dataset(), 0, 1, gcp_hash=gcp_hash)
+
+
+    def test_lru_order(self):
+        cache = reftools.TransformerCache(size=2)
+        a = self.acquire(cache, "a")
+        b = self.acquire(cache, "b")
+        cache.release(a)
+        cache.release(b)
+
+        # a hit moves the entry to the end
+        self.assertTrue(self.acquire(cache, "a") is a)
+        cache.release(a)
+        self.assertEqual(self.created, [1, 2])
+
+        c = self.acquire(cache, "c")
+        cache.release(c)
+        self.assertEqual(
+            [key[0] for key in cache._entries.keys()], ["a", "c"]
+        )
+        self.assertEqual(self.destroyed, [2])
+        self.assertEqual(b.handle, None)
+
+
+    def test_evicted_in_use(self):
+        cache = reftools.TransformerCache(size=1)
+        a_1 = self.acquire(cache, "a")
+        a_2 = self.acquire(cache, "a")
+        self.assertTrue(a_1 is a_2)
+        self.assertEqual(a_1.refs, 2)
+
+        b = self.acquire(cache, "b")
+        self.assertTrue(a_1.evicted)
+        self.assertEqual(self.destroyed, [])
+
+        cache.release(a_1)
+        self.assertEqual(self.destroyed, [])
+        cache.release(a_2)
+        self.assertEqual(self.destroyed, [1])
+
+        # the evicted entry is gone for good
+        cache.release(b)
+        cache.clear()
+        self.assertEqual(self.destroyed, [1, 2])
+
+
+    def test_concurrent_creation(self):
+        cache = reftools.TransformerCache()
+        inner = []
+
+        # another acquisition of the same key finishes while the transformer
+        # is created
+        self.on_create = lambda: inner.append(self.acquire(cache, "a"))
+        outer = self.acquire(cache, "a")
+
+        self.assertTrue(outer is inner[0])
+        self.assertEqual(outer.handle, 2)
+        self.assertEqual(outer.refs, 2)
+        self.assertEqual(self.destroyed, [1])
+        self.assertEqual(len(cache), 1)
+
+
+    def test_clear(self):
+        cache = reftools.TransformerCache()
+        a = self.acquire(cache, "a")
+        b = self.acquire(cache, "b")
+        cache.release(b)
+
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(self.destroyed, [2])
+
+        cache.release(a)
+        self.assertEqual(self.destroyed, [2, 1])
+
+        # a new entry is created after clearing
+        self.acquire(cache, "a")
+        self.assertEqual(self.created, [1, 2, 3])
+
+
 class MetadataFormatTests(TestCase):
     def test_native_reader(self):
         xml = """
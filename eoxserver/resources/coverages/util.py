@@ -69,11 +69,21 @@ def collect_eo_metadata(qs, insert=None, exclude=None, bbox=False):
         footprint=Union("footprint")
     )
 
-    begin_time, end_time, footprint = (
-        values["begin_time"], values["end_time"], values["footprint"]
+    return extend_eo_metadata(
+        values["begin_time"], values["end_time"], values["footprint"],
+        insert, bbox
     )
 
-    for eo_object in insert or ():
+
+def extend_eo_metadata(begin_time, end_time, footprint, eo_objects, bbox=False):
+    """ Helper function to extend already collected EO metadata by the EO 
+    metadata of the given EOObjects only. This allows incremental updates of 
+    collections without aggregating over all of their contents. If bbox is 
+    `True` then the returned polygon will only be a minimal bounding box of the 
+    footprints.
+    """
+
+    for eo_object in eo_objects or ():
         if begin_time is None:
             begin_time = eo_object.begin_time
         elif eo_object.begin_time is not None:
@@ -98,6 +108,28 @@ def collect_eo_metadata(qs, insert=None, exclude=None, bbox=False):
     return begin_time, end_time, footprint
 
 
+def is_extension(old_values, new_values):
+    """ Checks whether the EO metadata tuples ``(begin_time, end_time, 
+    footprint)`` of ``new_values`` include the ones of ``old_values``, i.e: 
+    whether an incremental update with the new values is sufficient.
+    """
+
+    old_begin, old_end, old_footprint = old_values
+    new_begin, new_end, new_footprint = new_values
+
+    if old_begin is not None and (new_begin is None or new_begin > old_begin):
+        return False
+
+    if old_end is not None and (new_end is None or new_end < old_end):
+        return False
+
+    if old_footprint is not None and (
+            new_footprint is None or not new_footprint.contains(old_footprint)):
+        return False
+
+    return True
+
+
 def is_same_grid(coverages, epsilon=1e-10):
     """ Function to determine if the given coverages share the same base grid.
         Returns a boolean value, whether or not the coverages share a common 
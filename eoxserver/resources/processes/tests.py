@@ -126,6 +126,30 @@ class TestSequenceFunctions(unittest.TestCase):
         deleteTaskByIdentifier( PROCESS_CLASS, ID1 )
 
 
+    def test_dequeue_batch(self):
+        registerTaskType( PROCESS_CLASS, ASYNC_HANDLER, ASYNC_TIMEOUT, ASYNC_TIMERET )
+
+        # enqueue three tasks and dequeue them at once 
+        enqueueTask( PROCESS_CLASS, ID1, inputs, PARAM )        
+        enqueueTask( PROCESS_CLASS, ID2, inputs, PARAM )        
+        enqueueTask( PROCESS_CLASS, ID3, inputs, PARAM )        
+
+        ids = dequeueTasks( SERVER_ID, 5 )
+        self.assertEqual( len( ids ), 3 )
+
+        # all tasks are scheduled and the status change is logged 
+        for id in ids:
+            self.assertEqual( getTaskStatus( id )[0], TaskStatus.SCHEDULED )
+        self.assertEqual( getTaskLog( PROCESS_CLASS, ID1 )[-1][1][0], TaskStatus.SCHEDULED )
+
+        # test for queue empty 
+        self.assertRaises( QueueEmpty, dequeueTasks, SERVER_ID, 5 )
+
+        deleteTaskByIdentifier( PROCESS_CLASS, ID1 )
+        deleteTaskByIdentifier( PROCESS_CLASS, ID2 )
+        deleteTaskByIdentifier( PROCESS_CLASS, ID3 )
+
+
     def test_full_empty_queue(self):
         # enue more task then  QUEUE_SIZE
         for t in range ( 0, getMaxQueueSize() ) :
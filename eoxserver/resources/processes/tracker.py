@@ -38,10 +38,14 @@ import zlib
 import base64 
 import time 
 import datetime 
+import select 
+import socket 
 
 try:    import cPickle as pickle
 except: import pickle
 
+from django.db import connection, transaction
+
 from eoxserver.resources.processes.models import Type, Instance, Task, LogRecord, Response, Input
 from eoxserver.resources.processes.models import STATUS2TEXT, TEXT2STATUS
 
@@ -261,6 +265,140 @@ def _logStatusChange( obj , message ):
 
     obj.logrecord_set.create( time=obj.timeUpdate , status=obj.status , message=message )
 
+def _setStatus( instance_ids , status , message ) : 
+    """ auxiliary function - set status of multiple task Instances and log 
+    the status change with one bulk insert. Returns number of updated 
+    instances. """ 
+
+    now = datetime.datetime.now() 
+
+    # NOTE: update() does not apply the 'auto_now' of 'timeUpdate' 
+    count = Instance.objects.filter( id__in = instance_ids ).update( status = status , timeUpdate = now ) 
+
+    if count : 
+        LogRecord.objects.bulk_create([ 
+            LogRecord( instance_id = id , time = now , status = status , message = message ) 
+            for id in instance_ids 
+        ])
+
+    return count 
+
+#-------------------------------------------------------------------------------
+# Task Queue Notification 
+
+#: PostgreSQL channel used to notify idle ATPDs about new tasks 
+NOTIFY_CHANNEL = "eoxs_atp_queue"
+
+#: local UDP address used to notify idle ATPDs about new tasks for DB backends
+#: not supporting LISTEN/NOTIFY 
+NOTIFY_ADDRESS = ( "127.0.0.1" , 50515 )
+
+def _isPostgreSQL() : 
+    """ auxiliary function """ 
+    return connection.vendor == "postgresql" 
+
+def _supportsSkipLocked() : 
+    """ auxiliary function - 'SKIP LOCKED' requires PostgreSQL 9.5 or newer """ 
+    return _isPostgreSQL() and getattr( connection , "pg_version" , 0 ) >= 90500 
+
+def notifyQueue() : 
+    """Wake up the ATPDs waiting for new tasks (see 'QueueListener'). 
+    For PostgreSQL the notification is delivered once the current transaction
+    is committed."""
+
+    if _isPostgreSQL() : 
+        connection.cursor().execute( "NOTIFY %s" % NOTIFY_CHANNEL ) 
+        transaction.commit_unless_managed() 
+
+    else : 
+        sock = socket.socket( socket.AF_INET , socket.SOCK_DGRAM ) 
+        try : 
+            sock.sendto( "\n" , NOTIFY_ADDRESS ) 
+        except socket.error : 
+            pass # nobody listening 
+        finally : 
+            sock.close() 
+
+
+class QueueListener( object ) : 
+    """ Listener receiving the notifications sent by 'notifyQueue'. 
+
+    On PostgreSQL a separate DB connection is used to LISTEN for 
+    notifications, otherwise the listener binds to the local UDP 
+    'NOTIFY_ADDRESS'. If this is not possible (e.g., another ATPD is bound 
+    to it already) 'wait()' simply sleeps for the given time. 
+    """ 
+
+    def __init__( self ) : 
+
+        self.conn = None 
+        self.sock = None 
+
+        if _isPostgreSQL() : 
+
+            import psycopg2 
+            import psycopg2.extensions 
+
+            settings = connection.settings_dict 
+            params = { "database" : settings["NAME"] } 
+            for key , param in ( ("USER","user") , ("PASSWORD","password") , ("HOST","host") , ("PORT","port") ) : 
+                if settings.get(key) : 
+                    params[param] = settings[key] 
+
+            self.conn = psycopg2.connect( **params ) 
+            self.conn.set_isolation_level( psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT ) 
+            self.conn.cursor().execute( "LISTEN %s" % NOTIFY_CHANNEL ) 
+
+        else : 
+
+            sock = socket.socket( socket.AF_INET , socket.SOCK_DGRAM ) 
+            try : 
+                sock.bind( NOTIFY_ADDRESS ) 
+                sock.setblocking( False ) 
+                self.sock = sock 
+            except socket.error : 
+                sock.close() 
+
+    def wait( self , timeout ) : 
+        """Block until a notification is received or the 'timeout' (in seconds)
+        elapsed. Returns True if notified, False otherwise.""" 
+
+        if self.conn is not None : 
+
+            if not select.select( [self.conn] , [] , [] , timeout )[0] : 
+                return False 
+
+            self.conn.poll() 
+            notified = bool( self.conn.notifies ) 
+            del self.conn.notifies[:] 
+            return notified 
+
+        elif self.sock is not None : 
+
+            if not select.select( [self.sock] , [] , [] , timeout )[0] : 
+                return False 
+
+            # drain all pending notifications 
+            try : 
+                while self.sock.recv( 64 ) : pass 
+            except socket.error : 
+                pass 
+            return True 
+
+        time.sleep( timeout ) 
+        return False 
+
+    def close( self ) : 
+        """Close the listener's connection or socket.""" 
+
+        if self.conn is not None : 
+            self.conn.close() 
+            self.conn = None 
+
+        if self.sock is not None : 
+            self.sock.close() 
+            self.sock = None 
+
 #-------------------------------------------------------------------------------
 # Task Queue Inspection 
 
@@ -349,6 +487,9 @@ def enqueueTask( type , identifier , input , message = "" ) :
     # enqueue task 
     _inst.task_set.create( lock = 0 , time = _inst.timeInsert ) 
 
+    # wake up waiting ATPDs 
+    notifyQueue() 
+
 
 def reenqueueTask( task_id , message = "" ) : 
     """ Re-enqueue an existing task Instance identified by the given DB record ID 
@@ -370,6 +511,9 @@ def reenqueueTask( task_id , message = "" ) :
     # enqueue task 
     _inst.task_set.create( lock = 0 , time = _inst.timeInsert ) 
 
+    # wake up waiting ATPDs 
+    notifyQueue() 
+
 
 #-------------------------------------------------------------------------------
 
@@ -386,39 +530,90 @@ def dequeueTask( serverID , message = "" ) :
 
     In case of an empty queue the QueueEmpty exception is risen."""
 
-    while True : 
-        # identify taks candidate 
-        try : 
+    return dequeueTasks( serverID , 1 , message ) 
+
 
-            id = Task.objects.filter( lock=0 ).order_by("time")[:1].get().id 
+def dequeueTasks( serverID , count , message = "" ) : 
+    """ Dequeue up to 'count' tasks from the task queue at once. 
+    An unique serverID must be provided to prevent collisions with the other 
+    ATPDs pulling tasks from the same queue. 
 
-        except Task.DoesNotExist : 
+    On PostgreSQL 9.5 or newer the tasks are locked by a single UPDATE 
+    statement skipping the rows locked by concurrent ATPDs (SELECT ... FOR 
+    UPDATE SKIP LOCKED). For older servers and other DB backends the tasks are locked by a conditional UPDATE of the 
+    selected candidates. 
 
-            raise QueueEmpty 
-    
-        # lock candidate assuming atomicity of a single SQL UPDATE statement  
-        if ( Task.objects.filter( id=id , lock=0 ).update( lock=serverID , time = datetime.datetime.now() ) ) :
-            break 
-            
-    # Process locked objects 
-    idx = []
-    for item in Task.objects.filter( lock=serverID ).order_by("time") : 
-        
-        # keep the instance ID  
-        idx.append( item.instance_id ) 
+    The function returns list of the dequeued task Instance IDs. Their status 
+    is set to SCHEDULED and the status changes are logged in bulk. 
 
-        # change objects status 
-        item.instance.status = TaskStatus.SCHEDULED 
-        item.instance.save() 
+    In case of an empty queue the QueueEmpty exception is risen."""
+
+    count = max( 1 , int(count) ) 
+
+    if _supportsSkipLocked() : 
+        items = _lockTasksSkipLocked( serverID , count ) 
+    else : 
+        items = _lockTasks( serverID , count ) 
+
+    if not items : 
+        raise QueueEmpty 
+
+    # keep the order of the queue (task IDs are increasing) 
+    items.sort() 
+    task_ids = [ item[0] for item in items ] 
+    idx = [ item[1] for item in items ] 
 
-        # log status change 
-        _logStatusChange( Instance.objects.get( id = item.instance_id ) , message )  
+    # change objects status and log status change 
+    _setStatus( idx , TaskStatus.SCHEDULED , message ) 
 
-        # delete item 
-        item.delete() 
+    # delete the items from the queue 
+    Task.objects.filter( id__in = task_ids ).delete() 
 
     return idx 
 
+
+def _lockTasksSkipLocked( serverID , count ) : 
+    """ auxiliary function - lock tasks using PostgreSQL 'SKIP LOCKED' 
+    Returns list of (task ID, instance ID) tuples. """ 
+
+    qn = connection.ops.quote_name 
+    table = qn( Task._meta.db_table ) 
+
+    cursor = connection.cursor() 
+    cursor.execute( 
+        "UPDATE %(table)s SET %(lock)s = %%s, %(time)s = %%s WHERE %(id)s IN ( "
+            "SELECT %(id)s FROM %(table)s WHERE %(lock)s = 0 "
+            "ORDER BY %(time)s LIMIT %%s FOR UPDATE SKIP LOCKED "
+        ") RETURNING %(id)s, %(instance)s" % { 
+            "table" : table , "id" : qn("id") , "lock" : qn("lock") , 
+            "time" : qn("time") , "instance" : qn("instance_id") , 
+        } , 
+        [ serverID , datetime.datetime.now() , count ]
+    )
+    items = [ tuple(row) for row in cursor.fetchall() ] 
+    transaction.commit_unless_managed() 
+
+    return items 
+
+
+def _lockTasks( serverID , count ) : 
+    """ auxiliary function - lock tasks by conditional UPDATE (DB agnostic)
+    Returns list of (task ID, instance ID) tuples. """ 
+
+    while True : 
+
+        # identify task candidates 
+        candidates = list( Task.objects.filter( lock=0 ).order_by("time").values_list( "id" , flat=True )[:count] ) 
+
+        if not candidates : 
+            return [] 
+
+        # lock candidates assuming atomicity of a single SQL UPDATE statement  
+        if Task.objects.filter( id__in=candidates , lock=0 ).update( lock=serverID , time = datetime.datetime.now() ) : 
+            break 
+
+    return list( Task.objects.filter( id__in=candidates , lock=serverID ).values_list( "id" , "instance_id" ) ) 
+
 #-------------------------------------------------------------------------------
 
 def startTask( task_id , message = "" ) : 
@@ -433,12 +628,8 @@ def startTask( task_id , message = "" ) :
     instID = _inst.identifier
     input  =  pickle.loads( zlib.decompress( base64.b64decode( _inst.input_set.get().input ) ) )  
     
-    # change objects status 
-    _inst.status = TaskStatus.RUNNING 
-    _inst.save() 
-
-    # log status change 
-    _logStatusChange( Instance.objects.get( id = task_id ) , message )  
+    # change objects status and log status change 
+    _setStatus( [ task_id ] , TaskStatus.RUNNING , message ) 
 
     return ( typeID , instID , typeHn , input )
 
@@ -449,14 +640,9 @@ def startTask( task_id , message = "" ) :
 def _setTaskStatus( task_id , message , status ) : 
     """ auxiliary function """ 
 
-    _inst = Instance.objects.get( id = task_id ) 
-
-    # change objects status 
-    _inst.status = status  
-    _inst.save() 
-
-    # log status change 
-    _logStatusChange( Instance.objects.get( id = task_id ) , message )  
+    # change objects status and log status change 
+    if not _setStatus( [ task_id ] , status , message ) : 
+        raise Instance.DoesNotExist( "Task %s does not exist." % task_id ) 
 
 def _getTaskStatus( task_id ) : 
     """ auxiliary function """ 
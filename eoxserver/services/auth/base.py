@@ -32,11 +32,17 @@ is integrated in the service layer for now).
 """
 
 import logging
+from os.path import getmtime
+from threading import RLock
+from time import time
 
 from django.http import HttpResponse
+from django.utils.datastructures import SortedDict
 
 from eoxserver.core import Component, ExtensionPoint, env
-from eoxserver.core.config import get_eoxserver_config
+from eoxserver.core.config import (
+    get_eoxserver_config, get_instance_config_path
+)
 from eoxserver.core.decoders import config
 from eoxserver.services.auth.exceptions import AuthorisationException
 from eoxserver.services.auth.interfaces import PolicyDecisionPointInterface
@@ -58,17 +64,118 @@ class AuthConfigReader(config.Reader):
     allowLocal = config.Option(type=bool)
     pdp_type = config.Option()
 
+    decision_cache_size = config.Option(type=int, default=1000)
+    decision_cache_ttl = config.Option(type=int, default=300)
+    denial_cache_ttl = config.Option(type=int, default=0)
+    connection_pool_size = config.Option(type=int, default=4)
+    connection_timeout = config.Option(type=float, default=10.0)
+
+
+#-------------------------------------------------------------------------------
+# Decision cache
+#-------------------------------------------------------------------------------
+
+class DecisionCache(object):
+    """ A size bounded cache of authorization decisions. Decisions expire after
+    the given number of seconds; the least recently used decisions are
+    discarded first when the cache is full. Granted and denied decisions have
+    separate lifetimes; a lifetime of ``0`` disables caching of the respective
+    decisions.
+    """
+
+    def __init__(self, max_size=None, ttl=300, denial_ttl=0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.denial_ttl = denial_ttl
+        self._decisions = SortedDict()
+        self._lock = RLock()
+
+
+    def get(self, key):
+        """ Returns the cached ``(authorized, message)`` tuple for the given
+        key or ``None`` if no valid decision is cached.
+        """
+        with self._lock:
+            try:
+                expires, decision = self._decisions.pop(key)
+            except KeyError:
+                return None
+
+            if expires <= time():
+                return None
+
+            self._decisions[key] = (expires, decision)
+            return decision
+
+
+    def set(self, key, decision):
+        """ Caches the ``(authorized, message)`` tuple for the given key,
+        according to the lifetime configured for its outcome.
+        """
+        ttl = self.ttl if decision[0] else self.denial_ttl
+        if not ttl or ttl <= 0:
+            return
+
+        with self._lock:
+            self._decisions.pop(key, None)
+            self._decisions[key] = (time() + ttl, decision)
+            while self.max_size and len(self._decisions) > self.max_size:
+                self._decisions.pop(iter(self._decisions).next())
+
+
+    def clear(self):
+        with self._lock:
+            self._decisions.clear()
+
+
+    def __len__(self):
+        return len(self._decisions)
+
 
 #-------------------------------------------------------------------------------
 # PDP Base Class
 #-------------------------------------------------------------------------------
 
-class BasePDP(object):
+class BasePDP(Component):
     """
     This is the base class for PDP implementations. It provides a skeleton for
     authorization request handling.
+
+    PDPs are components; a single instance is kept per process. Whenever the
+    instance configuration changes, :meth:`configure` is invoked with a fresh
+    :class:`AuthConfigReader` so that implementations can rebuild their
+    configuration dependent state.
     """
 
+    abstract = True
+
+    def __init__(self):
+        self._config_lock = RLock()
+        self._config_mtime = None
+        self._reader = None
+
+
+    def get_config(self):
+        """ Returns the current :class:`AuthConfigReader` of this PDP.
+        """
+        with self._config_lock:
+            mtime = getmtime(get_instance_config_path())
+            if self._reader is None or mtime != self._config_mtime:
+                reader = AuthConfigReader(get_eoxserver_config())
+                self.configure(reader)
+                self._reader = reader
+                self._config_mtime = mtime
+            return self._reader
+
+
+    def configure(self, reader):
+
+        # This method may be overridden to set up configuration dependent
+        # state, like clients or caches. It is called on first use and each
+        # time the instance configuration changed.
+
+        pass
+
     def authorize(self, request):
         """
         This method handles authorization requests according to the
@@ -79,7 +186,7 @@ class BasePDP(object):
         actual authorization decision logic.
         """
 
-        reader = AuthConfigReader(get_eoxserver_config())
+        reader = self.get_config()
 
         # This code segment allows local clients bypassing the
         # Authorisation process.
@@ -123,6 +230,9 @@ class PDPComponent(Component):
 
 
 def getPDP():
+    """ Returns the process-wide PDP instance of the configured type or
+    ``None`` if authorization is deactivated.
+    """
     reader = AuthConfigReader(get_eoxserver_config())
     if not reader.pdp_type or reader.pdp_type == "none":
         logger.debug("Authorization deactivated.")
@@ -30,14 +30,18 @@ import logging
 import os
 import datetime
 import httplib
-import xml.dom.minidom
+import socket
+from threading import Lock
 import eoxserver
 from urlparse import urlparse
 
+from lxml import etree
+from lxml.builder import ElementMaker
+
 from eoxserver.core import implements
-from eoxserver.core.config import get_eoxserver_config
+from eoxserver.core.util.xmltools import NameSpace, NameSpaceMap
 from eoxserver.services.ows.decoders import get_decoder
-from eoxserver.services.auth.base import BasePDP, AuthConfigReader
+from eoxserver.services.auth.base import BasePDP, DecisionCache
 from eoxserver.services.auth.interfaces import PolicyDecisionPointInterface
                                          
 
@@ -59,20 +63,20 @@ dt_date   = "http://www.w3.org/2001/XMLSchema#dateTime"
 dt_any    = "http://www.w3.org/2001/XMLSchema#anyURI"
 
 
-# Template for the XACMLAuthzDecisionQuery
-template_request = "<soapenv:Envelope xmlns:soapenv=\"http://schemas.xmlsoap.org/soap/envelope/\" " + \
-                   "xmlns:xsd=\"http://www.w3.org/2001/XMLSchema\" " + \
-                   "xmlns:xsi=\"http://www.w3.org/2001/XMLSchema-instance\">" + \
-                   "<soapenv:Header></soapenv:Header><soapenv:Body><XACMLAuthzDecisionQuery "  + \
-                   "xmlns=\"urn:oasis:xacml:2.0:saml:protocol:schema:os\">" + \
-                   "<Request xmlns=\"urn:oasis:names:tc:xacml:2.0:context:schema:os\">" + \
-                   "<Subject>{0}</Subject><Resource>{1}</Resource><Action>{2}</Action>" + \
-                   "<Environment>{3}</Environment></Request></XACMLAuthzDecisionQuery>" + \
-                   "</soapenv:Body></soapenv:Envelope>"
+# Namespaces and element makers for the XACMLAuthzDecisionQuery
+ns_soapenv = NameSpace("http://schemas.xmlsoap.org/soap/envelope/", "soapenv")
+ns_xacml_samlp = NameSpace("urn:oasis:xacml:2.0:saml:protocol:schema:os")
+ns_xacml_context = NameSpace("urn:oasis:names:tc:xacml:2.0:context:schema:os")
 
-# Template for the Attributes in the XACMLAuthzDecisionQuery
-template_attribute = "<Attribute AttributeId=\"{0}\" DataType=\"{1}\">" + \
-                     "<AttributeValue>{2}</AttributeValue></Attribute>"
+SOAPENV = ElementMaker(
+    namespace=ns_soapenv.uri, nsmap=NameSpaceMap(ns_soapenv)
+)
+XACMLSAMLP = ElementMaker(
+    namespace=ns_xacml_samlp.uri, nsmap=NameSpaceMap(ns_xacml_samlp)
+)
+XACML = ElementMaker(
+    namespace=ns_xacml_context.uri, nsmap=NameSpaceMap(ns_xacml_context)
+)
 
 
 #-------------------------------------------------------------------------------
@@ -80,24 +84,52 @@ template_attribute = "<Attribute AttributeId=\"{0}\" DataType=\"{1}\">" + \
 #-------------------------------------------------------------------------------
 
 class CharonPDP(BasePDP):
+    """ PDP querying the CHARON Policy Management and Authorisation Service.
+
+    Decisions are cached per combination of subject attributes, resource
+    attributes and action, so that subsequent requests of the same session
+    (e.g. tiles of a map) do not cause additional queries at the service.
+    """
+
     implements(PolicyDecisionPointInterface)
     # please do not remove this dictionary; it is needed for EOxServer internal
     # processes
 
     pdp_type = "charon"
 
-    def __init__(self, client=None):
+    def __init__(self):
+        super(CharonPDP, self).__init__()
+        self.client = None
+        self.decisions = None
+        self.attribMapping = {}
+        self.serviceID = "default"
 
-        cfgReader = AuthConfigReader(get_eoxserver_config())
-        url = cfgReader.authorisationServiceURL
 
-        # For tests
-        self.client = client or AuthorisationClient(url)
-        self.attribMapping = {}
+    def configure(self, reader):
+        if self.client is not None:
+            self.client.close()
 
-        self.serviceID = cfgReader.serviceID or "default"
+        self.client = self._createClient(reader)
+        self.decisions = DecisionCache(
+            reader.decision_cache_size, reader.decision_cache_ttl,
+            reader.denial_cache_ttl
+        )
+        self.serviceID = reader.serviceID or "default"
+        self.attribMapping = self._loadAttributeMapping(
+            reader.attribute_mapping
+        )
+
+
+    # Creates the client to query authorisation decisions with
+    def _createClient(self, reader):
+        return AuthorisationClient(
+            reader.authz_service, reader.connection_pool_size,
+            reader.connection_timeout
+        )
 
-        dictLocation = cfgReader.getAttributeMappingDictionary()
+
+    # Reads the attribute mapping dictionary
+    def _loadAttributeMapping(self, dictLocation):
         if not dictLocation or dictLocation == "default":
             basePath = os.path.split(eoxserver.__file__)[0]
             dictLocation = os.path.join(basePath, 'conf', 'defaultAttributeDictionary')
@@ -105,6 +137,7 @@ class CharonPDP(BasePDP):
         CHAR_COMMENT = '#'
         CHAR_ASSIGN  = '='
 
+        attribMapping = {}
         try:
             logger.debug(
                 "Loading attribute dictionary from the file %s" % dictLocation
@@ -117,7 +150,7 @@ class CharonPDP(BasePDP):
                         key, value = line.split(CHAR_ASSIGN, 1)
                         key = key.strip()
                         value = value.strip()
-                        self.attribMapping[key] = value
+                        attribMapping[key] = value
                         logger.debug(
                             "Adding SAML attribute to dictionary: %s = %s" 
                             % (key, value)
@@ -128,6 +161,8 @@ class CharonPDP(BasePDP):
                 "%s" % dictLocation
             )
 
+        return attribMapping
+
 
     # Extracts the asserted subject attributes from the OWS Request
     def _getAssertedAttributes(self, request):
@@ -153,7 +188,7 @@ class CharonPDP(BasePDP):
 
 
     # Extracts the resource specific attributes from the OWS Request
-    def _getResourceAttributes(self, request):
+    def _getResourceAttributes(self, request, decoder=None):
         httpHeader = request.META
         attributes = {}
 
@@ -162,7 +197,7 @@ class CharonPDP(BasePDP):
         else :
             attributes[attrib_resource] = self.serviceID
 
-        decoder = get_decoder(request)
+        decoder = decoder or get_decoder(request)
         attributes['serviceType'] = decoder.service.lower()
         attributes['serverName'] = httpHeader['SERVER_NAME']
 
@@ -171,14 +206,34 @@ class CharonPDP(BasePDP):
 
     # performs the actual authz. decision
     def _decide(self, request):
+        self.get_config()
 
         decoder = get_decoder(request)
         userAttributes     = self._getAssertedAttributes(request)
-        resourceAttributes = self._getResourceAttributes(request)
+        resourceAttributes = self._getResourceAttributes(request, decoder)
+        action = decoder.request.lower()
 
-        result = self.client.authorize(
-            userAttributes, resourceAttributes, decoder.request.lower()
+        key = (
+            frozenset(userAttributes.iteritems()),
+            frozenset(resourceAttributes.iteritems()),
+            action
         )
+
+        result = self.decisions.get(key)
+        if result is not None:
+            logger.debug("Using cached authorisation decision.")
+            return result
+
+        try:
+            result = self.client.authorize(
+                userAttributes, resourceAttributes, action
+            )
+        except AuthorisationClientException, e:
+            # failed queries are not decisions and are thus never cached
+            logger.warn(str(e))
+            return (False, str(e))
+
+        self.decisions.set(key, result)
         return result
 
 #-------------------------------------------------------------------------------
@@ -190,21 +245,28 @@ class AuthorisationClient(object):
     SOAP client for the CHARON Policy Management and Authorisation
     Service
 
-    .. method::  __init__(authz_service_url)
+    .. method::  __init__(authz_service_url, pool_size=4, timeout=None)
 
-        Constructor with Authorisation Service URL
+        Constructor with Authorisation Service URL. Up to ``pool_size`` idle
+        connections to the service are kept open and reused by subsequent
+        queries.
 
     .. method:: authorize(userAttributes, resource, action, request)
 
         This method performs an authorisation request at the Policy Management and
         Authorisation Service.
 
+    .. method:: close()
+
+        Closes all idle connections.
+
     """
 
-    def __init__(self, url):
+    def __init__(self, url, pool_size=4, timeout=None):
 
         urlObject = urlparse(url)
 
+        self.secure = urlObject.scheme == 'https'
         self.port = 80 if urlObject.scheme == 'http' else \
             443 if urlObject.scheme == 'https' else None
         self.hostname = urlObject.hostname
@@ -217,92 +279,153 @@ class AuthorisationClient(object):
         if (self.hostname is None or self.port is None):
             raise AuthorisationClientException("Invalid argument in constructor: "+str(url)+\
                                                " is not a valid URL.")
+
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._connections = []
+        self._lock = Lock()
+
         logger.debug("Created instance of AuthorisationClient with the URL "+str(url))
 
 
+    @property
+    def location(self):
+        return str(self.hostname)+":"+str(self.port)+str(self.path)
+
+
     def authorize(self, userAttributes, resourceAttributes, action):
         request = self._getFullRequest(userAttributes, resourceAttributes, action)
 
-        logger.debug("Sending XACMLAuthzDecisionQuery to "+\
-                      str(self.hostname)+":"+str(self.port)+str(self.path)+":\n"+\
+        logger.debug("Sending XACMLAuthzDecisionQuery to "+self.location+":\n"+\
                       request)
 
-        connection = httplib.HTTPConnection(self.hostname, self.port)
-        connection.request('POST', self.path, request, self.headers)
-        response = connection.getresponse()
+        status, reason, message = self._post(request)
 
         # Check for response codes
-        if response.status != 200 :
-            message = "Received an invalid status code ("+str(response.status)+") when "+\
-                      "trying to perform an authorisation query at "+\
-                      str(self.hostname)+":"+str(self.port)+str(self.path)+\
-                      " Server Message: "+response.reason
-            logger.warn(message)
-            return (False, message)
-
+        if status != 200 :
+            raise AuthorisationClientException(
+                "Received an invalid status code ("+str(status)+") when "+\
+                "trying to perform an authorisation query at "+\
+                self.location+" Server Message: "+reason
+            )
 
-        message = response.read()
-        connection.close()
         logger.debug("Received the following response from server:\n" + message)
-        dom = xml.dom.minidom.parseString(message)
-        decision = dom.getElementsByTagNameNS('urn:oasis:names:tc:xacml:2.0:context:schema:os','Decision')
 
-        for node in decision:
-            if node.hasChildNodes and node.firstChild.nodeType == xml.dom.minidom.Node.TEXT_NODE:
-                value = node.firstChild.data
+        try:
+            tree = etree.fromstring(message)
+        except etree.XMLSyntaxError, e:
+            raise AuthorisationClientException(
+                "Invalid response from Authorisation Service: %s" % e
+            )
+
+        for node in tree.iter(ns_xacml_context("Decision")):
+            if node.text:
+                value = node.text.strip()
                 if "Permit" == value:
                     return (True, value)
                 else :
                     return (False, "Authorisation Decision: "+value)
 
+        raise AuthorisationClientException(
+            'Invalid response from Authorisation Service'
+        )
 
-        return (False, 'Invalid response from Authorisation Service')
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+
+        for connection in connections:
+            connection.close()
+
+
+    # POSTs the request and returns the status, reason and content of the
+    # response. Reused connections might have been closed by the server in the
+    # meantime; in that case the request is repeated on a new connection.
+    def _post(self, request):
+        connection, reused = self._acquireConnection()
+        while True:
+            try:
+                connection.request('POST', self.path, request, self.headers)
+                response = connection.getresponse()
+                content = response.read()
+            except (httplib.HTTPException, socket.error), e:
+                connection.close()
+                if reused:
+                    connection, reused = self._createConnection(), False
+                    continue
+                raise AuthorisationClientException(
+                    "Failed to perform an authorisation query at "+\
+                    self.location+": "+str(e)
+                )
+
+            if response.will_close:
+                connection.close()
+            else:
+                self._releaseConnection(connection)
+
+            return response.status, response.reason, content
 
 
-    # Get XML snippet for the Subject part of the XACMLAuthzDecisionQuery
-    def _getPartSubject(self, userAttributes):
-        part = ""
-        for attID in userAttributes:
-            part += template_attribute.format(attID, \
-                                              dt_string, \
-                                              userAttributes[attID])
-        return part
+    def _acquireConnection(self):
+        with self._lock:
+            if self._connections:
+                return self._connections.pop(), True
+        return self._createConnection(), False
 
 
-    # Get XML snippet for the Resource part of the XACMLAuthzDecisionQuery
-    def _getPartResource(self, resourceAttributes):
+    def _releaseConnection(self, connection):
+        with self._lock:
+            if len(self._connections) < self.pool_size:
+                self._connections.append(connection)
+                return
+        connection.close()
 
-        part = ""
-        for attID in resourceAttributes:
-            part += template_attribute.format(attID, \
-                                              dt_string, \
-                                              resourceAttributes[attID])
-        return part
 
+    def _createConnection(self):
+        connection_class = httplib.HTTPSConnection if self.secure \
+            else httplib.HTTPConnection
+        return connection_class(self.hostname, self.port, timeout=self.timeout)
 
 
-    # Get XML snippet for the Action part of the XACMLAuthzDecisionQuery
-    def _getPartAction(self, action):
-        return template_attribute.format(attrib_action, \
-                                         dt_string, \
-                                         action)
+    # Get the Attribute elements for the given ID/value pairs
+    def _getAttributes(self, attributes, dataType=dt_string):
+        return [
+            XACML("Attribute",
+                XACML("AttributeValue", unicode(value)),
+                AttributeId=attID, DataType=dataType
+            )
+            for attID, value in attributes.iteritems()
+        ]
 
 
-    # Get XML snippet for the Environment part of the XACMLAuthzDecisionQuery
-    def _getPartEnvironment(self):
+    # Get the Environment attributes of the XACMLAuthzDecisionQuery
+    def _getEnvironment(self):
         now = datetime.datetime.now()
         formattedNow = now.strftime("%Y-%m-%dT%H:%M:%S.%f%z")
-        return template_attribute.format(attrib_current_date, \
-                                         dt_date, \
-                                         formattedNow)
+        return self._getAttributes({attrib_current_date: formattedNow}, dt_date)
 
 
     # Get the full XACMLAuthzDecisionQuery
     def _getFullRequest(self, userAttributes, resourceAttributes, action):
-        return template_request.format(self._getPartSubject(userAttributes), \
-                                       self._getPartResource(resourceAttributes), \
-                                       self._getPartAction(action), \
-                                       self._getPartEnvironment())
+        envelope = SOAPENV("Envelope",
+            SOAPENV("Header"),
+            SOAPENV("Body",
+                XACMLSAMLP("XACMLAuthzDecisionQuery",
+                    XACML("Request",
+                        XACML("Subject", *self._getAttributes(userAttributes)),
+                        XACML("Resource",
+                            *self._getAttributes(resourceAttributes)
+                        ),
+                        XACML("Action",
+                            *self._getAttributes({attrib_action: action})
+                        ),
+                        XACML("Environment", *self._getEnvironment())
+                    )
+                )
+            )
+        )
+        return etree.tostring(envelope, encoding="UTF-8")
 
 
 #-------------------------------------------------------------------------------
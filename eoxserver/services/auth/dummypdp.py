@@ -7,7 +7,6 @@ import eoxserver
 from urlparse import urlparse
 
 from eoxserver.core import implements
-from eoxserver.services.auth.base import BasePDP
 from eoxserver.services.auth.interfaces import PolicyDecisionPointInterface
 from eoxserver.services.auth.charonpdp import CharonPDP
 
@@ -21,11 +20,13 @@ validUser = {
     'description': 'Authorized User'
 }
 
-class DummyPDP(BasePDP):
+class DummyPDP(CharonPDP):
     implements(PolicyDecisionPointInterface)
 
-    def __init__(self):
-        self.pdp = CharonPDP(DummyAuthzClient())
+    pdp_type = "dummypdp"
+
+    def _createClient(self, reader):
+        return DummyAuthzClient()
 
     def _decide(self, request):
         httpHeader = request.META
@@ -33,7 +34,7 @@ class DummyPDP(BasePDP):
         #checks if a attribute 'DUMMY_MODE' is in the headers
         if 'DUMMY_MODE' in httpHeader:
             logger.info("Security Test: 'DUMMY_MODE' parameter in HTTP header")
-            return self.pdp._decide(request)
+            return super(DummyPDP, self)._decide(request)
         else :
             return (True, 'No authorisation testing')
 
@@ -48,3 +49,6 @@ class DummyAuthzClient(object):
                 return (False, 'Not Authorised')
 
         return (True, 'Authorised')
+
+    def close(self):
+        pass
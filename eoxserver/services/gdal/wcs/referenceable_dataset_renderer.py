@@ -27,21 +27,25 @@
 #-------------------------------------------------------------------------------
 
 
-from os.path import splitext, abspath
+import os
+from os.path import splitext, abspath, join
 from datetime import datetime
+from urllib import unquote
 from uuid import uuid4
+import tempfile
 
 from django.contrib.gis.geos import GEOSGeometry
 
 from eoxserver.core import Component, implements
 from eoxserver.core.util.rect import Rect
 from eoxserver.backends.access import connect
-from eoxserver.contrib import gdal, osr
+from eoxserver.contrib import gdal, osr, vsi
 from eoxserver.contrib.vrt import VRTBuilder
 from eoxserver.resources.coverages import models
+from eoxserver.resources.coverages.formats import getFormatRegistry
 from eoxserver.services.ows.version import Version
 from eoxserver.services.subset import Subsets
-from eoxserver.services.result import ResultFile, ResultBuffer
+from eoxserver.services.result import ResultFile, ResultVSIFile, ResultBuffer
 from eoxserver.services.ows.wcs.interfaces import WCSCoverageRendererInterface
 from eoxserver.services.ows.wcs.v20.encoders import WCS20EOXMLEncoder
 from eoxserver.processing.gdal import reftools
@@ -73,16 +77,30 @@ class GDALReferenceableDatasetRenderer(Component):
             coverage, data_items, range_type
         )
 
+        # transformer method and order, preferably persisted at registration
+        transformer_params = self.get_transformer_params(coverage, src_ds)
+
         # retrieve area of interest of the source image according to given 
         # subsets
-        src_rect = self.get_source_image_rect(src_ds, subsets)
+        src_rect = self.get_source_image_rect(
+            src_ds, subsets, transformer_params
+        )
 
         # deduct "native" format of the source image
         native_format = data_items[0].format if len(data_items) == 1 else None
 
         # get the requested image format, which defaults to the native format
-        # if available
-        format = params.format or native_format
+        # if available. The source format is mapped to a writeable WCS 2.0 
+        # native format, as e.g. the ENVISAT driver is read-only.
+        format = params.format
+        if not format:
+            registry = getFormatRegistry()
+            source_format = (
+                registry.getFormatByMIME(native_format) 
+                if native_format else None
+            )
+            reg_format = registry.mapSourceToNativeWCS20(source_format)
+            format = reg_format.mimeType if reg_format else None
 
         if not format:
             raise Exception("No format specified.")
@@ -99,27 +117,36 @@ class GDALReferenceableDatasetRenderer(Component):
                 src_ds, src_rect
             )
 
-        # encode the processed dataset and save it to the filesystem
-        out_ds, out_driver = self.encode(subsetted_ds, format)
+        # encode the processed dataset either in memory or on the filesystem
+        out_ds, mime_type = self.encode(subsetted_ds, format)
 
-        driver_metadata = out_driver.GetMetadata_Dict()
-        mime_type = driver_metadata.get("DMD_MIMETYPE")
+        try:
+            paths = out_ds.GetFileList()
+            multipart = params.mediatype.startswith("multipart")
+            if multipart and subsets.has_x and subsets.has_y:
+                footprint = GEOSGeometry(
+                    reftools.get_footprint_wkt(out_ds, **transformer_params)
+                )
+            else:
+                footprint = None
+        finally:
+            # close the dataset to flush all pending writes
+            del out_ds
 
         time_stamp = datetime.now().strftime("%Y%m%d%H%M%S")
         filename_base = "%s_%s" % (coverage.identifier, time_stamp)
 
         result_set = [
-            ResultFile(
+            (ResultVSIFile if path.startswith("/vsi") else ResultFile)(
                 path, mime_type, filename_base + splitext(path)[1],
                 ("cid:coverage/%s" % coverage.identifier) if i == 0 else None
-            ) for i, path in enumerate(out_ds.GetFileList())
+            ) for i, path in enumerate(paths)
         ]
 
-        if params.mediatype.startswith("multipart"):
+        if multipart:
             reference = result_set[0].identifier
             
-            if subsets.has_x and subsets.has_y:
-                footprint = GEOSGeometry(reftools.get_footprint_wkt(out_ds))
+            if footprint:
                 encoder_subset = (
                     subsets.xy_srid, src_rect.size, coverage.extent, footprint
                 )
@@ -127,11 +154,17 @@ class GDALReferenceableDatasetRenderer(Component):
                 encoder_subset = None
 
             encoder = WCS20EOXMLEncoder()
-            content = encoder.serialize(
-                encoder.encode_referenceable_dataset(
-                    coverage, range_type, reference, mime_type, encoder_subset
+            try:
+                content = encoder.serialize(
+                    encoder.encode_referenceable_dataset(
+                        coverage, range_type, reference, mime_type, 
+                        encoder_subset
+                    )
                 )
-            )
+            except:
+                for item in result_set:
+                    item.delete()
+                raise
             result_set.insert(0, ResultBuffer(content, encoder.content_type))
 
         return result_set
@@ -139,7 +172,7 @@ class GDALReferenceableDatasetRenderer(Component):
 
     def get_source_dataset(self, coverage, data_items, range_type):
         if len(data_items) == 1:
-            return gdal.OpenShared(abspath(connect(data_items[0])))
+            return gdal.OpenShared(_get_path(data_items[0]))
         else:
             vrt = VRTBuilder(
                 coverage.size_x, coverage.size_y,
@@ -152,7 +185,7 @@ class GDALReferenceableDatasetRenderer(Component):
             gcps = []
             compound_index = 0
             for data_item in data_items:
-                path = abspath(connect(data_item))
+                path = _get_path(data_item)
 
                 # iterate over all bands of the data item
                 for set_index, item_index in self._data_item_band_indices(data_item):
@@ -169,7 +202,18 @@ class GDALReferenceableDatasetRenderer(Component):
             return vrt.dataset
 
 
-    def get_source_image_rect(self, dataset, subsets):
+    def get_transformer_params(self, coverage, dataset):
+        """ Returns the GCP transformer method and order for the coverage. If
+            they were not persisted upon registration, they are suggested for
+            the dataset.
+        """
+        params = getattr(coverage.cast(), "transformer_params", None)
+        if params is None:
+            params = reftools.suggest_transformer(dataset)
+        return params
+
+
+    def get_source_image_rect(self, dataset, subsets, transformer_params=None):
         size_x, size_y = dataset.RasterXSize, dataset.RasterYSize
         image_rect = Rect(0, 0, size_x, size_y)
 
@@ -195,7 +239,8 @@ class GDALReferenceableDatasetRenderer(Component):
 
             # subset in geographical coordinates
             subset_rect = reftools.rect_from_subset(
-                vrt.dataset, subsets.xy_srid, minx, miny, maxx, maxy
+                vrt.dataset, subsets.xy_srid, minx, miny, maxx, maxy,
+                **(transformer_params or {})
             )
 
         # check whether or not the subsets intersect with the image
@@ -258,15 +303,47 @@ class GDALReferenceableDatasetRenderer(Component):
         return vrt.dataset
 
     def encode(self, dataset, format):
-        #format, options = None
-        options = {}
-        options = [
-            ("%s=%s" % key, value) for key, value in (options or {}).items()
-        ]
+        """ Encodes the dataset in the requested format, which may include
+            creation options (e.g. ``image/tiff;compress=lzw``). Small outputs
+            are written to ``/vsimem/``, large outputs (or those of drivers
+            without virtual I/O support) to a temporary file. Returns the
+            output dataset and its MIME type.
+        """
+
+        mime_type, options = split_format(format)
+
+        reg_format = getFormatRegistry().getFormatByMIME(mime_type)
+        if not reg_format or not reg_format.driver.startswith("GDAL/"):
+            raise Exception("Unsupported output format '%s'." % mime_type)
+
+        out_driver = gdal.GetDriverByName(reg_format.driver[len("GDAL/"):])
+        if out_driver is None:
+            raise Exception("Unsupported output format '%s'." % mime_type)
+
+        # drivers supporting Create() provide a generic CreateCopy()
+        metadata = out_driver.GetMetadata_Dict()
+        if "YES" not in (metadata.get("DCAP_CREATECOPY"), 
+                         metadata.get("DCAP_CREATE")):
+            raise Exception("Output format '%s' is not writeable." % mime_type)
+
+        options = ["%s=%s" % (key, value) for key, value in options]
+
+        if (metadata.get("DCAP_VIRTUALIO") == "YES" 
+                and estimate_size(dataset) <= VSIMEM_MAX_SIZE):
+            path = temp_vsimem_filename() + reg_format.defaultExt
+        else:
+            path = join(
+                tempfile.gettempdir(), uuid4().hex + reg_format.defaultExt
+            )
+
+        try:
+            out_ds = out_driver.CreateCopy(path, dataset, True, options)
+        except:
+            # remove any partially written files
+            cleanup_files(path)
+            raise
 
-        path = "/tmp/%s" % uuid4().hex
-        out_driver = gdal.GetDriverByName("GTiff")
-        return out_driver.CreateCopy(path, dataset, True, options), out_driver
+        return out_ds, reg_format.mimeType
 
 
 def index_of(iterable, predicate, default=None, start=1):
@@ -278,3 +355,53 @@ def index_of(iterable, predicate, default=None, start=1):
 
 def temp_vsimem_filename():
     return "/vsimem/%s" % uuid4().hex
+
+
+# outputs estimated to be larger are written to disk instead of /vsimem/
+VSIMEM_MAX_SIZE = 64 * 1024 * 1024
+
+
+def split_format(frmt):
+    """ Splits a format string like ``image/tiff;compress=lzw`` into the MIME 
+        type and a list of key/value option pairs.
+    """
+    parts = unquote(frmt).split(";")
+    mime_type = parts[0].strip()
+    options = [
+        map(lambda i: i.strip(), part.split("=", 1)) 
+        for part in parts[1:] if "=" in part
+    ]
+    return mime_type, options
+
+
+def estimate_size(dataset):
+    """ Returns the uncompressed size of the dataset in bytes.
+    """
+    return sum(
+        dataset.RasterXSize * dataset.RasterYSize
+        * gdal.GetDataTypeSize(dataset.GetRasterBand(i).DataType) / 8
+        for i in xrange(1, dataset.RasterCount + 1)
+    )
+
+
+def cleanup_files(path):
+    """ Removes the given file and any auxiliary files created alongside.
+    """
+    for filename in (path, path + ".aux.xml"):
+        try:
+            if filename.startswith("/vsi"):
+                vsi.unlink(filename)
+            elif os.path.exists(filename):
+                os.remove(filename)
+        except Exception:
+            pass
+
+
+def _get_path(data_item):
+    """ Returns the absolute path to the data item. GDAL virtual file system 
+        paths are returned as they are.
+    """
+    path = connect(data_item)
+    if path.startswith("/vsi"):
+        return path
+    return abspath(path)
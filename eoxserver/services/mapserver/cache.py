@@ -0,0 +1,178 @@
+#-------------------------------------------------------------------------------
+# $Id$
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2011 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" This module provides a per-process cache for prebuilt MapServer objects 
+like layers and maps. Cached objects serve as templates and are cloned for each
+request, as MapServer objects are altered when they are connected or inserted
+into a map.
+
+Templates of coverage layers are keyed by the revisions of the coverage and its
+range type (see :mod:`eoxserver.resources.coverages.revision`), so they are 
+replaced once the coverage, its data items or its range type change. The whole
+cache is cleared when the instance configuration is modified.
+"""
+
+from os.path import getmtime
+from threading import RLock
+
+from django.utils.datastructures import SortedDict
+
+from eoxserver.core.config import (
+    get_eoxserver_config, get_instance_config_path
+)
+from eoxserver.core.decoders import config
+from eoxserver.resources.coverages.revision import get_object_revisions
+
+
+class MapServerConfigReader(config.Reader):
+    section = "services.mapserver"
+    template_cache_size = config.Option(type=int, default=1000)
+
+
+class TemplateCache(object):
+    """ A size bounded cache of template objects. The least recently used 
+    templates are discarded first.
+    """
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size
+        self._templates = SortedDict()
+        self._lock = RLock()
+
+
+    def get(self, key, create):
+        """ Returns the template for the given key. If it is not yet cached, it
+        is created by calling ``create``. The returned object must not be 
+        altered.
+        """
+        with self._lock:
+            try:
+                template = self._templates.pop(key)
+                self._templates[key] = template
+                return template
+            except KeyError:
+                pass
+
+        template = create()
+
+        with self._lock:
+            self._templates[key] = template
+            while self.max_size and len(self._templates) > self.max_size:
+                self._templates.pop(iter(self._templates).next())
+
+        return template
+
+
+    def get_clone(self, key, create):
+        """ Returns a clone of the template for the given key.
+        """
+        return self.get(key, create).clone()
+
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
+
+
+    def __len__(self):
+        return len(self._templates)
+
+
+_template_cache = None
+_config_mtime = None
+_template_cache_lock = RLock()
+
+
+def get_template_cache():
+    """ Returns the template cache of this process. The cache is cleared when 
+    the configuration has changed.
+    """
+    global _template_cache, _config_mtime
+    with _template_cache_lock:
+        mtime = getmtime(get_instance_config_path())
+        if _template_cache is None or mtime != _config_mtime:
+            _template_cache = TemplateCache(
+                MapServerConfigReader(
+                    get_eoxserver_config()
+                ).template_cache_size
+            )
+            _config_mtime = mtime
+        return _template_cache
+
+
+def get_coverage_revisions(coverages):
+    """ Returns a dict mapping the primary keys of the coverages to a tuple of 
+    the revisions of the coverage and its range type. Other objects are 
+    ignored.
+    """
+    coverages = [
+        coverage for coverage in coverages 
+        if getattr(coverage, "range_type_id", None) is not None
+    ]
+    coverage_revisions = get_object_revisions(
+        "coverage", [coverage.pk for coverage in coverages]
+    )
+    range_type_revisions = get_object_revisions(
+        "range_type", set(coverage.range_type_id for coverage in coverages)
+    )
+    return dict(
+        (coverage.pk, (
+            coverage_revisions[coverage.pk], 
+            range_type_revisions[coverage.range_type_id]
+        )) for coverage in coverages
+    )
+
+
+def generate_layers(factory, coverage, group_layer, suffix, options, 
+                    revision=None):
+    """ Returns a tuple of the layers and data items generated by the factory 
+    for the given coverage. If the factory is marked as ``cacheable`` and the 
+    ``revision`` of the coverage is given, the layers are clones of cached 
+    templates. The options listed in the factories ``cache_options`` are part
+    of the key.
+    """
+    if not getattr(factory, "cacheable", False) or revision is None:
+        return tuple(factory.generate(coverage, group_layer, suffix, options))
+
+    key = (
+        type(factory), coverage.pk, suffix, revision, tuple(
+            (name, repr(options.get(name))) 
+            for name in getattr(factory, "cache_options", ())
+        )
+    )
+
+    def create():
+        return tuple(
+            (layer, tuple(data_items)) for layer, data_items 
+            in factory.generate(coverage, group_layer, suffix, options)
+        )
+
+    return tuple(
+        (layer.clone(), data_items) 
+        for layer, data_items in get_template_cache().get(key, create)
+    )
@@ -47,7 +47,10 @@ class TileIndexConnector(Component):
         )
 
     def connect(self, coverage, data_items, layer):
-        layer.tileindex = os.path.abspath(connect(data_items[0]))
+        path = connect(data_items[0])
+        if not path.startswith("/vsi"):
+            path = os.path.abspath(path)
+        layer.tileindex = path
         layer.tileitem = "location"
 
     def disconnect(self, coverage, data_items, layer):
@@ -36,6 +36,9 @@ from eoxserver.contrib import mapserver as ms
 from eoxserver.resources.coverages import crss
 from eoxserver.resources.coverages.models import RectifiedStitchedMosaic
 from eoxserver.resources.coverages.formats import getFormatRegistry
+from eoxserver.services.mapserver.cache import (
+    get_template_cache, get_coverage_revisions
+)
 
 
 class WCSConfigReader(config.Reader):
@@ -50,8 +53,14 @@ class BaseRenderer(Component):
     abstract = True
 
     def create_map(self):
-        """ Helper function to create a WCS enabled MapServer mapObj.
+        """ Helper function to create a WCS enabled MapServer mapObj. The map is
+            cloned from a template that is only set up once per process.
         """
+        return get_template_cache().get_clone(
+            (BaseRenderer, "map"), self._create_map_template
+        )
+
+    def _create_map_template(self):
         map_ = ms.mapObj()
         map_.setMetaData("ows_enable_request", "*")
         maxsize = WCSConfigReader(get_eoxserver_config()).maxsize
@@ -70,8 +79,19 @@ class BaseRenderer(Component):
 
     def layer_for_coverage(self, coverage, native_format, version=None):
         """ Helper method to generate a WCS enabled MapServer layer for a given 
-            coverage.
+            coverage. The layer is cloned from a cached template, which is 
+            replaced when the coverage or its range type change.
         """
+        revision = get_coverage_revisions([coverage]).get(coverage.pk)
+        return get_template_cache().get_clone(
+            (BaseRenderer, "layer", coverage.pk, revision, native_format, 
+             str(version)), 
+            lambda: self._create_coverage_layer(
+                coverage, native_format, version
+            )
+        )
+
+    def _create_coverage_layer(self, coverage, native_format, version=None):
         range_type = coverage.range_type
         bands = list(range_type)
 
@@ -29,7 +29,8 @@ from itertools import chain
 
 from eoxserver.core import Component, implements, ExtensionPoint
 from eoxserver.core.config import get_eoxserver_config
-from eoxserver.core.util.timetools import isoformat
+from eoxserver.core.decoders import config
+from eoxserver.core.util.timetools import encode_time_extent
 from eoxserver.contrib.mapserver import create_request, Map, Layer, Class, Style
 from eoxserver.resources.coverages import crss, models
 from eoxserver.resources.coverages.formats import getFormatRegistry
@@ -94,6 +95,11 @@ class MapServerWMSCapabilitiesRenderer(Component):
 
         map_extent = None
 
+        max_items = WMSCapabilitiesConfigReader(
+            get_eoxserver_config()
+        ).time_extent_max_items
+        time_extents = self.get_time_extents(collections)
+
         for collection in collections:
             group_name = None
             
@@ -102,17 +108,8 @@ class MapServerWMSCapabilitiesRenderer(Component):
             # save overall map extent
             map_extent = self.join_extents(map_extent, extent)
 
-            eo_objects = collection.eo_objects.filter(
-                begin_time__isnull=False, end_time__isnull=False
-            )
-            timeextent = ",".join(
-                map(
-                    lambda o: (
-                        "/".join(
-                            map(isoformat, o.time_extent)
-                        ) + "/PT1S"
-                    ), eo_objects
-                )
+            timeextent = encode_time_extent(
+                time_extents.get(collection.pk, ()), max_items
             )
 
             if len(suffixes) > 1:
@@ -184,6 +181,24 @@ class MapServerWMSCapabilitiesRenderer(Component):
         result = result_set_from_raw_data(raw_result)
         return result, get_content_type(result)
 
+    def get_time_extents(self, collections):
+        """ Returns a dict mapping the primary keys of the collections to the
+        time extents of their direct members, fetched by a single query.
+        """
+        time_extents = {}
+        values = models.EOObjectToCollectionThrough.objects.filter(
+            collection__in=collections, 
+            eo_object__begin_time__isnull=False,
+            eo_object__end_time__isnull=False
+        ).values_list(
+            "collection_id", "eo_object__begin_time", "eo_object__end_time"
+        )
+        for collection_id, begin_time, end_time in values:
+            time_extents.setdefault(collection_id, []).append(
+                (begin_time, end_time)
+            )
+        return time_extents
+
     def get_wms_formats(self):
         return getFormatRegistry().getSupportedFormatsWMS()
 
@@ -203,3 +218,8 @@ class MapServerWMSCapabilitiesRenderer(Component):
             return e2
         else:
             return None
+
+
+class WMSCapabilitiesConfigReader(config.Reader):
+    section = "services.ows.wms"
+    time_extent_max_items = config.Option(type=int, default=100)
@@ -35,6 +35,7 @@ from eoxserver.core import Component, implements
 from eoxserver.contrib import mapserver as ms
 from eoxserver.resources.coverages import models, crss
 from eoxserver.services.mapserver.interfaces import LayerFactoryInterface
+from eoxserver.services.mapserver.cache import get_template_cache
 
 from eoxserver.resources.coverages.dateline import (
     extent_crosses_dateline, wrap_extent_around_dateline
@@ -109,8 +110,15 @@ class OffsiteColorMixIn(object):
 
 class PolygonLayerMixIn(object):
     def _create_polygon_layer(self, name):
-        layer = ms.layerObj()
+        # the styled layer is only set up once per process and then cloned
+        layer = get_template_cache().get_clone(
+            (type(self), "polygon"), self._create_polygon_layer_template
+        )
         layer.name = name
+        return layer
+
+    def _create_polygon_layer_template(self):
+        layer = ms.layerObj()
         layer.type = ms.MS_LAYER_POLYGON
 
         self.apply_styles(layer)
@@ -186,6 +194,9 @@ class BaseCoverageLayerFactory(OffsiteColorMixIn, PlainLayerMixIn, Component):
     #       component's imports.
     abstract = True 
 
+    # the generated layers only depend on the coverage and may be cached
+    cacheable = True
+
     def generate(self, eo_object, group_layer, suffix, options):
         coverage = eo_object.cast()
         extent = coverage.extent
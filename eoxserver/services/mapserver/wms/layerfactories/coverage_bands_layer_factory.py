@@ -48,6 +48,10 @@ class CoverageBandsLayerFactory(OffsiteColorMixIn, AbstractLayerFactory):
     suffixes = ("_bands",)
     requires_connection = True
 
+    # the generated layers depend on the requested bands
+    cacheable = True
+    cache_options = ("bands",)
+
     def generate(self, eo_object, group_layer, suffix, options):
         name = eo_object.identifier + "_bands"
         layer = Layer(name)
@@ -28,6 +28,7 @@
 import logging
 
 from eoxserver.core import Component, implements
+from eoxserver.contrib import vsi
 from eoxserver.backends.access import connect
 from eoxserver.services.mapserver.interfaces import StyleApplicatorInterface
 
@@ -46,5 +47,5 @@ class SLDStyleApplicator(Component):
         for sld_item in sld_items:
             
             sld_filename = connect(sld_item)
-            with open(sld_filename) as f:
+            with vsi.open(sld_filename) as f:
                 layer.applySLD(f.read(), coverage.identifier)
@@ -39,6 +39,9 @@ from eoxserver.services.mapserver.interfaces import (
     ConnectorInterface, LayerFactoryInterface, StyleApplicatorInterface
 )
 from eoxserver.services.result import result_set_from_raw_data, get_content_type
+from eoxserver.services.mapserver.cache import (
+    get_template_cache, get_coverage_revisions, generate_layers
+)
 
 
 logger = logging.getLogger(__name__)
@@ -54,21 +57,31 @@ class MapServerWMSBaseComponent(Component):
 
 
     def render(self, layer_groups, request_values, **options):
-        map_ = ms.Map()
-        map_.setMetaData("ows_enable_request", "*")
-        map_.setProjection("EPSG:4326")
-        map_.imagecolor.setRGB(0, 0, 0)
+        map_ = get_template_cache().get_clone(
+            (MapServerWMSBaseComponent, "map"), self.create_map
+        )
 
         session = self.setup_map(layer_groups, map_, options)
         
         with session:
             request = ms.create_request(request_values)
-            raw_result = map_.dispatch(request)
+            raw_result = ms.dispatch(map_, request)
 
             result = result_set_from_raw_data(raw_result)
             return result, get_content_type(result)
 
 
+    def create_map(self):
+        """ Creates the base map, which is used as a template for all
+            requests.
+        """
+        map_ = ms.Map()
+        map_.setMetaData("ows_enable_request", "*")
+        map_.setProjection("EPSG:4326")
+        map_.imagecolor.setRGB(0, 0, 0)
+        return map_
+
+
     @property
     def suffixes(self):
         return list(
@@ -118,8 +131,15 @@ class MapServerWMSBaseComponent(Component):
             group_layer = factory.generate_group(group_name)
             group_layers[group_name] = group_layer
 
+        # the layers of coverages are created from cached templates, which are
+        # tied to the revisions of the coverages
+        walked = tuple(layer_selection.walk())
+        revisions = get_coverage_revisions(set(
+            coverage for _, coverage, _, _ in walked if coverage
+        ))
+
         # set up the actual layers for each coverage
-        for collections, coverage, name, suffix in layer_selection.walk():
+        for collections, coverage, name, suffix in walked:
             # get a factory for the given coverage and suffix
             factory = self.get_layer_factory(suffix)
 
@@ -137,9 +157,10 @@ class MapServerWMSBaseComponent(Component):
             else:
                 data_items = coverage.data_items.all()
                 coverage.cached_data_items = data_items
-                layers_and_data_items = tuple(factory.generate(
-                    coverage, group_layer, suffix, options
-                ))
+                layers_and_data_items = generate_layers(
+                    factory, coverage, group_layer, suffix, options,
+                    revisions.get(coverage.pk)
+                )
 
             for layer, data_items in layers_and_data_items:
                 connector = self.get_connector(data_items)
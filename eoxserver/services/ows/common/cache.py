@@ -0,0 +1,182 @@
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#          Stephan Meissl <stephan.meissl@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2013 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" This module provides a cache for rendered capabilities documents. Cached
+documents are keyed by the handler and the request parameters and are tagged
+with the revision of the EO objects (see
+:mod:`eoxserver.resources.coverages.revision`) and the modification time of the
+instance configuration they were rendered with. Once either changes, the
+document is considered stale and is rebuilt, either in the background while the
+stale document is still served, or within the request.
+"""
+
+import logging
+from hashlib import md5
+from os.path import getmtime
+from threading import Thread
+from time import time
+
+from django.core.cache import get_cache
+from django.db import connection
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+
+from eoxserver.core.config import (
+    get_eoxserver_config, get_instance_config_path
+)
+from eoxserver.resources.coverages.revision import get_revision
+from eoxserver.services.result import ResultBuffer
+from eoxserver.services.ows.common.config import CapabilitiesCacheConfigReader
+
+
+logger = logging.getLogger(__name__)
+
+
+# stale documents are kept in the cache to be served while they are rebuilt
+ENTRY_TIMEOUT = 30 * 24 * 60 * 60
+
+# maximum time a rebuild may take before another process may start one
+REBUILD_LOCK_TIMEOUT = 10 * 60
+
+
+class CapabilitiesCache(object):
+    """ Cache for the responses of GetCapabilities handlers. The ``render``
+    callable passed to :meth:`handle` is only invoked when no valid document is
+    cached. Result sets with more than one item are never cached.
+    """
+
+    def __init__(self, config=None):
+        reader = CapabilitiesCacheConfigReader(config or get_eoxserver_config())
+        self.enabled = reader.enabled
+        self.cache_alias = reader.cache
+        self.timeout = reader.timeout
+        self.rebuild_in_background = reader.rebuild_in_background
+
+
+    def handle(self, handler, request, render, to_http_response):
+        """ Returns the HTTP response for the capabilities request either from 
+        the cache or by rendering it. ``to_http_response`` is used to convert 
+        the result set to the actual response.
+        """
+        if not self.enabled:
+            return to_http_response(render())
+
+        cache = get_cache(self.cache_alias)
+        key = self.get_key(handler, request)
+        state = self.get_state()
+        entry = cache.get(key)
+
+        if entry is not None and not self.is_valid(entry, state):
+            if self.rebuild_in_background:
+                self._rebuild_in_background(cache, key, state, render)
+            else:
+                entry = None
+
+        if entry is None:
+            result_set = render()
+            entry = self._store(cache, key, state, result_set)
+            if entry is None:
+                # not cacheable
+                return to_http_response(result_set)
+
+        etag = entry["etag"]
+        if etag in parse_etags(request.META.get("HTTP_IF_NONE_MATCH", "")):
+            response = HttpResponseNotModified()
+        else:
+            response = to_http_response([
+                ResultBuffer(entry["data"], entry["content_type"])
+            ])
+        response["ETag"] = quote_etag(etag)
+        return response
+
+
+    def get_key(self, handler, request):
+        """ Returns the cache key for the given handler and request. The keys of
+        KVP parameters are case insensitive and their order is irrelevant.
+        """
+        digest = md5()
+        digest.update("%s.%s" % (type(handler).__module__, type(handler).__name__))
+        digest.update(request.get_host())
+        digest.update(request.method)
+        digest.update(repr(sorted(
+            (key.lower(), values) for key, values in request.GET.lists()
+        )))
+        if request.method == "POST":
+            digest.update(request.body)
+        return "eoxserver.services.ows.capabilities.%s" % digest.hexdigest()
+
+
+    def get_state(self):
+        """ Returns the current state the cached documents are compared with.
+        """
+        return (get_revision(), getmtime(get_instance_config_path()))
+
+
+    def is_valid(self, entry, state):
+        """ Checks whether a cached entry may be served without a rebuild.
+        """
+        return (
+            entry["state"] == state 
+            and (not self.timeout or entry["created"] + self.timeout > time())
+        )
+
+
+    def _store(self, cache, key, state, result_set):
+        if len(result_set) != 1:
+            return None
+
+        data = result_set[0].data
+        entry = {
+            "state": state,
+            "created": time(),
+            "etag": md5(data).hexdigest(),
+            "content_type": result_set[0].content_type,
+            "data": data
+        }
+        cache.set(key, entry, ENTRY_TIMEOUT)
+        return entry
+
+
+    def _rebuild_in_background(self, cache, key, state, render):
+        lock_key = "%s.lock" % key
+        if not cache.add(lock_key, True, REBUILD_LOCK_TIMEOUT):
+            # already being rebuilt
+            return
+
+        def rebuild():
+            try:
+                self._store(cache, key, state, render())
+            except Exception, e:
+                logger.error("Failed to rebuild capabilities document: %s" % e)
+            finally:
+                cache.delete(lock_key)
+                connection.close()
+
+        thread = Thread(target=rebuild)
+        thread.daemon = True
+        thread.start()
@@ -66,3 +66,16 @@ class CapabilitiesConfigReader(config.Reader):
 class WCSEOConfigReader(config.Reader):
     section = "services.ows.wcs20"
     paging_count_default = config.Option(type=int, default=None)
+    package_workers = config.Option(type=int, default=4)
+    package_chunk_size = config.Option(type=int, default=65536)
+    description_cache = config.Option(default=None)
+    description_cache_timeout = config.Option(type=int, default=86400)
+    description_page_size = config.Option(type=int, default=100)
+
+
+class CapabilitiesCacheConfigReader(config.Reader):
+    section = "services.ows.cache"
+    enabled = config.Option(type=bool, default=False)
+    cache = config.Option(default="default")
+    timeout = config.Option(type=int, default=3600)
+    rebuild_in_background = config.Option(type=bool, default=True)
@@ -34,6 +34,7 @@ default methods can be overidden.
 from eoxserver.core import ExtensionPoint
 from eoxserver.resources.coverages import models
 from eoxserver.services.result import to_http_response
+from eoxserver.services.ows.common.cache import CapabilitiesCache
 from eoxserver.services.ows.wcs.parameters import WCSCapabilitiesRenderParams
 from eoxserver.services.exceptions import (
     NoSuchCoverageException, OperationNotSupportedException
@@ -96,7 +97,15 @@ class WCSGetCapabilitiesHandlerBase(object):
 
 
     def handle(self, request):
-        """ Default handler method.
+        """ Default handler method. Responses are cached, if enabled.
+        """
+        return CapabilitiesCache().handle(
+            self, request, lambda: self.render(request), self.to_http_response
+        )
+
+
+    def render(self, request):
+        """ Default render method, returning the result set.
         """
 
         # parse the parameters
@@ -112,9 +121,8 @@ class WCSGetCapabilitiesHandlerBase(object):
         # get the renderer
         renderer = self.get_renderer(params)
 
-        # dispatch the renderer and return the response
-        result_set = renderer.render(params)
-        return self.to_http_response(result_set)
+        # dispatch the renderer and return the result set
+        return renderer.render(params)
 
 
 class WCSDescribeCoverageHandlerBase(object):
@@ -81,7 +81,9 @@ class PackageWriterInterface(object):
 
     def create_package(self, filename, format, params):
         """ Create a package, which the encoder can later add items to with the 
-            `cleanup` and `add_to_package` method.
+            `cleanup` and `add_to_package` method. The ``filename`` is either
+            the path of the package file or a writable, non-seekable file-like
+            object the package is streamed to.
         """
 
     def cleanup(self, package):
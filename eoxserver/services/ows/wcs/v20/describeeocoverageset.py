@@ -32,10 +32,16 @@ import logging
 from itertools import chain
 
 from django.db.models import Q
+from django.http import HttpResponse
+try:
+    from django.http import StreamingHttpResponse
+except:
+    StreamingHttpResponse = HttpResponse
 
 from eoxserver.core import Component, implements
 from eoxserver.core.config import get_eoxserver_config
 from eoxserver.core.decoders import xml, kvp, typelist, upper, enum
+from eoxserver.backends.cache import iter_in_cache_context
 from eoxserver.resources.coverages import models
 from eoxserver.services.ows.interfaces import (
     ServiceHandlerInterface, GetServiceHandlerInterface, 
@@ -114,28 +120,16 @@ class WCS20DescribeEOCoverageSetHandler(Component):
             identifier__in=eo_ids
         ), containment="overlaps")
 
-        # create a set of all indirectly referenced containers by iterating
-        # recursively. The containment is set to "overlaps", to also include 
-        # collections that might have been excluded with "contains" but would 
-        # have matching coverages inserted.
-
-        def recursive_lookup(super_collection, collection_set):
-            sub_collections = models.Collection.objects.filter(
-                collections__in=[super_collection.pk]
-            ).exclude(
-                pk__in=map(lambda c: c.pk, collection_set)
-            )
-            sub_collections = subsets.filter(sub_collections, "overlaps")
-
-            # Add all to the set
-            collection_set |= set(sub_collections)
-
-            for sub_collection in sub_collections:
-                recursive_lookup(sub_collection, collection_set)
+        # create a set of all indirectly referenced containers using the
+        # collection closure table. The containment is set to "overlaps", to 
+        # also include collections that might have been excluded with 
+        # "contains" but would have matching coverages inserted. Collections
+        # not matching the subsets are pruned along with their subtrees.
 
         collection_set = set(collections_qs)
-        for collection in set(collection_set):
-            recursive_lookup(collection, collection_set)
+        collection_set |= set(models.CollectionClosure.get_sub_collections(
+            collection_set, lambda qs: subsets.filter(qs, "overlaps")
+        ))
 
         collection_pks = map(lambda c: c.pk, collection_set)
 
@@ -159,32 +153,38 @@ class WCS20DescribeEOCoverageSetHandler(Component):
         else:
             num_collections = 0
 
+        # get a number of coverages that *would* have been included, but are not
+        # because of the count parameter
+        count_all_coverages = coverages_no_limit_qs.count()
+
         if num_collections < count and inc_cov_section:
             coverages_qs = coverages_qs.order_by("identifier")[:count - num_collections]
+            num_coverages = min(count_all_coverages, count - num_collections)
         elif num_collections == count or not inc_cov_section:
             coverages_qs = []
+            num_coverages = 0
         else:
             coverages_qs = []
+            num_coverages = 0
             collection_set = sorted(collection_set, key=lambda c: c.identifier)[:count]
 
-        # get a number of coverages that *would* have been included, but are not
-        # because of the count parameter
-        count_all_coverages = coverages_no_limit_qs.count()
-
         # TODO: if containment is "contains" we need to check all collections again
         if containment == "contains":
-            collection_set = filter(lambda c: subsets.matches(c), collection_set)
+            collection_set = subsets.matching(collection_set)
+
+        reader = WCSEOConfigReader(get_eoxserver_config())
 
         coverages = []
         dataset_series = []
 
-        # finally iterate over everything that has been retrieved and get
-        # a list of dataset series and coverages to be encoded into the response
-        for eo_object in chain(coverages_qs, collection_set):
+        # get a list of dataset series and coverages within the collections to
+        # be encoded into the response
+        casted = models.cast_eo_objects(collection_set)
+        for eo_object in collection_set:
             if inc_cov_section and issubclass(eo_object.real_type, models.Coverage):
-                coverages.append(eo_object.cast())
+                coverages.append(casted[eo_object.pk])
             elif inc_dss_section and issubclass(eo_object.real_type, models.DatasetSeries):
-                dataset_series.append(eo_object.cast())
+                dataset_series.append(casted[eo_object.pk])
 
             else:
                 # TODO: what to do here?
@@ -199,16 +199,37 @@ class WCS20DescribeEOCoverageSetHandler(Component):
         # TODO: remove this at some point
         encoder = WCS20EOXMLEncoder()
 
-        return (
-            encoder.serialize(
-                encoder.encode_eo_coverage_set_description(
-                    dataset_series, coverages, 
-                    count_all_coverages + num_collections
+        # the coverages of the (possibly huge) queryset are fetched and encoded
+        # page by page while the response is streamed
+        coverage_chunks = chain(
+            iter_coverage_chunks(
+                coverages_qs, num_coverages, reader.description_page_size
+            ), [coverages]
+        )
+
+        # the response is serialized after the cache session of the request
+        # was shut down, but e.g: metadata items may need to be retrieved
+        return StreamingHttpResponse(
+            iter_in_cache_context(encoder.serialize_streaming(
+                encoder.encode_eo_coverage_set_description_streaming(
+                    dataset_series, coverage_chunks, 
+                    count_all_coverages + num_collections,
+                    num_coverages + len(coverages) + len(dataset_series)
                 ), pretty_print=True
-            ),
+            )),
             encoder.content_type
         )
-    
+
+
+def iter_coverage_chunks(coverages_qs, num_coverages, page_size):
+    """ Yields lists of casted coverages from the queryset, using one query per
+    page and coverage type.
+    """
+    for offset in xrange(0, num_coverages, page_size):
+        eo_objects = list(coverages_qs[offset:offset + page_size])
+        casted = models.cast_eo_objects(eo_objects)
+        yield [casted[eo_object.pk] for eo_object in eo_objects]
+
 
 def pos_int(value):
     value = int(value)
@@ -33,10 +33,10 @@ from django.contrib.gis.geos import Polygon
 from django.utils.timezone import now
 
 from eoxserver.core.config import get_eoxserver_config
-from eoxserver.core.util.xmltools import XMLEncoder
+from eoxserver.core.util.xmltools import XMLEncoder, StreamingElement
 from eoxserver.core.util.timetools import isoformat
+from eoxserver.backends import models as backends
 from eoxserver.backends.access import retrieve
-from eoxserver.contrib.osr import SpatialReference
 from eoxserver.resources.coverages.models import (
     RectifiedStitchedMosaic, ReferenceableDataset
 )
@@ -45,6 +45,7 @@ from eoxserver.resources.coverages import crss, models
 from eoxserver.services.ows.component import ServiceComponent, env
 from eoxserver.services.ows.common.config import CapabilitiesConfigReader
 from eoxserver.services.ows.common.v20.encoders import OWS20Encoder
+from eoxserver.services.ows.wcs.v20.fragments import FragmentCache
 from eoxserver.services.ows.wcs.v20.util import (
     nsmap, ns_xlink, ns_xsi, ns_ogc, ns_ows, ns_gml, ns_gmlcov, ns_wcs, ns_crs, 
     ns_eowcs, OWS, GML, GMLCOV, WCS, CRS, EOWCS, OM, EOP, SWE, 
@@ -428,7 +429,7 @@ class GMLCOV10Encoder(GML32Encoder):
     def encode_domain_set(self, coverage, srid=None, size=None, extent=None, 
                           rectified=True):
         grid_name = "%s_grid" % coverage.identifier
-        srs = SpatialReference(srid) if srid is not None else None
+        srs = crss.getSpatialReference(srid) if srid is not None else None
 
         if rectified:
             return GML("domainSet", 
@@ -447,7 +448,7 @@ class GMLCOV10Encoder(GML32Encoder):
 
     def encode_bounded_by(self, extent, sr=None):
         minx, miny, maxx, maxy = extent
-        sr = sr or SpatialReference(4326)
+        sr = sr or crss.getSpatialReference(4326)
         swap = crss.getAxesSwapper(sr.srid)
         labels = ("x", "y") if sr.IsProjected() else ("long", "lat")
         axis_labels = " ".join(swap(*labels))
@@ -483,6 +484,17 @@ class GMLCOV10Encoder(GML32Encoder):
             cached_range_types[pk] = models.RangeType.objects.get(pk=pk)
             return cached_range_types[pk]
 
+    def get_data_items(self, coverage):
+        """ Returns the data items of a coverage, which are only queried once
+        per coverage.
+        """
+        cached_data_items = self._cache.setdefault(backends.DataItem, {})
+        try:
+            return cached_data_items[coverage.pk]
+        except KeyError:
+            cached_data_items[coverage.pk] = list(coverage.data_items.all())
+            return cached_data_items[coverage.pk]
+
     def get_nil_value_set(self, pk):
         cached_nil_value_set = self._cache.setdefault(models.NilValueSet, {})
         try:
@@ -543,10 +555,10 @@ class WCS20CoverageDescriptionXMLEncoder(GMLCOV10Encoder):
         )
 
     def encode_coverage_descriptions(self, coverages):
-        return WCS("CoverageDescriptions", *[
-            self.encode_coverage_description(coverage)
-            for coverage in coverages
-        ])
+        # the descriptions of the single coverages are cached, if enabled
+        return WCS("CoverageDescriptions", *FragmentCache(
+            type(self).__name__
+        ).encode_all(coverages, self.encode_coverage_description))
 
     def get_schema_locations(self):
         return {ns_wcs.uri: ns_wcs.schema_location}
@@ -555,12 +567,16 @@ class WCS20CoverageDescriptionXMLEncoder(GMLCOV10Encoder):
 class WCS20EOXMLEncoder(WCS20CoverageDescriptionXMLEncoder, EOP20Encoder, OWS20Encoder):
     def encode_eo_metadata(self, coverage, request=None, subset_polygon=None):
 
-        data_items = list(coverage.data_items.filter(
-            semantic="metadata", format="eogml"
-        ))
+        data_items = [
+            data_item for data_item in self.get_data_items(coverage)
+            if data_item.semantic == "metadata" and data_item.format == "eogml"
+        ]
         if len(data_items) >= 1:
-            with open(retrieve(data_items[0])) as f:
-                earth_observation = etree.parse(f).getroot()
+            earth_observation = FragmentCache(
+                "EarthObservation", range_type=False
+            ).encode(coverage, lambda coverage: self.parse_eo_metadata(
+                data_items[0]
+            ))
 
             if subset_polygon:
                 try:
@@ -574,11 +590,16 @@ class WCS20EOXMLEncoder(WCS20CoverageDescriptionXMLEncoder, EOP20Encoder, OWS20E
                 except IndexError:
                     pass # no featureOfInterest
 
-        else:
+        elif subset_polygon:
             earth_observation = self.encode_earth_observation(
                 coverage, subset_polygon=subset_polygon
             )
 
+        else:
+            earth_observation = FragmentCache(
+                "EarthObservation", range_type=False
+            ).encode(coverage, self.encode_earth_observation)
+
         if not request:
             lineage = None
 
@@ -610,10 +631,14 @@ class WCS20EOXMLEncoder(WCS20CoverageDescriptionXMLEncoder, EOP20Encoder, OWS20E
             )
         )
 
+    def parse_eo_metadata(self, data_item):
+        with open(retrieve(data_item)) as f:
+            return etree.parse(f).getroot()
+
     def encode_coverage_description(self, coverage, srid=None, size=None, extent=None, footprint=None):
         source_mime = None
-        for data_item in coverage.data_items.filter(semantic__startswith="bands"):
-            if data_item.format:
+        for data_item in self.get_data_items(coverage):
+            if data_item.semantic.startswith("bands") and data_item.format:
                 source_mime = data_item.format
                 break
 
@@ -632,7 +657,7 @@ class WCS20EOXMLEncoder(WCS20CoverageDescriptionXMLEncoder, EOP20Encoder, OWS20E
             poly = Polygon.from_bbox(extent)
             poly.srid = srid
             extent = poly.transform(4326).extent
-            sr = SpatialReference(4326)
+            sr = crss.getSpatialReference(4326)
         else:
             extent = coverage.extent
             sr = coverage.spatial_reference
@@ -691,7 +716,7 @@ class WCS20EOXMLEncoder(WCS20CoverageDescriptionXMLEncoder, EOP20Encoder, OWS20E
             domain_set = self.encode_domain_set(coverage, rectified=False)
             eo_metadata = self.encode_eo_metadata(coverage)
             extent = coverage.extent
-            sr = SpatialReference(dst_srid)
+            sr = crss.getSpatialReference(dst_srid)
 
         else:
             # subset is given 
@@ -711,7 +736,7 @@ class WCS20EOXMLEncoder(WCS20CoverageDescriptionXMLEncoder, EOP20Encoder, OWS20E
             if srid != dst_srid:
                 poly.transform(dst_srid)
             extent = poly.extent
-            sr = SpatialReference(srid)
+            sr = crss.getSpatialReference(srid)
 
         return EOWCS("ReferenceableDataset",
             self.encode_bounded_by(extent, sr),
@@ -761,5 +786,43 @@ class WCS20EOXMLEncoder(WCS20CoverageDescriptionXMLEncoder, EOP20Encoder, OWS20E
 
         return root
 
+    def encode_eo_coverage_set_description_streaming(self, dataset_series_set,
+                                                     coverage_chunks, 
+                                                     number_matched, 
+                                                     number_returned):
+        """ Returns an EOCoverageSetDescription for streaming serialization 
+        (see :meth:`serialize_streaming`). The coverages are passed as an 
+        iterable of coverage lists, which are only consumed during 
+        serialization. The coverage descriptions are only included, if the 
+        ``number_returned`` exceeds the number of dataset series.
+        """
+        children = []
+        if number_returned > len(dataset_series_set):
+            children.append(StreamingElement(
+                WCS("CoverageDescriptions"), 
+                self.iter_coverage_descriptions(coverage_chunks)
+            ))
+        if dataset_series_set:
+            children.append(self.encode_dataset_series_descriptions(
+                dataset_series_set
+            ))
+
+        return StreamingElement(
+            EOWCS("EOCoverageSetDescription", 
+                numberMatched=str(number_matched), 
+                numberReturned=str(number_returned)
+            ), children
+        )
+
+    def iter_coverage_descriptions(self, coverage_chunks):
+        fragment_cache = FragmentCache(type(self).__name__)
+        for coverages in coverage_chunks:
+            for description in fragment_cache.encode_all(
+                    coverages, self.encode_coverage_description):
+                yield description
+
+            # the data items are not required anymore
+            self._cache.pop(backends.DataItem, None)
+
     def get_schema_locations(self):
         return {ns_eowcs.uri: ns_eowcs.schema_location}
@@ -0,0 +1,118 @@
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#          Stephan Meissl <stephan.meissl@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2013 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" This module provides a cache for serialized XML fragments describing single
+coverages, like their coverage descriptions or EO metadata. The fragments are
+keyed by the coverage and the revisions of the coverage and, optionally, its 
+range type (see :mod:`eoxserver.resources.coverages.revision`), so they are 
+invalidated as soon as either of them is changed.
+"""
+
+from lxml import etree
+from django.core.cache import get_cache
+
+from eoxserver.core.config import get_eoxserver_config
+from eoxserver.resources.coverages.revision import get_object_revisions
+from eoxserver.services.ows.common.config import WCSEOConfigReader
+
+
+class FragmentCache(object):
+    """ Cache for the XML fragments of a certain ``name``. If ``range_type`` is
+    set, the fragments also depend on the range types of the coverages.
+    """
+
+    def __init__(self, name, range_type=True, config=None):
+        reader = WCSEOConfigReader(config or get_eoxserver_config())
+        self.name = name
+        self.range_type = range_type
+        self.cache_alias = reader.description_cache
+        self.timeout = reader.description_cache_timeout
+
+    @property
+    def enabled(self):
+        return bool(self.cache_alias)
+
+
+    def get_keys(self, coverages):
+        """ Returns a dict mapping the primary keys of the coverages to the keys
+        of their fragments.
+        """
+        coverage_revisions = get_object_revisions(
+            "coverage", [coverage.pk for coverage in coverages]
+        )
+        if self.range_type:
+            range_type_revisions = get_object_revisions(
+                "range_type", set(
+                    coverage.range_type_id for coverage in coverages
+                )
+            )
+
+        keys = {}
+        for coverage in coverages:
+            key = "eoxserver.services.ows.wcs.v20.fragments.%s.%s.%s" % (
+                self.name, coverage.pk, coverage_revisions[coverage.pk]
+            )
+            if self.range_type:
+                key += ".%s" % range_type_revisions[coverage.range_type_id]
+            keys[coverage.pk] = key
+        return keys
+
+
+    def encode_all(self, coverages, encode):
+        """ Returns a list of elements for the given coverages. Cached fragments
+        are parsed, all others are created by calling ``encode`` with the 
+        coverage and then stored in the cache.
+        """
+        if not self.enabled:
+            return [encode(coverage) for coverage in coverages]
+
+        cache = get_cache(self.cache_alias)
+        keys = self.get_keys(coverages)
+        fragments = cache.get_many(keys.values())
+
+        elements = []
+        new_fragments = {}
+        for coverage in coverages:
+            key = keys[coverage.pk]
+            fragment = fragments.get(key)
+            if fragment is not None:
+                element = etree.fromstring(fragment)
+            else:
+                element = encode(coverage)
+                new_fragments[key] = etree.tostring(element)
+            elements.append(element)
+
+        if new_fragments:
+            cache.set_many(new_fragments, self.timeout)
+        return elements
+
+
+    def encode(self, coverage, encode):
+        """ Returns the element for a single coverage. See :meth:`encode_all`.
+        """
+        return self.encode_all([coverage], encode)[0]
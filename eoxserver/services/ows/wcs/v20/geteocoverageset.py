@@ -28,11 +28,14 @@
 
 
 import sys
-import os
-import tempfile
 import logging
+import mimetypes
 from itertools import chain
-from cStringIO import StringIO
+from functools import partial
+from Queue import Queue
+from multiprocessing.pool import ThreadPool
+
+from django.db import connection
 
 from django.db.models import Q
 from django.http import HttpResponse
@@ -44,6 +47,9 @@ except:
 from eoxserver.core import Component, implements, ExtensionPoint
 from eoxserver.core.config import get_eoxserver_config
 from eoxserver.core.decoders import xml, kvp, typelist, upper, enum
+from eoxserver.backends.cache import (
+    create_cache_context, cache_context_session
+)
 from eoxserver.resources.coverages import models
 from eoxserver.services.ows.interfaces import (
     ServiceHandlerInterface, GetServiceHandlerInterface, 
@@ -116,6 +122,16 @@ class WCS20GetEOCoverageSetHandler(Component):
             "CountDefault": reader.paging_count_default
         }
 
+    def render_coverage(self, args):
+        """ Renders a single coverage. Returns a tuple of the coverage, the
+            result set and the exception info, if any occurred.
+        """
+        coverage, renderer, params = args
+        try:
+            return coverage, renderer.render(params), None
+        except Exception:
+            return coverage, None, sys.exc_info()
+
     def handle(self, request):
         decoder = self.get_decoder(request)
         eo_ids = decoder.eo_ids
@@ -153,28 +169,16 @@ class WCS20GetEOCoverageSetHandler(Component):
             identifier__in=eo_ids
         ), containment="overlaps")
 
-        # create a set of all indirectly referenced containers by iterating
-        # recursively. The containment is set to "overlaps", to also include 
-        # collections that might have been excluded with "contains" but would 
-        # have matching coverages inserted.
-
-        def recursive_lookup(super_collection, collection_set):
-            sub_collections = models.Collection.objects.filter(
-                collections__in=[super_collection.pk]
-            ).exclude(
-                pk__in=map(lambda c: c.pk, collection_set)
-            )
-            sub_collections = subsets.filter(sub_collections, "overlaps")
-
-            # Add all to the set
-            collection_set |= set(sub_collections)
-
-            for sub_collection in sub_collections:
-                recursive_lookup(sub_collection, collection_set)
+        # create a set of all indirectly referenced containers using the
+        # collection closure table. The containment is set to "overlaps", to 
+        # also include collections that might have been excluded with 
+        # "contains" but would have matching coverages inserted. Collections
+        # not matching the subsets are pruned along with their subtrees.
 
         collection_set = set(collections_qs)
-        for collection in set(collection_set):
-            recursive_lookup(collection, collection_set)
+        collection_set |= set(models.CollectionClosure.get_sub_collections(
+            collection_set, lambda qs: subsets.filter(qs, "overlaps")
+        ))
 
         collection_pks = map(lambda c: c.pk, collection_set)
 
@@ -214,7 +218,7 @@ class WCS20GetEOCoverageSetHandler(Component):
 
         # TODO: if containment is "within" we need to check all collections again
         if containment == "within":
-            collection_set = filter(lambda c: subsets.matches(c), collection_set)
+            collection_set = subsets.matching(collection_set)
 
         coverages = []
         dataset_series = []
@@ -226,53 +230,182 @@ class WCS20GetEOCoverageSetHandler(Component):
                 coverages.append(eo_object.cast())
 
 
-        fd, pkg_filename = tempfile.mkstemp()
-        tmp = os.fdopen(fd)
-        tmp.close()
-        package = writer.create_package(pkg_filename, format, format_params)
-
+        # look up the renderers beforehand, to report any errors before the
+        # response is streamed
+        render_args = []
         for coverage in coverages:
             params = self.get_params(coverage, decoder, request)
-            renderer = self.get_renderer(params)
-            result_set = renderer.render(params)
-            all_filenames = set()
-            for result_item in result_set:
-                if not result_item.filename:
-                    ext = mimetypes.guess_extension(result_item.content_type)
-                    filename = coverage.identifier + ext
-                else:
-                    filename = result_item.filename
-                if filename in all_filenames:
-                    continue # TODO: create new filename
-                all_filenames.add(filename)
-                location = "%s/%s" % (coverage.identifier, filename)
-                writer.add_to_package(
-                    package, result_item.data_file, result_item.size, location
-                )
-
-        mime_type = writer.get_mime_type(package, format, format_params)
-        ext = writer.get_file_extension(package, format, format_params)
-        writer.cleanup(package)
+            render_args.append((coverage, self.get_renderer(params), params))
+
+        reader = WCSEOConfigReader(get_eoxserver_config())
+
+        mime_type = writer.get_mime_type(None, format, format_params)
+        ext = writer.get_file_extension(None, format, format_params)
 
         response = StreamingHttpResponse(
-            tempfile_iterator(pkg_filename), mime_type
+            stream_package(
+                writer, format, format_params, self.render_coverage, 
+                render_args, reader.package_workers, reader.package_chunk_size
+            ), mime_type
         )
         response["Content-Disposition"] = 'inline; filename="ows%s"' % ext
-        response["Content-Length"] = str(os.path.getsize(pkg_filename))
 
         return response
 
 
-def tempfile_iterator(filename, chunksize=2048, delete=True):
-    with open(filename) as file_obj:
-        while True:
-            data = file_obj.read(chunksize)
-            if not data:
-                break
-            yield data
+class PackageStream(object):
+    """ Write-only file-like object that buffers the data written by a package
+        writer until it is consumed in chunks.
+    """
+
+    def __init__(self):
+        self._buffers = []
+        self._position = 0
+
+    def write(self, data):
+        if data:
+            self._buffers.append(data)
+            self._position += len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
 
-    if delete:
-        os.remove(filename)
+    def close(self):
+        pass
+
+    def chunks(self, chunksize, final=False):
+        """ Yields the buffered data in chunks of ``chunksize`` bytes. Unless 
+            ``final`` is set, a smaller remainder is kept in the buffer.
+        """
+        data = "".join(self._buffers)
+        self._buffers = []
+
+        i = 0
+        while len(data) - i >= chunksize:
+            yield data[i:i+chunksize]
+            i += chunksize
+
+        if final:
+            if i < len(data):
+                yield data[i:]
+        elif i < len(data):
+            self._buffers.append(data[i:])
+
+
+def stream_package(writer, format, format_params, render, render_args, 
+                   workers=1, chunksize=65536):
+    """ Generator to render the coverages and stream the package containing 
+        the results. The coverages are rendered in a pool of ``workers`` 
+        threads, at most twice as many being in progress at any time. Each 
+        result is added to the package as soon as it is available.
+
+        The generator is consumed after the cache session of the request was
+        shut down, so it uses a cache context of its own, which is associated
+        with the rendering threads and cleaned up once the package is done.
+    """
+
+    cache_context = create_cache_context()
+    render = partial(_render_in_context, cache_context, render)
+
+    stream = PackageStream()
+    package = writer.create_package(stream, format, format_params)
+
+    if workers > 1:
+        pool = ThreadPool(workers)
+        done = Queue()
+        results = _iter_concurrently(pool, done, render, render_args, workers * 2)
+    else:
+        pool = None
+        results = (render(args) for args in render_args)
+
+    try:
+        for coverage, result_set, exc_info in results:
+            if exc_info:
+                raise exc_info[0], exc_info[1], exc_info[2]
+
+            with cache_context_session(cache_context):
+                add_to_package(writer, package, coverage, result_set)
+            for chunk in stream.chunks(chunksize):
+                yield chunk
+
+        writer.cleanup(package)
+        for chunk in stream.chunks(chunksize, final=True):
+            yield chunk
+
+    except Exception:
+        logger.exception("Failed to stream the package.")
+        raise
+
+    finally:
+        if pool:
+            # wait for running renderers before their files are cleaned up
+            pool.terminate()
+            pool.join()
+        cache_context.cleanup()
+
+
+def _render_in_context(cache_context, render, args):
+    """ Helper to render within the given cache context.
+    """
+    with cache_context_session(cache_context):
+        return render(args)
+
+
+def _iter_concurrently(pool, done, func, args_list, max_pending):
+    """ Helper generator to apply the function on the arguments in the thread
+        pool. The results are yielded in the order of completion.
+    """
+    pending = 0
+    for args in args_list:
+        if pending >= max_pending:
+            yield done.get()
+            pending -= 1
+        pool.apply_async(_call_in_thread, (func, args), callback=done.put)
+        pending += 1
+
+    while pending:
+        yield done.get()
+        pending -= 1
+
+
+def _call_in_thread(func, args):
+    """ Helper to call the function in a worker thread and close the threads
+        database connection afterwards.
+    """
+    try:
+        return func(args)
+    finally:
+        connection.close()
+
+
+def add_to_package(writer, package, coverage, result_set):
+    """ Adds all items of a result set to the package and deletes them 
+        afterwards.
+    """
+    all_filenames = set()
+    try:
+        for result_item in result_set:
+            if not result_item.filename:
+                ext = mimetypes.guess_extension(result_item.content_type)
+                filename = coverage.identifier + ext
+            else:
+                filename = result_item.filename
+            if filename in all_filenames:
+                continue # TODO: create new filename
+            all_filenames.add(filename)
+            location = "%s/%s" % (coverage.identifier, filename)
+            writer.add_to_package(
+                package, result_item.data_file, result_item.size, location
+            )
+    finally:
+        for result_item in result_set:
+            try:
+                result_item.delete()
+            except:
+                pass
 
 
 def pos_int(value):
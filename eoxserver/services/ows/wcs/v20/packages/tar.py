@@ -57,7 +57,11 @@ class TarPackageWriter(Component):
         else:
             mode = "w"
 
-        return tarfile.open(filename, mode)
+        if isinstance(filename, basestring):
+            return tarfile.open(filename, mode)
+        # use the stream mode of tarfile for file-like objects
+        mode = mode.replace(":", "|") if ":" in mode else "w|"
+        return tarfile.open(fileobj=filename, mode=mode)
 
     def cleanup(self, package):
         package.close()
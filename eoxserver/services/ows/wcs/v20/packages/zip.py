@@ -45,7 +45,11 @@ class ZipPackageWriter(Component):
         if params.get("compression", "").upper() == "DEFLATED":
             print compression
             compression = zipfile.ZIP_DEFLATED
-        return zipfile.ZipFile(filename, "a", compression)
+        if isinstance(filename, basestring):
+            return zipfile.ZipFile(filename, "a", compression)
+        # entries are written sequentially to streams, which is possible as 
+        # long as the stream supports `tell()`
+        return zipfile.ZipFile(filename, "w", compression)
 
     def cleanup(self, package):
         package.close()
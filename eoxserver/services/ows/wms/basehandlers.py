@@ -38,6 +38,7 @@ from eoxserver.services.ows.wms.interfaces import (
     WMSCapabilitiesRendererInterface
 )
 from eoxserver.services.result import to_http_response
+from eoxserver.services.ows.common.cache import CapabilitiesCache
 
 
 class WMSGetCapabilitiesHandlerBase(object):
@@ -50,6 +51,13 @@ class WMSGetCapabilitiesHandlerBase(object):
     renderer = UniqueExtensionPoint(WMSCapabilitiesRendererInterface)
 
     def handle(self, request):
+        return CapabilitiesCache().handle(
+            self, request, lambda: self.render(request), to_http_response
+        )
+
+    def render(self, request):
+        """ Renders the capabilities document and returns the result set.
+        """
         collections_qs = models.Collection.objects \
             .order_by("identifier") \
             .exclude(
@@ -65,4 +73,4 @@ class WMSGetCapabilitiesHandlerBase(object):
         result, _ = self.renderer.render(
             collections_qs, coverages, request.GET.items()
         )
-        return to_http_response(result)
+        return result
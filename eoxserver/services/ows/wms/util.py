@@ -28,6 +28,7 @@
 
 
 import logging
+from itertools import chain
 
 from eoxserver.resources.coverages import models
 from eoxserver.core.decoders import InvalidParameterException
@@ -95,35 +96,35 @@ def lookup_layers(layers, subsets, suffixes=None):
             )
 
         if models.iscollection(eo_object):
-            # recursively iterate over all sub-collections and collect all
-            # coverages
+            # collect all coverages of the collection and its sub-collections
 
             used_ids = suffix_related_ids.setdefault(suffix, set())
+            members = lookup_members(eo_object, subsets)
 
-            def recursive_lookup(collection, suffix, used_ids, subsets):
+            # fetch all coverages with their actual types at once
+            coverages = cast_coverages(
+                member for member in chain.from_iterable(members.values())
+                if models.iscoverage(member) and member.pk not in used_ids
+            )
+
+            def recursive_lookup(collection, used_ids):
                 # get all EO objects related to this collection, excluding 
                 # those already searched
-                eo_objects = models.EOObject.objects.filter(
-                    collections__in=[collection.pk]
-                ).exclude(
-                    pk__in=used_ids
-                ).order_by("begin_time", "end_time")
-                # apply subsets
-                eo_objects = subsets.filter(eo_objects)
-
                 selection = LayerSelection()
 
                 # append all retrived EO objects, either as a coverage of 
                 # the real type, or as a subgroup.
-                for eo_object in eo_objects:
+                for eo_object in members.get(collection.pk, ()):
+                    if eo_object.pk in used_ids:
+                        continue
                     used_ids.add(eo_object.pk)
 
                     if models.iscoverage(eo_object):
-                        selection.append(eo_object.cast(), eo_object.identifier)
+                        selection.append(
+                            coverages[eo_object.pk], eo_object.identifier
+                        )
                     elif models.iscollection(eo_object):
-                        selection.extend(recursive_lookup(
-                            eo_object, suffix, used_ids, subsets
-                        ))
+                        selection.extend(recursive_lookup(eo_object, used_ids))
                     else: 
                         pass
 
@@ -132,7 +133,7 @@ def lookup_layers(layers, subsets, suffixes=None):
             root_group.append(
                 LayerSelection(
                     eo_object, suffix,
-                    recursive_lookup(eo_object, suffix, used_ids, subsets)
+                    recursive_lookup(eo_object, used_ids)
                 )
             )
 
@@ -141,7 +142,10 @@ def lookup_layers(layers, subsets, suffixes=None):
             selection = LayerSelection(None, suffix=suffix)
 
             if subsets.matches(eo_object):
-                selection.append(eo_object.cast(), eo_object.identifier)
+                selection.append(
+                    cast_coverages([eo_object])[eo_object.pk], 
+                    eo_object.identifier
+                )
             else:
                 selection.append(None, eo_object.identifier)
 
@@ -150,6 +154,69 @@ def lookup_layers(layers, subsets, suffixes=None):
     return root_group
 
 
+def lookup_members(collection, subsets):
+    """ Looks up the EO objects of a collection and all its sub-collections 
+        that match the given subsets. Returns a dict, mapping the primary key 
+        of each collection to the list of its EO objects, ordered by time. 
+        Using the collection closure table, only two queries are required, 
+        regardless of the depth of the hierarchy.
+    """
+
+    # all direct and indirect EO objects of the collection
+    eo_objects = models.EOObject.objects.filter(
+        ancestor_closures__ancestor=collection.pk
+    ).order_by("begin_time", "end_time")
+    # apply subsets
+    eo_objects = list(subsets.filter(eo_objects))
+
+    members = {collection.pk: []}
+    for eo_object in eo_objects:
+        if models.iscollection(eo_object):
+            members[eo_object.pk] = []
+
+    # all relations within the hierarchy. Relations to collections outside of 
+    # the hierarchy or to collections not matching the subsets are skipped.
+    memberships = {}
+    for collection_id, eo_object_id in (
+            models.EOObjectToCollectionThrough.objects.filter(
+                eo_object__ancestor_closures__ancestor=collection.pk
+            ).values_list("collection", "eo_object")):
+        if collection_id in members:
+            memberships.setdefault(eo_object_id, []).append(collection_id)
+
+    for eo_object in eo_objects:
+        for collection_id in memberships.get(eo_object.pk, ()):
+            members[collection_id].append(eo_object)
+
+    return members
+
+
+def cast_coverages(eo_objects, chunk_size=500):
+    """ Fetches the given EO objects as coverages of their actual types with 
+        a single query per coverage type (and chunk), instead of one query per
+        ``cast()``. The data items and range types (including their bands and
+        nil values) are prefetched. Returns a dict mapping the primary keys to the coverages.
+    """
+    pks_by_type = {}
+    for eo_object in eo_objects:
+        pks_by_type.setdefault(eo_object.real_type, set()).add(eo_object.pk)
+
+    coverages = {}
+    for CoverageType, pks in pks_by_type.items():
+        pks = list(pks)
+        for i in range(0, len(pks), chunk_size):
+            queryset = CoverageType.objects.filter(
+                pk__in=pks[i:i + chunk_size]
+            ).prefetch_related(
+                "data_items", "range_type__bands__nil_value_set__nil_values"
+            )
+
+            for coverage in queryset:
+                coverages[coverage.pk] = coverage
+
+    return coverages
+
+
 class LayerSelection(list):
     """ Helper class for hierarchical layer selections.
     """
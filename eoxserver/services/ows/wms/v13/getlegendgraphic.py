@@ -36,7 +36,8 @@ from eoxserver.services.ows.interfaces import (
     ServiceHandlerInterface, GetServiceHandlerInterface
 )
 from eoxserver.services.ows.wms.util import (
-    lookup_layers, parse_bbox, parse_time, int_or_str, LayerSelection
+    lookup_layers, parse_bbox, parse_time, int_or_str, LayerSelection,
+    cast_coverages
 )
 from eoxserver.services.ows.wms.interfaces import (
     WMSLegendGraphicRendererInterface
@@ -78,34 +79,20 @@ class WMS13GetLegendGraphicHandler(Component):
 
 
         if models.iscollection(eo_object):
-            def recursive_lookup(collection, used_ids, suffix):
-                eo_objects = models.EOObject.objects.filter(
-                    collections__in=[collection.pk]
-                ).exclude(
-                    pk__in=used_ids
-                )
-
-                result = []
-                for eo_object in eo_objects:
-                    used_ids.add(eo_object.pk)
-
-                    if models.iscoverage(eo_object):
-                        result.append((eo_object.cast(), suffix))
-                    elif models.iscollection(eo_object):
-                        result.extend(
-                            recursive_lookup(eo_object, used_ids, suffix)
-                        )
-                    else:
-                        pass
-
-                return result
-
-            used_ids = set()
-            coverages = recursive_lookup(eo_object, used_ids, suffix)
+            # all coverages within the collection and its sub-collections
+            descendants = models.EOObject.objects.filter(
+                ancestor_closures__ancestor=eo_object.pk
+            )
+            coverages = [
+                (coverage, suffix) for coverage in cast_coverages(
+                    descendant for descendant in descendants
+                    if models.iscoverage(descendant)
+                ).values()
+            ]
             collection = eo_object
 
             if coverage_id:
-                for coverage in coverages:
+                for coverage, _ in coverages:
                     if coverage.identifier == coverage_id:
                         coverages = ((coverage, suffix),)
                         break
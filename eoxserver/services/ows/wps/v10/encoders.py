@@ -334,10 +334,18 @@ class WPS10ExecuteResponseRawEncoder(object):
 
     def encode_execute_response(self, process, inputs, results, lineage):
         return [
-            ResultBuffer(value, identifier=key)
+            self._to_result_item(key, value)
             for key, value in results.iteritems()
         ]   
 
+    def _to_result_item(self, key, value):
+        # results that are already result items (e.g. streamed ones) are used 
+        # as they are
+        if isinstance(value, ResultItem):
+            value.identifier = value.identifier or key
+            return value
+        return ResultBuffer(value, identifier=key)
+
     def serialize(self, result_items):
         return to_http_response(result_items)
 
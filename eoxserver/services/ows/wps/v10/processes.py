@@ -21,8 +21,7 @@ import matplotlib as mpl
 mpl.use('Agg')
 from matplotlib import pyplot
 
-from django.contrib.gis.geos import Point, MultiPoint, Polygon
-from django.contrib.gis.gdal import SpatialReference
+from django.contrib.gis.geos import Polygon
 from django.db.models import Q
 
 from eoxserver.core import Component, ExtensionPoint, implements
@@ -31,6 +30,10 @@ from eoxserver.core.util.rect import Rect
 from eoxserver.contrib import gdal
 from eoxserver.contrib.vrt import VRTBuilder
 from eoxserver.backends.access import connect
+from eoxserver.processing.sampling import (
+    PointSet, sample_coverages, iter_csv
+)
+from eoxserver.services.result import ResultIterator
 from eoxserver.services.ows.wps.interfaces import ProcessInterface
 from eoxserver.services.ows.wps.parameters import LiteralData, ComplexData
 from eoxserver.services.subset import Subsets, Trim
@@ -76,72 +79,38 @@ class GetPixelValues(Component):
             begin_time__lte=end_time, end_time__gte=begin_time
         )
 
-        coordinates = coord_list.split(';')
-
-        points = []
-        for coordinate in coordinates:
-            x,y = coordinate.split(',')
-            # parameter parsing
-            point = Point(float(x), float(y))
-            point.srid = srid
-            points.append(point)
-
-        points = MultiPoint(points)
-        points.srid = srid
-
+        points = PointSet.from_string(coord_list, srid)
 
         eo_objects = eo_objects.filter(
-            footprint__intersects=points
+            footprint__intersects=points.to_geometry()
         )
 
-        output = StringIO()
-        writer = csv.writer(output, quoting=csv.QUOTE_ALL)
-        #header = ["id", "begin", "end"] + ["point%d" % i for i in range(len(points))]
-        header = ["id", "Green", "Red", "NIR", "MIR" ]
-        writer.writerow(header)
-
-        for eo_object in eo_objects:
-            coverage = eo_object.cast()
-
-            #values = [coverage.identifier, isoformat(coverage.begin_time), isoformat(coverage.end_time)] + [None] * len(points)
-            values = [collection] + [None] * 4
-
-            data_item = coverage.data_items.get(semantic__startswith="bands")
-            filename = connect(data_item)
-            ds = gdal.Open(filename)
-            sr = SpatialReference(ds.GetProjection())
-            #points_t = points.transform(sr, clone=True)
+        coverages = get_coverages(eo_objects)
+        result = sample_coverages(coverages, points)
 
-            for index, point in enumerate(points, start=1):
-
-                if not coverage.footprint.contains(point):
-                    continue
-
-                gt = ds.GetGeoTransform()
-
-                point.transform(sr)
-         
-                # Works only if gt[2] and gt[4] equal zero! 
-                px = int((point[0] - gt[0]) / gt[1]) #x pixel
-                py = int((point[1] - gt[3]) / gt[5]) #y pixel
-
-                #array = ds.ReadRaster(px, py, 1, 1)
-                #structval = ds.ReadRaster(px,py,1,1,buf_type=gdal.GDT_Int16) #TODO: Check Range Type to adapt buf_type!
-                pixelVal = ds.ReadAsArray(px,py,1,1)[:,0,0]
-
-                #pixel_value = array[0][0]
-                #print structval
-                #pixel_value = struct.unpack('IIII' , structval) #use the 'short' format code (2 bytes) not int (4 bytes)
-                
-                #values[index] = pixel_value[0]
-                #writer.writerow([ col_name+"_p"+str(index), pixelVal[0], pixelVal[1], pixelVal[2], pixelVal[3] ])
-                writer.writerow([ "P_"+str(index), pixelVal[0], pixelVal[1], pixelVal[2], pixelVal[3] ])
+        header = ["id", "Green", "Red", "NIR", "MIR" ]
+        rows = (
+            ["P_" + str(index)] + list(values[:4])
+            for coverage, index, values in result.iter_values()
+        )
 
         return {
-            "processed": output.getvalue()
+            "processed": ResultIterator(iter_csv(header, rows))
         }
 
 
+def get_coverages(eo_objects):
+    """ Returns the coverages of the EO objects, casted to their actual type, 
+    in the same order.
+    """
+    eo_objects = list(eo_objects)
+    casted = models.cast_eo_objects(eo_objects)
+    return [
+        casted[eo_object.pk] for eo_object in eo_objects
+        if models.iscoverage(eo_object)
+    ]
+
+
 
 
 class GetTimeDataProcess(Component):
@@ -193,28 +162,16 @@ class GetTimeDataProcess(Component):
             identifier__in=eo_ids
         ), containment="overlaps")
 
-        # create a set of all indirectly referenced containers by iterating
-        # recursively. The containment is set to "overlaps", to also include 
-        # collections that might have been excluded with "contains" but would 
-        # have matching coverages inserted.
-
-        def recursive_lookup(super_collection, collection_set):
-            sub_collections = models.Collection.objects.filter(
-                collections__in=[super_collection.pk]
-            ).exclude(
-                pk__in=map(lambda c: c.pk, collection_set)
-            )
-            sub_collections = subsets.filter(sub_collections, "overlaps")
-
-            # Add all to the set
-            collection_set |= set(sub_collections)
-
-            for sub_collection in sub_collections:
-                recursive_lookup(sub_collection, collection_set)
+        # create a set of all indirectly referenced containers using the
+        # collection closure table. The containment is set to "overlaps", to 
+        # also include collections that might have been excluded with 
+        # "contains" but would have matching coverages inserted. Collections
+        # not matching the subsets are pruned along with their subtrees.
 
         collection_set = set(collections_qs)
-        for collection in set(collection_set):
-            recursive_lookup(collection, collection_set)
+        collection_set |= set(models.CollectionClosure.get_sub_collections(
+            collection_set, lambda qs: subsets.filter(qs, "overlaps")
+        ))
 
         collection_pks = map(lambda c: c.pk, collection_set)
 
@@ -295,28 +252,16 @@ class GetCoverageDifference(Component):
             identifier__in=eo_ids
         ), containment="overlaps")
 
-        # create a set of all indirectly referenced containers by iterating
-        # recursively. The containment is set to "overlaps", to also include 
-        # collections that might have been excluded with "contains" but would 
-        # have matching coverages inserted.
-
-        def recursive_lookup(super_collection, collection_set):
-            sub_collections = models.Collection.objects.filter(
-                collections__in=[super_collection.pk]
-            ).exclude(
-                pk__in=map(lambda c: c.pk, collection_set)
-            )
-            sub_collections = subsets.filter(sub_collections, "overlaps")
-
-            # Add all to the set
-            collection_set |= set(sub_collections)
-
-            for sub_collection in sub_collections:
-                recursive_lookup(sub_collection, collection_set)
+        # create a set of all indirectly referenced containers using the
+        # collection closure table. The containment is set to "overlaps", to 
+        # also include collections that might have been excluded with 
+        # "contains" but would have matching coverages inserted. Collections
+        # not matching the subsets are pruned along with their subtrees.
 
         collection_set = set(collections_qs)
-        for collection in set(collection_set):
-            recursive_lookup(collection, collection_set)
+        collection_set |= set(models.CollectionClosure.get_sub_collections(
+            collection_set, lambda qs: subsets.filter(qs, "overlaps")
+        ))
 
         collection_pks = map(lambda c: c.pk, collection_set)
 
@@ -501,28 +446,16 @@ class GetCoverageDifferenceLabel(Component):
             identifier__in=eo_ids
         ), containment="overlaps")
 
-        # create a set of all indirectly referenced containers by iterating
-        # recursively. The containment is set to "overlaps", to also include 
-        # collections that might have been excluded with "contains" but would 
-        # have matching coverages inserted.
-
-        def recursive_lookup(super_collection, collection_set):
-            sub_collections = models.Collection.objects.filter(
-                collections__in=[super_collection.pk]
-            ).exclude(
-                pk__in=map(lambda c: c.pk, collection_set)
-            )
-            sub_collections = subsets.filter(sub_collections, "overlaps")
-
-            # Add all to the set
-            collection_set |= set(sub_collections)
-
-            for sub_collection in sub_collections:
-                recursive_lookup(sub_collection, collection_set)
+        # create a set of all indirectly referenced containers using the
+        # collection closure table. The containment is set to "overlaps", to 
+        # also include collections that might have been excluded with 
+        # "contains" but would have matching coverages inserted. Collections
+        # not matching the subsets are pruned along with their subtrees.
 
         collection_set = set(collections_qs)
-        for collection in set(collection_set):
-            recursive_lookup(collection, collection_set)
+        collection_set |= set(models.CollectionClosure.get_sub_collections(
+            collection_set, lambda qs: subsets.filter(qs, "overlaps")
+        ))
 
         collection_pks = map(lambda c: c.pk, collection_set)
 
@@ -734,28 +667,16 @@ class GetVolumePixelValues(Component):
             identifier__in=eo_ids
         ), containment="overlaps")
 
-        # create a set of all indirectly referenced containers by iterating
-        # recursively. The containment is set to "overlaps", to also include 
-        # collections that might have been excluded with "contains" but would 
-        # have matching coverages inserted.
-
-        def recursive_lookup(super_collection, collection_set):
-            sub_collections = models.Collection.objects.filter(
-                collections__in=[super_collection.pk]
-            ).exclude(
-                pk__in=map(lambda c: c.pk, collection_set)
-            )
-            sub_collections = subsets.filter(sub_collections, "overlaps")
-
-            # Add all to the set
-            collection_set |= set(sub_collections)
-
-            for sub_collection in sub_collections:
-                recursive_lookup(sub_collection, collection_set)
+        # create a set of all indirectly referenced containers using the
+        # collection closure table. The containment is set to "overlaps", to 
+        # also include collections that might have been excluded with 
+        # "contains" but would have matching coverages inserted. Collections
+        # not matching the subsets are pruned along with their subtrees.
 
         collection_set = set(collections_qs)
-        for collection in set(collection_set):
-            recursive_lookup(collection, collection_set)
+        collection_set |= set(models.CollectionClosure.get_sub_collections(
+            collection_set, lambda qs: subsets.filter(qs, "overlaps")
+        ))
 
         collection_pks = map(lambda c: c.pk, collection_set)
 
@@ -767,80 +688,46 @@ class GetVolumePixelValues(Component):
         ), containment=containment)
 
 
-        coordinates = coord_list.split(';')
-
-        points = []
-        for coordinate in coordinates:
-            x,y = coordinate.split(',')
-            # parameter parsing
-            point = Point(float(x), float(y))
-            point.srid = srid
-            points.append(point)
-
-        points = MultiPoint(points)
-        points.srid = srid
-
+        points = PointSet.from_string(coord_list, srid)
 
         eo_objects = coverages_qs.filter(
-            footprint__intersects=points
+            footprint__intersects=points.to_geometry()
         )
 
-        output = StringIO()
-        writer = csv.writer(output, quoting=csv.QUOTE_ALL)
-        header = ["id", "Value", "Height (m)", "Size" ]
-        writer.writerow(header)
-
-        for eo_object in eo_objects:
-
-            coverage = eo_object.cast()
-
-            data_item = coverage.data_items.get(semantic__startswith="bands")
-            filename = connect(data_item)
-            ds = gdal.Open(filename)
-
-            height_values_item = coverage.data_items.get(
-                semantic__startswith="heightvalues"
-            )
-
-            with open(height_values_item.location) as f:
-                height_values = json.load(f)
-            heightLevelsList=np.array(height_values)
+        coverages = get_coverages(eo_objects)
+        result = sample_coverages(coverages, points)
 
+        # read the height levels before streaming the response
+        height_levels = {}
+        for coverage, valid in zip(result.coverages, result.valid):
+            if valid.any():
+                height_values_item = coverage.data_items.get(
+                    semantic__startswith="heightvalues"
+                )
+                with open(height_values_item.location) as f:
+                    height_levels[coverage.pk] = np.array(json.load(f))
 
-            if ds.GetProjection():
-                gt = ds.GetGeoTransform()
-                sr = SpatialReference(ds.GetProjection())
-                points_t = points.transform(sr, clone=True)
-            else:
-                bbox = coverage.footprint.extent
-                gt = [ 
-                    bbox[0], (bbox[2] - bbox[0])/ds.RasterXSize, 0,
-                    bbox[3], 0, (bbox[1] - bbox[3])/ds.RasterYSize
-                ]
-          
-
-            for index, point in enumerate(points, start=1):
-                print index, point
-
-                if not coverage.footprint.contains(point):
-                    continue
-
-                #point.transform(sr)
-
-                # Works only if gt[2] and gt[4] equal zero! 
-                px = int((point[0] - gt[0]) / gt[1]) #x pixel
-                py = int((point[1] - gt[3]) / gt[5]) #y pixel
+        header = ["id", "Value", "Height (m)", "Size" ]
 
-                               
-                for i in range(1, ds.RasterCount+1):
-                    pixelVal = ds.GetRasterBand(i).ReadAsArray(px,py,1,1)[0,0]
+        def iter_rows():
+            for coverage, index, values in result.iter_values():
+                scale = (
+                    'GOME-2' in coverage.identifier 
+                    or 'NPL3Merged' in coverage.identifier 
+                    or 'BASCOE' in coverage.identifier 
+                    or 'LPL2_MIPAS' in coverage.identifier
+                )
+                for i, pixelVal in enumerate(values):
                     if pixelVal != -9999 and pixelVal != -999:
-                        if ('GOME-2' in coverage.identifier or 'NPL3Merged' in coverage.identifier or 'BASCOE' in coverage.identifier or 'LPL2_MIPAS' in coverage.identifier):
+                        if scale:
                             pixelVal = pixelVal * 1000000
-                        writer.writerow([ str(coverage.identifier)[:-27], pixelVal, heightLevelsList[i-1], 5 ])
+                        yield [
+                            str(coverage.identifier)[:-27], pixelVal,
+                            height_levels[coverage.pk][i], 5 
+                        ]
 
         return {
-            "processed": output.getvalue()
+            "processed": ResultIterator(iter_csv(header, iter_rows()))
         }
 
 
@@ -897,28 +784,16 @@ class GetValuesThroughTime(Component):
             identifier__in=eo_ids
         ), containment="overlaps")
 
-        # create a set of all indirectly referenced containers by iterating
-        # recursively. The containment is set to "overlaps", to also include 
-        # collections that might have been excluded with "contains" but would 
-        # have matching coverages inserted.
-
-        def recursive_lookup(super_collection, collection_set):
-            sub_collections = models.Collection.objects.filter(
-                collections__in=[super_collection.pk]
-            ).exclude(
-                pk__in=map(lambda c: c.pk, collection_set)
-            )
-            sub_collections = subsets.filter(sub_collections, "overlaps")
-
-            # Add all to the set
-            collection_set |= set(sub_collections)
-
-            for sub_collection in sub_collections:
-                recursive_lookup(sub_collection, collection_set)
+        # create a set of all indirectly referenced containers using the
+        # collection closure table. The containment is set to "overlaps", to 
+        # also include collections that might have been excluded with 
+        # "contains" but would have matching coverages inserted. Collections
+        # not matching the subsets are pruned along with their subtrees.
 
         collection_set = set(collections_qs)
-        for collection in set(collection_set):
-            recursive_lookup(collection, collection_set)
+        collection_set |= set(models.CollectionClosure.get_sub_collections(
+            collection_set, lambda qs: subsets.filter(qs, "overlaps")
+        ))
 
         collection_pks = map(lambda c: c.pk, collection_set)
 
@@ -930,74 +805,32 @@ class GetValuesThroughTime(Component):
         ), containment=containment)
 
 
-        coordinates = coord_list.split(';')
-
-        points = []
-        for coordinate in coordinates:
-            x,y = coordinate.split(',')
-            # parameter parsing
-            point = Point(float(x), float(y))
-            point.srid = srid
-            points.append(point)
-
-        points = MultiPoint(points)
-        points.srid = srid
-
+        points = PointSet.from_string(coord_list, srid)
 
         eo_objects = coverages_qs.filter(
-            footprint__intersects=points
+            footprint__intersects=points.to_geometry()
         ).order_by('begin_time')
 
-        output = StringIO()
-        writer = csv.writer(output, quoting=csv.QUOTE_NONE)
-        header = ["id", "time", "val"]
-        writer.writerow(header)
-
-        for eo_object in eo_objects:
-
-            coverage = eo_object.cast()
-
-            #layer = models.DatasetSeries.objects.get(identifier__in=coverage.identifier)
-            layer = eo_object.collections.all()[0]
-
-            time =  isoformat(coverage.begin_time)
-
-            data_item = coverage.data_items.get(semantic__startswith="bands")
-            filename = connect(data_item)
-            ds = gdal.Open(filename)
+        coverages = get_coverages(eo_objects)
+        result = sample_coverages(coverages, points, bands=[1])
 
-            if ds.GetProjection():
-                gt = ds.GetGeoTransform()
-                sr = SpatialReference(ds.GetProjection())
-                points_t = points.transform(sr, clone=True)
-            else:
-                bbox = coverage.footprint.extent
-                gt = [ 
-                    bbox[0], (bbox[2] - bbox[0])/ds.RasterXSize, 0,
-                    bbox[3], 0, (bbox[1] - bbox[3])/ds.RasterYSize
-                ]
-          
+        # the first collection of each coverage
+        layers = {}
+        relations = models.EOObjectToCollectionThrough.objects.filter(
+            eo_object__in=[coverage.pk for coverage in coverages]
+        ).values_list("eo_object_id", "collection__identifier")
+        for eo_object_id, identifier in relations:
+            layers.setdefault(eo_object_id, identifier)
 
-            for index, point in enumerate(points, start=1):
-                print index, point
-
-                if not coverage.footprint.contains(point):
-                    continue
-
-                #point.transform(sr)
-
-                # Works only if gt[2] and gt[4] equal zero! 
-                px = int((point[0] - gt[0]) / gt[1]) #x pixel
-                py = int((point[1] - gt[3]) / gt[5]) #y pixel
-
-               
-                pixelVal = ds.GetRasterBand(1).ReadAsArray(px,py,1,1)[0,0]
-                if pixelVal != -9999:
-                    writer.writerow([ str(layer.identifier), time, pixelVal])
-
-                
+        header = ["id", "time", "val"]
+        rows = (
+            [layers.get(coverage.pk), isoformat(coverage.begin_time), values[0]]
+            for coverage, index, values in result.iter_values()
+            if values[0] != -9999
+        )
 
         return {
-            "processed": output.getvalue()
+            "processed": ResultIterator(
+                iter_csv(header, rows, quoting=csv.QUOTE_NONE)
+            )
         }
-
@@ -32,9 +32,21 @@ from cStringIO import StringIO
 from uuid import uuid4
 
 from django.http import HttpResponse
+try:
+    from django.http import StreamingHttpResponse
+except ImportError:
+    StreamingHttpResponse = None
 from django.utils.datastructures import SortedDict
 
 from eoxserver.core.util import multiparttools as mp
+from eoxserver.contrib import vsi
+
+
+# size of the chunks that are read from result items when writing the response
+CHUNK_SIZE = 64 * 1024
+
+# result sets larger than this are streamed instead of being buffered
+STREAMING_THRESHOLD = 1024 * 1024
 
 
 class ResultItem(object):
@@ -109,6 +121,41 @@ class ResultFile(ResultItem):
         os.remove(self.path)
 
 
+class ResultVSIFile(ResultItem):
+    """ Class for results that wrap files accessible via the GDAL VSI file API,
+        e.g. in-memory files in ``/vsimem/``.
+    """
+
+    def __init__(self, path, content_type=None, filename=None, identifier=None):
+        super(ResultVSIFile, self).__init__(content_type, filename, identifier)
+        self.path = path
+
+    @property
+    def data(self):
+        with vsi.open(self.path) as f:
+            return f.read()
+
+    @property
+    def data_file(self):
+        return vsi.open(self.path)
+
+    def __len__(self):
+        with vsi.open(self.path) as f:
+            return f.size
+
+    def chunked(self, chunksize):
+        with vsi.open(self.path) as f:
+            while True:
+                data = f.read(chunksize)
+                if not data:
+                    break
+
+                yield data
+
+    def delete(self):
+        vsi.unlink(self.path)
+
+
 class ResultBuffer(ResultItem):
     """ Class for results that are actually a subset of a larger context. 
         Usually a buffer
@@ -144,6 +191,45 @@ class ResultBuffer(ResultItem):
             i += chunksize
 
 
+class ResultIterator(ResultItem):
+    """ Class for results that are generated lazily as an iterable of strings.
+        They are always streamed, as their size is only known once they are
+        consumed.
+    """
+
+    streaming = True
+
+    def __init__(self, iterable, content_type=None, filename=None, 
+                 identifier=None):
+        super(ResultIterator, self).__init__(content_type, filename, identifier)
+        self.iterable = iterable
+        self._data = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = "".join(self.iterable)
+        return self._data
+
+    @property
+    def data_file(self):
+        return StringIO(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __str__(self):
+        return self.data
+
+    def chunked(self, chunksize):
+        if self._data is not None:
+            yield self._data
+            return
+
+        for chunk in self.iterable:
+            yield chunk
+
+
 def get_content_type(result_set):
     """ Returns the content type of a result set. If only one item is included 
         its content type is used.
@@ -167,10 +253,21 @@ def get_headers(result_item):
         )
 
 
-def to_http_response(result_set, response_type=HttpResponse, boundary=None):
+def to_http_response(result_set, response_type=None, boundary=None):
     """ Returns a response for a given result set. The ``response_type`` is the 
-        class to be used. It must be capable to work with iterators.
+        class to be used. It must be capable to work with iterators. If it is
+        not given, result sets larger than ``STREAMING_THRESHOLD`` or with 
+        items that are always streamed are sent as a ``StreamingHttpResponse``
+        (when available), all others are buffered.
     """
+
+    if response_type is None:
+        if StreamingHttpResponse and (
+                any(getattr(item, "streaming", False) for item in result_set)
+                or sum(len(item) for item in result_set) > STREAMING_THRESHOLD):
+            response_type = StreamingHttpResponse
+        else:
+            response_type = HttpResponse
     
     # if more than one item is contained in the result set, the content type is
     # multipart
@@ -199,7 +296,8 @@ def to_http_response(result_set, response_type=HttpResponse, boundary=None):
                         "%s: %s" % (key, value) 
                         for key, value in get_headers(item)
                     ) + mp.CRLFCRLF
-                yield item.data
+                for chunk in item.chunked(CHUNK_SIZE):
+                    yield chunk
             if boundary:
                 yield boundary_str_end
         finally:
@@ -29,7 +29,9 @@
 
 import logging
 
-from django.contrib.gis.geos import Polygon
+import numpy
+from django.db.models import Q
+from django.contrib.gis.geos import Polygon, LineString as Line
 
 from eoxserver.resources.coverages import crss
 from eoxserver.services.exceptions import (
@@ -112,13 +114,6 @@ class Subsets(list):
 
         qs = queryset
 
-        bbox = [None, None, None, None]
-        srid = self.xy_srid
-        if srid is None:
-            srid = 4326
-        max_extent = crss.crs_bounds(srid)
-        tolerance = crss.crs_tolerance(srid)
-
         for subset in self:
             if isinstance(subset, Slice):
                 is_slice = True
@@ -149,51 +144,19 @@ class Subsets(list):
                         end_time__lt=low
                     )
 
+        # filter on the bounding box columns first, so that the exact geometry
+        # tests only have to be performed on the remaining objects. Objects 
+        # without a bounding box (e.g. not yet populated by 
+        # `eoxs_schema_upgrade`) always undergo the exact test.
+        for geometry, predicate, exact in self._get_spatial_constraints(
+                containment):
+            exact_lookup = Q(**{"footprint__%s" % predicate: geometry})
+            bounds_lookup = Q(**_bounds_lookup(geometry.extent, predicate))
+            unbounded = Q(min_lon__isnull=True)
+            if exact:
+                qs = qs.filter(bounds_lookup | (unbounded & exact_lookup))
             else:
-                if is_slice:
-                    if subset.is_x:
-                        line = Line(
-                            (value, max_extent[1]),
-                            (value, max_extent[3])
-                        )
-                    else:
-                        line = Line(
-                            (max_extent[0], value),
-                            (max_extent[2], value)
-                        )
-                    line.srid = srid
-                    if srid != 4326:
-                        line.transform(4326)
-                    qs = qs.filter(footprint__intersects=line)
-
-                else:
-                    if subset.is_x:
-                        bbox[0] = subset.low
-                        bbox[2] = subset.high
-                    else:
-                        bbox[1] = subset.low
-                        bbox[3] = subset.high
-
-
-        if bbox != [None, None, None, None]:
-            bbox = map(
-                lambda v: v[0] if v[0] is not None else v[1], zip(bbox, max_extent)
-            )
-
-            bbox[0] -= tolerance; bbox[1] -= tolerance
-            bbox[2] += tolerance; bbox[3] += tolerance
-
-            logger.debug("Applying BBox %s with containment '%s'." % (bbox, containment))
-
-            poly = Polygon.from_bbox(bbox)
-            poly.srid = srid
-
-            if srid != 4326:
-                poly.transform(4326)
-            if containment == "overlaps":
-                qs = qs.filter(footprint__intersects=poly)
-            elif containment == "contains":
-                qs = qs.filter(footprint__within=poly)
+                qs = qs.filter(bounds_lookup | unbounded).filter(exact_lookup)
 
         return qs
 
@@ -202,13 +165,6 @@ class Subsets(list):
         if not len(self):
             return True
 
-        bbox = [None, None, None, None]
-        srid = self.xy_srid
-        if srid is None:
-            srid = 4326
-        max_extent = crss.crs_bounds(srid)
-        tolerance = crss.crs_tolerance(srid)
-
         footprint = eo_object.footprint
         begin_time = eo_object.begin_time
         end_time = eo_object.end_time
@@ -236,33 +192,87 @@ class Subsets(list):
                     if begin_time > high or end_time < low:
                         return False
 
-            else:
-                if is_slice:
-                    if subset.is_x:
-                        line = Line(
-                            (value, max_extent[1]),
-                            (value, max_extent[3])
-                        )
-                    else:
-                        line = Line(
-                            (max_extent[0], value),
-                            (max_extent[2], value)
-                        )
-                    line.srid = srid
-                    if srid != 4326:
-                        line.transform(4326)
-
-                    if not line.intersects(footprint):
-                        return False
-                    
+        constraints = self._get_spatial_constraints(containment)
+        if constraints:
+            bounds = numpy.array([_get_bounds(eo_object)], dtype=float)
+
+        for geometry, predicate, exact in constraints:
+            if not _bounds_mask(bounds, geometry.extent, predicate)[0]:
+                return False
+            if not exact and not getattr(footprint, predicate)(geometry):
+                return False
+
+        return True
+
+
+    def matching(self, eo_objects, containment="overlaps"):
+        """ Returns a list of all EO objects of the given sequence that match
+            the subsets. The bounding boxes of all objects are tested at once,
+            so that the remaining checks are only performed on the candidates.
+        """
+        eo_objects = list(eo_objects)
+        constraints = self._get_spatial_constraints(containment)
+        if not eo_objects or not constraints:
+            return [
+                eo_object for eo_object in eo_objects
+                if self.matches(eo_object, containment)
+            ]
+
+        bounds = numpy.array(map(_get_bounds, eo_objects), dtype=float)
+        mask = numpy.ones(len(eo_objects), dtype=bool)
+        for geometry, predicate, _ in constraints:
+            mask &= _bounds_mask(bounds, geometry.extent, predicate)
+
+        return [
+            eo_objects[index] for index in numpy.flatnonzero(mask)
+            if self.matches(eo_objects[index], containment)
+        ]
+
+
+    def _get_spatial_constraints(self, containment="overlaps"):
+        """ Returns the spatial constraints of the subsets as a list of 
+            ``(geometry, predicate, exact)`` tuples. The geometries are in 
+            EPSG:4326, the predicate is either "intersects" or "within". If
+            ``exact`` is set, testing the bounding box of a footprint is 
+            sufficient.
+        """
+        bbox = [None, None, None, None]
+        srid = self.xy_srid
+        if srid is None:
+            srid = 4326
+        max_extent = crss.crs_bounds(srid)
+        tolerance = crss.crs_tolerance(srid)
+
+        constraints = []
+
+        for subset in self:
+            if subset.is_temporal:
+                continue
+
+            if isinstance(subset, Slice):
+                value = subset.value
+                if subset.is_x:
+                    line = Line(
+                        (value, max_extent[1]),
+                        (value, max_extent[3])
+                    )
                 else:
-                    if subset.is_x:
-                        bbox[0] = subset.low
-                        bbox[2] = subset.high
-                    else:
-                        bbox[1] = subset.low
-                        bbox[3] = subset.high
+                    line = Line(
+                        (max_extent[0], value),
+                        (max_extent[2], value)
+                    )
+                line.srid = srid
+                if srid != 4326:
+                    line.transform(4326)
+                constraints.append((line, "intersects", False))
 
+            elif isinstance(subset, Trim):
+                if subset.is_x:
+                    bbox[0] = subset.low
+                    bbox[2] = subset.high
+                else:
+                    bbox[1] = subset.low
+                    bbox[3] = subset.high
 
         if bbox != [None, None, None, None]:
             bbox = map(
@@ -283,12 +293,13 @@ class Subsets(list):
             if srid != 4326:
                 poly.transform(4326)
             if containment == "overlaps":
-                if not footprint.intersects(poly):
-                    return False
+                constraints.append((poly, "intersects", False))
             elif containment == "contains":
-                if not footprint.within(poly):
-                    return False
-        return True
+                # a footprint is within a WGS84 bounding box exactly if its 
+                # own bounding box is
+                constraints.append((poly, "within", srid == 4326))
+
+        return constraints
 
 
     def _check_subset(self, subset):
@@ -455,3 +466,48 @@ def is_temporal(axis):
     """ Returns whether or not an axis is a temporal one.
     """
     return (axis.lower() in temporal_axes)
+
+
+def _get_bounds(eo_object):
+    """ Returns the denormalized bounding box of the EO object, or computes it
+        from the footprint if it is not (yet) set. Missing values are NaN.
+    """
+    bounds = (
+        eo_object.min_lon, eo_object.min_lat, 
+        eo_object.max_lon, eo_object.max_lat
+    )
+    if None in bounds and eo_object.footprint is not None:
+        bounds = eo_object.footprint.extent
+    return [value if value is not None else numpy.nan for value in bounds]
+
+
+def _bounds_lookup(extent, predicate):
+    """ Returns the range lookups on the bounding box columns which are implied
+        by the geometric predicate with a geometry of the given extent.
+    """
+    minx, miny, maxx, maxy = extent
+    if predicate == "within":
+        return {
+            "min_lon__gte": minx, "min_lat__gte": miny,
+            "max_lon__lte": maxx, "max_lat__lte": maxy
+        }
+    return {
+        "min_lon__lte": maxx, "min_lat__lte": maxy,
+        "max_lon__gte": minx, "max_lat__gte": miny
+    }
+
+
+def _bounds_mask(bounds, extent, predicate):
+    """ Vectorized version of :func:`_bounds_lookup` for an array of bounding 
+        boxes. Boxes with NaN values never match.
+    """
+    minx, miny, maxx, maxy = extent
+    if predicate == "within":
+        return (
+            (bounds[:, 0] >= minx) & (bounds[:, 1] >= miny) &
+            (bounds[:, 2] <= maxx) & (bounds[:, 3] <= maxy)
+        )
+    return (
+        (bounds[:, 0] <= maxx) & (bounds[:, 1] <= maxy) &
+        (bounds[:, 2] >= minx) & (bounds[:, 3] >= miny)
+    )
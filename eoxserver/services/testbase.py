@@ -37,6 +37,7 @@ import mimetypes
 from cStringIO import StringIO
 
 from django.test import Client
+from django.http import HttpResponse
 from django.conf import settings
 
 from eoxserver.core.system import System
@@ -115,6 +116,17 @@ class OWSTestCase(EOxServerTestCase):
 
         else:
             raise Exception("Invalid request type '%s'." % req_type)
+
+        # consume streamed responses, so that their content can be accessed 
+        # like the one of regular responses
+        if getattr(self.response, "streaming", False):
+            response = HttpResponse(
+                "".join(self.response.streaming_content),
+                status=self.response.status_code
+            )
+            for key, value in self.response.items():
+                response[key] = value
+            self.response = response
     
     def isRequestConfigEnabled(self, config_key, default=False):
         value = System.getConfig().getConfigValue("testing", config_key)
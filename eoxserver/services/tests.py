@@ -27,11 +27,43 @@
 #-------------------------------------------------------------------------------
 
 from textwrap import dedent
+from cStringIO import StringIO
+from ConfigParser import RawConfigParser
+import os.path
+import shutil
+import tempfile
+import time
+import zipfile
 
+from lxml import etree
+from lxml.builder import ElementMaker
 from django.test import TestCase
+from django.utils import unittest
+from django.test.client import RequestFactory
+from django.contrib.gis.geos import GEOSGeometry
 
+from eoxserver.core import env
 from eoxserver.core.util import multiparttools as mp
-from eoxserver.services.result import result_set_from_raw_data
+from eoxserver.contrib import vsi
+from eoxserver.contrib import mapserver as ms
+from eoxserver.contrib import mapserver_pool
+from eoxserver.backends.access import retrieve
+from eoxserver.backends.cache import setup_cache_session, shutdown_cache_session
+from eoxserver.backends.models import DataItem
+from eoxserver.resources.coverages.models import RangeType, RectifiedDataset
+from eoxserver.core.util.xmltools import XMLEncoder, StreamingElement
+from eoxserver.resources.coverages.revision import increment_revision
+from eoxserver.services.result import (
+    result_set_from_raw_data, to_http_response, ResultBuffer, ResultIterator,
+    StreamingHttpResponse, STREAMING_THRESHOLD
+)
+from eoxserver.services.ows.common.cache import CapabilitiesCache
+from eoxserver.services.mapserver.cache import TemplateCache
+from eoxserver.services.auth.base import DecisionCache
+from eoxserver.services.ows.wcs.v20.parameters import WCS20CoverageRenderParams
+from eoxserver.services.ows.wcs.v20.geteocoverageset import (
+    PackageStream, WCS20GetEOCoverageSetHandler, stream_package
+)
 
 
 
@@ -106,3 +138,453 @@ class ResultSetTestCase(TestCase):
         self.assertEqual(first.identifier, "message-part")
         self.assertEqual(str(second.data), "PGh0bWw+CiAgPGhlYWQ+CiAgPC9oZWFkPgogIDxib2R5PgogICAgPHA+VGhpcyBpcyB0aGUgYm9keSBvZiB0aGUgbWVzc2FnZS48L3A+CiAgPC9ib2R5Pgo8L2h0bWw+Cg==")
 
+    @unittest.skipIf(
+        StreamingHttpResponse is None, "Streaming responses require Django 1.5"
+    )
+    def test_to_http_response_streaming(self):
+        small = to_http_response([ResultBuffer("small", "text/plain")])
+        self.assertFalse(getattr(small, "streaming", False))
+        self.assertEqual(small.content, "small")
+
+        data = "x" * (STREAMING_THRESHOLD + 1)
+        large = to_http_response([ResultBuffer(data, "text/plain")])
+        self.assertTrue(large.streaming)
+        chunks = list(large.streaming_content)
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual("".join(chunks), data)
+
+    @unittest.skipIf(
+        StreamingHttpResponse is None, "Streaming responses require Django 1.5"
+    )
+    def test_to_http_response_iterator(self):
+        chunks = ["a,b\r\n", "1,2\r\n"]
+        response = to_http_response([ResultIterator(iter(chunks))])
+        self.assertTrue(response.streaming)
+        self.assertEqual(list(response.streaming_content), chunks)
+
+
+class PackageStreamTestCase(TestCase):
+    """ Test class for streaming packages in chunks
+    """
+
+    def test_zip_stream(self):
+        stream = PackageStream()
+        package = zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED)
+
+        package.writestr("a/first.txt", "first" * 1000)
+        chunks = list(stream.chunks(100))
+        self.assertTrue(len(chunks) > 0)
+        self.assertTrue(all(len(chunk) == 100 for chunk in chunks))
+
+        package.writestr("b/second.txt", "second")
+        package.close()
+        chunks.extend(stream.chunks(100, final=True))
+
+        result = zipfile.ZipFile(StringIO("".join(chunks)))
+        self.assertEqual(result.namelist(), ["a/first.txt", "b/second.txt"])
+        self.assertEqual(result.read("a/first.txt"), "first" * 1000)
+        self.assertEqual(result.read("b/second.txt"), "second")
+
+
+class CapabilitiesCacheTestCase(TestCase):
+    """ Test class for the invalidation of cached capabilities documents
+    """
+
+    def setUp(self):
+        config = RawConfigParser()
+        config.add_section("services.ows.cache")
+        config.set("services.ows.cache", "enabled", "true")
+        config.set("services.ows.cache", "rebuild_in_background", "false")
+        self.cache = CapabilitiesCache(config)
+        self.rendered = []
+
+    def render(self):
+        self.rendered.append(True)
+        return [ResultBuffer("<Capabilities/>", "text/xml")]
+
+    def handle(self, request):
+        return self.cache.handle(self, request, self.render, to_http_response)
+
+    def test_invalidation(self):
+        factory = RequestFactory()
+        request = factory.get("/ows", {"service": "WCS", "request": "GetCapabilities"})
+
+        response = self.handle(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.rendered), 1)
+        etag = response["ETag"]
+
+        # parameter case and order does not matter
+        request = factory.get("/ows?REQUEST=GetCapabilities&SERVICE=WCS")
+        self.assertEqual(self.handle(request)["ETag"], etag)
+        self.assertEqual(len(self.rendered), 1)
+
+        request = factory.get(
+            "/ows", {"service": "WCS", "request": "GetCapabilities"},
+            HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(self.handle(request).status_code, 304)
+        self.assertEqual(len(self.rendered), 1)
+
+        increment_revision()
+        self.assertEqual(self.handle(request).status_code, 304)
+        self.assertEqual(len(self.rendered), 2)
+
+
+class StreamingSerializationTestCase(TestCase):
+    """ Test class for the incremental serialization of XML documents
+    """
+
+    def test_serialize_streaming(self):
+        E = ElementMaker(namespace="http://example.org", nsmap={"ex": "http://example.org"})
+        consumed = []
+
+        def children():
+            for i in range(100):
+                consumed.append(i)
+                yield E("Child", str(i))
+
+        root = StreamingElement(E("Root", count="100"), [
+            StreamingElement(E("Children"), children()), E("Last")
+        ])
+        chunks = XMLEncoder().serialize_streaming(root, chunk_size=100)
+
+        # the children are only generated while the chunks are consumed
+        first = next(chunks)
+        if hasattr(etree, "xmlfile"):
+            self.assertTrue(len(consumed) < 100)
+
+        tree = etree.fromstring(first + "".join(chunks))
+        self.assertEqual(tree.get("count"), "100")
+        self.assertEqual(len(tree), 2)
+        self.assertEqual(
+            [child.text for child in tree[0]], [str(i) for i in range(100)]
+        )
+
+    def test_serialize_buffered(self):
+        # lxml prior to 3.1 does not provide xmlfile
+        E = ElementMaker(namespace="http://example.org", nsmap={"ex": "http://example.org"})
+        root = StreamingElement(E("Root"), [
+            StreamingElement(E("Children"), (E("Child") for i in range(10)))
+        ])
+
+        xmlfile = getattr(etree, "xmlfile", None)
+        if xmlfile:
+            del etree.xmlfile
+        try:
+            chunks = list(XMLEncoder().serialize_streaming(root, chunk_size=100))
+        finally:
+            if xmlfile:
+                etree.xmlfile = xmlfile
+
+        self.assertTrue(len(chunks) > 1)
+        tree = etree.fromstring("".join(chunks))
+        self.assertEqual(len(tree[0]), 10)
+
+
+class TemplateCacheTestCase(TestCase):
+    """ Test class for the least recently used eviction of MapServer templates
+    """
+
+    def test_eviction(self):
+        cache = TemplateCache(2)
+        created = []
+
+        def create(key):
+            created.append(key)
+            return key
+
+        cache.get("a", lambda: create("a"))
+        cache.get("b", lambda: create("b"))
+        cache.get("a", lambda: create("a"))
+        cache.get("c", lambda: create("c"))
+        self.assertEqual(created, ["a", "b", "c"])
+        self.assertEqual(len(cache), 2)
+
+        # "b" was the least recently used one
+        cache.get("a", lambda: create("a"))
+        cache.get("b", lambda: create("b"))
+        self.assertEqual(created, ["a", "b", "c", "b"])
+
+
+class DecisionCacheTestCase(TestCase):
+    """ Test class for the caching policy of authorization decisions
+    """
+
+    def test_expiry(self):
+        cache = DecisionCache(2, ttl=60, denial_ttl=0)
+
+        cache.set("a", (True, "Permit"))
+        cache.set("b", (False, "Deny"))
+        self.assertEqual(cache.get("a"), (True, "Permit"))
+        # denials are not cached with a lifetime of 0
+        self.assertEqual(cache.get("b"), None)
+
+        # "a" is the least recently used decision and is discarded
+        cache.denial_ttl = 60
+        cache.set("b", (False, "Deny"))
+        cache.set("c", (True, "Permit"))
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get("a"), None)
+        self.assertEqual(cache.get("b"), (False, "Deny"))
+
+
+class _Layer(object):
+    def __init__(self, data=None, tileindex=None, connection=None):
+        self.data = data
+        self.tileindex = tileindex
+        self.connection = connection
+
+
+class _Map(object):
+    """ Stand-in for a ``mapscript.mapObj``, only providing what is required
+        to dispatch it.
+    """
+
+    def __init__(self, *layers):
+        self.layers = layers
+        self.numlayers = len(layers)
+
+    def getLayer(self, i):
+        return self.layers[i]
+
+    def save(self, filename):
+        with open(filename, "w") as f:
+            f.write("MAP END")
+
+
+class _Process(object):
+    def __init__(self, alive=True):
+        self.alive = alive
+
+    def is_alive(self):
+        return self.alive
+
+
+class _Worker(object):
+    """ Stand-in for a `mapserver_pool.Worker` that does not start a process.
+    """
+
+    def __init__(self, alive=True):
+        self.process = _Process(alive)
+        self.requests = 0
+        self.terminated = False
+
+    def dispatch(self, mapfile, request_args, files, timeout=None):
+        self.requests += 1
+        return "result"
+
+    def terminate(self):
+        self.process.alive = False
+        self.terminated = True
+
+
+def _serve_never(connection):
+    """ Worker main loop that never responds.
+    """
+    connection.recv()
+    time.sleep(60)
+
+
+class DispatchPoolTestCase(TestCase):
+    """ Test class for the dispatching of MapServer requests to worker 
+        processes
+    """
+
+    def test_request_serialization(self):
+        request = ms.create_request([
+            ("service", "WMS"), ("request", "GetMap"), ("layers", "a,b")
+        ])
+        copy = mapserver_pool.deserialize_request(
+            *mapserver_pool.serialize_request(request)
+        )
+        self.assertEqual(copy.type, ms.MS_GET_REQUEST)
+        self.assertEqual(
+            [(copy.getName(i), copy.getValue(i)) 
+             for i in range(copy.NumParams)],
+            [("service", "WMS"), ("request", "GetMap"), ("layers", "a,b")]
+        )
+
+        request = ms.OWSRequest()
+        request.type = ms.MS_POST_REQUEST
+        request.postrequest = "<GetCapabilities service=\"WCS\"/>"
+        copy = mapserver_pool.deserialize_request(
+            *mapserver_pool.serialize_request(request)
+        )
+        self.assertEqual(copy.type, ms.MS_POST_REQUEST)
+        self.assertEqual(copy.postrequest, request.postrequest)
+        self.assertEqual(copy.NumParams, 0)
+
+
+    def test_collect_vsimem_files(self):
+        files = {
+            "/vsimem/pool-test/a.vrt": 
+                "<SourceFilename>/vsimem/pool-test/b.vrt</SourceFilename>",
+            "/vsimem/pool-test/b.vrt": 
+                "<SourceFilename>/vsimem/pool-test/c.tif</SourceFilename>"
+                "<SourceFilename>/vsimem/pool-test/missing.tif</SourceFilename>",
+            "/vsimem/pool-test/c.tif": "data",
+        }
+        for path, data in files.items():
+            vsi.FileFromMemBuffer(path, data)
+
+        try:
+            map_ = _Map(
+                _Layer(data="/vsimem/pool-test/a.vrt"),
+                _Layer(data="/path/to/file.tif"),
+                # referenced twice, but only collected once
+                _Layer(tileindex="/vsimem/pool-test/c.tif")
+            )
+            self.assertEqual(
+                dict(mapserver_pool.collect_vsimem_files(map_)), files
+            )
+            self.assertEqual(
+                len(mapserver_pool.collect_vsimem_files(map_)), len(files)
+            )
+        finally:
+            for path in files:
+                vsi.unlink(path)
+
+
+    def test_acquire_drops_dead_workers(self):
+        pool = mapserver_pool.DispatchPool(2)
+        alive, dead = _Worker(), _Worker(alive=False)
+        pool._idle = [alive, dead]
+
+        self.assertTrue(pool._acquire() is alive)
+        self.assertTrue(dead.terminated)
+        self.assertEqual(pool._idle, [])
+
+
+    def test_max_requests(self):
+        pool = mapserver_pool.DispatchPool(1, max_requests=2)
+        workers = []
+        def acquire():
+            if not pool._idle:
+                workers.append(_Worker())
+                return workers[-1]
+            return pool._idle.pop()
+        pool._acquire = acquire
+
+        request = ms.create_request([("service", "WMS")])
+        for _ in range(3):
+            self.assertEqual(pool.dispatch(_Map(), request), "result")
+
+        # the first worker was replaced after its second request
+        self.assertEqual(len(workers), 2)
+        self.assertTrue(workers[0].terminated)
+        self.assertFalse(workers[1].terminated)
+        self.assertEqual(pool._idle, [workers[1]])
+
+
+    def test_timeout(self):
+        pool = mapserver_pool.DispatchPool(1, timeout=0.5)
+        request = ms.create_request([("service", "WMS")])
+
+        # the worker processes are started with the patched main loop
+        serve = mapserver_pool._serve
+        mapserver_pool._serve = _serve_never
+        try:
+            with self.assertRaises(ms.MapServerException):
+                pool.dispatch(_Map(), request)
+
+            # the worker is discarded
+            self.assertEqual(pool._idle, [])
+        finally:
+            mapserver_pool._serve = serve
+            pool.close()
+
+
+class DataItemRenderer(object):
+    """ Renders the data item of a coverage as it is. The data item is accessed
+        via the cache context of the current thread.
+    """
+
+    def render(self, params):
+        data_item = params.coverage.data_items.get(semantic="bands[1]")
+        with open(retrieve(data_item)) as f:
+            return [ResultBuffer(f.read(), "text/plain", filename="data.txt")]
+
+
+class DataItemGetEOCoverageSetHandler(WCS20GetEOCoverageSetHandler):
+    abstract = True
+
+    def get_renderer(self, params):
+        return DataItemRenderer()
+
+
+class GetEOCoverageSetStreamingTestCase(TestCase):
+    """ Test class for GetEOCoverageSet packages, which are streamed after the
+        cache session of the request was shut down
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, "data.txt")
+        with open(path, "w") as f:
+            f.write("data")
+
+        range_type = RangeType.objects.create(name="RGB")
+        self.coverages = []
+        for i in range(3):
+            coverage = RectifiedDataset(
+                identifier="rectified-%d" % i,
+                footprint=GEOSGeometry(
+                    "MULTIPOLYGON(((10 10, 20 10, 20 20, 10 20, 10 10)))"
+                ),
+                begin_time="2013-06-11T14:55:23Z", 
+                end_time="2013-06-11T14:55:23Z",
+                min_x=10, min_y=10, max_x=20, max_y=20, srid=4326, 
+                size_x=100, size_y=100, range_type=range_type
+            )
+            coverage.full_clean()
+            coverage.save()
+            DataItem.objects.create(
+                dataset=coverage, location=path, format="text/plain", 
+                semantic="bands[1]"
+            )
+            self.coverages.append(coverage)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assertPackage(self, content):
+        package = zipfile.ZipFile(StringIO(content))
+        self.assertEqual(
+            sorted(package.namelist()), 
+            ["rectified-%d/data.txt" % i for i in range(3)]
+        )
+        for name in package.namelist():
+            self.assertEqual(package.read(name), "data")
+
+    def test_handler(self):
+        request = RequestFactory().get("/ows", {
+            "service": "WCS", "version": "2.0.1", 
+            "request": "GetEOCoverageSet", "format": "application/zip",
+            "eoid": ",".join(c.identifier for c in self.coverages)
+        })
+
+        # same as the BackendsCacheMiddleware, the response is consumed after
+        # the cache session was shut down
+        setup_cache_session()
+        try:
+            response = DataItemGetEOCoverageSetHandler(env).handle(request)
+        finally:
+            shutdown_cache_session()
+
+        # iterating works for both streaming and plain responses (Django 1.4)
+        self.assertPackage("".join(response))
+
+    def test_sequential(self):
+        handler = DataItemGetEOCoverageSetHandler(env)
+        renderer = DataItemRenderer()
+        render_args = [
+            (coverage, renderer, WCS20CoverageRenderParams(coverage))
+            for coverage in self.coverages
+        ]
+        writer = handler.get_pacakge_writer("application/zip", {})
+        content = "".join(stream_package(
+            writer, "application/zip", {}, handler.render_coverage, 
+            render_args, workers=1
+        ))
+        self.assertPackage(content)
@@ -47,9 +47,9 @@ import signal
 import logging
 import traceback
 import os.path 
-import time 
 import struct
 import socket 
+import select 
 from datetime import datetime, timedelta 
 
 
@@ -62,7 +62,7 @@ except: import pickle
 
 #-------------------------------------------------------------------------------
 
-QUEUE_EMPTY_QUERY_DELAY=1.5 # time in seconds of next query to empty queue 
+QUEUE_EMPTY_QUERY_DELAY=1.5 # max. time in seconds of next query to empty queue (unless notified earlier)
 QUEUE_PUT_TIMEOUT=1.0 # time out used by internal task queue put operation 
 QUEUE_CLEAN_UP_COUNT=300 
 
@@ -262,6 +262,7 @@ class WorkerPool( object ) :
 
     def __init__( self , nthread ) :
 
+        self.nthread   = nthread 
         self.queue     = Queue( nthread )
         self.terminate = False 
         self.killChild = False 
@@ -300,20 +301,26 @@ class WorkerPool( object ) :
         taskIds = [] 
         self.terminate = False 
 
+        # listener waking up the loop when new tasks are enqueued 
+        listener = QueueListener() 
+
         while not self.terminate : 
 
             try: 
 
-                # get a pending task from the queue 
-                taskIds = dbLocker( dbLock , dequeueTask , SERVER_ID ) 
+                # get a batch of pending tasks (one per worker) from the queue 
+                taskIds = dbLocker( dbLock , dequeueTasks , SERVER_ID , self.nthread ) 
 
             except QueueEmpty : # no task to be processed 
 
                 # perform DB cleanup 
                 cleanup()
 
-                # wait some ammount of time 
-                time.sleep( QUEUE_EMPTY_QUERY_DELAY ) 
+                # wait until notified or some ammount of time elapsed 
+                try : 
+                    listener.wait( QUEUE_EMPTY_QUERY_DELAY ) 
+                except ( select.error , IOError ) : 
+                    pass # interrupted by a signal 
 
                 # clear counter 
                 cnt = 0 
@@ -336,6 +343,8 @@ class WorkerPool( object ) :
                 cleanup()
                 cnt = 0  
 
+        listener.close() 
+
         info( "[MASTER]: termination in progress ... " ) 
 
         # try to reenequeue processes taken from the DB task queue 
@@ -425,8 +434,8 @@ if __name__ == "__main__" :
     # once the search path is set -> load the required modules
     from eoxserver.core.system import System
     from eoxserver.resources.processes.tracker import TaskStatus, QueueEmpty, \
-            dequeueTask, startTask, reenqueueTask, stopTaskSuccessIfNotFinished, \
-            reenqueueZombieTasks, deleteRetiredTasks, dbLocker 
+            dequeueTasks, startTask, reenqueueTask, stopTaskSuccessIfNotFinished, \
+            reenqueueZombieTasks, deleteRetiredTasks, dbLocker, QueueListener 
 
     # initialize the system 
     System.init()
@@ -47,6 +47,9 @@ from eoxserver.processing.preprocessing.format import (
 from eoxserver.processing.preprocessing.georeference import (
     Extent, GCPList
 )
+from eoxserver.processing.preprocessing.batch import (
+    BatchPreProcessor, jobs_from_manifest, jobs_from_glob
+)
 
 
 def main(args):
@@ -85,6 +88,9 @@ def main(args):
     eoxserver-preprocess.py --bands 1:0:255,2:0:255,3:0:100,4 --rgba \\
                             --no-metadata input.tif
 
+    # streaming a large dataset in windows of at most 64 megabytes
+    eoxserver-preprocess.py --window-budget 64 --no-metadata input.tif
+
     # with DEFLATE compression and color index from a palette file
     eoxserver-preprocess.py  --compression=DEFLATE --zlevel=2 --indexed \\ 
                              --pct palette.vrt --no-metadata input.tif
@@ -99,6 +105,12 @@ def main(args):
                             
     # reading arguments from a file (1 line per argument), with overrides
     eoxserver-preprocess.py @args.txt --crs=3035 --no-tiling input.tif
+
+    # batch processing all files of a directory with 8 worker processes,
+    # resumable after a crash by re-running the same command
+    eoxserver-preprocess.py --no-metadata --glob "/data/*.tif" \\
+                            --output-dir /out --workers 8 \\
+                            --journal /out/batch.journal
     """)
     
     #===========================================================================
@@ -226,6 +238,45 @@ def main(args):
                         help="Additional GDAL dataset creation options. "
                              "See http://www.gdal.org/frmt_gtiff.html")
     
+    parser.add_argument("--window-budget", dest="window_budget",
+                        type=_parse_window_budget,
+                        help="Process the dataset in windows of at most the "
+                             "given size in megabytes instead of loading it "
+                             "to memory as a whole.")
+    parser.add_argument("--approximate-statistics", 
+                        dest="approximate_statistics", action="store_true",
+                        help="Compute the minimum and maximum values for "
+                             "the radiometric scaling from overviews or a "
+                             "subsample of the dataset.")
+    
+    #===========================================================================
+    # Batch processing group
+    #===========================================================================
+    
+    batch_g = parser.add_mutually_exclusive_group()
+    batch_g.add_argument("--manifest", dest="manifest",
+                         help="Batch process the files listed in the given "
+                              "manifest file. Each line contains an input "
+                              "file and optionally an output basename.")
+    batch_g.add_argument("--glob", dest="glob",
+                         help="Batch process all files matching the given "
+                              "pattern.")
+    
+    parser.add_argument("--output-dir", dest="output_dir",
+                        help="The directory for the output files of a batch.")
+    parser.add_argument("--workers", dest="workers", type=int,
+                        help="The number of worker processes of a batch. "
+                             "Defaults to the number of CPUs.")
+    parser.add_argument("--gdal-cache", dest="gdal_cache", type=int,
+                        help="The GDAL cache size of each batch worker in "
+                             "megabytes.")
+    parser.add_argument("--journal", dest="journal",
+                        help="A journal file to record the progress of a "
+                             "batch. Files that were already successfully "
+                             "processed according to the journal are "
+                             "skipped, the outputs of all other files are "
+                             "overridden.")
+    
     parser.add_argument("--traceback", action="store_true", default=False)
     
     parser.add_argument("--force", "-f", dest="force", action="store_true",
@@ -236,7 +287,7 @@ def main(args):
                         default=1,
                         help="Set the verbosity (0, 1, 2). Default is 1.")
     
-    parser.add_argument("input_filename", metavar="infile", nargs=1,
+    parser.add_argument("input_filename", metavar="infile", nargs="?",
                         help="The input raster file to be processed.")
     parser.add_argument("output_basename", metavar="outfiles_basename",
                         nargs="?", 
@@ -245,6 +296,23 @@ def main(args):
     
     values = vars(parser.parse_args(args))
     
+    batch_values = _extract(values, ("manifest", "glob", "output_dir",
+                                     "workers", "gdal_cache", "journal"))
+    batch = "manifest" in batch_values or "glob" in batch_values
+    
+    # check batch values
+    if batch:
+        if "input_filename" in values or "output_basename" in values:
+            parser.error("--manifest and --glob are mutually exclusive with "
+                         "infile and outfiles_basename.")
+        if "generate_metadata" not in values:
+            parser.error("Batch processing requires --no-metadata.")
+        if "extent" in values or "gcps" in values:
+            parser.error("--extent and --gcp cannot be used for batch "
+                         "processing.")
+    
+    elif "input_filename" not in values:
+        parser.error("Either infile, --manifest or --glob is required.")
     
     # check metadata values
     if "generate_metadata" in values and ("begin_time" in values 
@@ -259,9 +327,6 @@ def main(args):
         parser.error("Enter the full metadata with --begin-time, --end-time "
                      "and --coverage-id.")
     
-    # hack to flatten the list
-    values["input_filename"] = values["input_filename"][0]
-    
     georef_crs = values.pop("georef_crs", None)
     
     if "extent" in values:
@@ -300,6 +365,11 @@ def main(args):
         # create a format selection
         format_selection = get_format_selection("GTiff", **format_values)
 
+        if batch:
+            _process_batch(WMSPreProcessor(format_selection, **values),
+                           force, **batch_values)
+            return
+
 
         # TODO: make 'tif' dependant on format selection
         # check files exist
@@ -340,6 +410,41 @@ def main(args):
         sys.stderr.write("%s: %s\n" % (type(e).__name__, str(e)))
 
 
+def _process_batch(preprocessor, force, manifest=None, glob=None,
+                   output_dir=None, workers=None, gdal_cache=None, 
+                   journal=None):
+    """ Helper function to run the batch processing and print the report.
+    """
+    
+    if manifest:
+        jobs = jobs_from_manifest(manifest, output_dir)
+    else:
+        jobs = jobs_from_glob(glob, output_dir)
+    
+    # when resuming from a journal, existing output files of unfinished jobs
+    # are incomplete and are overridden
+    if not force and not journal:
+        jobs = _check_batch_jobs(preprocessor, jobs)
+    
+    batch = BatchPreProcessor(
+        preprocessor, workers, 
+        gdal_cache * 1024 * 1024 if gdal_cache else None, journal
+    )
+    report = batch.process(jobs)
+    
+    print "\n".join(report.summary())
+
+
+def _check_batch_jobs(preprocessor, jobs):
+    """ Helper generator to check that the output files of the batch jobs do 
+        not exist yet.
+    """
+    
+    for job in jobs:
+        check_file_existence(preprocessor.generate_filename(job.output_filename))
+        yield job
+
+
 def _parse_datetime(input_str):
     """ Helper callback function to check if a given datetime is correct.
     """
@@ -376,6 +481,22 @@ def _parse_extent(input_str):
     return map(float, parts)
 
 
+def _parse_window_budget(input_str):
+    """ Helper callback function to parse a window budget in megabytes and 
+        return it in bytes.
+    """
+    
+    try:
+        budget = int(float(input_str) * 1024 * 1024)
+    except ValueError:
+        raise argparse.ArgumentTypeError("Wrong format of window budget.")
+    
+    if budget <= 0:
+        raise argparse.ArgumentTypeError("The window budget must be positive.")
+    
+    return budget
+
+
 def _parse_footprint(input_str):
     """ Helper callback function to parse a footprint.
     """